@@ -11,6 +11,11 @@ from typing import List, Dict, Optional
 
 # 数据库配置 - 从环境变量读取，支持GitHub Secrets
 import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "tools"))
+from rds_pool import get_pool
 
 DB_CONFIG = {
     "host": os.environ.get("RDS_HOST", "pgm-j6c0rrysy447d8tc.pg.rds.aliyuncs.com"),
@@ -31,111 +36,118 @@ DB_CONFIG_LOCAL = {
 
 class MarvinDB:
     def __init__(self):
-        self.conn = None
+        self.pool = None
         self.connect()
     
     def connect(self):
-        """连接数据库"""
+        """连接数据库（共享 rds_pool 连接池）"""
         try:
-            self.conn = psycopg2.connect(**DB_CONFIG)
+            pool = get_pool(DB_CONFIG)
+            # 连接池按需建连，这里取出并归还一个连接，配置错误在此时就报告
+            with pool.get_connection(retries=1):
+                pass
+            self.pool = pool
             print("[DB] 数据库连接成功")
         except Exception as e:
             print(f"[DB] 连接失败: {e}")
     
     def get_active_persons(self, priority: Optional[str] = None) -> List[Dict]:
         """获取活跃监测人员"""
-        cursor = self.conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        
-        if priority:
-            cursor.execute(
-                "SELECT * FROM persons WHERE status = 'active' AND priority = %s ORDER BY priority, name",
-                (priority,)
-            )
-        else:
-            cursor.execute("SELECT * FROM persons WHERE status = 'active' ORDER BY priority, name")
-        
-        return cursor.fetchall()
+        with self.pool.get_connection() as conn:
+            cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+            
+            if priority:
+                cursor.execute(
+                    "SELECT * FROM persons WHERE status = 'active' AND priority = %s ORDER BY priority, name",
+                    (priority,)
+                )
+            else:
+                cursor.execute("SELECT * FROM persons WHERE status = 'active' ORDER BY priority, name")
+            
+            return cursor.fetchall()
     
     def add_activity(self, person_id: int, platform: str, content_original: str,
                      content_summary: str, url: str, category: str, 
                      importance: str, sentiment: str, published_at: datetime) -> int:
         """添加动态记录"""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            INSERT INTO activities (person_id, platform, content_original, content_summary,
-                                   url, category, importance, sentiment, published_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING id
-        """, (person_id, platform, content_original, content_summary, url,
-              category, importance, sentiment, published_at))
-        
-        activity_id = cursor.fetchone()[0]
-        self.conn.commit()
-        
-        # 更新人员最后活跃时间
-        cursor.execute(
-            "UPDATE persons SET last_active = %s WHERE id = %s",
-            (datetime.now(), person_id)
-        )
-        self.conn.commit()
+        with self.pool.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO activities (person_id, platform, content_original, content_summary,
+                                       url, category, importance, sentiment, published_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                RETURNING id
+            """, (person_id, platform, content_original, content_summary, url,
+                  category, importance, sentiment, published_at))
+            
+            activity_id = cursor.fetchone()[0]
+            
+            # 更新人员最后活跃时间（同一事务提交）
+            cursor.execute(
+                "UPDATE persons SET last_active = %s WHERE id = %s",
+                (datetime.now(), person_id)
+            )
+            conn.commit()
         
         return activity_id
     
     def get_recent_activities(self, hours: int = 24) -> List[Dict]:
         """获取最近N小时的动态"""
-        cursor = self.conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
         since = datetime.now() - timedelta(hours=hours)
         
-        cursor.execute("""
-            SELECT a.*, p.name, p.company 
-            FROM activities a
-            JOIN persons p ON a.person_id = p.id
-            WHERE a.created_at > %s
-            ORDER BY a.importance DESC, a.created_at DESC
-        """, (since,))
-        
-        return cursor.fetchall()
+        with self.pool.get_connection() as conn:
+            cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+            cursor.execute("""
+                SELECT a.*, p.name, p.company 
+                FROM activities a
+                JOIN persons p ON a.person_id = p.id
+                WHERE a.created_at > %s
+                ORDER BY a.importance DESC, a.created_at DESC
+            """, (since,))
+            
+            return cursor.fetchall()
     
     def get_weekly_stats(self, start_date: datetime, end_date: datetime) -> Dict:
         """获取周报统计数据"""
-        cursor = self.conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        
-        # 总动态数
-        cursor.execute("""
-            SELECT COUNT(*) as count FROM activities 
-            WHERE published_at BETWEEN %s AND %s
-        """, (start_date, end_date))
-        total = cursor.fetchone()['count']
-        
-        # 按平台统计
-        cursor.execute("""
-            SELECT platform, COUNT(*) as count 
-            FROM activities 
-            WHERE published_at BETWEEN %s AND %s
-            GROUP BY platform
-        """, (start_date, end_date))
-        by_platform = {row['platform']: row['count'] for row in cursor.fetchall()}
-        
-        # 按重要性统计
-        cursor.execute("""
-            SELECT importance, COUNT(*) as count 
-            FROM activities 
-            WHERE published_at BETWEEN %s AND %s
-            GROUP BY importance
-        """, (start_date, end_date))
-        by_importance = {row['importance']: row['count'] for row in cursor.fetchall()}
-        
-        # 高重要性动态详情
-        cursor.execute("""
-            SELECT a.*, p.name, p.company 
-            FROM activities a
-            JOIN persons p ON a.person_id = p.id
-            WHERE a.published_at BETWEEN %s AND %s
-            AND a.importance = '高'
-            ORDER BY a.published_at DESC
-            LIMIT 10
-        """, (start_date, end_date))
-        key_events = cursor.fetchall()
+        with self.pool.get_connection() as conn:
+            cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+            
+            # 总动态数
+            cursor.execute("""
+                SELECT COUNT(*) as count FROM activities 
+                WHERE published_at BETWEEN %s AND %s
+            """, (start_date, end_date))
+            total = cursor.fetchone()['count']
+            
+            # 按平台统计
+            cursor.execute("""
+                SELECT platform, COUNT(*) as count 
+                FROM activities 
+                WHERE published_at BETWEEN %s AND %s
+                GROUP BY platform
+            """, (start_date, end_date))
+            by_platform = {row['platform']: row['count'] for row in cursor.fetchall()}
+            
+            # 按重要性统计
+            cursor.execute("""
+                SELECT importance, COUNT(*) as count 
+                FROM activities 
+                WHERE published_at BETWEEN %s AND %s
+                GROUP BY importance
+            """, (start_date, end_date))
+            by_importance = {row['importance']: row['count'] for row in cursor.fetchall()}
+            
+            # 高重要性动态详情
+            cursor.execute("""
+                SELECT a.*, p.name, p.company 
+                FROM activities a
+                JOIN persons p ON a.person_id = p.id
+                WHERE a.published_at BETWEEN %s AND %s
+                AND a.importance = '高'
+                ORDER BY a.published_at DESC
+                LIMIT 10
+            """, (start_date, end_date))
+            key_events = cursor.fetchall()
         
         return {
             "total": total,
@@ -147,42 +159,42 @@ class MarvinDB:
     def add_weekly_report(self, week_number: str, start_date: datetime, 
                          end_date: datetime, stats: Dict, report: str):
         """添加周报"""
-        cursor = self.conn.cursor()
-        
         key_events_text = "\n".join([
             f"- {e['name']} ({e['company']}): {e['content_summary']}"
             for e in stats['key_events']
         ])
         
-        cursor.execute("""
-            INSERT INTO weekly_reports (week_number, start_date, end_date, 
-                                       activity_count, key_events, full_report)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (week_number, start_date, end_date, stats['total'], 
-              key_events_text, report))
-        
-        self.conn.commit()
+        with self.pool.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO weekly_reports (week_number, start_date, end_date, 
+                                           activity_count, key_events, full_report)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, (week_number, start_date, end_date, stats['total'], 
+                  key_events_text, report))
+            conn.commit()
     
     def log_adjustment(self, person_id: int, action_type: str, reason: str,
                        trigger_by: str, details: str = ""):
         """记录名单调整"""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            INSERT INTO adjustment_logs (person_id, action_type, reason, trigger_by, details)
-            VALUES (%s, %s, %s, %s, %s)
-        """, (person_id, action_type, reason, trigger_by, details))
-        self.conn.commit()
+        with self.pool.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO adjustment_logs (person_id, action_type, reason, trigger_by, details)
+                VALUES (%s, %s, %s, %s, %s)
+            """, (person_id, action_type, reason, trigger_by, details))
+            conn.commit()
     
     def execute_sql(self, sql: str, params=None) -> List[Dict]:
         """执行自定义SQL查询"""
-        cursor = self.conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        cursor.execute(sql, params or ())
-        return cursor.fetchall()
+        with self.pool.get_connection() as conn:
+            cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+            cursor.execute(sql, params or ())
+            return cursor.fetchall()
     
     def close(self):
-        """关闭连接"""
-        if self.conn:
-            self.conn.close()
+        """释放引用（连接由共享连接池统一管理）"""
+        self.pool = None
 
 if __name__ == "__main__":
     # 测试数据库连接
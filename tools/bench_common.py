@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+基准测试共用的工具：合成词表、逐次计时、分位数与延迟摘要、切换到基准 schema 的连接池连接
+"""
+
+import random
+import time
+from contextlib import contextmanager
+
+COMMON_CHARS = ("的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处理世车")
+TECH_WORDS = ["rds", "postgres", "docker", "feishu", "github", "backup", "memory", "vector",
+              "index", "email", "restaurant", "cron", "python", "nginx", "redis", "vpn",
+              "wireguard", "akshare", "gaode", "webhook", "pool", "spool", "query", "cache"]
+
+
+def make_vocab(seed=42, cjk_words=4000, latin_words=2000):
+    """合成词表：常见技术词 + 随机汉字二元组 + 随机英文词（打乱顺序）"""
+    rng = random.Random(seed)
+    words = list(TECH_WORDS)
+    words += [''.join(rng.sample(COMMON_CHARS, 2)) for _ in range(cjk_words)]
+    words += [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(4, 9)))
+              for _ in range(latin_words)]
+    rng.shuffle(words)
+    return words
+
+
+def zipf_pick(rng, words):
+    """偏向词表前部地取词（近似 Zipf 分布，常用词出现得多）"""
+    return words[int(len(words) * rng.random() ** 3)]
+
+
+def timed(fn, items):
+    """逐个执行 fn(item)，返回 (每次耗时毫秒列表, 结果列表)"""
+    times, results = [], []
+    for item in items:
+        start = time.perf_counter()
+        results.append(fn(item))
+        times.append((time.perf_counter() - start) * 1000)
+    return times, results
+
+
+def percentile(times, p):
+    ordered = sorted(times)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def fmt(times, digits=2):
+    """p50 / p99 延迟摘要"""
+    return f"p50 {percentile(times, 0.5):9.{digits}f} ms  p99 {percentile(times, 0.99):9.{digits}f} ms"
+
+
+@contextmanager
+def schema_connection(rds, schema):
+    """从连接池取连接并切换到基准 schema，归还前恢复
+
+    切换后立即提交，基准代码中途 rollback 不会把 search_path 一起回滚。
+    """
+    from rds_manager import RDSManager
+
+    with RDSManager.get_connection(rds) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"SET search_path TO {schema}, public")
+        conn.commit()
+        try:
+            yield conn
+        finally:
+            conn.rollback()
+            with conn.cursor() as cursor:
+                cursor.execute("RESET search_path")
+            conn.commit()
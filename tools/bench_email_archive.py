@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+EmailArchiveRDS 批量归档基准测试
+在独立 schema (bench_email) 中对比:
+- 旧实现: 每封邮件一次 INSERT + 提交（连接池取连接 / 每封新建连接两种）
+- 新实现: bulk_archive，COPY 到临时表 + 一条 INSERT ... ON CONFLICT 合并，正文 zlib 压缩
+再次归档同一批邮件验证 ON CONFLICT 更新路径。
+
+用法:
+  python3 bench_email_archive.py                     # 默认 100,000 封（旧实现取前 2,000 封）
+  python3 bench_email_archive.py --emails 20000 --legacy 500
+  python3 bench_email_archive.py --drop              # 删除 bench_email schema
+"""
+
+import argparse
+import json
+import random
+import time
+from email.utils import format_datetime
+from datetime import datetime, timedelta
+
+import psycopg2
+
+from rds_manager import RDSManager
+from bench_common import schema_connection
+from rds_pool import _normalize_config
+from email_rds import EmailArchiveRDS, parse_sender
+
+SCHEMA = "bench_email"
+
+LEGACY_SQL = """
+INSERT INTO emails
+(message_id, subject, sender, sender_name, received_at, category,
+ is_read, body_summary, full_content, labels)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+ON CONFLICT (message_id) DO UPDATE SET
+category = EXCLUDED.category, is_read = EXCLUDED.is_read
+"""
+
+SENDERS = ["GitHub <noreply@github.com>", "Shop <news@mailchimp.com>", "同事 <colleague@corp.cn>",
+           "Friend <friend@example.com>", "Zwift <hello@zwift.com>", "Bank <service@bank.cn>"]
+WORDS = ["meeting", "invoice", "report", "project", "deploy", "review", "weekly", "update",
+         "会议", "报告", "项目", "发布", "周报", "账单", "提醒", "总结", "the", "and", "for", "with"]
+
+
+def make_bodies(count=200, seed=1):
+    rng = random.Random(seed)
+    return ['\n'.join(' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 16)))
+                      for _ in range(rng.randint(20, 80)))
+            for _ in range(count)]
+
+
+def make_emails(n, seed=1):
+    """合成邮件生成器（正文从预生成的池中选取，避免生成数据本身成为瓶颈）"""
+    rng = random.Random(seed)
+    bodies = make_bodies()
+    start = datetime(2020, 1, 1)
+    for i in range(n):
+        yield {
+            'id': str(i + 1),
+            'message_id': f'<bench-{i}@example.com>',
+            'subject': ' '.join(rng.choice(WORDS) for _ in range(6)),
+            'from': rng.choice(SENDERS),
+            'date': format_datetime(start + timedelta(minutes=i * 17)),
+            'is_read': rng.random() < 0.7,
+            'body': f'#{i}\n' + bodies[i % len(bodies)],
+            'labels': ['INBOX'],
+        }
+
+
+def legacy_row(e):
+    sender, sender_name = parse_sender(e['from'])
+    return (e['message_id'], e['subject'][:500], sender[:250], sender_name[:250], e['date'],
+            'normal', e['is_read'], e['body'][:500], e['body'], json.dumps(e['labels']))
+
+
+def setup(rds):
+    with rds.get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+            cursor.execute(f"SET search_path TO {SCHEMA}, public")
+            cursor.execute(rds._create_emails_table())
+            cursor.execute("RESET search_path")
+            conn.commit()
+
+
+def table_size(rds):
+    with rds.get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"SELECT count(*), pg_total_relation_size('{SCHEMA}.emails') FROM {SCHEMA}.emails")
+            return cursor.fetchone()
+
+
+def truncate(rds):
+    with rds.get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {SCHEMA}.emails")
+            conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="邮件批量归档基准")
+    parser.add_argument('--emails', type=int, default=100000)
+    parser.add_argument('--legacy', type=int, default=2000, help="旧实现写入的邮件数")
+    parser.add_argument('--drop', action='store_true', help="删除基准 schema 后退出")
+    args = parser.parse_args()
+
+    rds = RDSManager()
+    if args.drop:
+        with rds.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+                conn.commit()
+        print(f"🗑️ 已删除 schema {SCHEMA}")
+        return
+
+    setup(rds)
+    print(f"📐 合成邮件 {args.emails:,} 封（旧实现 {args.legacy:,} 封）")
+
+    # 旧实现 1: 连接池取连接，每封一次提交
+    legacy = list(make_emails(args.legacy))
+    start = time.perf_counter()
+    for e in legacy:
+        with schema_connection(rds, SCHEMA) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(LEGACY_SQL, legacy_row(e))
+                conn.commit()
+    pooled_s = time.perf_counter() - start
+    legacy_rows, legacy_bytes = table_size(rds)
+    truncate(rds)
+
+    # 旧实现 2: 每封新建连接（改造前的 archive_email，远程 RDS 上还要加上 TCP/TLS 握手）
+    config = _normalize_config(rds.config)
+    config.pop('statement_timeout_ms')
+    n_connect = min(args.legacy, 500)
+    start = time.perf_counter()
+    for e in legacy[:n_connect]:
+        conn = psycopg2.connect(**config, connect_timeout=10, options=f'-c search_path={SCHEMA}')
+        with conn.cursor() as cursor:
+            cursor.execute(LEGACY_SQL, legacy_row(e))
+        conn.commit()
+        conn.close()
+    connect_s = time.perf_counter() - start
+    truncate(rds)
+
+    # 新实现
+    tool = EmailArchiveRDS()
+    tool.rds.get_connection = lambda: schema_connection(rds, SCHEMA)
+    stats = tool.bulk_archive(make_emails(args.emails))
+    rows, size = table_size(rds)
+    again = tool.bulk_archive(make_emails(args.emails))
+
+    print(f"\n  {'旧: 每封新建连接':<22} {n_connect / connect_s:>10,.0f} 行/秒")
+    print(f"  {'旧: 连接池 + 每封提交':<20} {args.legacy / pooled_s:>10,.0f} 行/秒  "
+          f"表大小 {legacy_bytes / max(legacy_rows, 1):,.0f} 字节/封")
+    print(f"  {'新: COPY + 合并':<22} {stats['rows_per_sec']:>10,} 行/秒  "
+          f"表大小 {size / max(rows, 1):,.0f} 字节/封  ({stats['batches']} 批, {stats['seconds']:.1f}s)")
+    print(f"  {'新: 重复归档（更新）':<20} {again['rows_per_sec']:>10,} 行/秒  "
+          f"新增 {again['inserted']:,} 更新 {again['updated']:,}")
+    print(f"  正文压缩: {stats['body_bytes'] / 1e6:,.1f} MB -> {stats['stored_bytes'] / 1e6:,.1f} MB "
+          f"({stats['body_bytes'] / max(stats['stored_bytes'], 1):.1f}x)")
+    sample = tool.get_full_content('<bench-0@example.com>')
+    print(f"  正文读回校验: {'通过' if sample == next(make_emails(1))['body'] else '失败'}")
+
+
+if __name__ == '__main__':
+    main()
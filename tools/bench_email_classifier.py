@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+邮件分类器微基准
+用合成邮件头对比:
+- 旧实现: 每封邮件对每个关键词执行一次 `kw in text`（重要 / 营销关键词 / 域名三轮循环）
+- 新实现: 全部关键词编译为一个字典树正则，逐封 classify() 与整批 classify_batch()
+--extra-keywords 额外加入随机关键词，观察规则数增长时两者的耗时变化。
+
+用法:
+  python3 bench_email_classifier.py                          # 10,000 封，额外关键词 0,500,2000
+  python3 bench_email_classifier.py --emails 100000 --extra-keywords 0
+"""
+
+import argparse
+import copy
+import random
+import string
+import time
+
+from email_classifier import RuleClassifier, load_rules
+
+SUBJECT_WORDS = ["hello", "your", "account", "report", "team", "notes", "project", "order",
+                 "shipped", "review", "update", "weekly", "trip", "photos", "ride", "summary",
+                 "你好", "明天", "项目", "报告", "周末", "照片", "订单", "出发"]
+SENDERS = ["GitHub <noreply@github.com>", "Shop <news@mailchimp.com>", "同事 <colleague@corp.cn>",
+           "Friend <friend@example.com>", "Zwift <hello@zwift.com>", "Bank <service@bank.cn>",
+           "Hyatt <offers@email.hyatt.com>", "Boss <boss@company.com>"]
+
+
+def make_emails(n, rules, seed=1):
+    rng = random.Random(seed)
+    keywords = [kw for rule in rules['rules'] for kw in rule.get('keywords', [])]
+    emails = []
+    for _ in range(n):
+        words = [rng.choice(SUBJECT_WORDS) for _ in range(rng.randint(4, 10))]
+        if rng.random() < 0.4:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(keywords))
+        emails.append({'subject': ' '.join(words), 'from': rng.choice(SENDERS)})
+    return emails
+
+
+def add_extra_keywords(rules, count, seed=2):
+    rules = copy.deepcopy(rules)
+    if count:
+        rng = random.Random(seed)
+        rules['rules'].append({
+            'name': '扩展关键词', 'category': rules['categories'][-1], 'field': 'any', 'weight': 1,
+            'keywords': [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 10)))
+                         for _ in range(count)],
+        })
+    return rules
+
+
+def legacy_classifier(rules):
+    """旧实现的逐关键词扫描（与改造前 email_quick / email_cleaner 相同的循环结构）"""
+    important = [kw.lower() for r in rules['rules'] if r['category'] == 'important'
+                 for kw in r.get('keywords', [])]
+    promo = [kw.lower() for r in rules['rules'] if r['category'] != 'important'
+             for kw in r.get('keywords', [])]
+    domains = [d for r in rules['rules'] for d in r.get('domains', [])]
+
+    def classify(e):
+        subject = e['subject'].lower()
+        from_addr = e['from'].lower()
+        score = 0
+        for kw in important:
+            if kw in subject:
+                score += 3
+        if 'github' in from_addr and 'alert' in subject:
+            score += 5
+        if score:
+            return 'important'
+        text = f"{subject} {from_addr}"
+        for kw in promo:
+            if kw in text:
+                return 'promo'
+        for d in domains:
+            if d in from_addr:
+                return 'promo'
+        return 'normal'
+    return classify
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - start), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="邮件分类器微基准")
+    parser.add_argument('--emails', type=int, default=10000)
+    parser.add_argument('--extra-keywords', default='0,500,2000', help="逗号分隔的额外关键词数")
+    args = parser.parse_args()
+
+    base_rules = load_rules()
+    emails = make_emails(args.emails, base_rules)
+    print(f"📐 {len(emails):,} 封合成邮件头")
+
+    for extra in [int(x) for x in args.extra_keywords.split(',')]:
+        rules = add_extra_keywords(base_rules, extra)
+        legacy = legacy_classifier(rules)
+        build_s, classifier = timed(lambda: RuleClassifier(rules))
+        stats = classifier.get_stats()
+
+        legacy_s, legacy_cats = timed(lambda: [legacy(e) for e in emails])
+        single_s, _ = timed(lambda: [classifier.classify(e) for e in emails])
+        batch_s, results = timed(lambda: classifier.classify_batch(emails))
+        new_cats = [r['category'] for r in results]
+
+        per = lambda s: s / len(emails) * 1e6
+        print(f"\n  关键词 {stats['keywords']:,} 个（正则 {stats['pattern_chars']:,} 字符，编译 {build_s * 1000:.1f} ms）")
+        print(f"  {'旧: 逐关键词扫描':<20} {per(legacy_s):8.1f} µs/封  {len(emails) / legacy_s:>10,.0f} 封/秒")
+        print(f"  {'新: classify()':<20} {per(single_s):8.1f} µs/封  {len(emails) / single_s:>10,.0f} 封/秒")
+        print(f"  {'新: classify_batch()':<20} {per(batch_s):8.1f} µs/封  {len(emails) / batch_s:>10,.0f} 封/秒  "
+              f"(加速 {legacy_s / batch_s:.1f}x)")
+        agree = sum(a == b for a, b in zip(legacy_cats, new_cats)) / len(emails)
+        counts = {c: new_cats.count(c) for c in ('important', 'promo', 'normal')}
+        print(f"  新实现分类: {counts}，与旧实现一致 {agree:.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+EmailArchiveRDS 搜索基准测试
+在独立 schema (bench_email_search) 中生成合成邮件，对比:
+- 旧实现: subject / body_summary / sender ILIKE '%kw%'（时间范围内逐行扫描），只有 LIMIT
+- 新实现: search_vector (GIN，中文二元组) [+ pg_trgm 索引]，按 (received_at, id) 游标翻页
+每种场景报告 p50 / p99 延迟。
+
+用法:
+  python3 bench_email_search.py                    # 默认 1,000,000 封
+  python3 bench_email_search.py --rows 100000 --queries 50
+  python3 bench_email_search.py --keep             # 保留已生成的数据（规模不变时跳过生成）
+  python3 bench_email_search.py --drop             # 删除 bench_email_search schema
+"""
+
+import argparse
+import random
+import re
+import statistics
+import time
+
+from rds_manager import RDSManager
+from email_rds import EmailArchiveRDS, SEARCH_DDL, TRIGRAM_DDL
+from bench_common import make_vocab, percentile, schema_connection, timed, zipf_pick
+
+SCHEMA = "bench_email_search"
+BATCH = 100000
+PAGE = 50
+
+# 旧实现的查询（改造前的 search_emails）
+LEGACY_SQL = """
+SELECT * FROM emails
+WHERE received_at > NOW() - INTERVAL '%s days' {extra}
+ORDER BY received_at DESC
+LIMIT %s OFFSET %s
+"""
+
+
+def make_senders(n=5000, seed=3):
+    rng = random.Random(seed)
+    domains = ['github.com', 'mailchimp.com', 'corp.cn', 'example.com', 'zwift.com', 'bank.cn',
+               'qq.com', '163.com', 'gmail.com', 'outlook.com']
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    return [f"{''.join(rng.choice(letters) for _ in range(rng.randint(4, 10)))}@{rng.choice(domains)}"
+            for _ in range(n)]
+
+
+def populate(cursor, conn, rows, words, senders):
+    cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+    cursor.execute(f"SET search_path TO {SCHEMA}, public")
+    cursor.execute(RDSManager()._create_emails_table())
+    conn.commit()
+
+    start = time.perf_counter()
+    for lo in range(1, rows + 1, BATCH):
+        hi = min(lo + BATCH - 1, rows)
+        cursor.execute("""
+            INSERT INTO emails (message_id, subject, sender, sender_name, received_at, category,
+                                is_read, body_summary, labels)
+            SELECT '<bench-' || g || '@example.com>', c.subject, (%(senders)s)[1 + g %% %(nsenders)s], '',
+                   NOW() - random() * INTERVAL '1095 days', (%(cats)s)[1 + g %% 3],
+                   random() < 0.7, left(c.body, 500), '["INBOX"]'
+            FROM generate_series(%(lo)s, %(hi)s) AS g
+            CROSS JOIN LATERAL (
+                SELECT string_agg(w, ' ') FILTER (WHERE n <= 4 + g %% 6) AS subject,
+                       string_agg(w, ' ') AS body
+                FROM (SELECT n, (%(words)s)[1 + floor(%(nwords)s * power(random(), 3))::int] AS w
+                      FROM generate_series(1, 30 + g %% 40) AS n) t
+            ) c
+        """, {'senders': senders, 'nsenders': len(senders), 'cats': ['important', 'promo', 'normal'],
+              'lo': lo, 'hi': hi, 'words': words, 'nwords': len(words)})
+        conn.commit()
+        print(f"  写入 {hi:,}/{rows:,} 封 ({time.perf_counter() - start:.0f}s)", flush=True)
+
+
+def build_indexes(cursor, conn):
+    """创建检索列与索引（已存在则跳过）"""
+    start = time.perf_counter()
+    for sql in SEARCH_DDL:
+        cursor.execute(sql)
+    conn.commit()
+    print(f"  search_vector 列 + GIN / 游标索引 {time.perf_counter() - start:.0f}s")
+
+    for sql in TRIGRAM_DDL:
+        try:
+            cursor.execute(sql)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            cursor.execute(f"SET search_path TO {SCHEMA}, public; SET statement_timeout = 0")
+            print(f"  ⚠️ pg_trgm 不可用，发件人搜索按时间范围扫描: {str(e).splitlines()[0]}")
+            break
+    cursor.execute("ANALYZE emails")
+    conn.commit()
+
+
+def legacy_search(rds, keyword=None, sender=None, days=30, offset=0):
+    extra, params = '', [days]
+    if keyword:
+        extra += " AND (subject ILIKE %s OR body_summary ILIKE %s)"
+        params += [f"%{keyword}%", f"%{keyword}%"]
+    if sender:
+        extra += " AND sender ILIKE %s"
+        params.append(f"%{sender}%")
+    with schema_connection(rds, SCHEMA) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(LEGACY_SQL.format(extra=extra), params + [PAGE, offset])
+            return cursor.fetchall()
+
+
+def report(name, old_times, new_times):
+    print(f"  {name:<16} 旧 p50 {percentile(old_times, 0.5):8.2f} ms  p99 {percentile(old_times, 0.99):8.2f} ms"
+          f"  |  新 p50 {percentile(new_times, 0.5):7.2f} ms  p99 {percentile(new_times, 0.99):7.2f} ms"
+          f"  (p50 加速 {percentile(old_times, 0.5) / max(percentile(new_times, 0.5), 1e-6):.0f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="邮件搜索基准")
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--keep', action='store_true', help="规模一致时复用已有数据")
+    parser.add_argument('--drop', action='store_true', help="删除基准 schema 后退出")
+    args = parser.parse_args()
+
+    rds = RDSManager()
+    with rds.get_connection() as conn:
+        with conn.cursor() as cursor:
+            try:
+                if args.drop:
+                    cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+                    conn.commit()
+                    print(f"🗑️ 已删除 schema {SCHEMA}")
+                    return
+
+                words = make_vocab()
+                senders = make_senders()
+                existing = 0
+                if args.keep:
+                    cursor.execute("SELECT to_regclass(%s)", (f"{SCHEMA}.emails",))
+                    if cursor.fetchone()[0]:
+                        cursor.execute(f"SELECT count(*) FROM {SCHEMA}.emails")
+                        existing = cursor.fetchone()[0]
+                # 生成数据与建索引可能超过连接池默认的语句超时
+                cursor.execute("SET statement_timeout = 0")
+                if existing != args.rows:
+                    print(f"📦 生成 {args.rows:,} 封合成邮件...")
+                    populate(cursor, conn, args.rows, words, senders)
+                cursor.execute(f"SET search_path TO {SCHEMA}, public")
+                build_indexes(cursor, conn)
+            finally:
+                conn.rollback()
+                cursor.execute("RESET search_path; RESET statement_timeout")
+                conn.commit()
+
+    tool = EmailArchiveRDS()
+    tool.rds.get_connection = lambda: schema_connection(rds, SCHEMA)
+    rng = random.Random(7)
+    keywords = [zipf_pick(rng, words) for _ in range(args.queries)]
+    sender_terms = [rng.choice(senders).split('@')[0][:5] for _ in range(args.queries)]
+    features = None
+    with schema_connection(rds, SCHEMA) as conn:
+        with conn.cursor() as cursor:
+            features = tool._detect_search_features(cursor)
+    print(f"\n📐 {args.rows:,} 封邮件, 每个场景 {args.queries} 个查询, 每页 {PAGE} 封, "
+          f"pg_trgm={'是' if features['trigram'] else '否'}")
+
+    # 预热
+    tool.search_page(keyword=keywords[0], limit=PAGE)
+    legacy_search(rds, keyword=keywords[0])
+
+    scenarios = [
+        ("关键词 近30天", lambda k: legacy_search(rds, keyword=k),
+         lambda k: tool.search_page(keyword=k, limit=PAGE)['emails'], keywords),
+        ("关键词 全部", lambda k: legacy_search(rds, keyword=k, days=3650),
+         lambda k: tool.search_page(keyword=k, days=None, limit=PAGE)['emails'], keywords),
+        ("发件人 全部", lambda s: legacy_search(rds, sender=s, days=3650),
+         lambda s: tool.search_page(sender=s, days=None, limit=PAGE)['emails'], sender_terms),
+    ]
+    for name, old_fn, new_fn, items in scenarios:
+        old_times, old_results = timed(old_fn, items)
+        new_times, new_results = timed(new_fn, items)
+        report(name, old_times, new_times)
+        same = sum({r[0] for r in a} == {r[0] for r in b} for a, b in zip(old_results, new_results))
+        print(f"  {'':<16} 结果与旧实现一致 {same}/{len(items)}，"
+              f"平均命中 {statistics.mean(len(r) for r in new_results):.1f} 封")
+
+    # 第 10 页: 旧实现只能 OFFSET，新实现带上一页游标
+    deep = keywords[:max(1, args.queries // 5)]
+    cursors = []
+    for k in deep:
+        cursor = None
+        for _ in range(9):
+            cursor = tool.search_page(keyword=k, days=None, limit=PAGE, cursor=cursor)['next_cursor']
+            if cursor is None:
+                break
+        cursors.append((k, cursor))
+    cursors = [(k, c) for k, c in cursors if c is not None]
+    if cursors:
+        old_times, _ = timed(lambda kc: legacy_search(rds, keyword=kc[0], days=3650, offset=9 * PAGE), cursors)
+        new_times, _ = timed(lambda kc: tool.search_page(keyword=kc[0], days=None, limit=PAGE,
+                                                         cursor=kc[1])['emails'], cursors)
+        report("第10页 全部", old_times, new_times)
+
+    with schema_connection(rds, SCHEMA) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("EXPLAIN SELECT id FROM emails, (SELECT email_search_query(%s) AS tsq) q "
+                           "WHERE search_vector @@ q.tsq ORDER BY received_at DESC, id DESC LIMIT 50",
+                           (keywords[1],))
+            plan = [row[0] for row in cursor.fetchall()]
+            used = sorted({m.group(1) for line in plan
+                           for m in [re.search(r'Index (?:Only )?Scan(?: Backward)? (?:using|on) (\w+)', line)] if m})
+            print(f"  执行计划使用的索引: {', '.join(used) or '无'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+高德批量地理编码基准测试（离线）
+在本进程内启动模拟高德 Web 服务的桩服务（/v3/geocode/geo、/v3/direction/driving），
+按 --latency 延迟答复，超过 --qps 次/秒时返回 CUQPS_HAS_EXCEEDED_THE_LIMIT，
+超过日配额时返回 DAILY_QUERY_OVER_LIMIT。以 restaurants_full.csv 为模板生成餐厅 CSV（约 10% 地址重复），对比:
+- 旧实现: 逐个请求 + time.sleep(0.2)，没有缓存
+- 新实现: batch_geocode_restaurants（令牌桶限速 + 线程池 + SQLite 缓存）
+  冷缓存 / 重复执行（全部命中缓存）/ 配额中途用完后从断点续传；driving_route 两次调用的请求数
+
+用法:
+  python3 bench_gaode_geocode.py                          # 200 家，QPS 10，延迟 100ms
+  python3 bench_gaode_geocode.py --rows 500 --qps 3 --latency 0.3
+"""
+
+import argparse
+import contextlib
+import csv
+import hashlib
+import io
+import json
+import random
+import tempfile
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from gaode_map import GaodeMap, batch_geocode_restaurants
+
+TEMPLATE_CSV = Path(__file__).resolve().parent.parent / "restaurants_full.csv"
+
+
+class StubGaode:
+    """桩服务状态：请求计数、每秒请求窗口、日配额"""
+
+    def __init__(self, qps, latency, quota=None):
+        self.qps = qps
+        self.latency = latency
+        self.quota = quota
+        self.lock = threading.Lock()
+        self.window = deque()
+        self.counts = {'requests': 0, 'geocode': 0, 'route': 0, 'qps_rejected': 0, 'quota_rejected': 0}
+
+    def admit(self):
+        """-> None（放行）或错误答复"""
+        with self.lock:
+            now = time.monotonic()
+            self.counts['requests'] += 1
+            while self.window and self.window[0] <= now - 1.0:
+                self.window.popleft()
+            if self.quota is not None and self.counts['geocode'] + self.counts['route'] >= self.quota:
+                self.counts['quota_rejected'] += 1
+                return {"status": "0", "info": "DAILY_QUERY_OVER_LIMIT", "infocode": "10003"}
+            if len(self.window) >= self.qps:
+                self.counts['qps_rejected'] += 1
+                return {"status": "0", "info": "CUQPS_HAS_EXCEEDED_THE_LIMIT", "infocode": "10021"}
+            self.window.append(now)
+            return None
+
+    def geocode(self, address):
+        digest = hashlib.md5(address.encode('utf-8')).digest()
+        if digest[0] < 13:                      # 约 5% 的地址没有结果
+            return {"status": "1", "info": "OK", "infocode": "10000", "count": "0", "geocodes": []}
+        lng = 113.20 + digest[1] / 255 * 0.25
+        lat = 22.95 + digest[2] / 255 * 0.25
+        return {"status": "1", "info": "OK", "infocode": "10000", "count": "1", "geocodes": [{
+            "formatted_address": f"广东省广州市{address}", "province": "广东省", "city": "广州市",
+            "district": "", "adcode": "440100", "location": f"{lng:.6f},{lat:.6f}",
+        }]}
+
+
+def make_handler(stub):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            time.sleep(stub.latency)
+            body = stub.admit()
+            if body is None:
+                if url.path.endswith('/geocode/geo'):
+                    stub.counts['geocode'] += 1
+                    body = stub.geocode(params.get('address', ''))
+                elif url.path.endswith('/direction/driving'):
+                    stub.counts['route'] += 1
+                    body = {"status": "1", "info": "OK", "route": {"paths": [
+                        {"distance": "5230", "duration": "960", "tolls": "0", "traffic_lights": "7"}]}}
+                else:
+                    body = {"status": "0", "info": "INVALID_PARAMS", "infocode": "20000"}
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def make_csv(path, rows, seed=1):
+    """餐厅 CSV（只含 店名 / 城区），约 10% 与前面的行同名同区"""
+    with open(TEMPLATE_CSV, encoding='utf-8') as f:
+        base = list(csv.DictReader(f))
+    rng = random.Random(seed)
+    records = []
+    for i in range(rows):
+        if records and rng.random() < 0.1:
+            records.append(dict(rng.choice(records)))
+        else:
+            r = rng.choice(base)
+            records.append({'店名': f"{r['店名']}{i}", '城区': r['城区']})
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['店名', '城区'])
+        writer.writeheader()
+        writer.writerows(records)
+    return len({(r['城区'], r['店名']) for r in records})
+
+
+def legacy_batch(csv_file, base_url):
+    """改造前 batch_geocode_restaurants 的请求部分（逐个请求 + sleep 0.2，不缓存）"""
+    gaode = GaodeMap(base_url=base_url, qps=1e9, cache_file=None)
+    with open(csv_file, encoding='utf-8') as f:
+        restaurants = list(csv.DictReader(f))
+    ok = 0
+    for r in restaurants:
+        ok += gaode.geocode(f"广州市{r.get('城区', '')}{r.get('店名', '')}")["success"]
+        time.sleep(0.2)
+    return ok
+
+
+def run(label, stub, fn):
+    """执行 fn（不显示其逐行输出），报告耗时与桩服务收到的请求"""
+    before = dict(stub.counts)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fn()
+    elapsed = time.perf_counter() - start
+    delta = {k: stub.counts[k] - before[k] for k in stub.counts}
+    print(f"  {label:<18} {elapsed:7.2f}s  API 请求 {delta['requests']:>4}（地理编码 {delta['geocode']}，"
+          f"限流拒绝 {delta['qps_rejected']}，配额拒绝 {delta['quota_rejected']}）")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="高德批量地理编码基准（本地桩服务）")
+    parser.add_argument('--rows', type=int, default=200)
+    parser.add_argument('--qps', type=float, default=10)
+    parser.add_argument('--latency', type=float, default=0.1, help="桩服务每个请求的延迟（秒）")
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    stub = StubGaode(args.qps, args.latency)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(stub))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v3"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        source = str(tmp / 'restaurants.csv')
+        unique = make_csv(source, args.rows)
+        print(f"📐 {args.rows} 家餐厅（{unique} 个不同地址），桩服务 QPS {args.qps:g}、延迟 {args.latency * 1000:.0f}ms，"
+              f"并发 {args.workers}\n")
+
+        def batch(cache, output, **kwargs):
+            gaode = GaodeMap(base_url=base_url, qps=args.qps, cache_file=tmp / cache)
+            return batch_geocode_restaurants(source, str(tmp / output), workers=args.workers, gaode=gaode, **kwargs)
+
+        run("旧实现", stub, lambda: legacy_batch(source, base_url))
+        cold = run("新实现 冷缓存", stub, lambda: batch('cache.sqlite', 'out.csv'))
+        warm = run("新实现 重复执行", stub, lambda: batch('cache.sqlite', 'out2.csv'))
+        print(f"  {'':<18} 成功 {cold['success']} / 失败 {cold['failed']}，重复执行缓存命中 {warm['cached']}，"
+              f"两次输出一致: {Path(tmp / 'out.csv').read_bytes() == Path(tmp / 'out2.csv').read_bytes()}")
+
+        # 配额在一半时用完 -> 保存断点；恢复配额后重新执行只处理剩余的行
+        stub.quota = stub.counts['geocode'] + stub.counts['route'] + unique // 2
+        first = run("断点 第一次", stub, lambda: batch('resume.sqlite', 'resume.csv'))
+        checkpoint = tmp / 'resume.csv.checkpoint.json'
+        print(f"  {'':<18} 提前停止 {first['stopped']}，断点文件 {checkpoint.exists()}")
+        stub.quota = None
+        second = run("断点 续传", stub, lambda: batch('resume.sqlite', 'resume.csv'))
+        print(f"  {'':<18} 续传跳过 {second['resumed']} 行，断点文件已删除 {not checkpoint.exists()}，"
+              f"与冷缓存输出一致: {Path(tmp / 'out.csv').read_bytes() == Path(tmp / 'resume.csv').read_bytes()}")
+
+        gaode = GaodeMap(base_url=base_url, qps=args.qps, cache_file=tmp / 'route.sqlite')
+        run("路线 第一次", stub, lambda: gaode.driving_route("广州塔", "沙面侨美"))
+        run("路线 第二次", stub, lambda: gaode.driving_route("广州塔", "沙面侨美"))
+        run("路线 坐标", stub, lambda: gaode.driving_route("113.3245,23.1064", "113.2190,23.1071"))
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
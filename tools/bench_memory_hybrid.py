@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+MemoryOptimizer 混合检索基准测试
+在独立 schema (bench_hybrid) 中生成合成记忆，对比:
+- 旧实现: 三次查询（临时计算 to_tsvector + ILIKE 全表扫描 + 关联子查询），Python 中 RRF
+- 新实现: 存储的 search_vector (GIN) [+ pg_trgm 索引]，RRF 在一条 SQL 内完成
+
+用法:
+  python3 bench_memory_hybrid.py                    # 默认 1,000,000 条
+  python3 bench_memory_hybrid.py --rows 100000 --queries 30
+  python3 bench_memory_hybrid.py --keep             # 保留已生成的数据（规模不变时跳过生成）
+  python3 bench_memory_hybrid.py --drop             # 删除 bench_hybrid schema
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from rds_manager import RDSManager
+from bench_common import make_vocab, timed, zipf_pick
+from memory_optimizer import (SEARCH_INDEX_DDL, TRIGRAM_DDL, LEGACY_FTS_SQL, LEGACY_LIKE_SQL,
+                              LEGACY_RELATED_SQL, RRF_K, build_hybrid_sql, like_pattern)
+
+SCHEMA = "bench_hybrid"
+BATCH = 100000
+
+
+def make_queries(words, n, seed=7):
+    rng = random.Random(seed)
+    queries = []
+    for i in range(n):
+        kind = i % 3
+        if kind == 0:
+            queries.append(zipf_pick(rng, words))
+        elif kind == 1:
+            queries.append(zipf_pick(rng, words) + zipf_pick(rng, words))
+        else:
+            queries.append(f"{zipf_pick(rng, words)} {zipf_pick(rng, words)}")
+    return queries
+
+
+def populate(cursor, conn, rows, words):
+    cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+    cursor.execute(f"SET search_path TO {SCHEMA}, public")
+    cursor.execute(RDSManager()._create_memories_table())
+    cursor.execute("""
+        CREATE TABLE memory_links (
+            id SERIAL PRIMARY KEY,
+            source_memory_id INTEGER,
+            target_memory_id INTEGER,
+            link_type VARCHAR(50) DEFAULT 'related',
+            strength NUMERIC(3, 2) DEFAULT 0.5,
+            UNIQUE(source_memory_id, target_memory_id, link_type)
+        );
+        CREATE INDEX idx_memory_links_source ON memory_links(source_memory_id);
+    """)
+    conn.commit()
+
+    start = time.perf_counter()
+    for lo in range(1, rows + 1, BATCH):
+        hi = min(lo + BATCH - 1, rows)
+        cursor.execute("""
+            INSERT INTO memories (memory_type, category, content, keywords, importance_score, created_at)
+            SELECT 'short_term', (%(cats)s)[1 + g %% 5], c.content, to_jsonb(c.kw),
+                   round(random()::numeric, 2), NOW() - random() * INTERVAL '365 days'
+            FROM generate_series(%(lo)s, %(hi)s) AS g
+            CROSS JOIN LATERAL (
+                SELECT string_agg(w, CASE WHEN random() < 0.5 THEN '' ELSE ' ' END) AS content,
+                       (array_agg(w))[1:3] AS kw
+                FROM (SELECT (%(words)s)[1 + floor(%(nwords)s * power(random(), 3))::int] AS w
+                      FROM generate_series(1, 10 + g %% 16)) t
+            ) c
+        """, {'cats': ['tech', 'life', 'work', 'finance', 'travel'], 'lo': lo, 'hi': hi,
+              'words': words, 'nwords': len(words)})
+        conn.commit()
+        print(f"  写入 {hi:,}/{rows:,} 条 ({time.perf_counter() - start:.0f}s)", flush=True)
+
+    cursor.execute("""
+        INSERT INTO memory_links (source_memory_id, target_memory_id, link_type, strength)
+        SELECT 1 + floor(random() * %(n)s)::int, 1 + floor(random() * %(n)s)::int,
+               'related', round(random()::numeric, 2)
+        FROM generate_series(1, %(n)s)
+        ON CONFLICT DO NOTHING
+    """, {'n': rows})
+    conn.commit()
+
+
+def build_indexes(cursor, conn):
+    """创建新旧两种实现所需的索引（已存在则跳过）"""
+    # 旧实现依赖的表达式索引（保持对照公平）
+    start = time.perf_counter()
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_memories_content_fts ON memories "
+                   "USING gin(to_tsvector('simple', content))")
+    conn.commit()
+    print(f"  旧表达式索引 {time.perf_counter() - start:.0f}s")
+
+    start = time.perf_counter()
+    for sql in SEARCH_INDEX_DDL:
+        if 'DROP INDEX' not in sql:
+            cursor.execute(sql)
+    conn.commit()
+    print(f"  search_vector 列 + GIN 索引 {time.perf_counter() - start:.0f}s")
+
+    for sql in TRIGRAM_DDL:
+        try:
+            cursor.execute(sql)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            cursor.execute(f"SET search_path TO {SCHEMA}, public")
+            print(f"  ⚠️ pg_trgm 不可用，跳过模糊匹配: {str(e).splitlines()[0]}")
+            break
+    cursor.execute("ANALYZE memories; ANALYZE memory_links;")
+    conn.commit()
+
+
+def legacy_search(cursor, query, top_k):
+    """旧实现：三次往返"""
+    lists = []
+    cursor.execute(LEGACY_FTS_SQL, (query, query, top_k))
+    lists.append(cursor.fetchall())
+    cursor.execute(LEGACY_LIKE_SQL, (f'%{query}%', f'%{query}%', top_k))
+    lists.append(cursor.fetchall())
+    cursor.execute(LEGACY_RELATED_SQL, (f'%{query}%', top_k))
+    lists.append(cursor.fetchall())
+    scores = {}
+    for results in lists:
+        for rank, item in enumerate(results):
+            scores[item[0]] = scores.get(item[0], 0) + 1.0 / (RRF_K + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)[:top_k]
+
+
+def hybrid_search(cursor, sql, query, top_k):
+    cursor.execute(sql, {'query': query, 'pattern': like_pattern(query),
+                         'depth': max(top_k, 20), 'rrf_k': RRF_K, 'top_k': top_k})
+    return [r[0] for r in cursor.fetchall()]
+
+
+def report(name, times):
+    p95 = sorted(times)[max(0, int(len(times) * 0.95) - 1)]
+    print(f"  {name:<24} 平均 {statistics.mean(times):9.2f} ms  中位数 {statistics.median(times):9.2f} ms  "
+          f"p95 {p95:9.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="混合检索基准")
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=30)
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--keep', action='store_true', help="规模一致时复用已有数据")
+    parser.add_argument('--drop', action='store_true', help="删除基准 schema 后退出")
+    args = parser.parse_args()
+
+    with RDSManager().get_connection() as conn:
+        with conn.cursor() as cursor:
+            try:
+                if args.drop:
+                    cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+                    conn.commit()
+                    print(f"🗑️ 已删除 schema {SCHEMA}")
+                    return
+
+                words = make_vocab()
+                existing = 0
+                if args.keep:
+                    cursor.execute("SELECT to_regclass(%s)", (f"{SCHEMA}.memories",))
+                    if cursor.fetchone()[0]:
+                        cursor.execute(f"SELECT count(*) FROM {SCHEMA}.memories")
+                        existing = cursor.fetchone()[0]
+                # 建索引与旧实现的全表扫描都可能超过连接池默认的语句超时
+                cursor.execute("SET statement_timeout = 0")
+                if existing != args.rows:
+                    print(f"📦 生成 {args.rows:,} 条合成记忆...")
+                    populate(cursor, conn, args.rows, words)
+                cursor.execute(f"SET search_path TO {SCHEMA}, public")
+                build_indexes(cursor, conn)
+                cursor.execute("SELECT to_regclass('idx_memories_content_trgm') IS NOT NULL")
+                trigram = cursor.fetchone()[0]
+                conn.commit()
+
+                queries = make_queries(words, args.queries)
+                sql = build_hybrid_sql(trigram)
+                print(f"\n📐 {args.rows:,} 条记忆, {len(queries)} 个查询, top_k={args.top_k}, "
+                      f"pg_trgm={'是' if trigram else '否'}")
+
+                # 预热
+                hybrid_search(cursor, sql, queries[0], args.top_k)
+
+                new_times, new_results = timed(lambda q: hybrid_search(cursor, sql, q, args.top_k), queries)
+                report("新: 单条 SQL + 索引", new_times)
+                old_times, _ = timed(lambda q: legacy_search(cursor, q, args.top_k), queries)
+                report("旧: 三次查询", old_times)
+                print(f"  加速 {statistics.mean(old_times) / statistics.mean(new_times):.1f}x, "
+                      f"新实现平均返回 {statistics.mean(len(r) for r in new_results):.1f} 条")
+
+                cursor.execute("EXPLAIN " + cursor.mogrify(sql, {
+                    'query': queries[1], 'pattern': like_pattern(queries[1]),
+                    'depth': 20, 'rrf_k': RRF_K, 'top_k': args.top_k}).decode())
+                plan = [row[0] for row in cursor.fetchall()]
+                used = sorted({line.split(' on ')[1].split()[0] for line in plan if 'Index Scan on' in line})
+                print(f"  执行计划使用的索引: {', '.join(used) or '无'}")
+            finally:
+                conn.rollback()
+                cursor.execute("RESET search_path; RESET statement_timeout")
+                conn.commit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+SimpleMemory 关键词检索基准测试
+用现有 MEMORY.md + memory/*.md 的文本行随机拼成指定数量的段落，对比:
+- 旧实现: 空格切词 + 命中数 × 覆盖率
+- BM25 全量打分 (exhaustive)
+- BM25 + MaxScore 提前终止
+- 短语查询
+
+recall@K: 从某个段落中截取一段原文作为查询，所有包含这段原文的段落视为相关，
+前 K 名中相关段落数 / min(K, 相关段落总数)。
+
+用法:
+  python3 bench_memory_keyword.py                      # 默认 10k,100k
+  python3 bench_memory_keyword.py --sizes 100000 --top-k 10
+"""
+
+import argparse
+import random
+import re
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from bench_common import timed
+from memory_simple import MEMORY_DIR, MEMORY_FILE, SimpleMemory, tokenize
+
+PARAGRAPHS_PER_FILE = 1000
+
+
+def load_lines():
+    """现有记忆文件中的非空文本行"""
+    lines = []
+    for path in [MEMORY_FILE, *sorted(MEMORY_DIR.glob("*.md"))]:
+        if path.exists():
+            with open(path, 'r', encoding='utf-8') as f:
+                lines.extend(l.strip() for l in f if len(l.strip()) > 8)
+    if not lines:
+        raise SystemExit("❌ 没有可用的记忆文件")
+    return lines
+
+
+def make_corpus(lines, n, seed=42):
+    """每个段落随机取 3-8 行拼接"""
+    rng = random.Random(seed)
+    return ["\n".join(rng.sample(lines, min(len(lines), rng.randint(3, 8)))) for _ in range(n)]
+
+
+def write_corpus(directory, paragraphs):
+    directory.mkdir(parents=True, exist_ok=True)
+    for start in range(0, len(paragraphs), PARAGRAPHS_PER_FILE):
+        with open(directory / f"bench-{start // PARAGRAPHS_PER_FILE:05d}.md", 'w', encoding='utf-8') as f:
+            f.write("\n\n".join(paragraphs[start:start + PARAGRAPHS_PER_FILE]))
+
+
+def normalize(text):
+    return ' '.join(re.findall(r'[a-z0-9_]+|[\u4e00-\u9fff]+', text.lower()))
+
+
+def make_queries(memory, num_queries, seed=7):
+    """(查询, 相关段落id集合)：从段落原文中截取 2-3 个词或 4-6 个汉字"""
+    rng = random.Random(seed)
+    documents = list(memory.index['documents'].values())
+    spans = []
+    while len(spans) < num_queries:
+        doc = rng.choice(documents)
+        text = doc['content']
+        cjk = re.findall(r'[\u4e00-\u9fff]{4,}', text)
+        if cjk and rng.random() < 0.5:
+            run = rng.choice(cjk)
+            size = min(len(run), rng.randint(4, 6))
+            start = rng.randint(0, len(run) - size)
+            spans.append(run[start:start + size])
+            continue
+        words = re.findall(r'[A-Za-z][A-Za-z0-9_]+', text)
+        if len(words) >= 3:
+            start = rng.randint(0, len(words) - 3)
+            spans.append(' '.join(words[start:start + rng.randint(2, 3)]))
+
+    normalized = [(doc['id'], normalize(doc['content'])) for doc in documents]
+    queries = []
+    for span in spans:
+        needle = normalize(span)
+        relevant = {doc_id for doc_id, text in normalized if needle in text}
+        if relevant:  # 截取时跳过了单字母词等，原文可能不连续
+            queries.append((span, relevant))
+    return queries
+
+
+# ---------- 旧实现（空格切词） ----------
+
+LEGACY_STOPWORDS = {'the', 'a', 'an', 'is', 'are', 'was', 'were', 'be', 'been',
+                    '的', '了', '和', '是', '在', '有', '我', '你', '他', '它',
+                    'this', 'that', 'these', 'those', 'to', 'of', 'in', 'for',
+                    'with', 'on', 'at', 'by', 'from', 'as', 'it', 'its'}
+
+
+def legacy_keywords(text):
+    text = re.sub(r'[^\w\u4e00-\u9fa5\s]', ' ', text)
+    return list({w for w in text.lower().split()
+                 if (len(w) >= 2 or any('\u4e00' <= c <= '\u9fff' for c in w))
+                 and w not in LEGACY_STOPWORDS})
+
+
+def legacy_index(memory):
+    keywords = defaultdict(list)
+    word_counts = {}
+    for doc in memory.index['documents'].values():
+        for w in legacy_keywords(doc['content']):
+            keywords[w].append(doc['id'])
+        word_counts[doc['id']] = len(doc['content'].split())
+    return keywords, word_counts
+
+
+def legacy_search(index, query, top_k):
+    keywords, word_counts = index
+    query_words = legacy_keywords(query)
+    if not query_words:
+        return []
+    scores = defaultdict(float)
+    matched = defaultdict(set)
+    for word in query_words:
+        for doc_id in keywords.get(word, []):
+            scores[doc_id] += 1
+            matched[doc_id].add(word)
+    for doc_id in scores:
+        coverage = len(matched[doc_id]) / len(query_words)
+        scores[doc_id] = scores[doc_id] * coverage * (1 + min(word_counts[doc_id] / 100, 1.0) * 0.2)
+    return [d for d, _ in sorted(scores.items(), key=lambda x: x[1], reverse=True)[:top_k]]
+
+
+# ---------- 测量 ----------
+
+def recall_at_k(results, queries, k):
+    total = 0.0
+    for ids, (_, relevant) in zip(results, queries):
+        total += len(set(ids) & relevant) / min(k, len(relevant))
+    return total / len(queries)
+
+
+def run(lines, n, top_k, num_queries):
+    print(f"\n📐 {n:,} 段落, top_k={top_k}")
+    paragraphs = make_corpus(lines, n)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        write_corpus(tmp / "memory", paragraphs)
+        kwargs = dict(memory_dir=tmp / "memory", memory_file=tmp / "MEMORY.md",
+                      index_file=tmp / "memory_index.bin")
+
+        start = time.perf_counter()
+        memory = SimpleMemory(**kwargs)
+        build_s = time.perf_counter() - start
+        start = time.perf_counter()
+        memory = SimpleMemory(**kwargs)
+        load_s = time.perf_counter() - start
+        size_mb = (tmp / "memory_index.bin").stat().st_size / 2**20
+        print(f"  建索引 {build_s:.1f}s, 重新加载 {load_s:.2f}s, 快照 {size_mb:.0f}MB")
+
+        queries = make_queries(memory, num_queries)
+
+        legacy = legacy_index(memory)
+        legacy_times, legacy_results = timed(lambda q: legacy_search(legacy, q[0], top_k), queries)
+        legacy_ms = statistics.mean(legacy_times)
+        print(f"  旧实现 (空格切词)      {legacy_ms:8.2f} ms/查询  "
+              f"recall@{top_k} {recall_at_k(legacy_results, queries, top_k):.3f}")
+
+        def ids(results):
+            return [r['id'] for r in results]
+
+        full_times, full = timed(lambda q: memory.search(q[0], top_k, exhaustive=True), queries)
+        full_ms = statistics.mean(full_times)
+        print(f"  BM25 全量打分          {full_ms:8.2f} ms/查询  "
+              f"recall@{top_k} {recall_at_k([ids(r) for r in full], queries, top_k):.3f}")
+
+        ms_times, ms = timed(lambda q: memory.search(q[0], top_k), queries)
+        ms_ms = statistics.mean(ms_times)
+        same = sum([round(r['score'], 6) for r in a] == [round(r['score'], 6) for r in b]
+                   for a, b in zip(ms, full)) / len(queries)
+        print(f"  BM25 + MaxScore        {ms_ms:8.2f} ms/查询  "
+              f"recall@{top_k} {recall_at_k([ids(r) for r in ms], queries, top_k):.3f}  "
+              f"与全量一致 {same:.0%}  加速 {full_ms / ms_ms:.1f}x")
+
+        phrase_queries = [(f'"{q}"', relevant) for q, relevant in queries]
+        phrase_times, phrase = timed(lambda q: memory.search(q[0], top_k), phrase_queries)
+        phrase_ms = statistics.mean(phrase_times)
+        print(f"  短语查询               {phrase_ms:8.2f} ms/查询  "
+              f"recall@{top_k} {recall_at_k([ids(r) for r in phrase], phrase_queries, top_k):.3f}")
+
+        terms = sum(len(tokenize(q)) for q, _ in queries) / len(queries)
+        print(f"  平均查询词项数 {terms:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SimpleMemory 关键词检索基准")
+    parser.add_argument('--sizes', default='10000,100000')
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    lines = load_lines()
+    print(f"📚 语料: {len(lines)} 行原始文本")
+    for n in (int(s) for s in args.sizes.split(',')):
+        run(lines, n, args.top_k, args.queries)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+LocalMemory 语义检索基准测试
+对比逐条 Python 循环 (旧实现) 与 VectorIndex (矩阵乘法 / int8 / IVF)
+
+用法:
+  python3 bench_memory_search.py                       # 默认 10k,100k,1M
+  python3 bench_memory_search.py --sizes 10000,100000  # 自定义规模
+"""
+
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from bench_common import timed
+from vector_index import VectorIndex
+
+DIM = 384  # paraphrase-multilingual-MiniLM-L12-v2 向量维度
+
+
+def make_corpus(n, dim=DIM, clusters=256, seed=42):
+    """带聚类结构的合成向量（接近真实文本嵌入的分布）"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    vectors = centers[labels]
+    for start in range(0, n, 65536):
+        block = vectors[start:start + 65536]
+        block += 0.6 * rng.normal(size=block.shape).astype(np.float32)
+    return vectors
+
+
+def legacy_search(embeddings, query_vec, top_k):
+    """旧实现：对每个段落逐一计算余弦相似度后整体排序"""
+    results = []
+    for doc_id, vec in embeddings.items():
+        similarity = np.dot(query_vec, vec) / (np.linalg.norm(query_vec) * np.linalg.norm(vec))
+        results.append((doc_id, float(similarity)))
+    results.sort(key=lambda x: x[1], reverse=True)
+    return results[:top_k]
+
+
+def recall(approx, exact):
+    hits = sum(len({i for i, _ in a} & {i for i, _ in e}) for a, e in zip(approx, exact))
+    return hits / sum(len(e) for e in exact)
+
+
+def run(n, top_k, num_queries, legacy_queries):
+    vectors = make_corpus(n)
+    ids = [f"doc#{i}" for i in range(n)]
+    rng = np.random.default_rng(7)
+    queries = vectors[rng.choice(n, size=num_queries, replace=False)] + \
+        0.3 * rng.normal(size=(num_queries, DIM)).astype(np.float32)
+
+    print(f"\n📐 {n:,} 段落 × {DIM} 维, top_k={top_k}")
+
+    embeddings = {doc_id: vectors[i] for i, doc_id in enumerate(ids)}
+    legacy_times, _ = timed(lambda q: legacy_search(embeddings, q, top_k), queries[:legacy_queries])
+    legacy_ms = statistics.mean(legacy_times)
+    del embeddings
+    print(f"  旧实现 (Python 循环)   {legacy_ms:10.2f} ms/查询")
+
+    exact = VectorIndex(DIM, ivf_threshold=None)
+    start = time.perf_counter()
+    exact.add(ids, vectors)
+    build_ms = (time.perf_counter() - start) * 1000
+    exact_times, exact_results = timed(lambda q: exact.search(q, top_k), queries)
+    exact_ms = statistics.mean(exact_times)
+    print(f"  矩阵乘法 (float32)     {exact_ms:10.2f} ms/查询  "
+          f"加速 {legacy_ms / exact_ms:6.0f}x  (构建 {build_ms:.0f}ms, {exact.matrix.nbytes / 2**20:.0f}MB)")
+
+    q8 = VectorIndex(DIM, quantize=True, ivf_threshold=None)
+    q8.add(ids, vectors)
+    del vectors
+    q8_times, q8_results = timed(lambda q: q8.search(q, top_k), queries)
+    q8_ms = statistics.mean(q8_times)
+    print(f"  矩阵乘法 (int8)        {q8_ms:10.2f} ms/查询  "
+          f"recall@{top_k} {recall(q8_results, exact_results):.3f}  ({q8.matrix.nbytes / 2**20:.0f}MB)")
+    del q8
+
+    start = time.perf_counter()
+    exact.build_ivf()
+    ivf_build_ms = (time.perf_counter() - start) * 1000
+    exact.ivf_threshold = 0
+    for nprobe in (8, 32):
+        exact.nprobe = nprobe
+        ivf_times, ivf_results = timed(lambda q: exact.search(q, top_k), queries)
+        ivf_ms = statistics.mean(ivf_times)
+        print(f"  IVF nprobe={nprobe:<3}          {ivf_ms:10.2f} ms/查询  "
+              f"recall@{top_k} {recall(ivf_results, exact_results):.3f}  (建索引 {ivf_build_ms:.0f}ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LocalMemory 语义检索基准")
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--legacy-queries', type=int, default=3,
+                        help="旧实现太慢，只跑少量查询")
+    args = parser.parse_args()
+
+    for n in (int(s) for s in args.sizes.split(',')):
+        run(n, args.top_k, args.queries, args.legacy_queries)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+RestaurantRDS 附近搜索基准测试
+在独立 schema (bench_restaurant_geo) 中逐级扩充合成餐厅（广州范围，围绕若干热点正态分布），对比:
+- 旧实现: 全表逐行计算两次 ACOS 球面距离，再排序
+- 新实现: 子查询只算一次距离，按可建的索引分别测试 earth（earthdistance GiST KNN）、
+  point（内置 point GiST: KNN 上界 + 外接矩形）、btree（(lat, lng) 外接矩形范围扫描）
+场景: nearby（3km 内前 10 家）、nearest（不限距离最近 10 家，仅新实现，各模式结果互相核对）；
+报告 p50 / p99 延迟。
+
+用法:
+  python3 bench_restaurant_geo.py                               # 规模 65,10000,100000,1000000
+  python3 bench_restaurant_geo.py --sizes 65,50000 --queries 100
+  python3 bench_restaurant_geo.py --drop                        # 删除 bench_restaurant_geo schema
+"""
+
+import argparse
+import random
+import re
+import time
+
+from rds_manager import RDSManager
+from bench_common import fmt, percentile, schema_connection, timed
+from restaurant_rds import (RestaurantRDS, GEO_INDEX_DDL, KNN_EARTH_SQL, KNN_POINT_SQL, NEARBY_BTREE_SQL,
+                            bounding_box)
+
+SCHEMA = "bench_restaurant_geo"
+BATCH = 200000
+BBOX = (113.10, 22.80, 113.60, 23.40)     # 广州主城区外接矩形 (lng0, lat0, lng1, lat1)
+HOTSPOTS = 60
+
+# 旧实现的查询（改造前的 search_nearby）
+LEGACY_SQL = """
+SELECT *,
+    (6371 * ACOS(
+        COS(RADIANS(%s)) * COS(RADIANS(lat)) *
+        COS(RADIANS(lng) - RADIANS(%s)) +
+        SIN(RADIANS(%s)) * SIN(RADIANS(lat))
+    )) AS distance
+FROM restaurants
+WHERE lat IS NOT NULL AND lng IS NOT NULL
+AND (6371 * ACOS(
+        COS(RADIANS(%s)) * COS(RADIANS(lat)) *
+        COS(RADIANS(lng) - RADIANS(%s)) +
+        SIN(RADIANS(%s)) * SIN(RADIANS(lat))
+    )) < %s
+ORDER BY distance
+LIMIT %s
+"""
+
+
+def grow(cursor, conn, start, end, hotspots):
+    """追加第 start+1 ~ end 家餐厅：80% 围绕热点（约 3km 标准差）、20% 在范围内均匀分布"""
+    for lo in range(start + 1, end + 1, BATCH):
+        hi = min(lo + BATCH - 1, end)
+        cursor.execute("""
+            INSERT INTO restaurants (name, address, city, district, lat, lng, rating, category)
+            SELECT 'POI' || g, '', '广州', '', p.lat, p.lng, round((3 + random() * 2)::numeric, 2), '餐厅'
+            FROM generate_series(%(lo)s, %(hi)s) AS g
+            CROSS JOIN LATERAL (
+                SELECT CASE WHEN random() < 0.8
+                            THEN (%(hlat)s)[1 + g %% %(n)s] + 0.03 * sqrt(-2 * ln(1 - random())) * cos(2 * pi() * random())
+                            ELSE %(lat0)s + random() * (%(lat1)s - %(lat0)s) END AS lat,
+                       CASE WHEN random() < 0.8
+                            THEN (%(hlng)s)[1 + g %% %(n)s] + 0.03 * sqrt(-2 * ln(1 - random())) * cos(2 * pi() * random())
+                            ELSE %(lng0)s + random() * (%(lng1)s - %(lng0)s) END AS lng
+            ) p
+        """, {'lo': lo, 'hi': hi, 'n': len(hotspots),
+              'hlat': [h[1] for h in hotspots], 'hlng': [h[0] for h in hotspots],
+              'lng0': BBOX[0], 'lat0': BBOX[1], 'lng1': BBOX[2], 'lat1': BBOX[3]})
+        conn.commit()
+    cursor.execute("ANALYZE restaurants")
+    conn.commit()
+
+
+def build_indexes(rds):
+    """尽量建全部模式的索引（基准逐个模式测试）-> 可用的模式"""
+    modes = []
+    with schema_connection(rds, SCHEMA) as conn:
+        with conn.cursor() as cursor:
+            for mode, index, ddl in GEO_INDEX_DDL:
+                try:
+                    for sql in ddl:
+                        cursor.execute(sql)
+                    conn.commit()
+                    modes.append(mode)
+                except Exception as e:
+                    conn.rollback()
+                    cursor.execute(f"SET search_path TO {SCHEMA}, public")
+                    print(f"  ⚠️ {mode} 不可用: {str(e).splitlines()[0]}")
+    return modes
+
+
+def legacy_nearby(rds, lat, lng, radius_km=3, limit=10):
+    with schema_connection(rds, SCHEMA) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(LEGACY_SQL, (lat, lng, lat, lat, lng, lat, radius_km, limit))
+            return cursor.fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="餐厅附近搜索基准")
+    parser.add_argument('--sizes', default='65,10000,100000,1000000')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--legacy-queries', type=int, default=20, help="旧实现在大规模下的查询数")
+    parser.add_argument('--drop', action='store_true', help="删除基准 schema 后退出")
+    args = parser.parse_args()
+
+    rds = RDSManager()
+    tool = RestaurantRDS()
+    tool.rds.get_connection = lambda: schema_connection(rds, SCHEMA)
+    rng = random.Random(7)
+    hotspots = [(rng.uniform(113.20, 113.45), rng.uniform(22.95, 23.20)) for _ in range(HOTSPOTS)]
+    points = [(rng.uniform(22.95, 23.20), rng.uniform(113.20, 113.45)) for _ in range(args.queries)]
+
+    with RDSManager.get_connection(rds) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            conn.commit()
+            if args.drop:
+                print(f"🗑️ 已删除 schema {SCHEMA}")
+                return
+            cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+            conn.commit()
+
+    with schema_connection(rds, SCHEMA) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(rds._create_restaurants_table())
+            conn.commit()
+    modes = build_indexes(rds)
+    print(f"📐 模式 {', '.join(modes)}，每个规模 {args.queries} 个查询点")
+
+    size = 0
+    for n in [int(x) for x in args.sizes.split(',')]:
+        with schema_connection(rds, SCHEMA) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SET statement_timeout = 0")
+                start = time.perf_counter()
+                grow(cursor, conn, size, n, hotspots)
+                cursor.execute("RESET statement_timeout")
+                conn.commit()
+        size = n
+        legacy_points = points if n <= 10000 else points[:args.legacy_queries]
+        print(f"\n  {n:,} 家（写入 + 索引维护 {time.perf_counter() - start:,.1f}s）")
+
+        legacy_nearby(rds, *points[0])      # 预热
+        old_times, old_results = timed(lambda p: legacy_nearby(rds, p[0], p[1], 3), legacy_points)
+        print(f"  {'nearby 3km 前10':<16} {'旧':<6} {fmt(old_times)}")
+        nearest_results = {}
+        for mode in modes:
+            tool._geo_mode = mode
+            tool.search_nearby(*points[0], 3)
+            new_times, new_results = timed(lambda p: tool.search_nearby(p[0], p[1], 3, 10), points)
+            same = sum([r[0] for r in a] == [r[0] for r in b] for a, b in zip(old_results, new_results))
+            print(f"  {'':<16} {mode:<6} {fmt(new_times)}  "
+                  f"(p50 加速 {percentile(old_times, 0.5) / percentile(new_times, 0.5):,.0f}x，"
+                  f"与旧实现一致 {same}/{len(old_results)})")
+        for mode in modes:
+            tool._geo_mode = mode
+            new_times, nearest_results[mode] = timed(lambda p: tool.nearest(p[0], p[1], 10), points)
+            ref = nearest_results[modes[0]]
+            same = sum([r[0] for r in a] == [r[0] for r in b] for a, b in zip(ref, nearest_results[mode]))
+            print(f"  {'nearest 前10' if mode == modes[0] else '':<16} {mode:<6} {fmt(new_times)}  "
+                  f"(与 {modes[0]} 一致 {same}/{len(ref)})")
+
+    # 各模式 nearby 查询的执行计划使用的索引
+    lat, lng = points[1]
+    lat0, lat1, lng0, lng1 = bounding_box(lat, lng, 3)
+    params = {'lat': lat, 'lng': lng, 'radius': 3, 'limit': 10,
+              'lat0': lat0, 'lat1': lat1, 'lng0': lng0, 'lng1': lng1}
+    with schema_connection(rds, SCHEMA) as conn:
+        with conn.cursor() as cursor:
+            for mode in modes:
+                sql = {'earth': KNN_EARTH_SQL, 'point': KNN_POINT_SQL, 'btree': NEARBY_BTREE_SQL}[mode]
+                cursor.execute("EXPLAIN " + sql, params)
+                plan = [row[0] for row in cursor.fetchall()]
+                used = sorted({m.group(1) for line in plan
+                               for m in [re.search(r'Index (?:Only )?Scan (?:using|on) (\w+)', line)] if m})
+                print(f"  {mode} 执行计划使用的索引: {', '.join(used) or '无'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+RestaurantRDS CSV 导入基准测试
+以 restaurants_full_with_coords.csv 为模板生成城市规模的合成 POI 文件（真实表头，约 1% 不合格行、
+0.5% 文件内重复），在独立 schema (bench_restaurant_import) 中对比:
+- 旧实现: 逐行 INSERT，每 10 行提交一次（只导入前 --legacy-rows 行，按速率比较）
+- 新实现: bulk_import（校验 -> COPY 临时表 -> 按自然键合并，一个事务）
+  首次导入 / 原样重复导入 / 修改 1% 后重新导入，并检查表中行数等于自然键数
+
+用法:
+  python3 bench_restaurant_import.py                      # 默认 200,000 行
+  python3 bench_restaurant_import.py --rows 50000 --legacy-rows 2000
+  python3 bench_restaurant_import.py --drop               # 删除 bench_restaurant_import schema
+"""
+
+import argparse
+import csv
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from rds_manager import RDSManager
+from bench_common import schema_connection
+from restaurant_rds import RestaurantRDS
+
+SCHEMA = "bench_restaurant_import"
+LOCAL_CSV = Path(__file__).resolve().parent.parent / "restaurants_full_with_coords.csv"
+
+
+def make_csv(path, rows, seed=1, changed=0.0):
+    """生成合成 CSV；changed 为评分被修改的行比例（同一 seed 生成相同的店名与坐标）"""
+    with open(LOCAL_CSV, encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        header = reader.fieldnames
+        base = [r for r in reader if r.get('经度') and r.get('纬度')]
+    rng = random.Random(seed)
+    change_rng = random.Random(seed + 1)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=header)
+        writer.writeheader()
+        previous = None
+        for i in range(rows):
+            r = dict(rng.choice(base))
+            r['序号'] = i + 1
+            r['店名'] = f"{r['店名']}（分店{i}）"
+            r['经度'] = f"{float(r['经度']) + rng.gauss(0, 0.03):.6f}"
+            r['纬度'] = f"{float(r['纬度']) + rng.gauss(0, 0.03):.6f}"
+            r['推荐分'] = f"{rng.uniform(3, 5):.2f}"
+            kind = rng.random()
+            if kind < 0.005:
+                r['店名'] = ''                          # 不合格: 缺少店名
+            elif kind < 0.01:
+                r['纬度'] = 'N/A'                       # 不合格: 坐标不是数字
+            elif kind < 0.015 and previous:
+                r = dict(previous, 推荐分=r['推荐分'])  # 文件内重复（最后一行为准）
+            if change_rng.random() < changed:
+                r['推荐分'] = f"{float(r['推荐分'] or 4) - 0.5:.2f}"
+            writer.writerow(r)
+            previous = r
+
+
+def legacy_import(rds, csv_file, limit):
+    """改造前的 import_from_csv（逐行 INSERT，每 10 行提交），只导入前 limit 行"""
+    imported = 0
+    with schema_connection(rds, SCHEMA) as conn:
+        with conn.cursor() as cursor:
+            with open(csv_file, 'r', encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    if imported >= limit:
+                        break
+                    try:
+                        cursor.execute("""
+                            INSERT INTO restaurants
+                            (name, address, city, district, lat, lng, rating, category, tags, phone)
+                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                            ON CONFLICT DO NOTHING
+                        """, (
+                            row.get('店名', ''), row.get('地址', ''), row.get('城市', ''), row.get('区域', ''),
+                            float(row['纬度']) if row.get('纬度') else None,
+                            float(row['经度']) if row.get('经度') else None,
+                            float(row['推荐分']) if row.get('推荐分') else None,
+                            row.get('类别', ''),
+                            json.dumps(row.get('标签', '').split(',') if row.get('标签') else []),
+                            row.get('电话', ''),
+                        ))
+                        imported += 1
+                        if imported % 10 == 0:
+                            conn.commit()
+                    except Exception:
+                        conn.rollback()
+                        cursor.execute(f"SET search_path TO {SCHEMA}, public")
+            conn.commit()
+    return imported
+
+
+def reset_table(rds):
+    with schema_connection(rds, SCHEMA) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("DROP TABLE IF EXISTS restaurants")
+            cursor.execute(rds._create_restaurants_table())
+            conn.commit()
+
+
+def table_counts(rds):
+    with schema_connection(rds, SCHEMA) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT count(*), count(DISTINCT (name, ROUND(lat, 5), ROUND(lng, 5))) FROM restaurants")
+            return cursor.fetchone()
+
+
+def report(name, stats):
+    print(f"  {name:<14} {stats['seconds']:7.2f}s  {stats['rows_per_sec']:>8,} 行/秒  "
+          f"新增 {stats['inserted']:,}  更新 {stats['updated']:,}  未变 {stats['unchanged']:,}  "
+          f"文件内重复 {stats['duplicates']:,}  不合格 {stats['rejected']:,}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="餐厅 CSV 导入基准")
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--legacy-rows', type=int, default=5000, help="旧实现导入的行数")
+    parser.add_argument('--drop', action='store_true', help="删除基准 schema 后退出")
+    args = parser.parse_args()
+
+    rds = RDSManager()
+    with RDSManager.get_connection(rds) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            conn.commit()
+            if args.drop:
+                print(f"🗑️ 已删除 schema {SCHEMA}")
+                return
+            cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+            conn.commit()
+
+    tool = RestaurantRDS()
+    tool.rds.get_connection = lambda: schema_connection(rds, SCHEMA)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        original, changed = Path(tmp) / 'pois.csv', Path(tmp) / 'pois_changed.csv'
+        make_csv(original, args.rows)
+        make_csv(changed, args.rows, changed=0.01)
+        print(f"📦 合成 CSV {args.rows:,} 行（{original.stat().st_size / 1e6:.1f} MB）")
+
+        reset_table(rds)
+        start = time.perf_counter()
+        imported = legacy_import(rds, original, args.legacy_rows)
+        elapsed = time.perf_counter() - start
+        print(f"\n  {'旧实现':<14} {elapsed:7.2f}s  {imported / elapsed:>8,.0f} 行/秒  （前 {imported:,} 行，"
+              f"全文件预计 {args.rows / (imported / elapsed):,.0f}s）")
+        legacy_twice = legacy_import(rds, original, args.legacy_rows)
+        total, keys = table_counts(rds)
+        print(f"  {'旧实现 重复导入':<14} 表中 {total:,} 行 / 自然键 {keys:,} 个（重复 {legacy_twice:,} 行）")
+
+        reset_table(rds)
+        report("首次导入", tool.bulk_import(original))
+        report("原样重复导入", tool.bulk_import(original))
+        stats = tool.bulk_import(changed)
+        report("修改 1% 后", stats)
+        total, keys = table_counts(rds)
+        print(f"  表中 {total:,} 行 / 自然键 {keys:,} 个，不合格原因: "
+              f"{json.dumps(stats['reject_reasons'], ensure_ascii=False)}")
+
+
+if __name__ == '__main__':
+    main()
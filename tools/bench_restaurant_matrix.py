@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+地标 × 餐厅距离矩阵基准测试
+以 restaurants_full_with_coords.csv 为模板，逐级生成合成餐厅（围绕模板坐标正态分布），对比:
+- 网格索引: RestaurantCatalog.nearby（候选格子 + 向量化 haversine + top-k）
+- 距离矩阵: DistanceMatrix.nearby（已排序的行上 searchsorted + top-k）
+场景: 每个地标 3km / 1km 内前 5 家（含按清单过滤），核对两者结果；全量构建 vs 新增 1% 餐厅后增量刷新；
+npz 大小与加载耗时；最后用本地高德桩服务补齐 65 家规模下的驾车时间，确认刷新后保留。
+
+用法:
+  python3 bench_restaurant_matrix.py                         # 规模 65,100000,1000000
+  python3 bench_restaurant_matrix.py --sizes 65,50000 --rounds 50
+"""
+
+import argparse
+import random
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+
+from bench_common import fmt, percentile, timed
+from restaurant_finder import LANDMARKS, load_restaurants
+from restaurant_index import RestaurantCatalog
+from restaurant_matrix import DistanceMatrix
+
+LOCAL_CSV = Path(__file__).resolve().parent.parent / "restaurants_full_with_coords.csv"
+QUERIES = [(3, None), (1, None), (3, '必吃榜')]
+
+
+def make_records(base, n, seed=1):
+    """n 家餐厅：n 不超过模板行数时直接取模板，否则围绕模板坐标（约 3km 标准差）生成分店"""
+    if n <= len(base):
+        return [dict(r) for r in base[:n]]
+    rng = random.Random(seed)
+    records = []
+    for i in range(n):
+        r = dict(rng.choice(base))
+        r['店名'] = f"{r['店名']}（分店{i}）"
+        r['经度'] = r['经度'] + rng.gauss(0, 0.03)
+        r['纬度'] = r['纬度'] + rng.gauss(0, 0.03)
+        r['评分'] = round(rng.uniform(3, 5), 2)
+        records.append(r)
+    return records
+
+
+def same_results(catalog, matrix):
+    """两种实现的结果（店名与距离）一致的查询数 / 总数"""
+    same = total = 0
+    for name, (lng, lat) in LANDMARKS.items():
+        for distance, list_type in QUERIES:
+            a = [(r['店名'], round(r['距离'], 3)) for r in catalog.nearby(lng, lat, distance, list_type=list_type)]
+            b = [(r['店名'], round(r['距离'], 3)) for r in matrix.nearby(name, distance, list_type=list_type)]
+            same += a == b
+            total += 1
+    return same, total
+
+
+def bench_routes(catalog, tmp):
+    """驾车时间：补齐 3km 内的缺失项 -> 保存 -> 再次刷新后是否保留、是否重复请求"""
+    from bench_gaode_geocode import StubGaode, make_handler
+    from gaode_map import GaodeMap
+
+    stub = StubGaode(qps=20, latency=0.02)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(stub))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    gaode = GaodeMap(base_url=f"http://127.0.0.1:{server.server_address[1]}/v3", qps=20, cache_file=None)
+    path = tmp / 'routes.npz'
+
+    matrix, _ = DistanceMatrix.empty().refresh(catalog, LANDMARKS)
+    start = time.perf_counter()
+    stats = matrix.fetch_routes(gaode, radius_km=3, path=path)
+    elapsed = time.perf_counter() - start
+    print(f"\n  驾车时间 {stats['fetched']} 条（3km 内，桩服务 QPS 20）{elapsed:.1f}s，失败 {stats['failed']}")
+
+    before = stub.counts['route']
+    again, _ = DistanceMatrix.load(path).refresh(catalog, LANDMARKS)
+    stats = again.fetch_routes(gaode, radius_km=3)
+    kept = int(np.count_nonzero(~np.isnan(again.durations)))
+    print(f"  刷新后保留 {kept} 条，再次补齐请求 {stub.counts['route'] - before} 次（待补 {stats['pending']}）")
+    name = next(iter(LANDMARKS))
+    top = again.nearby(name, 3)[:1]
+    if top:
+        print(f"  {name} 最近: {top[0]['店名']} {top[0]['距离']:.2f}km / 驾车约 {top[0].get('驾车分钟')} 分钟")
+    server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="地标距离矩阵基准")
+    parser.add_argument('--sizes', default='65,100000,1000000')
+    parser.add_argument('--rounds', type=int, default=20, help="每个地标 × 查询的重复次数")
+    args = parser.parse_args()
+
+    base = load_restaurants(LOCAL_CSV)
+    # 每个地标 × 查询重复 rounds 次
+    queries = [(name, distance, list_type) for _ in range(args.rounds)
+               for name in LANDMARKS for distance, list_type in QUERIES]
+    print(f"📐 {len(LANDMARKS)} 个地标，每轮 {len(LANDMARKS) * len(QUERIES)} 个查询，{args.rounds} 轮")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        for n in [int(x) for x in args.sizes.split(',')]:
+            records = make_records(base, n)
+            catalog = RestaurantCatalog(records)
+            start = time.perf_counter()
+            matrix, _ = DistanceMatrix.empty().refresh(catalog, LANDMARKS)
+            build = time.perf_counter() - start
+            print(f"\n  {len(records):,} 家（全量构建 {build * 1000:,.1f} ms，内存 {matrix.nbytes() / 1e6:,.1f} MB）")
+
+            grid, _ = timed(lambda q: catalog.nearby(*LANDMARKS[q[0]], q[1], list_type=q[2]), queries)
+            dense, _ = timed(lambda q: matrix.nearby(q[0], q[1], list_type=q[2]), queries)
+            same, total = same_results(catalog, matrix)
+            print(f"  {'网格索引':<10} {fmt(grid, 3)}")
+            print(f"  {'距离矩阵':<10} {fmt(dense, 3)}  (p50 加速 {percentile(grid, 0.5) / percentile(dense, 0.5):,.1f}x，"
+                  f"结果一致 {same}/{total})")
+
+            path = tmp / f'matrix_{n}.npz'
+            start = time.perf_counter()
+            matrix.save(path)
+            saved = time.perf_counter() - start
+            start = time.perf_counter()
+            loaded = DistanceMatrix.load(path)
+            load = time.perf_counter() - start
+            print(f"  npz {path.stat().st_size / 1e6:,.2f} MB，保存 {saved * 1000:,.0f} ms，加载 {load * 1000:,.0f} ms")
+
+            added = max(len(records) // 100, 1)
+            extra = make_records(base, len(base) + added, seed=2)[-added:]
+            grown = RestaurantCatalog(records + extra)
+            start = time.perf_counter()
+            refreshed, stats = loaded.refresh(grown, LANDMARKS)
+            incremental = time.perf_counter() - start
+            start = time.perf_counter()
+            full, _ = DistanceMatrix.empty().refresh(grown, LANDMARKS)
+            rebuild = time.perf_counter() - start
+            print(f"  新增 {stats['added']:,} 家: 增量刷新 {incremental * 1000:,.1f} ms（计算 {stats['computed']:,} 个距离），"
+                  f"全量重建 {rebuild * 1000:,.1f} ms，结果相同 {np.array_equal(refreshed.distances, full.distances) and np.array_equal(refreshed.sorted, full.sorted)}")
+
+        bench_routes(RestaurantCatalog(make_records(base, len(base))), tmp)
+
+
+if __name__ == '__main__':
+    main()
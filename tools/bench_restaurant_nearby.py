@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+餐厅附近查询基准测试
+以 restaurants_full_with_coords.csv 的真实餐厅为中心生成合成 POI（广州范围），对比:
+- 旧实现: 逐条标量 math haversine + 写入 距离 字段 + 全量排序（不含旧实现每次重新解析 CSV 的开销）
+- 新实现: RestaurantCatalog 网格索引 + 向量化 haversine + 有界堆 top-k
+场景: nearby（3km 内前 5 家）、radius（1km 内全部）、nearest（不限距离最近 5 家，仅新实现）
+
+用法:
+  python3 bench_restaurant_nearby.py                               # 规模 65,10000,100000,1000000
+  python3 bench_restaurant_nearby.py --sizes 65,50000 --queries 200
+"""
+
+import argparse
+import random
+import time
+from pathlib import Path
+
+from bench_common import fmt, percentile, timed
+from restaurant_finder import load_restaurants, haversine_distance
+from restaurant_index import RestaurantCatalog
+
+LOCAL_CSV = Path(__file__).resolve().parent.parent / "restaurants_full_with_coords.csv"
+BBOX = (113.10, 22.80, 113.60, 23.40)     # 广州主城区外接矩形 (lng0, lat0, lng1, lat1)
+
+
+def make_pois(base, n, seed=1):
+    """真实餐厅原样保留，其余 80% 围绕真实餐厅正态分布、20% 在范围内均匀分布"""
+    rng = random.Random(seed)
+    pois = [dict(r) for r in base[:n]]
+    lists = ['必吃', '值得试', '']
+    for i in range(len(pois), n):
+        if rng.random() < 0.8:
+            r = rng.choice(base)
+            lng, lat = rng.gauss(r['经度'], 0.03), rng.gauss(r['纬度'], 0.03)
+        else:
+            lng, lat = rng.uniform(BBOX[0], BBOX[2]), rng.uniform(BBOX[1], BBOX[3])
+        pois.append({'店名': f'POI{i}', '经度': lng, '纬度': lat,
+                     '评分': round(rng.uniform(3, 5), 2), '清单': rng.choice(lists)})
+    return pois
+
+
+def legacy_nearby(restaurants, lng, lat, max_distance_km=5, min_score=0, list_type=None, limit=5):
+    """改造前 get_nearby_restaurants 的查询部分"""
+    for r in restaurants:
+        r['距离'] = haversine_distance(lng, lat, r['经度'], r['纬度'])
+    filtered = [r for r in restaurants if r['距离'] <= max_distance_km]
+    if min_score > 0:
+        filtered = [r for r in filtered if r['评分'] >= min_score]
+    if list_type:
+        filtered = [r for r in filtered if r.get('清单') == list_type]
+    filtered.sort(key=lambda x: (x['距离'], -x['评分']))
+    return filtered[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="餐厅附近查询基准")
+    parser.add_argument('--sizes', default='65,10000,100000,1000000')
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--legacy-queries', type=int, default=20, help="旧实现在大规模下的查询数")
+    args = parser.parse_args()
+
+    base = load_restaurants(LOCAL_CSV)
+    rng = random.Random(7)
+    points = [(rng.uniform(113.20, 113.45), rng.uniform(22.95, 23.20)) for _ in range(args.queries)]
+    print(f"📐 真实餐厅 {len(base)} 家，每个规模 {args.queries} 个查询点")
+
+    for n in [int(x) for x in args.sizes.split(',')]:
+        pois = make_pois(base, n)
+        start = time.perf_counter()
+        catalog = RestaurantCatalog(pois)
+        build_ms = (time.perf_counter() - start) * 1000
+        legacy_points = points if n <= 10000 else points[:args.legacy_queries]
+
+        print(f"\n  {n:,} 家（建索引 {build_ms:,.0f} ms，网格 {catalog.index.nx}x{catalog.index.ny}）")
+        old_times, old_results = timed(lambda p: legacy_nearby(pois, p[0], p[1], 3), legacy_points)
+        new_times, new_results = timed(lambda p: catalog.nearby(p[0], p[1], 3), points)
+        same = sum([r['店名'] for r in a] == [r['店名'] for r in b]
+                   for a, b in zip(old_results, new_results))
+        print(f"  {'nearby 3km 前5':<16} 旧 {fmt(old_times, 3)}  |  新 {fmt(new_times, 3)}  "
+              f"(p50 加速 {percentile(old_times, 0.5) / percentile(new_times, 0.5):,.0f}x，"
+              f"结果一致 {same}/{len(old_results)})")
+
+        old_times, _ = timed(lambda p: legacy_nearby(pois, p[0], p[1], 1, limit=n), legacy_points)
+        new_times, found = timed(lambda p: catalog.radius(p[0], p[1], 1), points)
+        print(f"  {'radius 1km 全部':<16} 旧 {fmt(old_times, 3)}  |  新 {fmt(new_times, 3)}  "
+              f"(平均 {sum(map(len, found)) / len(found):,.0f} 家)")
+
+        new_times, _ = timed(lambda p: catalog.nearest(p[0], p[1], 5), points)
+        print(f"  {'nearest 前5':<16} {'':<42}  |  新 {fmt(new_times, 3)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,14 +3,17 @@
 邮件快速检查 - 最终优化版
 """
 
-import imaplib
-import email
-from email.header import decode_header
 import json
 import os
 from datetime import datetime
 
+from imap_client import get_client
+from email_sync import MailboxSync
+from email_classifier import classify_batch
+
 CONFIG_FILE = "/root/.openclaw/workspace/config/email_config.json"
+SYNC_CONSUMER = os.path.splitext(os.path.basename(__file__))[0]   # 同步进度按脚本名分开记录
+CHECK_LIMIT = 10
 
 def load_config():
     if os.path.exists(CONFIG_FILE):
@@ -18,14 +21,6 @@ def load_config():
             return json.load(f)
     return None
 
-# 重要关键词
-IMPORTANT_KEYWORDS = [
-    'security', 'alert', 'warning', 'verify', 'authentication',
-    '安全', '验证', '提醒', '警告', '确认', '登录', '密码',
-    'invoice', 'payment', '账单', '发票', '付款',
-    'meeting', 'schedule', '会议', '日程',
-]
-
 def check_emails():
     config = load_config()
     if not config:
@@ -33,62 +28,23 @@ def check_emails():
         return
     
     try:
-        # 连接 IMAP
-        imap = imaplib.IMAP4_SSL(config['imap_server'], config['imap_port'], timeout=30)
-        imap.login(config['email'], config['password'])
-        imap.select('INBOX')
-        
-        # 搜索未读
-        status, messages = imap.search(None, 'UNSEEN')
-        if status != 'OK':
-            print("❌ 搜索失败")
-            return
+        # 复用已登录的会话（只读打开，不改变已读状态），只取上次检查以来的新邮件
+        sync = MailboxSync(get_client(config), SYNC_CONSUMER, initial_limit=CHECK_LIMIT)
+        new = [m for m in sync.sync('INBOX')['new'] if not m['seen']]
         
-        email_ids = messages[0].split()
-        total = len(email_ids)
-        
-        if total == 0:
+        if not new:
+            sync.commit()
             print("✅ 没有新邮件")
-            imap.logout()
             return
         
-        # 只检查最新的10封
+        # 只检查最新的10封（邮件头已在同步时一次取回）
+        checked = new[-CHECK_LIMIT:]
+        # 重要邮件规则见 config/email_rules.json
         important = []
-        for eid in email_ids[-10:]:
-            status, msg_data = imap.fetch(eid, '(RFC822)')
-            if status != 'OK':
-                continue
-            
-            msg = email.message_from_bytes(msg_data[0][1])
-            
-            # 解析主题
-            subject_hdr = msg['Subject']
-            if subject_hdr:
-                decoded = decode_header(subject_hdr)[0]
-                subject = decoded[0]
-                if isinstance(subject, bytes):
-                    subject = subject.decode(decoded[1] or 'utf-8', errors='ignore')
-            else:
-                subject = "(无主题)"
-            
-            from_addr = msg['From'] or "(未知发件人)"
-            
-            # 检查是否重要
-            is_important = False
-            subj_lower = subject.lower()
-            for kw in IMPORTANT_KEYWORDS:
-                if kw.lower() in subj_lower:
-                    is_important = True
-                    break
-            
-            # GitHub alerts
-            if 'github' in from_addr.lower() and 'alert' in subj_lower:
-                is_important = True
-            
-            if is_important:
-                important.append({'subject': subject, 'from': from_addr})
-        
-        imap.logout()
+        for m, c in zip(checked, classify_batch(checked)):
+            if c['category'] == 'important':
+                important.append({'subject': m['subject'] or "(无主题)",
+                                  'from': m['from'] or "(未知发件人)"})
         
         # 输出结果
         now = datetime.now().strftime('%H:%M')
@@ -99,7 +55,9 @@ def check_emails():
                 print(f"\n📧 {m['subject'][:60]}")
                 print(f"   发件人: {m['from'][:50]}")
         else:
-            print(f"✅ 已检查 {min(total, 10)} 封邮件，无重要邮件 [{now}]")
+            print(f"✅ 已检查 {len(checked)} 封新邮件，无重要邮件 [{now}]")
+        
+        sync.commit()
         
     except Exception as e:
         print(f"❌ 错误: {e}")
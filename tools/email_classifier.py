@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+邮件分类器 - 规则从 config/email_rules.json 加载，全部关键词编译为一个正则
+
+- 所有规则（重要 / 营销等类别）的关键词按字典树合并为一个正则，整批邮件的主题和发件人
+  一次扫描即得到全部命中的关键词；耗时随关键词数增长缓慢（逐个 `kw in text` 线性增长）
+- 发件人域名规则按域名后缀查表：zwift.com 匹配 news.zwift.com，不匹配 notzwift.com
+- 每条规则得分 = 权重 × 命中的不同关键词数；按 categories 的顺序取第一个达到阈值的
+  类别，都未达到则为 normal（同时命中重要和营销时按重要处理，不会被清理）
+- 规则文件修改后 get_classifier() 自动重新编译
+
+规则格式:
+  {"categories": ["important", "promo"], "thresholds": {"important": 3, "promo": 1},
+   "rules": [{"name": "账单", "category": "important", "field": "subject", "weight": 3,
+              "keywords": ["invoice", "账单"]},
+             {"name": "GitHub 告警", "category": "important", "field": "subject", "weight": 5,
+              "keywords": ["alert"], "require": {"field": "from", "keywords": ["github"]}},
+             {"name": "营销域名", "category": "promo", "field": "from", "domains": ["zwift.com"]}]}
+  field: subject / from / any（主题或发件人）
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+from bisect import bisect_right
+from collections import defaultdict
+from pathlib import Path
+
+RULES_FILE = "/root/.openclaw/workspace/config/email_rules.json"
+# 从代码仓库直接运行时使用仓库内的规则文件
+LOCAL_RULES_FILE = Path(__file__).resolve().parent.parent / "config" / "email_rules.json"
+
+SUBJECT, FROM = 1, 2
+FIELD_MASKS = {'subject': SUBJECT, 'from': FROM, 'any': SUBJECT | FROM}
+
+
+def load_rules(path=None):
+    """加载规则文件"""
+    if path is None:
+        path = RULES_FILE if os.path.exists(RULES_FILE) else LOCAL_RULES_FILE
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+DOMAIN_RE = re.compile(r'@([\w.-]+)')
+
+def sender_domain(from_addr):
+    """发件人地址的域名（小写；"名字 <a@b.com>" 取尖括号内的地址）"""
+    found = DOMAIN_RE.findall(from_addr or '')
+    return found[-1].strip('.').lower() if found else ''
+
+
+class RuleClassifier:
+    """编译后的规则集（只读，可多线程共享）"""
+
+    def __init__(self, rules):
+        self.categories = list(rules.get('categories') or
+                               dict.fromkeys(r['category'] for r in rules['rules']))
+        self.thresholds = rules.get('thresholds', {})
+        self.rules = []
+
+        patterns = {}                          # 关键词 -> 模式编号
+        self._triggers = defaultdict(list)     # 模式编号 -> [(规则序号, 字段, 是否为 require 条件)]
+        self._domains = defaultdict(list)      # 域名 -> [规则序号]
+
+        def add(keyword, rule_idx, field, required):
+            pid = patterns.setdefault(keyword.lower(), len(patterns))
+            self._triggers[pid].append((rule_idx, FIELD_MASKS[field], required))
+
+        for idx, rule in enumerate(rules['rules']):
+            if rule['category'] not in self.categories:
+                raise ValueError(f"规则 {rule.get('name')} 的类别 {rule['category']} 不在 categories 中")
+            for kw in rule.get('keywords', []):
+                add(kw, idx, rule.get('field', 'any'), False)
+            require = rule.get('require')
+            if require:
+                for kw in require['keywords']:
+                    add(kw, idx, require.get('field', 'any'), True)
+            for domain in rule.get('domains', []):
+                self._domains[domain.lower().strip('@.')].append(idx)
+            self.rules.append({
+                'name': rule.get('name', f'rule{idx}'),
+                'category': rule['category'],
+                'weight': rule.get('weight', 1),
+                'require': bool(require),
+            })
+
+        self.keywords = sorted(patterns, key=patterns.get)
+        self._build(self.keywords)
+
+    def _build(self, keywords):
+        """把全部关键词编译为一个按字典树组织的正则
+
+        分支按首字符展开，匹配引擎在每个位置只沿字典树走一条路径，而不是逐个尝试全部关键词；
+        可选的后缀使每个位置匹配以该位置开头的最长关键词，再加上作为其前缀的其他关键词，
+        即为从该位置开始的全部关键词。每次从上一个匹配的下一个字符继续搜索，重叠的关键词也能命中。
+        """
+        trie = {}
+        for kw in keywords:
+            node = trie
+            for ch in kw:
+                node = node.setdefault(ch, {})
+            node[''] = True
+
+        def emit(node):
+            branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+            if not branches:
+                return ''
+            body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+            if '' in node:
+                return f'(?:{body})?' if len(branches) == 1 else body + '?'
+            return body
+
+        ids = {kw: pid for pid, kw in enumerate(keywords)}
+        self._pattern = re.compile(emit(trie)) if keywords else None
+        self._closure = {kw: tuple(ids[kw[:i]] for i in range(1, len(kw) + 1) if kw[:i] in ids)
+                         for kw in keywords}
+
+    def _domain_rules(self, from_addr):
+        """发件人域名（及其各级父域名）命中的域名规则 -> [(规则序号, 域名)]"""
+        found = []
+        domain = sender_domain(from_addr)
+        while '.' in domain:
+            for idx in self._domains.get(domain, ()):
+                found.append((idx, domain))
+            domain = domain.partition('.')[2]
+        return found
+
+    def _evaluate(self, subject_hits, from_hits, domain_hits):
+        matched = {}
+        required = set()
+        triggers, keywords = self._triggers, self.keywords
+        for mask, hits in ((SUBJECT, subject_hits), (FROM, from_hits)):
+            for pid in hits:
+                for idx, field, is_require in triggers[pid]:
+                    if field & mask:
+                        if is_require:
+                            required.add(idx)
+                        else:
+                            matched.setdefault(idx, set()).add(keywords[pid])
+        for idx, domain in domain_hits:
+            matched.setdefault(idx, set()).add(domain)
+
+        scores = dict.fromkeys(self.categories, 0)
+        if not matched:
+            return {'category': 'normal', 'score': 0, 'scores': scores, 'reasons': []}
+
+        rules = self.rules
+        for idx, words in matched.items():
+            rule = rules[idx]
+            if rule['require'] and idx not in required:
+                continue
+            scores[rule['category']] += rule['weight'] * len(words)
+
+        category = next((c for c in self.categories if scores[c] >= self.thresholds.get(c, 1)), 'normal')
+        reasons = [f"{rules[idx]['name']}: {', '.join(sorted(matched[idx]))}"
+                   for idx in sorted(matched)
+                   if rules[idx]['category'] == category and (not rules[idx]['require'] or idx in required)]
+        return {
+            'category': category,
+            'score': scores.get(category, 0),
+            'scores': scores,
+            'reasons': reasons,
+        }
+
+    def classify(self, email_data):
+        """分类单封邮件（需要 subject / from 字段）"""
+        return self.classify_batch([email_data])[0]
+
+    def classify_batch(self, emails):
+        """批量分类，返回与输入顺序一致的结果列表
+
+        整批邮件的主题和发件人以分隔符拼成一个字符串，由正则一次扫描完；
+        关键词不含分隔符，不会跨邮件匹配。
+        """
+        subjects = [(e.get('subject') or '').lower() for e in emails]
+        senders = [(e.get('from') or '').lower() for e in emails]
+        hits = {}                          # 邮件序号 -> (主题命中的模式, 发件人命中的模式)
+
+        if self._pattern is not None and emails:
+            starts, boundaries, parts, pos = [], [], [], 0
+            for subject, sender in zip(subjects, senders):
+                starts.append(pos)
+                boundaries.append(pos + len(subject))
+                parts.append(f'{subject}\x01{sender}')
+                pos += len(subject) + len(sender) + 2
+            text = '\x00'.join(parts)
+            search, closure = self._pattern.search, self._closure
+            m = search(text)
+            while m:
+                at = m.start()
+                i = bisect_right(starts, at) - 1
+                entry = hits.get(i)
+                if entry is None:
+                    entry = hits[i] = (set(), set())
+                entry[at >= boundaries[i]].update(closure[m.group()])
+                m = search(text, at + 1)
+
+        # 同一批邮件中发件人大量重复，域名规则按发件人缓存
+        domain_cache = {}
+        if self._domains:
+            for sender in senders:
+                if sender not in domain_cache:
+                    domain_cache[sender] = self._domain_rules(sender)
+
+        # 命中组合相同的邮件得分相同，每种组合只计算一次
+        results, memo, empty = [], {}, (frozenset(), frozenset())
+        for i, sender in enumerate(senders):
+            subject_hits, from_hits = hits.get(i, empty)
+            domain_hits = domain_cache.get(sender, ())
+            key = (frozenset(subject_hits), frozenset(from_hits), tuple(domain_hits))
+            result = memo.get(key)
+            if result is None:
+                result = memo[key] = self._evaluate(subject_hits, from_hits, domain_hits)
+            results.append({**result, 'scores': dict(result['scores']), 'reasons': list(result['reasons'])})
+        return results
+
+    def get_stats(self):
+        return {
+            'rules': len(self.rules),
+            'keywords': len(self.keywords),
+            'domains': len(self._domains),
+            'pattern_chars': len(self._pattern.pattern) if self._pattern else 0,
+        }
+
+
+_classifier = None
+_classifier_key = None
+_classifier_lock = threading.Lock()
+
+def get_classifier(path=None):
+    """获取进程内共享的分类器（规则文件修改后自动重新编译）"""
+    global _classifier, _classifier_key
+    if path is None:
+        path = RULES_FILE if os.path.exists(RULES_FILE) else LOCAL_RULES_FILE
+    key = (str(path), os.stat(path).st_mtime_ns)
+    with _classifier_lock:
+        if _classifier is None or _classifier_key != key:
+            _classifier = RuleClassifier(load_rules(path))
+            _classifier_key = key
+    return _classifier
+
+
+def classify(email_data):
+    """分类单封邮件 -> {category, score, scores, reasons}"""
+    return get_classifier().classify(email_data)
+
+
+def classify_batch(emails):
+    """批量分类"""
+    return get_classifier().classify_batch(emails)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("🏷️ 邮件分类器")
+        print("\n用法:")
+        print("  python3 email_classifier.py rules                 # 查看规则统计")
+        print("  python3 email_classifier.py test <主题> [发件人]   # 分类一封邮件")
+        sys.exit(1)
+
+    cmd = sys.argv[1]
+    if cmd == 'rules':
+        classifier = get_classifier()
+        print(json.dumps(classifier.get_stats(), ensure_ascii=False, indent=2))
+        for rule in classifier.rules:
+            print(f"  [{rule['category']}] {rule['name']} (权重 {rule['weight']})")
+    elif cmd == 'test' and len(sys.argv) > 2:
+        result = classify({'subject': sys.argv[2], 'from': sys.argv[3] if len(sys.argv) > 3 else ''})
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print(f"未知命令: {cmd}")
+
+
+if __name__ == '__main__':
+    main()
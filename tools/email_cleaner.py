@@ -2,31 +2,27 @@
 """
 邮件清理工具
 自动识别并删除营销/促销邮件
+
+- 营销规则（config/email_rules.json 中 promo 类别的关键词和域名）转换为服务器端
+  UID SEARCH OR FROM ... SUBJECT ... 条件，只有命中的候选邮件才会被取回
+- 服务器搜索是子串匹配，候选邮件再取邮件头（不下载正文）用分类器复核：
+  同时命中重要规则、域名只是子串（notzwift.com）的邮件不会被删除
+- 删除对压缩后的 UID 集合一次完成：UID STORE +FLAGS.SILENT (\\Deleted) 后
+  UID EXPUNGE（UIDPLUS）/ EXPUNGE；指定了回收文件夹时支持 MOVE 用 UID MOVE，
+  否则先 UID COPY 到回收文件夹再删除，复制失败时不删除任何邮件
+- 预览模式额外取范围内邮件的 RFC822.SIZE，报告避免下载的字节数
 """
 
-import imaplib
 import json
 import os
 from datetime import datetime
 
-CONFIG_FILE = "/root/.openclaw/workspace/config/email_config.json"
+from imap_client import get_client
+from email_classifier import classify, classify_batch, load_rules
 
-# 营销邮件关键词
-PROMO_KEYWORDS = [
-    'savings', 'sale', 'deal', 'offer', 'promo', 'discount',
-    'award', 'reward', 'points', 'bonus', 'free', 'limited',
-    'newsletter', 'subscribe', 'unsubscribe', 'marketing',
-    'news', 'update', 'digest', 'weekly', 'monthly',
-    'zwift', 'garmin', 'hyatt', 'amazon', 'promotion',
-    '优惠', '促销', '打折', '特价', '限时', '免费',
-    '积分', '奖励', '会员', '订阅', '退订', '广告',
-]
-
-# 营销邮件发件人域名
-PROMO_DOMAINS = [
-    'zwift.com', 'garmin.com', 'hyatt.com', 'discoverasr.com',
-    'sendgrid.net', 'mailchimp.com', 'campaign-monitor.com',
-]
+CONFIG_FILE = "/root/.openclaw/workspace/config/email_config.json"
+OR_CHUNK = 30          # 每条 SEARCH 命令 OR 合并的条件数
+PRINT_LIMIT = 50       # 逐封打印的最多邮件数
 
 def load_config():
     """加载配置"""
@@ -34,110 +30,169 @@ def load_config():
         return json.load(f)
 
 def is_promo_email(subject, from_addr, body=''):
-    """判断是否为营销邮件"""
-    text = f"{subject} {from_addr} {body}".lower()
+    """判断是否为营销邮件（规则见 config/email_rules.json；同时命中重要规则的邮件不算营销）"""
+    result = classify({'subject': subject, 'from': from_addr})
+    if result['category'] == 'promo':
+        return True, '; '.join(result['reasons'])
+    return False, None
+
+def quote(value):
+    """IMAP 带引号字符串"""
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def build_search_criteria(rules=None, category='promo'):
+    """营销规则 -> SEARCH 条件
+
+    返回 (ascii_criteria, literal_criteria)：ASCII 条件可以 OR 合并为一条命令；
+    含中文的关键词必须作为字面量发送，每条命令只能带一个，分别为 (字段, 关键词)。
+    """
+    rules = rules or load_rules()
+    ascii_criteria, literal_criteria = [], []
     
-    # 检查关键词
-    for keyword in PROMO_KEYWORDS:
-        if keyword in text:
-            return True, f"关键词: {keyword}"
+    def add(field, value):
+        if value.isascii():
+            ascii_criteria.append(f'{field} {quote(value)}')
+        else:
+            literal_criteria.append((field, value))
     
-    # 检查发件人域名
-    for domain in PROMO_DOMAINS:
-        if domain in from_addr.lower():
-            return True, f"营销域名: {domain}"
+    for rule in rules['rules']:
+        if rule['category'] != category:
+            continue
+        field = rule.get('field', 'any')
+        for kw in rule.get('keywords', []):
+            if field in ('subject', 'any'):
+                add('SUBJECT', kw)
+            if field in ('from', 'any'):
+                add('FROM', kw)
+        for domain in rule.get('domains', []):
+            # 子串匹配：@zwift.com 与子域名 .zwift.com（news.zwift.com）
+            domain = domain.lower().strip('@.')
+            add('FROM', f'@{domain}')
+            add('FROM', f'.{domain}')
+    return list(dict.fromkeys(ascii_criteria)), list(dict.fromkeys(literal_criteria))
+
+def or_tree(criteria):
+    """[a, b, c, d] -> OR OR a b OR c d（前缀表示，平衡嵌套）"""
+    if len(criteria) == 1:
+        return criteria[0]
+    mid = len(criteria) // 2
+    return f'OR {or_tree(criteria[:mid])} {or_tree(criteria[mid:])}'
+
+def server_search(client, scope, rules=None):
+    """在服务器端搜索命中营销规则的候选 UID，返回 (uids, 搜索命令数)"""
+    ascii_criteria, literal_criteria = build_search_criteria(rules)
+    found, commands = set(), 0
+    for start in range(0, len(ascii_criteria), OR_CHUNK):
+        found.update(client.uid_search(scope, or_tree(ascii_criteria[start:start + OR_CHUNK])))
+        commands += 1
+    for field, value in literal_criteria:
+        found.update(client.uid_search(scope, field, value))
+        commands += 1
+    return sorted(found), commands
+
+def delete_uids(client, uids, trash=None):
+    """对 UID 集合一次完成删除，返回使用的方式
     
-    return False, None
+    指定 trash 时邮件一定先进入回收文件夹：支持 MOVE 用 UID MOVE，否则 UID COPY 后再删除
+    （返回 'copy+uid_expunge' / 'copy+expunge'）；COPY 失败会抛出异常，不会标记删除。
+    """
+    if trash:
+        if client.has_capability('MOVE'):
+            client.uid_move(uids, trash)
+            return 'move'
+        client.uid_copy(uids, trash)
+    client.uid_store(uids, '+FLAGS.SILENT', '(\\Deleted)')
+    if client.has_capability('UIDPLUS'):
+        # 只清除本次标记的邮件，不影响用户在其他客户端已标记删除的邮件
+        client.uid_expunge(uids)
+        method = 'uid_expunge'
+    else:
+        client.expunge()
+        method = 'expunge'
+    return f'copy+{method}' if trash else method
+
+def clean_promo_emails(dry_run=True, limit=50, trash=None):
+    """清理营销邮件
 
-def clean_promo_emails(dry_run=True, limit=50):
-    """清理营销邮件"""
+    limit: 只检查收件箱最新的 limit 封邮件；None / 0 检查整个收件箱
+    trash: 移动到该文件夹而不是永久删除（不支持 MOVE 的服务器用 COPY + 删除）
+    """
     config = load_config()
     
     try:
-        # 连接IMAP
-        imap = imaplib.IMAP4_SSL(config['imap_server'], config['imap_port'])
-        imap.login(config['email'], config['password'])
+        # 复用已登录的会话；预览模式只读打开收件箱
+        client = get_client(config)
+        info = client.select('INBOX', readonly=dry_run)
+        exists = info.get('exists') or 0
         
-        # 选择收件箱
-        imap.select('INBOX')
+        if not exists:
+            print("📭 收件箱为空")
+            return {'success': True, 'found': 0, 'deleted': 0, 'dry_run': dry_run, 'emails': []}
         
-        # 搜索邮件
-        _, messages = imap.search(None, 'ALL')
-        email_ids = messages[0].split()
+        # 搜索范围：最新 limit 封（序号区间），或整个收件箱
+        scanned = min(limit, exists) if limit else exists
+        scope = f'{exists - scanned + 1}:*'
+        header_bytes_before = client.stats['header_bytes']
         
-        # 限制处理数量
-        email_ids = email_ids[-limit:] if len(email_ids) > limit else email_ids
+        print(f"📧 在服务器端搜索 {scanned} 封邮件...")
+        print("=" * 60)
         
-        promos_found = []
-        deleted_count = 0
+        candidates, search_commands = server_search(client, scope)
         
-        print(f"📧 检查 {len(email_ids)} 封邮件...")
-        print("=" * 60)
+        # 候选邮件只取邮件头复核（服务器 SEARCH 是子串匹配，且不知道重要规则优先）
+        headers = client.fetch_headers(candidates)
+        promos_found = []
+        for m, c in zip(headers, classify_batch(headers)):
+            if c['category'] == 'promo':
+                promos_found.append({
+                    'id': str(m['uid']),
+                    'subject': m['subject'][:60],
+                    'from': m['from'][:40],
+                    'reason': '; '.join(c['reasons']),
+                    'size': m['size'],
+                })
         
-        for email_id in email_ids:
-            try:
-                _, msg_data = imap.fetch(email_id, '(RFC822)')
-                import email
-                msg = email.message_from_bytes(msg_data[0][1])
-                
-                subject = msg.get('Subject', '')
-                from_addr = msg.get('From', '')
-                
-                # 解码主题
-                try:
-                    decoded_subject = email.header.decode_header(subject)[0]
-                    if isinstance(decoded_subject[0], bytes):
-                        subject = decoded_subject[0].decode(decoded_subject[1] or 'utf-8')
-                    else:
-                        subject = decoded_subject[0]
-                except:
-                    pass
-                
-                is_promo, reason = is_promo_email(subject, from_addr)
-                
-                if is_promo:
-                    promos_found.append({
-                        'id': email_id.decode(),
-                        'subject': subject[:60],
-                        'from': from_addr[:40],
-                        'reason': reason
-                    })
-                    
-                    if not dry_run:
-                        # 删除邮件
-                        imap.store(email_id, '+FLAGS', '\\Deleted')
-                        deleted_count += 1
-                        print(f"🗑️ 已删除: {subject[:50]} ({reason})")
-                    else:
-                        print(f"🔴 将删除: {subject[:50]} ({reason})")
-            
-            except Exception as e:
-                print(f"⚠️ 处理邮件失败: {e}")
-                continue
+        for e in promos_found[:PRINT_LIMIT]:
+            print(f"{'🔴 将删除' if dry_run else '🗑️ 删除'}: {e['subject'][:50]} ({e['reason']})")
+        if len(promos_found) > PRINT_LIMIT:
+            print(f"   ... 另有 {len(promos_found) - PRINT_LIMIT} 封")
         
-        if not dry_run:
-            # 永久删除
-            imap.expunge()
+        deleted_count, method = 0, None
+        if promos_found and not dry_run:
+            method = delete_uids(client, [int(e['id']) for e in promos_found], trash)
+            deleted_count = len(promos_found)
         
-        imap.close()
-        imap.logout()
+        header_bytes = client.stats['header_bytes'] - header_bytes_before
+        result = {
+            'success': True,
+            'scanned': scanned,
+            'candidates': len(candidates),
+            'found': len(promos_found),
+            'deleted': deleted_count,
+            'dry_run': dry_run,
+            'method': method,
+            'search_commands': search_commands,
+            'header_bytes': header_bytes,
+            'emails': promos_found
+        }
         
         print("\n" + "=" * 60)
-        print(f"📊 发现 {len(promos_found)} 封营销邮件")
+        print(f"📊 服务器搜索 {search_commands} 条命令，候选 {len(candidates)} 封，"
+              f"复核后 {len(promos_found)} 封营销邮件")
         
         if dry_run:
+            # 对比逐封下载整封邮件的做法：范围内邮件的总大小（只取 RFC822.SIZE）
+            scope_bytes = sum(client.fetch_sizes(client.uid_search(scope)).values())
+            result['scope_bytes'] = scope_bytes
+            result['bytes_avoided'] = scope_bytes - header_bytes
+            print(f"📦 取回邮件头 {header_bytes / 1024:,.1f} KB，范围内邮件共 {scope_bytes / 1024:,.1f} KB，"
+                  f"避免下载 {result['bytes_avoided'] / 1024:,.1f} KB")
             print("💡 这是预览模式，没有实际删除")
             print("💡 运行 'python3 email_cleaner.py clean' 执行删除")
         else:
-            print(f"🗑️ 已删除 {deleted_count} 封邮件")
+            print(f"🗑️ 已删除 {deleted_count} 封邮件" + (f"（移动到 {trash}）" if trash else ""))
         
-        return {
-            'success': True,
-            'found': len(promos_found),
-            'deleted': deleted_count if not dry_run else 0,
-            'dry_run': dry_run,
-            'emails': promos_found
-        }
+        return result
     
     except Exception as e:
         return {'success': False, 'error': str(e)}
@@ -149,16 +204,26 @@ def main():
     if len(sys.argv) < 2:
         print("🧹 邮件清理工具")
         print("\n用法:")
-        print("  python3 email_cleaner.py preview [数量]  # 预览要删除的邮件")
-        print("  python3 email_cleaner.py clean [数量]    # 执行删除")
+        print("  python3 email_cleaner.py preview [数量|all]                  # 预览要删除的邮件")
+        print("  python3 email_cleaner.py clean [数量|all] [--trash 文件夹]    # 执行删除")
         print("\n示例:")
-        print("  python3 email_cleaner.py preview         # 预览前50封")
-        print("  python3 email_cleaner.py preview 20      # 预览前20封")
-        print("  python3 email_cleaner.py clean           # 删除前50封营销邮件")
+        print("  python3 email_cleaner.py preview         # 预览最新50封")
+        print("  python3 email_cleaner.py preview 20      # 预览最新20封")
+        print("  python3 email_cleaner.py preview all     # 预览整个收件箱（报告避免下载的字节数）")
+        print("  python3 email_cleaner.py clean           # 删除最新50封中的营销邮件")
+        print("  python3 email_cleaner.py clean all --trash Trash  # 整个收件箱的营销邮件移到 Trash")
         sys.exit(1)
     
     cmd = sys.argv[1]
-    limit = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    args = sys.argv[2:]
+    trash = None
+    if '--trash' in args:
+        i = args.index('--trash')
+        trash = args[i + 1] if i + 1 < len(args) else 'Trash'
+        del args[i:i + 2]
+    limit = 50
+    if args:
+        limit = None if args[0] == 'all' else int(args[0])
     
     if cmd == 'preview':
         result = clean_promo_emails(dry_run=True, limit=limit)
@@ -169,7 +234,7 @@ def main():
         print("⚠️ 即将删除营销邮件！")
         response = input("确认删除? (yes/no): ").strip().lower()
         if response == 'yes':
-            result = clean_promo_emails(dry_run=False, limit=limit)
+            result = clean_promo_emails(dry_run=False, limit=limit, trash=trash)
             if not result.get('success'):
                 print(f"❌ 错误: {result.get('error')}")
         else:
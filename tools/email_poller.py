@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+多账号邮件轮询 - asyncio 并发检查多个账号 / 文件夹，合并去重后分类、归档
+
+- 账号来自 config/email_accounts.json（{"accounts": [...]}，每个账号与 email_config.json 格式相同，
+  可另配 name、folders（默认 ["INBOX"]）、enabled）；没有该文件时只轮询 email_config.json 中的账号，
+  其他单账号工具继续使用 email_config.json
+- imaplib 是阻塞库，每个账号的增量同步（email_sync.MailboxSync）在线程池中执行；同一账号的
+  文件夹共用一个会话，按顺序检查。全局 Semaphore 限制同时检查的账号数，一轮的耗时取决于
+  最慢的服务器，而不是所有服务器之和
+- 账号失败后指数退避：BACKOFF_BASE * 2^(连续失败次数-1) 秒（上限 BACKOFF_MAX，±20% 抖动），
+  退避期间跳过该账号，成功一次后清零
+- 账号整体超时后线程无法取消：记住仍在运行的任务，结束前跳过该账号（不会有两个线程同时
+  使用同一个会话），结束后丢弃该账号的 MailboxSync，未提交的进度不会被保存
+- 各账号的结果按完成顺序进入同一个流，按 Message-ID 去重（同一封邮件可能同时出现在多个账号 /
+  文件夹中）后立即分类；一轮结束后整批归档到 RDS，归档成功才保存同步进度
+"""
+
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from imap_client import get_client
+from email_sync import MailboxSync, SyncStateStore
+from email_classifier import classify_batch
+
+CONFIG_FILE = "/root/.openclaw/workspace/config/email_config.json"
+ACCOUNTS_FILE = "/root/.openclaw/workspace/config/email_accounts.json"
+CONSUMER = "email_poller"
+CONCURRENCY = 4             # 同时检查的账号数
+BACKOFF_BASE = 30           # 首次失败后的退避秒数
+BACKOFF_MAX = 30 * 60       # 退避上限
+POLL_INTERVAL = 300         # run 模式的轮询间隔（秒）
+DEDUP_SIZE = 10000          # 跨轮次去重记住的 Message-ID 数
+
+
+def load_accounts(path=None):
+    """读取账号列表（兼容单账号配置）"""
+    if path is None:
+        path = ACCOUNTS_FILE if os.path.exists(ACCOUNTS_FILE) else CONFIG_FILE
+    with open(path, 'r') as f:
+        data = json.load(f)
+    accounts = data.get('accounts', [data]) if isinstance(data, dict) else data
+    return [a for a in accounts if a.get('enabled', True)]
+
+
+def account_key(account):
+    return account.get('name') or account['email']
+
+
+def dedup_key(message):
+    """去重键：Message-ID，缺失时退回 账号/文件夹/UID"""
+    return message.get('message_id') or f"{message['account']}/{message['folder']}/{message['uid']}"
+
+
+class MailPoller:
+    """多账号并发轮询（同一时刻只运行一轮）"""
+
+    def __init__(self, accounts, consumer=CONSUMER, concurrency=CONCURRENCY, timeout=30,
+                 archive=False, initial_limit=20):
+        self.accounts = accounts
+        self.consumer = consumer
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.archive = archive
+        self.initial_limit = initial_limit
+
+        self.store = SyncStateStore(consumer)   # 所有账号共用一个进度文件
+        self._syncs = {}                        # 账号 -> MailboxSync
+        self._backoff = {}                      # 账号 -> {failures, until, error}
+        self._inflight = {}                     # 账号 -> 超时后仍在运行的同步任务
+        self._seen = OrderedDict()              # 最近处理过的去重键（跨轮次）
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='email-poller')
+        self._archiver = None
+
+    # ---------- 单个账号（线程池中执行） ----------
+
+    def _sync_account(self, account):
+        key = account_key(account)
+        sync = self._syncs.get(key)
+        if sync is None:
+            client = get_client(account, timeout=self.timeout)
+            sync = self._syncs[key] = MailboxSync(client, self.consumer, store=self.store,
+                                                  initial_limit=self.initial_limit)
+        emails = []
+        for folder in account.get('folders', ['INBOX']):
+            state = sync.sync(folder)
+            emails.extend(dict(m, account=key, folder=folder) for m in state['new'])
+        return emails
+
+    def _backoff_delay(self, failures):
+        return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (failures - 1)) * random.uniform(0.8, 1.2)
+
+    def _abandon(self, key, future):
+        """超时的同步线程还在使用该账号的会话：结束前跳过该账号，结束后丢弃它的同步状态"""
+        self._inflight[key] = future
+
+        def finished(_):
+            # 在工作线程中回调，与事件循环是否还在运行无关
+            self._syncs.pop(key, None)
+            self._inflight.pop(key, None)
+
+        future.add_done_callback(finished)
+
+    async def _poll_account(self, account, semaphore, queue):
+        key = account_key(account)
+        if key in self._inflight:
+            await queue.put((key, {'status': 'busy'}, []))
+            return
+        backoff = self._backoff.get(key)
+        if backoff and time.monotonic() < backoff['until']:
+            await queue.put((key, {'status': 'backoff', 'error': backoff['error'],
+                                   'retry_in': round(backoff['until'] - time.monotonic())}, []))
+            return
+
+        async with semaphore:
+            start = time.perf_counter()
+            # 每个阻塞操作都受套接字超时限制，这里再限制整个账号的耗时
+            limit = self.timeout * (1 + len(account.get('folders', ['INBOX'])))
+            future = self._executor.submit(self._sync_account, account)
+            try:
+                emails = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), limit)
+            except Exception as e:
+                if not future.done():
+                    self._abandon(key, future)
+                failures = (backoff or {}).get('failures', 0) + 1
+                delay = self._backoff_delay(failures)
+                error = str(e) or type(e).__name__
+                self._backoff[key] = {'failures': failures, 'until': time.monotonic() + delay, 'error': error}
+                await queue.put((key, {'status': 'error', 'error': error, 'failures': failures,
+                                       'retry_in': round(delay),
+                                       'seconds': round(time.perf_counter() - start, 2)}, []))
+                return
+
+        self._backoff.pop(key, None)
+        await queue.put((key, {'status': 'ok', 'new': len(emails),
+                               'seconds': round(time.perf_counter() - start, 2)}, emails))
+
+    # ---------- 合并的结果流 ----------
+
+    async def stream(self):
+        """并发检查全部账号，按完成顺序产出 (账号, 状态, 去重并分类后的新邮件)"""
+        queue = asyncio.Queue()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = [asyncio.create_task(self._poll_account(a, semaphore, queue)) for a in self.accounts]
+        batch_keys = set()
+        try:
+            for _ in tasks:
+                key, status, emails = await queue.get()
+                unique = []
+                for m in emails:
+                    dk = dedup_key(m)
+                    if dk in batch_keys or dk in self._seen:
+                        continue
+                    batch_keys.add(dk)
+                    unique.append(m)
+                status['duplicates'] = len(emails) - len(unique)
+                for m, c in zip(unique, classify_batch(unique)):
+                    m['category'] = c['category']
+                    m['reasons'] = c['reasons']
+                yield key, status, unique
+        finally:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _archive(self, emails):
+        if self._archiver is None:
+            from email_rds import EmailArchiveRDS
+            self._archiver = EmailArchiveRDS()
+        return self._archiver.bulk_archive({
+            'message_id': m['message_id'] or f"<{dedup_key(m)}>",
+            'subject': m['subject'],
+            'from': m['from'],
+            'date': m['date'],
+            'is_read': m['seen'],
+            'category': m['category'],
+            'labels': [m['account'], m['folder']],
+        } for m in emails)
+
+    async def poll_once(self):
+        """执行一轮：返回 {accounts: {账号: 状态}, emails, duplicates, archived, seconds}"""
+        start = time.perf_counter()
+        statuses, emails = {}, []
+        async for key, status, unique in self.stream():
+            statuses[key] = status
+            emails.extend(unique)
+
+        result = {
+            'accounts': statuses,
+            'emails': emails,
+            'duplicates': sum(s.get('duplicates', 0) for s in statuses.values()),
+            'archived': None,
+        }
+        if self.archive and emails:
+            loop = asyncio.get_running_loop()
+            try:
+                result['archived'] = await loop.run_in_executor(None, self._archive, emails)
+            except Exception as e:
+                # 不保存进度：下一轮重新取回这些邮件
+                result['archive_error'] = str(e)
+                result['seconds'] = round(time.perf_counter() - start, 2)
+                return result
+
+        # 处理完成后才保存同步进度并记住去重键
+        for key, status in statuses.items():
+            if status['status'] == 'ok':
+                self._syncs[key].commit()
+        for m in emails:
+            self._seen[dedup_key(m)] = True
+        while len(self._seen) > DEDUP_SIZE:
+            self._seen.popitem(last=False)
+
+        result['seconds'] = round(time.perf_counter() - start, 2)
+        return result
+
+    async def run(self, interval=POLL_INTERVAL, on_result=None):
+        """持续轮询；每轮从开始计时，间隔 interval 秒"""
+        while True:
+            start = time.monotonic()
+            result = await self.poll_once()
+            if on_result:
+                on_result(result)
+            await asyncio.sleep(max(0, interval - (time.monotonic() - start)))
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+def print_result(result):
+    print(f"\n📬 {time.strftime('%H:%M:%S')} 本轮 {result['seconds']}s，新邮件 {len(result['emails'])} 封"
+          f"（去重 {result['duplicates']} 封）")
+    for key, status in result['accounts'].items():
+        if status['status'] == 'ok':
+            print(f"  ✅ {key}: {status['new']} 封 ({status['seconds']}s)")
+        elif status['status'] == 'busy':
+            print(f"  ⏳ {key}: 上一次超时的检查仍在运行，跳过")
+        elif status['status'] == 'backoff':
+            print(f"  ⏸️ {key}: 退避中，{status['retry_in']}s 后重试 ({status['error']})")
+        else:
+            print(f"  ❌ {key}: {status['error']}（连续失败 {status['failures']} 次，{status['retry_in']}s 后重试）")
+    for m in result['emails']:
+        if m['category'] == 'important':
+            print(f"  🔴 [{m['account']}] {m['subject'][:50]} - {m['from'][:30]}")
+    if result.get('archived'):
+        archived = result['archived']
+        print(f"  🗄️ 已归档 {archived['inserted'] + archived['updated']} 封")
+    elif result.get('archive_error'):
+        print(f"  ⚠️ 归档失败，下一轮重试: {result['archive_error']}")
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("📮 多账号邮件轮询")
+        print("\n用法:")
+        print("  python3 email_poller.py accounts                     # 查看账号")
+        print("  python3 email_poller.py once [--archive]             # 检查一轮")
+        print("  python3 email_poller.py run [间隔秒] [--archive]      # 持续轮询")
+        sys.exit(1)
+
+    cmd = sys.argv[1]
+    args = [a for a in sys.argv[2:] if a != '--archive']
+    archive = '--archive' in sys.argv
+    accounts = load_accounts()
+
+    if cmd == 'accounts':
+        for a in accounts:
+            print(f"  {account_key(a)}: {a['email']} @ {a['imap_server']} {a.get('folders', ['INBOX'])}")
+    elif cmd == 'once':
+        poller = MailPoller(accounts, archive=archive)
+        print_result(asyncio.run(poller.poll_once()))
+        poller.close()
+    elif cmd == 'run':
+        interval = int(args[0]) if args else POLL_INTERVAL
+        poller = MailPoller(accounts, archive=archive)
+        try:
+            asyncio.run(poller.run(interval, on_result=print_result))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            poller.close()
+    else:
+        print(f"未知命令: {cmd}")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,106 +2,412 @@
 """
 邮件归档RDS工具 (PostgreSQL)
 存储邮件、分类管理、全文搜索
+
+搜索（执行 init 创建检索列和索引之后）:
+- 关键词: 主题 + 正文摘要的 search_vector (GIN)，中文连续字串切分为相邻二元组，
+  英文按词前缀匹配；有 pg_trgm 时 ASCII 关键词另外按主题子串匹配（"voice" 命中 "invoice"，
+  走主题三元组索引），没有时只按词前缀匹配；未初始化或关键词无法分词（单个汉字）时退回 ILIKE
+- 发件人: ILIKE，有 pg_trgm 时走三元组 GIN 索引
+- 结果按 (received_at, id) 倒序，翻页用上一页最后一封的 (received_at, id) 作为游标
 """
 
+import io
 import json
+import re
+import time
+import zlib
 from datetime import datetime
+from email.utils import parsedate_to_datetime
 from rds_manager import RDSManager
 
+ARCHIVE_BATCH = 5000        # 批量归档时每批 COPY 的行数（同时限制内存中的行数）
+COMPRESS_LEVEL = 1          # 正文 zlib 压缩级别（1 的速度约为 6 的两倍，压缩率只低约 10%）
+
+ARCHIVE_COLUMNS = ('message_id', 'subject', 'sender', 'sender_name', 'received_at',
+                   'category', 'is_read', 'body_summary', 'content_zlib', 'labels')
+
+# 正文压缩后存放在 content_zlib（full_content 只保留旧数据）；
+# STORAGE EXTERNAL: 大字段行外存储，且不再由 TOAST 重复压缩已压缩的数据
+ARCHIVE_DDL = [
+    "ALTER TABLE emails ADD COLUMN IF NOT EXISTS content_zlib BYTEA",
+    "ALTER TABLE emails ALTER COLUMN content_zlib SET STORAGE EXTERNAL",
+]
+
+# 会话级临时表，事务提交时清空；received_at 用 timestamptz 接收，写入 emails 时
+# 与逐条 INSERT 一样按会话时区转换
+STAGE_DDL = """
+CREATE TEMP TABLE IF NOT EXISTS emails_stage (
+    seq BIGSERIAL,
+    message_id VARCHAR(128),
+    subject VARCHAR(512),
+    sender VARCHAR(256),
+    sender_name VARCHAR(256),
+    received_at TIMESTAMPTZ,
+    category VARCHAR(20),
+    is_read BOOLEAN,
+    body_summary TEXT,
+    content_zlib BYTEA,
+    labels JSONB
+) ON COMMIT DELETE ROWS
+"""
+
+# 同一批内重复的 message_id 取最后一条；已存在的邮件更新分类、已读状态和正文
+MERGE_SQL = f"""
+WITH merged AS (
+    INSERT INTO emails ({', '.join(ARCHIVE_COLUMNS)})
+    SELECT DISTINCT ON (message_id) {', '.join(ARCHIVE_COLUMNS)}
+    FROM emails_stage
+    WHERE message_id IS NOT NULL
+    ORDER BY message_id, seq DESC
+    ON CONFLICT (message_id) DO UPDATE SET
+        category = EXCLUDED.category,
+        is_read = EXCLUDED.is_read,
+        body_summary = COALESCE(EXCLUDED.body_summary, emails.body_summary),
+        content_zlib = COALESCE(EXCLUDED.content_zlib, emails.content_zlib)
+    RETURNING (xmax = 0) AS inserted
+)
+SELECT count(*) FILTER (WHERE inserted), count(*) FROM merged
+"""
+
+
+# 检索文本：中文连续字串替换为相邻二元组（simple 分词器无法切分中文），查询与文档使用同一个切分函数
+SEARCH_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION email_search_text(t text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+        SELECT regexp_replace(coalesce(t, ''), '[\u4e00-\u9fff]+', ' ', 'g') || ' ' || coalesce((
+            SELECT string_agg(substr(m[1], i, 2), ' ')
+            FROM regexp_matches(coalesce(t, ''), '[\u4e00-\u9fff]{2,}', 'g') AS m,
+                 generate_series(1, char_length(m[1]) - 1) AS i
+        ), '')
+    $$;
+    """,
+    # 查询词项之间取 AND（与 ILIKE 过滤的语义一致），每个词项前缀匹配
+    """
+    CREATE OR REPLACE FUNCTION email_search_query(q text) RETURNS tsquery
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+        SELECT string_agg(quote_literal(lexeme) || ':*', ' & ')::tsquery
+        FROM unnest(to_tsvector('simple', email_search_text(q)))
+    $$;
+    """,
+    """
+    ALTER TABLE emails ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', email_search_text(subject)), 'A') ||
+        setweight(to_tsvector('simple', email_search_text(body_summary)), 'B')
+    ) STORED;
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_emails_search_vector ON emails USING gin(search_vector);",
+    # 游标翻页: WHERE (received_at, id) < (...) ORDER BY received_at DESC, id DESC
+    "CREATE INDEX IF NOT EXISTS idx_emails_received_id ON emails(received_at DESC, id DESC);",
+]
+
+# 主题 / 发件人子串匹配的三元组索引（需要 pg_trgm 扩展，不可用时 ILIKE 按时间范围扫描）
+TRIGRAM_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm;",
+    "CREATE INDEX IF NOT EXISTS idx_emails_subject_trgm ON emails USING gin(subject gin_trgm_ops);",
+    "CREATE INDEX IF NOT EXISTS idx_emails_sender_trgm ON emails USING gin(sender gin_trgm_ops);",
+]
+
+# 搜索结果的列（不含正文，前 7 列与 SELECT * 相同）
+SEARCH_COLUMNS = ('id', 'message_id', 'subject', 'sender', 'sender_name', 'received_at',
+                  'category', 'is_read', 'body_summary', 'labels')
+
+CJK_RUN = re.compile(r'[\u4e00-\u9fff]+')
+
+
+def like_pattern(text):
+    """ILIKE 模式，转义 % 和 _"""
+    return '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def fts_usable(keyword):
+    """关键词能否走 search_vector：单个汉字不产生二元组，只能用 ILIKE"""
+    runs = CJK_RUN.findall(keyword)
+    if any(len(run) == 1 for run in runs):
+        return False
+    return bool(runs) or bool(re.search(r'[^\W_]', CJK_RUN.sub(' ', keyword)))
+
+def parse_sender(sender):
+    """'名字 <地址>' -> (地址, 名字)"""
+    sender = sender or ''
+    if '<' in sender:
+        return sender.split('<')[1].strip('>'), sender.split('<')[0].strip().strip('"')
+    return sender, ''
+
+
+def compress_body(body):
+    return zlib.compress(body.encode('utf-8'), COMPRESS_LEVEL) if body else None
+
+
+def decompress_body(data):
+    return zlib.decompress(bytes(data)).decode('utf-8') if data else ''
+
+
+def _copy_text(value):
+    """COPY 文本格式的字段编码"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (bytes, bytearray)):
+        return '\\\\x' + value.hex()
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r').replace('\x00', ''))
+
+
 class EmailArchiveRDS:
     """邮件归档管理"""
     
     def __init__(self):
         self.rds = RDSManager()
+        self._schema_ready = False
+        self._search_features = None
+    
+    def _ensure_schema(self, cursor):
+        """首次使用时补充 content_zlib 列（已存在则不执行 DDL，避免每次获取表锁）"""
+        if self._schema_ready:
+            return
+        cursor.execute("""
+            SELECT 1 FROM pg_attribute
+            WHERE attrelid = 'emails'::regclass AND attname = 'content_zlib' AND NOT attisdropped
+        """)
+        if cursor.fetchone() is None:
+            for sql in ARCHIVE_DDL:
+                cursor.execute(sql)
+        self._schema_ready = True
+    
+    def _email_row(self, email_data, category):
+        """邮件 dict -> ARCHIVE_COLUMNS 顺序的一行（message_id 优先取邮件头的 Message-ID）"""
+        sender, sender_name = parse_sender(email_data.get('from', ''))
+        
+        # 解析日期
+        try:
+            received_at = parsedate_to_datetime(email_data.get('date'))
+        except (TypeError, ValueError, IndexError):
+            received_at = datetime.now()
+        
+        body = email_data.get('body') or ''
+        return (
+            str(email_data.get('message_id') or email_data.get('id') or '')[:128] or None,
+            (email_data.get('subject') or '')[:500],
+            sender[:250],
+            sender_name[:250],
+            received_at,
+            category,
+            bool(email_data.get('is_read', False)),
+            body[:500],
+            compress_body(body),
+            json.dumps(email_data.get('labels', []), ensure_ascii=False),
+        )
     
     def archive_email(self, email_data, category='normal'):
         """归档单封邮件"""
-        sql = """
-        INSERT INTO emails 
-        (message_id, subject, sender, sender_name, received_at, category, 
-         is_read, body_summary, full_content, labels)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        sql = f"""
+        INSERT INTO emails ({', '.join(ARCHIVE_COLUMNS)})
+        VALUES ({', '.join(['%s'] * len(ARCHIVE_COLUMNS))})
         ON CONFLICT (message_id) DO UPDATE SET
         category = EXCLUDED.category, is_read = EXCLUDED.is_read
         """
         
-        # 提取发件人名称
-        sender = email_data.get('from', '')
-        sender_name = ''
-        if '<' in sender:
-            sender_name = sender.split('<')[0].strip().strip('"')
-            sender = sender.split('<')[1].strip('>')
+        with self.rds.get_connection() as conn:
+            with conn.cursor() as cursor:
+                self._ensure_schema(cursor)
+                cursor.execute(sql, self._email_row(email_data, category))
+                conn.commit()
         
-        # 解析日期
-        received_at = email_data.get('date')
-        try:
-            from email.utils import parsedate_to_datetime
-            received_at = parsedate_to_datetime(received_at)
-        except:
-            received_at = datetime.now()
+        return True
+    
+    def bulk_archive(self, emails, category_map=None, batch_size=ARCHIVE_BATCH):
+        """批量归档（emails 可以是生成器，按批流式写入）
+        
+        每批: COPY 到会话临时表 emails_stage -> 一条 INSERT ... SELECT ... ON CONFLICT 合并
+        -> 提交。整个过程只占用一个连接。
+        返回 {rows, inserted, updated, duplicates, rejected, batches, seconds, rows_per_sec,
+        body_bytes, stored_bytes}；没有 message_id / id 的邮件无法合并，计入 rejected 不写入，
+        同一批内 message_id 重复的只保留最后一封，计入 duplicates
+        """
+        category_map = category_map or {}
+        stats = {'rows': 0, 'inserted': 0, 'updated': 0, 'duplicates': 0, 'rejected': 0, 'batches': 0,
+                 'body_bytes': 0, 'stored_bytes': 0}
+        start = time.perf_counter()
+        copy_sql = f"COPY emails_stage ({', '.join(ARCHIVE_COLUMNS)}) FROM STDIN"
         
         with self.rds.get_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute(sql, (
-                    email_data.get('id'),
-                    email_data.get('subject', '')[:500],
-                    sender[:250],
-                    sender_name[:250],
-                    received_at,
-                    category,
-                    email_data.get('is_read', False),
-                    email_data.get('body', '')[:500],
-                    email_data.get('body', ''),
-                    json.dumps(email_data.get('labels', []))
-                ))
+                self._ensure_schema(cursor)
+                cursor.execute(STAGE_DDL)
                 conn.commit()
+                
+                buf, count = io.StringIO(), 0
+                
+                def flush(count):
+                    buf.seek(0)
+                    cursor.copy_expert(copy_sql, buf)
+                    cursor.execute(MERGE_SQL)
+                    inserted, merged = cursor.fetchone()
+                    conn.commit()
+                    stats['inserted'] += inserted
+                    stats['updated'] += merged - inserted
+                    stats['duplicates'] += count - merged
+                    stats['batches'] += 1
+                    buf.seek(0)
+                    buf.truncate()
+                
+                for email in emails:
+                    category = (category_map.get(email.get('id')) or email.get('category') or 'normal')
+                    row = self._email_row(email, category)
+                    stats['rows'] += 1
+                    if row[0] is None:
+                        stats['rejected'] += 1
+                        continue
+                    buf.write('\t'.join(_copy_text(v) for v in row))
+                    buf.write('\n')
+                    stats['body_bytes'] += len((email.get('body') or '').encode('utf-8'))
+                    stats['stored_bytes'] += len(row[8] or b'')
+                    count += 1
+                    if count >= batch_size:
+                        flush(count)
+                        count = 0
+                if count:
+                    flush(count)
         
-        return True
+        elapsed = time.perf_counter() - start
+        stats['seconds'] = round(elapsed, 3)
+        stats['rows_per_sec'] = round(stats['rows'] / elapsed) if elapsed > 0 else 0
+        return stats
     
     def batch_archive(self, emails, category_map=None):
         """批量归档"""
-        category_map = category_map or {}
-        archived = 0
+        try:
+            stats = self.bulk_archive(emails, category_map)
+        except Exception as e:
+            return f"⚠️ 归档失败: {e}"
+        result = (f"✅ 已归档 {stats['inserted'] + stats['updated']} 封邮件（新增 {stats['inserted']}，"
+                  f"更新 {stats['updated']}，{stats['rows_per_sec']} 行/秒）")
+        if stats['duplicates']:
+            result += f"，重复 {stats['duplicates']} 封"
+        if stats['rejected']:
+            result += f"\n⚠️ {stats['rejected']} 封邮件缺少 message_id / id，未归档"
+        return result
+    
+    def get_full_content(self, message_id):
+        """读取邮件正文（解压 content_zlib，旧数据读 full_content）"""
+        with self.rds.get_connection() as conn:
+            with conn.cursor() as cursor:
+                self._ensure_schema(cursor)
+                cursor.execute("SELECT content_zlib, full_content FROM emails WHERE message_id = %s",
+                               (message_id,))
+                row = cursor.fetchone()
+                conn.commit()
+        if not row:
+            return None
+        return decompress_body(row[0]) if row[0] else (row[1] or '')
+    
+    def init_search(self):
+        """创建检索列与索引（已有数据时需要重写整表，只需执行一次）"""
+        results = []
+        with self.rds.get_connection() as conn:
+            with conn.cursor() as cursor:
+                # 大表建索引可能超过连接池默认的语句超时
+                cursor.execute("SET statement_timeout = 0")
+                for sql in SEARCH_DDL + TRIGRAM_DDL:
+                    try:
+                        cursor.execute(sql)
+                        conn.commit()
+                    except Exception as e:
+                        conn.rollback()
+                        cursor.execute("SET statement_timeout = 0")
+                        results.append(f"⚠️ {str(e).splitlines()[0]}")
+                        if sql in TRIGRAM_DDL:
+                            break
+                cursor.execute("RESET statement_timeout")
+                conn.commit()
+        self._search_features = None
+        return results or ["✅ 检索列与索引已创建"]
+    
+    def _detect_search_features(self, cursor):
+        """检查检索列与三元组索引是否已创建（init 之后才有）"""
+        if self._search_features is None:
+            cursor.execute("""
+                SELECT EXISTS (
+                    SELECT 1 FROM pg_attribute
+                    WHERE attrelid = 'emails'::regclass AND attname = 'search_vector' AND NOT attisdropped
+                ), to_regclass('idx_emails_sender_trgm') IS NOT NULL,
+                to_regclass('idx_emails_subject_trgm') IS NOT NULL
+            """)
+            vector, trigram, subject_trigram = cursor.fetchone()
+            self._search_features = {'search_vector': vector, 'trigram': trigram,
+                                     'subject_trigram': subject_trigram}
+        return self._search_features
+    
+    def search_page(self, keyword=None, category=None, sender=None, days=30, limit=50, cursor=None):
+        """搜索邮件，返回 {emails, next_cursor}
         
-        for email in emails:
-            category = category_map.get(email.get('id'), 'normal')
-            try:
-                self.archive_email(email, category)
-                archived += 1
-            except Exception as e:
-                print(f"⚠️ 归档失败 {email.get('id')}: {e}")
+        emails 为 SEARCH_COLUMNS 加 rank（关键词相关度，无关键词时为 0）的元组，
+        按 (received_at, id) 倒序；下一页传入 cursor=next_cursor，没有更多结果时 next_cursor 为 None。
+        days 为 None / 0 时不限时间范围。
+        """
+        conditions = []
+        params = {'limit': limit}
+        source = "emails"
+        rank = "0::real"
         
-        return f"✅ 已归档 {archived} 封邮件"
-    
-    def search_emails(self, keyword=None, category=None, sender=None, days=30, limit=50):
-        """搜索邮件"""
-        conditions = ["received_at > NOW() - INTERVAL '%s days'"]
-        params = [days]
+        if days:
+            conditions.append("received_at > NOW() - INTERVAL '1 day' * %(days)s")
+            params['days'] = days
         
-        if keyword:
-            conditions.append("(subject ILIKE %s OR body_summary ILIKE %s)")
-            params.extend([f"%{keyword}%", f"%{keyword}%"])
+        if cursor:
+            conditions.append("(received_at, id) < (%(cursor_at)s, %(cursor_id)s)")
+            params['cursor_at'], params['cursor_id'] = cursor
         
         if category:
-            conditions.append("category = %s")
-            params.append(category)
+            conditions.append("category = %(category)s")
+            params['category'] = category
         
         if sender:
-            conditions.append("sender ILIKE %s")
-            params.append(f"%{sender}%")
-        
-        sql = f"""
-        SELECT * FROM emails
-        WHERE {' AND '.join(conditions)}
-        ORDER BY received_at DESC
-        LIMIT %s
-        """
-        params.append(limit)
+            conditions.append("sender ILIKE %(sender)s")
+            params['sender'] = like_pattern(sender)
         
         with self.rds.get_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(sql, params)
-                return cursor.fetchall()
+            with conn.cursor() as db:
+                if keyword:
+                    features = self._detect_search_features(db)
+                    params['keyword'] = keyword
+                    if features['search_vector'] and fts_usable(keyword):
+                        source = "emails, (SELECT email_search_query(%(keyword)s) AS tsq) q"
+                        rank = "ts_rank_cd(search_vector, q.tsq)"
+                        if keyword.isascii() and features['subject_trigram']:
+                            # 词前缀匹配不到词中间的子串（"hub" -> "GitHub"），主题再走三元组索引
+                            conditions.append("(search_vector @@ q.tsq OR subject ILIKE %(pattern)s)")
+                            params['pattern'] = like_pattern(keyword)
+                        else:
+                            conditions.append("search_vector @@ q.tsq")
+                    else:
+                        conditions.append("(subject ILIKE %(pattern)s OR body_summary ILIKE %(pattern)s)")
+                        params['pattern'] = like_pattern(keyword)
+                
+                sql = f"""
+                SELECT {', '.join(SEARCH_COLUMNS)}, {rank} AS rank
+                FROM {source}
+                WHERE {' AND '.join(conditions) or 'TRUE'}
+                ORDER BY received_at DESC, id DESC
+                LIMIT %(limit)s
+                """
+                db.execute(sql, params)
+                rows = db.fetchall()
+        
+        last = rows[-1] if len(rows) == limit else None
+        return {
+            'emails': rows,
+            'next_cursor': (last[5], last[0]) if last else None,
+        }
+    
+    def search_emails(self, keyword=None, category=None, sender=None, days=30, limit=50, cursor=None):
+        """搜索邮件（只返回结果列表，翻页见 search_page）"""
+        return self.search_page(keyword, category, sender, days, limit, cursor)['emails']
     
     def get_unread_summary(self, days=7):
         """获取未读摘要"""
@@ -187,7 +493,8 @@ def main():
         print("📧 邮件归档RDS工具")
         print("\n用法:")
         print("  python3 email_rds.py stats                    # 邮件统计")
-        print("  python3 email_rds.py search <关键词>          # 搜索邮件")
+        print("  python3 email_rds.py init                     # 创建检索列与索引（执行一次）")
+        print("  python3 email_rds.py search <关键词> [页数]   # 搜索邮件")
         print("  python3 email_rds.py unread                   # 未读摘要")
         print("  python3 email_rds.py cleanup [天数]           # 清理旧营销邮件")
         sys.exit(1)
@@ -205,12 +512,23 @@ def main():
         for c in stats['by_category']:
             print(f"  {c[0]}: {c[1]}")
     
+    elif cmd == 'init':
+        for line in tool.init_search():
+            print(line)
+    
     elif cmd == 'search':
         keyword = sys.argv[2] if len(sys.argv) > 2 else None
-        results = tool.search_emails(keyword=keyword)
-        print(f"找到 {len(results)} 封邮件:")
-        for e in results[:10]:
-            print(f"  [{e[6]}] {e[2][:50]} - {e[3][:30]}")
+        pages = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+        cursor, page = None, 0
+        while page < pages:
+            result = tool.search_page(keyword=keyword, limit=10, cursor=cursor)
+            page += 1
+            print(f"第 {page} 页 {len(result['emails'])} 封邮件:")
+            for e in result['emails']:
+                print(f"  [{e[6]}] {e[5]:%Y-%m-%d} {e[2][:50]} - {e[3][:30]}")
+            cursor = result['next_cursor']
+            if cursor is None:
+                break
     
     elif cmd == 'unread':
         summary = tool.get_unread_summary()
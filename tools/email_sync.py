@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+邮箱增量同步 - 按文件夹记录 UIDVALIDITY / 已处理的最大 UID / HIGHESTMODSEQ
+
+每次检查只 SELECT 一次并比较状态：
+- UIDNEXT 未变且 HIGHESTMODSEQ 未变: 没有任何变化，不再发出其他命令
+- 有新邮件: UID SEARCH UID <last_uid+1>:* 后一条 UID FETCH 只取新邮件的邮件头
+- HIGHESTMODSEQ 变化 (CONDSTORE): UID FETCH 1:<last_uid> (UID FLAGS) (CHANGEDSINCE <modseq>)
+  取回标记有变化的旧邮件（如在手机上已读）
+- 首次同步或 UIDVALIDITY 变化: 旧 UID 全部作废，以当前最新的 INITIAL_LIMIT 封未读邮件为基线
+
+UID 在同一 UIDVALIDITY 内不会复用，因此不再需要按序号去重的“已通知”列表。
+状态按使用方分文件保存（各个定时任务互不影响），处理完成后调用 commit() 才落盘。
+"""
+
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+SYNC_DIR = Path("/root/.openclaw/workspace/config/email_sync")
+INITIAL_LIMIT = 50      # 首次同步 / 重新同步时作为“新邮件”返回的未读邮件数
+
+
+class SyncStateStore:
+    """同步状态：{"账号/文件夹": {uidvalidity, last_uid, highestmodseq, synced_at}}"""
+
+    def __init__(self, consumer, directory=SYNC_DIR):
+        self.path = Path(directory) / f"{consumer}.json"
+        try:
+            with open(self.path, 'r') as f:
+                self.states = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.states = {}
+
+    def get(self, key):
+        return self.states.get(key)
+
+    def set(self, key, state):
+        self.states[key] = state
+
+    def save(self):
+        """原子写入"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix('.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self.states, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+class MailboxSync:
+    """基于 IMAPClient 的增量同步"""
+
+    def __init__(self, client, consumer, store=None, initial_limit=INITIAL_LIMIT):
+        self.client = client
+        self.store = store or SyncStateStore(consumer)
+        self.initial_limit = initial_limit
+        self._staged = {}
+
+    def _key(self, folder):
+        return f"{self.client.config['email']}/{folder}"
+
+    def sync(self, folder='INBOX'):
+        """返回 {folder, resync, unchanged, new: [邮件头], changed: [{uid, flags, seen}]}"""
+        condstore = self.client.has_capability('CONDSTORE')
+        info = self.client.select(folder, readonly=True, condstore=condstore)
+        uidvalidity = info.get('uidvalidity')
+        uidnext = info.get('uidnext')
+        modseq = info.get('highestmodseq') if condstore else None
+
+        key = self._key(folder)
+        state = self.store.get(key)
+        result = {'folder': folder, 'resync': False, 'unchanged': False, 'new': [], 'changed': []}
+
+        if not state or state.get('uidvalidity') != uidvalidity:
+            # 首次同步或邮箱被重建：旧 UID 作废
+            result['resync'] = True
+            unseen = self.client.uid_search('UNSEEN')
+            result['new'] = self.client.fetch_headers(unseen[-self.initial_limit:]) if self.initial_limit else []
+            if uidnext:
+                last_uid = uidnext - 1
+            else:
+                highest = self.client.uid_search('UID', '*')
+                last_uid = highest[-1] if highest else 0
+        else:
+            last_uid = state['last_uid']
+            has_new = uidnext is None or uidnext > last_uid + 1
+            modseq_changed = bool(modseq and state.get('highestmodseq') and modseq != state['highestmodseq'])
+
+            if not has_new and not modseq_changed:
+                result['unchanged'] = True
+            if has_new:
+                # n:* 在没有更大 UID 时会返回最后一封，需要过滤
+                uids = [u for u in self.client.uid_search('UID', f'{last_uid + 1}:*') if u > last_uid]
+                result['new'] = self.client.fetch_headers(uids)
+            if modseq_changed and last_uid:
+                result['changed'] = self.client.fetch_flags(f'1:{last_uid}', changedsince=state['highestmodseq'])
+
+            if uidnext:
+                last_uid = max(last_uid, uidnext - 1)
+        if result['new']:
+            last_uid = max(last_uid, result['new'][-1]['uid'])
+
+        self._staged[key] = {
+            'uidvalidity': uidvalidity,
+            'last_uid': last_uid,
+            'highestmodseq': modseq,
+            'synced_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        return result
+
+    def commit(self):
+        """处理完成后保存同步状态（未 commit 时下次检查会再次返回同一批邮件）"""
+        if not self._staged:
+            return
+        for key, state in self._staged.items():
+            self.store.set(key, state)
+        self._staged = {}
+        self.store.save()
@@ -38,12 +38,11 @@ if not emails:
 
 # 3. 分类测试
 print("\n3️⃣ 分类邮件...")
-from email_smart import EmailClassifier
+from email_classifier import classify_batch
 
-for i, email in enumerate(emails[:5], 1):
+for i, (email, c) in enumerate(zip(emails[:5], classify_batch(emails[:5])), 1):
     print(f"  处理第 {i} 封: {email['subject'][:40]}...")
-    category, score = EmailClassifier.classify(email)
-    print(f"    -> {category} (分数: {score})")
+    print(f"    -> {c['category']} (分数: {c['score']})")
 
 print("\n✅ 测试完成！")
 print(f"\n📊 统计:")
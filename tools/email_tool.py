@@ -6,14 +6,15 @@
 
 import imaplib
 import smtplib
-import email
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from email.header import decode_header
 import json
 import os
 from datetime import datetime
 
+from imap_client import get_client
+from email_sync import MailboxSync
+
 # 配置文件路径
 CONFIG_FILE = "/root/.openclaw/workspace/config/email_config.json"
 
@@ -109,50 +110,70 @@ def fetch_unread(config=None, limit=10):
         return {'error': '未配置邮箱'}
     
     try:
-        imap = imaplib.IMAP4_SSL(config['imap_server'], config['imap_port'], timeout=30)
-        imap.login(config['email'], config['password'])
-        imap.select('INBOX')
+        # 复用已登录的会话，只取邮件头
+        client = get_client(config)
+        client.select('INBOX')
         
         # 搜索未读邮件
-        status, messages = imap.search(None, 'UNSEEN')
-        if status != 'OK':
-            return {'error': '搜索失败'}
+        uids = client.uid_search('UNSEEN')
         
-        email_ids = messages[0].split()
+        # 获取最新的 N 封（一条 UID FETCH）
         emails = []
+        for m in client.fetch_headers(uids[-limit:] if limit > 0 else []):
+            emails.append({
+                'id': str(m['uid']),
+                'uid': m['uid'],
+                'message_id': m['message_id'],
+                'subject': m['subject'][:100],
+                'from': m['from'],
+                'date': m['date'],
+                'size': m['size'],
+                'body': ''  # 正文可选，默认空
+            })
         
-        # 获取最新的 N 封
-        for eid in email_ids[-limit:]:
-            status, msg_data = imap.fetch(eid, '(RFC822)')
-            if status == 'OK':
-                msg = email.message_from_bytes(msg_data[0][1])
-                
-                # 解析主题
-                subject, encoding = decode_header(msg['Subject'])[0]
-                if isinstance(subject, bytes):
-                    subject = subject.decode(encoding or 'utf-8')
-                
-                # 解析发件人
-                from_addr = msg['From']
-                
-                # 解析日期
-                date = msg['Date']
-                
-                # 简化：只获取元数据，跳过正文解析（提升速度）
-                emails.append({
-                    'id': eid.decode(),
-                    'subject': subject[:100],
-                    'from': from_addr,
-                    'date': date,
-                    'body': ''  # 正文可选，默认空
-                })
-        
-        imap.logout()
         return {'success': True, 'count': len(emails), 'emails': emails}
     
     except Exception as e:
         return {'error': str(e)}
 
+def fetch_new(consumer, config=None, limit=20, folder='INBOX'):
+    """获取上次检查以来的新未读邮件（按 UIDVALIDITY/UID 增量同步，每个使用方独立记录进度）
+
+    处理完成后调用 result['sync'].commit() 保存进度；首次运行或 UIDVALIDITY 变化时
+    返回最新的 limit 封未读邮件（resync=True）。
+    """
+    if not config:
+        config = load_config()
+    if not config:
+        return {'error': '未配置邮箱'}
+    
+    try:
+        sync = MailboxSync(get_client(config), consumer, initial_limit=limit)
+        state = sync.sync(folder)
+        
+        emails = []
+        for m in state['new']:
+            if m['seen']:
+                continue
+            emails.append({
+                'id': str(m['uid']),
+                'uid': m['uid'],
+                'message_id': m['message_id'],
+                'subject': m['subject'][:100],
+                'from': m['from'],
+                'date': m['date'],
+                'size': m['size'],
+                'body': ''
+            })
+        
+        total = len(emails)
+        emails = emails[-limit:] if limit > 0 else []
+        return {'success': True, 'count': len(emails), 'total_new': total, 'emails': emails,
+                'resync': state['resync'], 'changed': state['changed'], 'sync': sync}
+    
+    except Exception as e:
+        return {'error': str(e)}
+
 def send_email(to, subject, body, html=False, config=None):
     """发送邮件"""
     if not config:
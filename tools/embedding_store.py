@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+段落嵌入持久化缓存 - 按内容哈希增量更新
+
+存储结构 (memory/vector_db):
+- embeddings-<摘要>.npy  所有段落向量 (float32, N×D)，以 mmap 方式加载；文件名中的摘要
+                         由每行的内容哈希计算，清单只会加载与自己的哈希列表对应的向量文件
+- manifest.json          模型名、维度、每行对应的内容哈希、每个文件包含的段落哈希
+
+启动时只对内容哈希发生变化的段落调用模型，文件删除后其向量随之淘汰。
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+MANIFEST_VERSION = 2
+
+
+def paragraph_hash(text):
+    """段落内容哈希（缓存键）"""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:20]
+
+
+def rows_digest(hashes):
+    """向量矩阵各行内容哈希的摘要（向量文件名的一部分）"""
+    return hashlib.sha1('\n'.join(hashes).encode('utf-8')).hexdigest()[:16]
+
+
+class EmbeddingStore:
+    """按内容哈希缓存段落向量"""
+
+    def __init__(self, directory, model_name, dim):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.model_name = model_name
+        self.dim = dim
+
+        self._manifest_file = self.directory / "manifest.json"
+        self._vectors_file = None     # 当前清单对应的向量文件
+
+        self.files = {}        # filename -> [hash, ...]
+        self._rows = {}        # hash -> 已持久化矩阵中的行号
+        self._vectors = np.empty((0, dim), dtype=np.float32)
+        self._pending = {}     # hash -> 新生成、尚未落盘的向量
+        self._dirty = False
+        self.encoded = 0       # 本次进程内实际调用模型编码的段落数
+
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self._manifest_file, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if (manifest.get('version') != MANIFEST_VERSION
+                    or manifest.get('model') != self.model_name
+                    or manifest.get('dim') != self.dim):
+                return  # 模型变化，缓存作废
+            hashes = manifest['hashes']
+            vectors_file = self._vectors_path(hashes)
+            vectors = np.load(vectors_file, mmap_mode='r')
+            if vectors.shape != (len(hashes), self.dim):
+                return
+        except (FileNotFoundError, ValueError, KeyError):
+            return
+
+        self._vectors_file = vectors_file
+        self._vectors = vectors
+        self._rows = {h: i for i, h in enumerate(hashes)}
+        self.files = manifest.get('files', {})
+
+    def _vectors_path(self, hashes):
+        return self.directory / f"embeddings-{rows_digest(hashes)}.npy"
+
+    def __contains__(self, h):
+        return h in self._pending or h in self._rows
+
+    def __len__(self):
+        return len(set(self._rows) | set(self._pending))
+
+    def _get(self, h):
+        if h in self._pending:
+            return self._pending[h]
+        return self._vectors[self._rows[h]]
+
+    def _encode_missing(self, paragraphs, encode):
+        """只对缓存中没有的段落调用模型"""
+        missing = {}
+        for text in paragraphs:
+            h = paragraph_hash(text)
+            if h not in self and h not in missing:
+                missing[h] = text
+        if missing:
+            vectors = np.asarray(encode(list(missing.values())), dtype=np.float32)
+            self._pending.update(zip(missing.keys(), vectors.reshape(-1, self.dim)))
+            self.encoded += len(missing)
+            self._dirty = True
+
+    def sync(self, documents, encode):
+        """用当前全部文件同步缓存
+
+        documents: {filename: [paragraph, ...]}，未出现的文件视为已删除并淘汰
+        encode: 段落列表 -> 向量矩阵
+        返回与各文件段落依次拼接后顺序一致的向量矩阵
+        """
+        all_paragraphs = [p for paras in documents.values() for p in paras]
+        self._encode_missing(all_paragraphs, encode)
+
+        files = {name: [paragraph_hash(p) for p in paras] for name, paras in documents.items()}
+        if files != self.files:
+            self.files = files
+            self._dirty = True
+
+        if not all_paragraphs:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.stack([self._get(h) for hashes in files.values() for h in hashes])
+
+    def update_file(self, filename, paragraphs, encode):
+        """新增或更新单个文件，返回该文件段落的向量"""
+        self._encode_missing(paragraphs, encode)
+        hashes = [paragraph_hash(p) for p in paragraphs]
+        if self.files.get(filename) != hashes:
+            self.files[filename] = hashes
+            self._dirty = True
+        if not hashes:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.stack([self._get(h) for h in hashes])
+
+    def remove_file(self, filename):
+        """淘汰文件的向量"""
+        if self.files.pop(filename, None) is not None:
+            self._dirty = True
+
+    def save(self):
+        """压缩掉不再被引用的向量并原子写入磁盘"""
+        if not self._dirty:
+            return False
+
+        live = list(dict.fromkeys(h for hashes in self.files.values() for h in hashes))
+        matrix = np.empty((len(live), self.dim), dtype=np.float32)
+        for i, h in enumerate(live):
+            matrix[i] = self._get(h)
+
+        vectors_file = self._vectors_path(live)
+        tmp_vectors = self.directory / "embeddings.tmp.npy"
+        np.save(tmp_vectors, matrix)
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'model': self.model_name,
+            'dim': self.dim,
+            'hashes': live,
+            'files': self.files,
+        }
+        tmp_manifest = self._manifest_file.with_suffix('.tmp')
+        with open(tmp_manifest, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+
+        # 向量文件名由哈希列表决定，清单替换是唯一的提交点：中途崩溃时旧清单仍指向旧向量文件
+        os.replace(tmp_vectors, vectors_file)
+        os.replace(tmp_manifest, self._manifest_file)
+        for old in self.directory.glob("embeddings*.npy"):
+            if old != vectors_file and old != tmp_vectors:
+                old.unlink(missing_ok=True)
+
+        self._vectors_file = vectors_file
+        self._vectors = np.load(vectors_file, mmap_mode='r')
+        self._rows = {h: i for i, h in enumerate(live)}
+        self._pending = {}
+        self._dirty = False
+        return True
+
+    def get_stats(self):
+        return {
+            'files': len(self.files),
+            'vectors': len(self),
+            'encoded_this_run': self.encoded,
+            'bytes': self._vectors_file.stat().st_size if self._vectors_file and self._vectors_file.exists() else 0,
+        }
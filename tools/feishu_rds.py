@@ -6,6 +6,9 @@
 
 import json
 import sys
+import time
+import atexit
+import threading
 from pathlib import Path
 from datetime import datetime
 import logging
@@ -16,6 +19,13 @@ from rds_pool import RobustRDSManager, get_pool
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger('feishu_rds')
 
+# 已完成建表的连接池（每个进程只执行一次 DDL）
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+MESSAGE_COLUMNS = ('message_id', 'sender_id', 'sender_name', 'chat_type', 'chat_id',
+                   'content', 'content_type', 'is_processed', 'processed_action', 'created_at')
+
 
 class FeishuMessageRDS:
     """飞书消息 RDS 存储 - 健壮版"""
@@ -26,7 +36,18 @@ class FeishuMessageRDS:
         self._ensure_table_exists()
     
     def _ensure_table_exists(self):
-        """确保表存在"""
+        """确保表存在（同一进程内只执行一次）"""
+        if id(self.manager.pool) in _schema_ready:
+            return
+        
+        with _schema_lock:
+            if id(self.manager.pool) in _schema_ready:
+                return
+            self._create_table()
+            _schema_ready.add(id(self.manager.pool))
+    
+    def _create_table(self):
+        """执行建表 DDL"""
         try:
             sql = """
             CREATE TABLE IF NOT EXISTS feishu_messages (
@@ -95,6 +116,61 @@ class FeishuMessageRDS:
         
         return False
     
+    def save_messages(self, messages) -> int:
+        """批量保存消息 - 单条多行 INSERT，返回新写入条数
+
+        messages: dict 列表，字段同 save_message 参数；失败时抛出异常由调用方处理
+        """
+        if not messages:
+            return 0
+        
+        from psycopg2.extras import execute_values
+        
+        now = datetime.now()
+        rows = [(
+            m.get('message_id'),
+            m.get('sender_id'),
+            m.get('sender_name'),
+            m.get('chat_type'),
+            m.get('chat_id'),
+            m.get('content'),
+            m.get('content_type', 'text'),
+            m.get('processed', False),
+            m.get('processed_action'),
+            m.get('created_at') or now,
+        ) for m in messages]
+        
+        sql = f"""
+        INSERT INTO feishu_messages ({', '.join(MESSAGE_COLUMNS)})
+        VALUES %s
+        ON CONFLICT (message_id) DO NOTHING
+        """
+        
+        with self.manager.pool.get_connection() as conn:
+            with conn.cursor() as cursor:
+                execute_values(cursor, sql, rows, page_size=len(rows))
+                inserted = cursor.rowcount
+                conn.commit()
+        return inserted
+    
+    def save_messages_isolating(self, messages):
+        """批量保存，遇到单行数据错误（超长、非法字符等）时二分拆批定位坏行
+        
+        返回 (新写入条数, [(坏消息, 错误)])；连接类错误照常抛出，整批留给调用方重试
+        """
+        import psycopg2
+        
+        try:
+            return self.save_messages(messages), []
+        except (psycopg2.DataError, psycopg2.IntegrityError, ValueError) as e:
+            if len(messages) == 1:
+                return 0, [(messages[0], str(e).splitlines()[0])]
+        
+        mid = len(messages) // 2
+        left, left_rejected = self.save_messages_isolating(messages[:mid])
+        right, right_rejected = self.save_messages_isolating(messages[mid:])
+        return left + right, left_rejected + right_rejected
+    
     def mark_processed(self, message_id, action='processed') -> bool:
         """标记消息已处理 - 带重试"""
         max_retries = 3
@@ -238,6 +314,160 @@ class FeishuMessageRDS:
             return False
 
 
+class FeishuIngestBuffer:
+    """飞书消息写入缓冲 - 攒批后一次性写入 RDS
+
+    消息先进入内存缓冲，达到 max_batch 条或等待超过 max_delay 秒时由后台线程
+    用一条多行 INSERT ... ON CONFLICT DO NOTHING 写入。进程退出时自动刷新。
+    写入最终失败的批次交给 on_failure 回调（如写入本地队列）。
+    """
+    
+    def __init__(self, max_batch=200, max_delay=2.0, max_retries=3,
+                 on_failure=None, on_success=None):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_retries = max_retries
+        self.on_failure = on_failure
+        self.on_success = on_success
+        
+        self._rds = None
+        self._buffer = []
+        self._oldest = None
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._stats = {
+            'received': 0,
+            'flushed': 0,
+            'inserted': 0,
+            'failed': 0,
+            'flushes': 0,
+            'batch_max': 0,
+            'flush_ms_total': 0.0,
+            'flush_ms_max': 0.0,
+        }
+        
+        self._thread = threading.Thread(target=self._run, name='feishu-ingest', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+    
+    def _get_rds(self):
+        if self._rds is None:
+            self._rds = FeishuMessageRDS()
+        return self._rds
+    
+    def add(self, message: dict) -> bool:
+        """加入缓冲，立即返回"""
+        with self._cond:
+            if self._closed:
+                return False
+            if not self._buffer:
+                self._oldest = time.monotonic()
+            self._buffer.append(message)
+            self._stats['received'] += 1
+            if len(self._buffer) >= self.max_batch:
+                self._cond.notify()
+        return True
+    
+    def _run(self):
+        """后台刷新线程：按条数或时间阈值触发"""
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if len(self._buffer) >= self.max_batch:
+                        break
+                    if self._buffer:
+                        remaining = self.max_delay - (time.monotonic() - self._oldest)
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    else:
+                        self._cond.wait()
+                if self._closed:
+                    return
+            self.flush()
+    
+    def flush(self) -> int:
+        """立即写入缓冲中的全部消息，返回新写入条数"""
+        with self._flush_lock:
+            with self._cond:
+                batch, self._buffer = self._buffer, []
+                self._oldest = None
+            if not batch:
+                return 0
+            
+            start = time.monotonic()
+            last_error = None
+            inserted = None
+            for attempt in range(self.max_retries):
+                try:
+                    inserted = self._get_rds().save_messages(batch)
+                    break
+                except Exception as e:
+                    last_error = e
+                    logger.warning(f"批量写入尝试 {attempt+1}/{self.max_retries} 失败: {e}")
+                    if attempt < self.max_retries - 1:
+                        time.sleep(0.5 * (attempt + 1))
+            elapsed_ms = (time.monotonic() - start) * 1000
+            
+            self._record(len(batch), inserted, elapsed_ms)
+            if inserted is None:
+                logger.error(f"❌ 批量写入最终失败 ({len(batch)} 条): {last_error}")
+                if self.on_failure:
+                    self.on_failure(batch)
+                return 0
+            
+            logger.info(f"✅ 批量写入 {len(batch)} 条 (新增 {inserted}) 耗时 {elapsed_ms:.1f}ms")
+            if self.on_success:
+                self.on_success(batch)
+            return inserted
+    
+    def _record(self, size, inserted, elapsed_ms):
+        s = self._stats
+        s['flushes'] += 1
+        s['batch_max'] = max(s['batch_max'], size)
+        s['flush_ms_total'] += elapsed_ms
+        s['flush_ms_max'] = max(s['flush_ms_max'], elapsed_ms)
+        if inserted is None:
+            s['failed'] += size
+        else:
+            s['flushed'] += size
+            s['inserted'] += inserted
+    
+    def get_stats(self) -> dict:
+        """刷新延迟与批大小统计"""
+        s = dict(self._stats)
+        flushes = s['flushes']
+        s['pending'] = len(self._buffer)
+        s['batch_avg'] = round((s['flushed'] + s['failed']) / flushes, 1) if flushes else 0
+        s['flush_ms_avg'] = round(s['flush_ms_total'] / flushes, 2) if flushes else 0
+        s['flush_ms_total'] = round(s['flush_ms_total'], 2)
+        s['flush_ms_max'] = round(s['flush_ms_max'], 2)
+        return s
+    
+    def close(self):
+        """停止后台线程并写入剩余消息"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=5)
+        self.flush()
+
+
+_ingest_buffer = None
+_ingest_lock = threading.Lock()
+
+def get_ingest_buffer(**kwargs):
+    """获取进程内共享的写入缓冲（首次调用时的参数生效）"""
+    global _ingest_buffer
+    with _ingest_lock:
+        if _ingest_buffer is None:
+            _ingest_buffer = FeishuIngestBuffer(**kwargs)
+    return _ingest_buffer
+
+
 def main():
     """命令行工具"""
     import sys
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+飞书消息本地落盘队列 - 分段追加写 (JSON Lines)
+
+替代整文件重写的 feishu_messages_queue.json:
+- 追加写入: 每条消息一行 JSON，O(1) 追加，不再读取/重写整个文件
+- 分段存储: 单个段超过 segment_bytes 后滚动到新段
+- 崩溃安全: 启动时和每次追加前，给写入中崩溃留下的半行补上换行，读取时作为损坏行移入死信，
+  不会与下一条消息拼成一行；checkpoint 原子替换
+- 提交位点: 消费方批量写入 RDS 成功后推进 (段号, 字节偏移)，已消费完的段直接删除
+- 死信: 无法写入的消息（数据错误）移到 dead-letter.jsonl，位点照常推进，不阻塞后续消息
+"""
+
+import fcntl
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".jsonl"
+DEAD_LETTER_FILE = "dead-letter.jsonl"
+
+
+class MessageSpool:
+    """分段追加写的本地消息队列"""
+
+    def __init__(self, directory, segment_bytes=8 * 1024 * 1024, fsync='always',
+                 fsync_interval=1.0):
+        """
+        fsync: 'always' 每次追加后 fsync；'interval' 距上次 fsync 超过
+               fsync_interval 秒才 fsync；'never' 交给操作系统
+        """
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self._last_fsync = 0.0
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._checkpoint_file = self.directory / "checkpoint.json"
+        self._lock_file = self.directory / ".lock"
+        self._drain_lock_file = self.directory / ".drain.lock"
+        self._dead_letter_file = self.directory / DEAD_LETTER_FILE
+
+        with self._locked(self._lock_file):
+            self._repair_tail()
+
+    # ---------- 内部工具 ----------
+
+    @contextmanager
+    def _locked(self, path, blocking=True):
+        """文件锁（跨进程互斥）；非阻塞模式下拿不到锁时返回 False"""
+        with open(path, 'a') as f:
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            try:
+                fcntl.flock(f, flags)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _segment_path(self, index):
+        return self.directory / f"{SEGMENT_PREFIX}{index:08d}{SEGMENT_SUFFIX}"
+
+    def _segments(self):
+        """按序号排列的段列表 [(index, path)]"""
+        result = []
+        for p in self.directory.glob(f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}"):
+            try:
+                result.append((int(p.name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]), p))
+            except ValueError:
+                continue
+        return sorted(result)
+
+    def _repair_tail(self):
+        """最后一段以半行结尾（写入过程中崩溃留下的）时补上换行，调用方需持有写锁
+
+        只检查最后一个字节；补齐后的半行由 read_batches 作为损坏行移入死信。
+        """
+        segments = self._segments()
+        if not segments:
+            return
+        path = segments[-1][1]
+        with open(path, 'rb+') as f:
+            end = f.seek(0, os.SEEK_END)
+            if end == 0:
+                return
+            f.seek(end - 1)
+            if f.read(1) == b"\n":
+                return
+            f.write(b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _maybe_fsync(self, f):
+        if self.fsync == 'always':
+            os.fsync(f.fileno())
+        elif self.fsync == 'interval':
+            now = time.monotonic()
+            if now - self._last_fsync >= self.fsync_interval:
+                os.fsync(f.fileno())
+                self._last_fsync = now
+
+    def read_checkpoint(self):
+        """已提交位点 (段号, 字节偏移)"""
+        try:
+            with open(self._checkpoint_file, 'r') as f:
+                cp = json.load(f)
+            return cp['segment'], cp['offset']
+        except (FileNotFoundError, ValueError, KeyError):
+            segments = self._segments()
+            return (segments[0][0] if segments else 1), 0
+
+    def _write_checkpoint(self, segment, offset):
+        """原子写入 checkpoint：临时文件 + fsync + rename"""
+        tmp = self._checkpoint_file.with_suffix('.tmp')
+        with open(tmp, 'w') as f:
+            json.dump({'segment': segment, 'offset': offset,
+                       'committed_at': time.time()}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._checkpoint_file)
+        dir_fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    # ---------- 写入 ----------
+
+    def append(self, records):
+        """追加一批记录，返回写入条数"""
+        if not records:
+            return 0
+        payload = b"".join(
+            json.dumps(r, ensure_ascii=False, default=str).encode('utf-8') + b"\n"
+            for r in records
+        )
+
+        with self._locked(self._lock_file):
+            # 其他进程可能在写入中途被杀，留下没有换行的半行
+            self._repair_tail()
+            segments = self._segments()
+            index = segments[-1][0] if segments else self.read_checkpoint()[0]
+            path = self._segment_path(index)
+            if path.exists() and path.stat().st_size >= self.segment_bytes:
+                index += 1
+                path = self._segment_path(index)
+
+            with open(path, 'ab') as f:
+                f.write(payload)
+                f.flush()
+                self._maybe_fsync(f)
+        return len(records)
+
+    def dead_letter(self, records):
+        """追加到死信文件（不参与消费，留待人工处理），返回写入条数"""
+        if not records:
+            return 0
+        payload = b"".join(
+            json.dumps(r, ensure_ascii=False, default=str).encode('utf-8') + b"\n"
+            for r in records
+        )
+        with self._locked(self._lock_file):
+            with open(self._dead_letter_file, 'ab') as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+        return len(records)
+
+    # ---------- 消费 ----------
+
+    def read_batches(self, batch_size=1000, dead_letter_corrupt=True):
+        """从已提交位点开始按批读取，产出 (records, position)
+
+        position 为该批之后的位点，消费成功后传给 commit()。
+        只读取完整的行，正在写入的半行留给下次；无法解析的行移入死信
+        （dead_letter_corrupt=False 时只跳过，供只读查看使用）。
+        """
+        cp_segment, cp_offset = self.read_checkpoint()
+
+        for index, path in self._segments():
+            if index < cp_segment:
+                continue
+            offset = cp_offset if index == cp_segment else 0
+
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                batch = []
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    start = offset
+                    offset += len(line)
+                    try:
+                        batch.append(json.loads(line))
+                    except ValueError as e:
+                        if dead_letter_corrupt:
+                            self.dead_letter([{
+                                'raw': line.decode('utf-8', errors='replace').rstrip('\n'),
+                                'error': f"损坏的行: {e}",
+                                'failed_at': datetime.now().isoformat(),
+                                'segment': index,
+                                'offset': start,
+                            }])
+                        continue
+                    if len(batch) >= batch_size:
+                        yield batch, (index, offset)
+                        batch = []
+                if batch:
+                    yield batch, (index, offset)
+
+    def commit(self, position):
+        """推进已提交位点，并删除已完全消费的段"""
+        segment, offset = position
+        with self._locked(self._lock_file):
+            segments = self._segments()
+            last_index = segments[-1][0] if segments else segment
+            path = self._segment_path(segment)
+
+            # 当前段已读完且后面还有新段，位点直接移到下一段开头
+            if (segment < last_index and path.exists()
+                    and offset >= path.stat().st_size):
+                segment, offset = segment + 1, 0
+
+            self._write_checkpoint(segment, offset)
+
+            for index, p in segments:
+                if index < segment:
+                    p.unlink()
+
+    @contextmanager
+    def draining(self):
+        """同一时间只允许一个消费者；拿不到锁时返回 False"""
+        with self._locked(self._drain_lock_file, blocking=False) as acquired:
+            yield acquired
+
+    # ---------- 状态 ----------
+
+    def pending_bytes(self):
+        """未提交的字节数（空队列判断用，无需逐行解析）"""
+        cp_segment, cp_offset = self.read_checkpoint()
+        total = 0
+        for index, path in self._segments():
+            if index < cp_segment:
+                continue
+            size = path.stat().st_size
+            total += size - cp_offset if index == cp_segment else size
+        return max(total, 0)
+
+    def pending_count(self):
+        """未提交的消息条数"""
+        cp_segment, cp_offset = self.read_checkpoint()
+        count = 0
+        for index, path in self._segments():
+            if index < cp_segment:
+                continue
+            with open(path, 'rb') as f:
+                if index == cp_segment:
+                    f.seek(cp_offset)
+                count += sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b""))
+        return count
+
+    def dead_letter_count(self):
+        """死信条数"""
+        try:
+            with open(self._dead_letter_file, 'rb') as f:
+                return sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b""))
+        except FileNotFoundError:
+            return 0
+
+    def tail(self, n=3):
+        """最近 n 条未提交的消息"""
+        result = []
+        for records, _ in self.read_batches(dead_letter_corrupt=False):
+            result = (result + records)[-n:]
+        return result
@@ -16,6 +16,7 @@ from datetime import datetime
 
 # 添加工具路径
 sys.path.insert(0, str(Path(__file__).parent))
+from feishu_spool import MessageSpool
 
 
 class FeishuMessageSync:
@@ -23,102 +24,109 @@ class FeishuMessageSync:
     
     def __init__(self):
         self.enabled = True
-        self.fallback_file = Path("/root/.openclaw/workspace/data/feishu_messages_queue.json")
+        self.data_dir = Path("/root/.openclaw/workspace/data")
+        self.legacy_queue_file = self.data_dir / "feishu_messages_queue.json"
+        self.spool = None
         self._init_fallback()
+        self._buffer = None
+    
+    def _get_buffer(self):
+        """进程内共享的批量写入缓冲"""
+        if self._buffer is None:
+            from feishu_rds import get_ingest_buffer
+            self._buffer = get_ingest_buffer(
+                on_failure=self._save_batch_to_fallback,
+                on_success=self._on_flushed
+            )
+        return self._buffer
     
     def _init_fallback(self):
-        """初始化本地队列文件"""
-        self.fallback_file.parent.mkdir(parents=True, exist_ok=True)
-        if not self.fallback_file.exists():
-            with open(self.fallback_file, 'w') as f:
-                json.dump([], f)
+        """初始化本地落盘队列，并迁移旧版 JSON 队列"""
+        self.spool = MessageSpool(self.data_dir / "feishu_spool")
+        
+        if self.legacy_queue_file.exists():
+            try:
+                with open(self.legacy_queue_file, 'r') as f:
+                    legacy = json.load(f)
+                if legacy:
+                    self.spool.append(legacy)
+                    print(f"📦 已迁移旧队列 {len(legacy)} 条消息")
+                self.legacy_queue_file.unlink()
+            except Exception as e:
+                print(f"⚠️ 旧队列迁移失败: {e}")
     
     def _save_to_fallback(self, message_data):
         """保存到本地队列（RDS失败时备用）"""
+        return self._save_batch_to_fallback([message_data])
+    
+    def _save_batch_to_fallback(self, messages):
+        """追加写入本地队列（批量写入失败的消息整体转入）"""
         try:
-            with open(self.fallback_file, 'r+') as f:
-                queue = json.load(f)
-                queue.append({
-                    **message_data,
-                    'queued_at': datetime.now().isoformat()
-                })
-                f.seek(0)
-                json.dump(queue, f, indent=2, default=str)
-                f.truncate()
+            queued_at = datetime.now().isoformat()
+            self.spool.append([{**m, 'queued_at': queued_at} for m in messages])
+            if len(messages) > 1:
+                print(f"⚠️ RDS批量写入失败，{len(messages)} 条消息已写入本地队列")
             return True
         except Exception as e:
             print(f"❌ 本地队列保存失败: {e}")
             return False
     
-    def _sync_fallback_to_rds(self):
-        """将本地队列同步到RDS"""
-        try:
-            from feishu_rds import FeishuMessageRDS
-            
-            with open(self.fallback_file, 'r') as f:
-                queue = json.load(f)
-            
-            if not queue:
-                return 0
+    def _on_flushed(self, batch):
+        """批量写入成功后，顺带同步本地队列中的积压消息"""
+        if self.spool.pending_bytes() > 0:
+            self._sync_fallback_to_rds()
+    
+    def _sync_fallback_to_rds(self, batch_size=1000):
+        """将本地队列批量同步到RDS，每批成功后推进提交位点
+        
+        批内数据错误的消息拆批定位后移入死信文件，其余消息照常写入，位点不会卡住
+        """
+        with self.spool.draining() as acquired:
+            if not acquired:
+                return 0  # 其他进程正在同步
             
-            tool = FeishuMessageRDS()
             synced = 0
-            failed = []
-            
-            for msg in queue:
-                success = tool.save_message(
-                    message_id=msg.get('message_id'),
-                    sender_id=msg.get('sender_id'),
-                    sender_name=msg.get('sender_name'),
-                    chat_type=msg.get('chat_type'),
-                    chat_id=msg.get('chat_id'),
-                    content=msg.get('content'),
-                    content_type=msg.get('content_type', 'text')
-                )
-                if success:
-                    synced += 1
-                else:
-                    failed.append(msg)
-            
-            # 更新队列（只保留失败的）
-            with open(self.fallback_file, 'w') as f:
-                json.dump(failed, f, indent=2, default=str)
-            
-            return synced
-            
-        except Exception as e:
-            print(f"❌ 同步队列失败: {e}")
-            return 0
+            try:
+                from feishu_rds import FeishuMessageRDS
+                
+                tool = None
+                for batch, position in self.spool.read_batches(batch_size):
+                    if tool is None:
+                        tool = FeishuMessageRDS()
+                    _, rejected = tool.save_messages_isolating(batch)
+                    if rejected:
+                        failed_at = datetime.now().isoformat()
+                        self.spool.dead_letter([{**m, 'error': error, 'failed_at': failed_at}
+                                                for m, error in rejected])
+                        print(f"⚠️ {len(rejected)} 条消息无法写入RDS，已移入死信: {rejected[0][1]}")
+                    self.spool.commit(position)
+                    synced += len(batch) - len(rejected)
+                
+                return synced
+                
+            except Exception as e:
+                print(f"❌ 同步队列失败: {e}")
+                return synced
     
     def save_message(self, message_data: dict) -> bool:
-        """保存消息 - 优先RDS，失败则本地队列"""
+        """保存消息 - 进入批量写入缓冲，RDS写入失败的批次转入本地队列"""
         try:
-            from feishu_rds import FeishuMessageRDS
-            
-            tool = FeishuMessageRDS()
-            success = tool.save_message(
-                message_id=message_data.get('message_id'),
-                sender_id=message_data.get('sender_id'),
-                sender_name=message_data.get('sender_name'),
-                chat_type=message_data.get('chat_type'),
-                chat_id=message_data.get('chat_id'),
-                content=message_data.get('content'),
-                content_type=message_data.get('content_type', 'text')
-            )
-            
-            if success:
-                # 检查是否有待同步的本地队列
-                self._sync_fallback_to_rds()
+            message = {**message_data, 'created_at': datetime.now()}
+            if self._get_buffer().add(message):
                 return True
-            else:
-                # RDS失败，保存到本地队列
-                print("⚠️ RDS保存失败，写入本地队列")
-                return self._save_to_fallback(message_data)
+            # 缓冲已关闭（进程退出中），直接写本地队列
+            return self._save_to_fallback(message_data)
                 
         except Exception as e:
             print(f"❌ 保存异常: {e}")
             return self._save_to_fallback(message_data)
     
+    def flush(self) -> dict:
+        """立即写入缓冲中的消息，返回写入统计"""
+        buffer = self._get_buffer()
+        buffer.flush()
+        return buffer.get_stats()
+    
     def process_inbound_message(self, inbound_data: dict) -> bool:
         """处理 OpenClaw 入站消息格式
         
@@ -160,13 +168,12 @@ class FeishuMessageSync:
     def sync_queue(self) -> dict:
         """手动触发队列同步"""
         synced = self._sync_fallback_to_rds()
-        
-        with open(self.fallback_file, 'r') as f:
-            remaining = len(json.load(f))
+        remaining = self.spool.pending_count()
         
         return {
             'synced': synced,
             'remaining': remaining,
+            'dead_letter': self.spool.dead_letter_count(),
             'timestamp': datetime.now().isoformat()
         }
 
@@ -193,6 +200,8 @@ def main():
         result = sync.sync_queue()
         print(f"✅ 已同步 {result['synced']} 条消息")
         print(f"📋 队列剩余: {result['remaining']} 条")
+        if result['dead_letter']:
+            print(f"☠️ 死信: {result['dead_letter']} 条 ({sync.spool.directory / 'dead-letter.jsonl'})")
     
     elif cmd == 'test':
         test_msg = {
@@ -205,15 +214,21 @@ def main():
             'content_type': 'text'
         }
         success = sync.save_message(test_msg)
+        stats = sync.flush()
+        success = success and stats['failed'] == 0
         print(f"{'✅' if success else '❌'} 测试保存: {'成功' if success else '失败'}")
+        print(f"   批次 {stats['flushes']}  平均批大小 {stats['batch_avg']}  "
+              f"平均耗时 {stats['flush_ms_avg']}ms")
     
     elif cmd == 'status':
-        with open(sync.fallback_file, 'r') as f:
-            queue = json.load(f)
-        print(f"📋 本地队列: {len(queue)} 条消息待同步")
-        if queue:
+        pending = sync.spool.pending_count()
+        print(f"📋 本地队列: {pending} 条消息待同步")
+        dead = sync.spool.dead_letter_count()
+        if dead:
+            print(f"☠️ 死信: {dead} 条 ({sync.spool.directory / 'dead-letter.jsonl'})")
+        if pending:
             print("\n最近3条:")
-            for msg in queue[-3:]:
+            for msg in sync.spool.tail(3):
                 print(f"  - {msg.get('sender_name')}: {msg.get('content', '')[:30]}...")
     
     elif cmd == 'process':
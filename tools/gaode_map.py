@@ -2,25 +2,167 @@
 """
 高德地图 API Python 工具
 用于餐厅位置解析和地理分析
+
+地理编码:
+- 结果缓存在 SQLite（CACHE_FILE），键为规范化后的 城市|地址（NFKC、去空白、英文小写）；
+  有明确答复的结果（包括“无结果”）才缓存，网络错误和限流不缓存
+- 所有请求经过令牌桶限速（默认 QPS 次/秒，与高德 Web 服务的并发配额一致），
+  遇到 QPS 超限的 infocode 时退避重试；日配额用完时批量任务停止并保存断点
+- geocode_many / batch_geocode_restaurants 用有界线程池并发请求，相同的地址只请求一次
+- 批量任务每完成 CHECKPOINT_EVERY 行写一次断点文件（<输出文件>.checkpoint.json），
+  中断后重新执行同一命令只处理未成功的行，完成后删除断点文件
+- 基础地址可用环境变量 GAODE_BASE_URL 指向本地桩服务离线测试（见 bench_gaode_geocode.py）
 """
 
 import requests
 import json
 import csv
+import os
+import re
+import sqlite3
+import threading
 import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
 from urllib.parse import quote
 
 KEY = "cc5130adf53b9696f8eef9444eeb6845"
 BASE_URL = "https://restapi.amap.com/v3"
+CACHE_FILE = Path("/root/.openclaw/workspace/data/gaode_cache.sqlite")
+QPS = 3                     # 每秒请求数（个人开发者 Web 服务默认配额）
+RATE_HEADROOM = 0.9         # 网络抖动会让请求到达服务端的间隔小于发出间隔，限速留 10% 余量
+WORKERS = 4                 # 批量地理编码的并发线程数
+RETRIES = 3                 # 限流 / 网络错误的重试次数
+CHECKPOINT_EVERY = 50       # 批量任务每完成多少行保存一次断点
+
+# 限流类 infocode（稍后重试即可）与配额用完的 infocode（当天无法继续）
+RETRY_INFOCODES = {'10004', '10014', '10015', '10019', '10020', '10021'}
+QUOTA_INFOCODES = {'10003', '10044', '10045'}
+
+COORD_PATTERN = re.compile(r'^\s*-?\d{1,3}(\.\d+)?\s*,\s*-?\d{1,2}(\.\d+)?\s*$')    # "lng,lat"
+
+
+def normalize_address(address, city=None):
+    """缓存键: 城市|地址（全角转半角、去掉空白、英文小写）"""
+    def norm(text):
+        return ''.join(unicodedata.normalize('NFKC', text or '').split()).lower()
+    return f"{norm(city)}|{norm(address)}"
+
+
+class TokenBucket:
+    """线程安全的令牌桶（capacity 默认为 1，即请求严格按 1/rate 秒间隔发出）"""
+    
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class GeocodeCache:
+    """地理编码结果缓存（SQLite，多线程共用一个连接）"""
+    
+    def __init__(self, path=CACHE_FILE):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS geocode (
+                key TEXT PRIMARY KEY,
+                address TEXT,
+                city TEXT,
+                result TEXT NOT NULL,
+                created_at TEXT
+            )
+        """)
+        self.conn.commit()
+    
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT result FROM geocode WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def set(self, key, address, city, result):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO geocode (key, address, city, result, created_at) VALUES (?, ?, ?, ?, ?)",
+                (key, address, city, json.dumps(result, ensure_ascii=False),
+                 datetime.now().isoformat(timespec='seconds')))
+            self.conn.commit()
+    
+    def stats(self):
+        with self.lock:
+            total, found = self.conn.execute(
+                "SELECT count(*), count(*) FILTER (WHERE json_extract(result, '$.success')) FROM geocode").fetchone()
+        return {'entries': total, 'found': found, 'path': str(self.path)}
+    
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
 
 class GaodeMap:
-    def __init__(self, api_key=KEY):
+    def __init__(self, api_key=KEY, base_url=None, qps=QPS, cache_file=CACHE_FILE, timeout=10):
         self.key = api_key
-        self.session = requests.Session()
+        self.base_url = base_url or os.environ.get('GAODE_BASE_URL') or BASE_URL
+        self.timeout = timeout
+        self.bucket = TokenBucket(qps * RATE_HEADROOM)
+        self.cache = GeocodeCache(cache_file) if cache_file else None
+        self.requests_sent = 0
+        self._local = threading.local()
+        self._counter_lock = threading.Lock()
+    
+    @property
+    def session(self):
+        """每个线程一个 Session（复用连接）"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+    
+    def _get(self, path, params):
+        """限速的 GET；限流 infocode 和网络错误时退避重试，返回解析后的 JSON"""
+        for attempt in range(RETRIES + 1):
+            self.bucket.acquire()
+            with self._counter_lock:
+                self.requests_sent += 1
+            try:
+                resp = self.session.get(f"{self.base_url}{path}", params=params, timeout=self.timeout)
+                data = resp.json()
+            except (requests.RequestException, ValueError):
+                if attempt == RETRIES:
+                    raise
+            else:
+                if data.get("status") == "1" or data.get("infocode") not in RETRY_INFOCODES or attempt == RETRIES:
+                    return data
+            time.sleep(0.5 * 2 ** attempt)
     
     def geocode(self, address, city=None):
-        """地理编码: 地址 → 坐标"""
-        url = f"{BASE_URL}/geocode/geo"
+        """地理编码: 地址 → 坐标（命中缓存时结果带 cached=True）"""
+        key = normalize_address(address, city)
+        if self.cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return dict(cached, cached=True)
+        
         params = {
             "key": self.key,
             "address": address,
@@ -30,12 +172,11 @@ class GaodeMap:
             params["city"] = city
         
         try:
-            resp = self.session.get(url, params=params, timeout=10)
-            data = resp.json()
+            data = self._get("/geocode/geo", params)
             
             if data.get("status") == "1" and data.get("geocodes"):
                 result = data["geocodes"][0]
-                return {
+                result = {
                     "success": True,
                     "address": result.get("formatted_address"),
                     "location": result.get("location"),  # "lng,lat"
@@ -44,13 +185,58 @@ class GaodeMap:
                     "district": result.get("district"),
                     "adcode": result.get("adcode")
                 }
-            return {"success": False, "error": data.get("info", "未知错误")}
+            elif data.get("status") == "1":
+                result = {"success": False, "error": "无结果"}
+            else:
+                # 错误答复（限流、配额、key 无效）不缓存
+                return {"success": False, "error": data.get("info", "未知错误"), "infocode": data.get("infocode")}
         except Exception as e:
             return {"success": False, "error": str(e)}
+        
+        if self.cache:
+            self.cache.set(key, address, city, result)
+        return result
+    
+    def geocode_many(self, addresses, city=None, workers=WORKERS, on_result=None):
+        """并发地理编码 -> 与 addresses 同序的结果列表
+        
+        addresses 为地址或 (地址, 城市) 的列表；规范化后相同的地址只请求一次。
+        on_result(序号, 结果) 在每个结果完成时调用（同一线程内依次调用）；
+        返回 False 时停止提交新的请求（未处理的位置为 None）。
+        """
+        items = [a if isinstance(a, tuple) else (a, city) for a in addresses]
+        groups = {}
+        for i, (address, item_city) in enumerate(items):
+            groups.setdefault(normalize_address(address, item_city), []).append(i)
+        
+        results = [None] * len(items)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='gaode') as pool:
+            pending = {}
+            queue = iter(groups.values())
+            stopped = False
+            
+            def submit():
+                indices = next(queue, None)
+                if indices is not None:
+                    pending[pool.submit(self.geocode, *items[indices[0]])] = indices
+            
+            # 同时在途的请求不超过 workers 个，停止时不再提交
+            for _ in range(workers):
+                submit()
+            while pending:
+                future = next(as_completed(pending))
+                indices = pending.pop(future)
+                result = future.result()
+                for i in indices:
+                    results[i] = result
+                    if on_result and on_result(i, result) is False:
+                        stopped = True
+                if not stopped:
+                    submit()
+        return results
     
     def regeocode(self, lng, lat):
         """逆地理编码: 坐标 → 地址"""
-        url = f"{BASE_URL}/geocode/regeo"
         params = {
             "key": self.key,
             "location": f"{lng},{lat}",
@@ -59,8 +245,7 @@ class GaodeMap:
         }
         
         try:
-            resp = self.session.get(url, params=params, timeout=10)
-            data = resp.json()
+            data = self._get("/geocode/regeo", params)
             
             if data.get("status") == "1":
                 regeo = data.get("regeocode", {})
@@ -80,7 +265,6 @@ class GaodeMap:
     
     def search_poi(self, keywords, city="广州", page=1):
         """POI 搜索"""
-        url = f"{BASE_URL}/place/text"
         params = {
             "key": self.key,
             "keywords": keywords,
@@ -92,8 +276,7 @@ class GaodeMap:
         }
         
         try:
-            resp = self.session.get(url, params=params, timeout=10)
-            data = resp.json()
+            data = self._get("/place/text", params)
             
             if data.get("status") == "1":
                 pois = []
@@ -111,26 +294,30 @@ class GaodeMap:
         except Exception as e:
             return {"success": False, "error": str(e)}
     
+    def _location(self, place):
+        """"lng,lat" 原样使用，否则地理编码（走缓存）"""
+        if COORD_PATTERN.match(place):
+            return place.replace(' ', '')
+        geo = self.geocode(place)
+        return geo["location"] if geo["success"] else None
+    
     def driving_route(self, origin, destination):
-        """驾车路线规划"""
-        # 先解析起点和终点
-        orig_geo = self.geocode(origin)
-        dest_geo = self.geocode(destination)
+        """驾车路线规划（起点 / 终点可以是地址或 "lng,lat"）"""
+        orig_location = self._location(origin)
+        dest_location = self._location(destination)
         
-        if not orig_geo["success"] or not dest_geo["success"]:
+        if not orig_location or not dest_location:
             return {"success": False, "error": "无法解析起点或终点"}
         
-        url = f"{BASE_URL}/direction/driving"
         params = {
             "key": self.key,
-            "origin": orig_geo["location"],
-            "destination": dest_geo["location"],
+            "origin": orig_location,
+            "destination": dest_location,
             "extensions": "all"
         }
         
         try:
-            resp = self.session.get(url, params=params, timeout=10)
-            data = resp.json()
+            data = self._get("/direction/driving", params)
             
             if data.get("status") == "1" and data.get("route", {}).get("paths"):
                 path = data["route"]["paths"][0]
@@ -143,54 +330,127 @@ class GaodeMap:
                     "tolls": path.get("tolls"),
                     "traffic_lights": path.get("traffic_lights")
                 }
-            return {"success": False, "error": data.get("info")}
+            return {"success": False, "error": data.get("info"), "infocode": data.get("infocode")}
         except Exception as e:
             return {"success": False, "error": str(e)}
 
 
-def batch_geocode_restaurants(csv_file):
-    """批量解析餐厅地址获取坐标"""
-    gaode = GaodeMap()
+def _load_checkpoint(path, source, addresses):
+    """断点中与当前输入一致（同一文件、同一行的地址未变）的成功结果 -> {行号: 结果}"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    if checkpoint.get('source') != str(source):
+        return {}
+    done = {}
+    for i, entry in checkpoint.get('results', {}).items():
+        i = int(i)
+        if i < len(addresses) and entry.get('address_query') == addresses[i] and entry['result'].get('success'):
+            done[i] = entry['result']
+    return done
+
+
+def _save_checkpoint(path, source, addresses, results):
+    """原子写入断点"""
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({
+            'source': str(source),
+            'saved_at': datetime.now().isoformat(timespec='seconds'),
+            'results': {str(i): {'address_query': addresses[i], 'result': r} for i, r in results.items()},
+        }, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def batch_geocode_restaurants(csv_file, output_file=None, workers=WORKERS, gaode=None, resume=True):
+    """批量解析餐厅地址获取坐标（并发 + 缓存 + 断点续传）
+    
+    返回 {output_file, total, success, failed, cached, requests, resumed, stopped, seconds}；
+    stopped 为 True 表示配额用完提前停止（断点已保存，output_file 为 None）
+    """
+    gaode = gaode or GaodeMap()
+    output_file = output_file or csv_file.replace('.csv', '_with_coords.csv')
+    checkpoint_file = f"{output_file}.checkpoint.json"
+    start = time.perf_counter()
+    requests_before = gaode.requests_sent
     
-    results = []
     with open(csv_file, 'r', encoding='utf-8') as f:
         reader = csv.DictReader(f)
         restaurants = list(reader)
     
-    print(f"开始批量解析 {len(restaurants)} 家餐厅...")
+    # 构建搜索地址
+    addresses = [f"广州市{r.get('城区', '')}{r.get('店名', '')}" for r in restaurants]
+    results = _load_checkpoint(checkpoint_file, csv_file, addresses) if resume else {}
+    todo = [i for i in range(len(restaurants)) if i not in results]
     
-    for i, r in enumerate(restaurants, 1):
-        name = r.get('店名', '')
-        district = r.get('城区', '')
-        
-        # 构建搜索地址
-        address = f"广州市{district}{name}"
-        
-        result = gaode.geocode(address)
+    print(f"开始批量解析 {len(restaurants)} 家餐厅（断点已完成 {len(results)} 家，并发 {workers}）...")
+    
+    state = {'done': 0, 'cached': 0, 'stopped': False}
+    
+    def on_result(j, result):
+        i = todo[j]
+        results[i] = result
+        state['done'] += 1
+        name = restaurants[i].get('店名', '')
         if result["success"]:
-            r['经度'] = result['location'].split(',')[0]
-            r['纬度'] = result['location'].split(',')[1]
+            state['cached'] += bool(result.get('cached'))
+            mark = '（缓存）' if result.get('cached') else ''
+            print(f"✅ {len(results)}/{len(restaurants)} {name}: {result['location']}{mark}")
+        else:
+            print(f"❌ {len(results)}/{len(restaurants)} {name}: 解析失败 - {result.get('error')}")
+        if result.get('infocode') in QUOTA_INFOCODES:
+            state['stopped'] = True
+        if state['done'] % CHECKPOINT_EVERY == 0 or state['stopped']:
+            _save_checkpoint(checkpoint_file, csv_file, addresses, results)
+        return not state['stopped']
+    
+    try:
+        gaode.geocode_many([addresses[i] for i in todo], workers=workers, on_result=on_result)
+    finally:
+        # 中断（含 Ctrl+C）时保留已完成的结果
+        if state['stopped'] or len(results) < len(restaurants):
+            _save_checkpoint(checkpoint_file, csv_file, addresses, results)
+    
+    summary = {
+        'output_file': None,
+        'total': len(restaurants),
+        'success': sum(1 for r in results.values() if r['success']),
+        'failed': sum(1 for r in results.values() if not r['success']),
+        'cached': state['cached'],
+        'requests': gaode.requests_sent - requests_before,
+        'resumed': len(restaurants) - len(todo),
+        'stopped': state['stopped'],
+    }
+    if state['stopped']:
+        print(f"\n⚠️ 配额已用完，已保存断点: {checkpoint_file}（之后重新执行同一命令继续）")
+        summary['seconds'] = round(time.perf_counter() - start, 2)
+        return summary
+    
+    for r, result in zip(restaurants, (results[i] for i in range(len(restaurants)))):
+        if result["success"]:
+            r['经度'], r['纬度'] = result['location'].split(',')
             r['完整地址'] = result['address']
-            print(f"✅ {i}/{len(restaurants)} {name}: {result['location']}")
         else:
             r['经度'] = ''
             r['纬度'] = ''
             r['完整地址'] = ''
-            print(f"❌ {i}/{len(restaurants)} {name}: 解析失败 - {result.get('error')}")
-        
-        # 避免请求过快
-        time.sleep(0.2)
     
     # 保存结果
-    output_file = csv_file.replace('.csv', '_with_coords.csv')
     with open(output_file, 'w', newline='', encoding='utf-8') as f:
-        fieldnames = list(restaurants[0].keys())
+        fieldnames = list(restaurants[0].keys()) if restaurants else ['店名', '城区', '经度', '纬度', '完整地址']
         writer = csv.DictWriter(f, fieldnames=fieldnames)
         writer.writeheader()
         writer.writerows(restaurants)
+    if os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
     
-    print(f"\n完成！已保存到: {output_file}")
-    return output_file
+    summary['output_file'] = output_file
+    summary['seconds'] = round(time.perf_counter() - start, 2)
+    print(f"\n完成！已保存到: {output_file}（成功 {summary['success']}，失败 {summary['failed']}，"
+          f"缓存命中 {summary['cached']}，API 请求 {summary['requests']} 次，{summary['seconds']}s）")
+    return summary
 
 
 if __name__ == "__main__":
@@ -202,8 +462,9 @@ if __name__ == "__main__":
         print("  python3 gaode_map.py geo <地址> [城市]")
         print("  python3 gaode_map.py regeo <经度> <纬度>")
         print("  python3 gaode_map.py search <关键词> [城市]")
-        print("  python3 gaode_map.py route <起点> <终点>")
-        print("  python3 gaode_map.py batch <csv文件>")
+        print("  python3 gaode_map.py route <起点> <终点>          # 起点 / 终点可以是地址或 经度,纬度")
+        print("  python3 gaode_map.py batch <csv文件> [并发数]   # 并发 + 缓存，中断后重新执行即可续传")
+        print("  python3 gaode_map.py cache                       # 缓存统计")
         print("\n示例:")
         print("  python3 gaode_map.py geo '沙面侨美' 广州")
         print("  python3 gaode_map.py batch restaurants_full.csv")
@@ -235,7 +496,10 @@ if __name__ == "__main__":
         if len(sys.argv) < 3:
             print("用法: batch <csv文件>")
             sys.exit(1)
-        batch_geocode_restaurants(sys.argv[2])
+        batch_geocode_restaurants(sys.argv[2], workers=int(sys.argv[3]) if len(sys.argv) > 3 else WORKERS)
+    
+    elif cmd == "cache":
+        print(json.dumps(gaode.cache.stats(), ensure_ascii=False, indent=2))
     
     else:
         print(f"未知命令: {cmd}")
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+共享 IMAP 客户端 - 常驻登录会话 + 批量只取邮件头 + IDLE
+
+- 同一进程内按 (服务器, 端口, 账号) 复用一个已登录连接；空闲超过 NOOP_INTERVAL 秒先
+  NOOP 探活，连接中断时自动重连并重新选择文件夹，操作重试一次
+- fetch_headers: UID 列表压缩为区间集合 (1:5,9,12:20)，每 FETCH_BATCH 个 UID 一条
+  UID FETCH <集合> (UID FLAGS RFC822.SIZE BODY.PEEK[HEADER.FIELDS (...)])，
+  只传输所需的邮件头，BODY.PEEK 不会把邮件标记为已读
+- idle: RFC 2177 IDLE，阻塞等待服务器推送新邮件/删除通知
+"""
+
+import re
+import ssl
+import time
+import email
+import atexit
+import select
+import logging
+import imaplib
+import threading
+from email.header import decode_header
+
+logger = logging.getLogger('imap_client')
+
+HEADER_FIELDS = "SUBJECT FROM DATE MESSAGE-ID"
+FETCH_ITEMS = f"(UID FLAGS RFC822.SIZE BODY.PEEK[HEADER.FIELDS ({HEADER_FIELDS})])"
+FETCH_BATCH = 500           # 每条 UID FETCH 包含的 UID 数
+STORE_BATCH = 2000          # 每条 UID STORE / MOVE / EXPUNGE 包含的 UID 数
+NOOP_INTERVAL = 60          # 连接空闲超过该秒数时先 NOOP 探活
+IDLE_TIMEOUT = 29 * 60      # RFC 2177：服务器可能在 30 分钟后断开 IDLE，需定期重新发出
+
+NETWORK_ERRORS = (imaplib.IMAP4.abort, ssl.SSLError, OSError)
+
+
+def decode_mime_header(value):
+    """解码 RFC 2047 编码的邮件头（拼接全部片段）"""
+    if not value:
+        return ''
+    parts = []
+    for text, charset in decode_header(value):
+        if isinstance(text, bytes):
+            try:
+                text = text.decode(charset or 'utf-8', errors='ignore')
+            except LookupError:
+                text = text.decode('utf-8', errors='ignore')
+        parts.append(text)
+    return ''.join(parts).strip()
+
+
+def compress_uids(uids):
+    """UID 列表 -> IMAP 消息集合，连续的 UID 合并为区间"""
+    ranges = []
+    for uid in sorted({int(u) for u in uids}):
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1][1] = uid
+        else:
+            ranges.append([uid, uid])
+    return ','.join(str(a) if a == b else f'{a}:{b}' for a, b in ranges)
+
+
+def parse_fetch_response(data):
+    """解析 UID FETCH 的响应 -> [{uid, subject, from, date, message_id, flags, seen, size}]
+
+    imaplib 把每封邮件返回为 (前缀, 字面量) 元组，字面量之后的属性（部分服务器把
+    FLAGS 放在邮件头之后）作为紧随其后的 bytes 片段；没有字面量的邮件整体是一个 bytes。
+    """
+    raw = []
+    for item in data:
+        if isinstance(item, tuple):
+            raw.append([item[0], item[1] or b''])
+        elif isinstance(item, bytes):
+            if re.match(rb'\d+ \(', item):
+                raw.append([item, b''])
+            elif raw:
+                raw[-1][0] += item
+
+    messages = []
+    for meta, header in raw:
+        uid = re.search(rb'\bUID (\d+)', meta)
+        if not uid:
+            continue
+        size = re.search(rb'RFC822\.SIZE (\d+)', meta)
+        flags = re.search(rb'FLAGS \(([^)]*)\)', meta)
+        flag_list = flags.group(1).decode(errors='ignore').split() if flags else []
+        msg = email.message_from_bytes(header)
+        messages.append({
+            'uid': int(uid.group(1)),
+            'subject': decode_mime_header(msg['Subject']),
+            'from': decode_mime_header(msg['From']),
+            'date': msg['Date'] or '',
+            'message_id': (msg['Message-ID'] or '').strip(),
+            'flags': flag_list,
+            'seen': '\\Seen' in flag_list,
+            'size': int(size.group(1)) if size else 0,
+            'header_bytes': len(header),
+        })
+    return messages
+
+
+class IMAPClient:
+    """常驻登录的 IMAP 会话（线程安全，同一时刻只执行一条命令）"""
+
+    def __init__(self, config, timeout=30):
+        self.config = config
+        self.timeout = timeout
+
+        self._imap = None
+        self._folder = None          # (文件夹, 只读, CONDSTORE)，重连后自动重新选择
+        self._last_used = 0.0
+        self._lock = threading.RLock()
+        self.mailbox = {}            # 最近一次 SELECT 返回的 EXISTS/UIDVALIDITY/UIDNEXT/HIGHESTMODSEQ
+        self.stats = {
+            'connects': 0,
+            'commands': 0,
+            'fetched': 0,
+            'header_bytes': 0,
+            'message_bytes': 0,      # 被取邮件头的邮件完整大小之和（旧实现需要下载的量）
+        }
+
+    # ---------- 连接 ----------
+
+    def _connect(self):
+        imap = imaplib.IMAP4_SSL(self.config['imap_server'], self.config.get('imap_port', 993),
+                                 timeout=self.timeout)
+        imap.login(self.config['email'], self.config['password'])
+        self._imap = imap
+        self.stats['connects'] += 1
+        if self._folder:
+            self._select(*self._folder)
+
+    def _reset(self):
+        imap, self._imap = self._imap, None
+        if imap is not None:
+            try:
+                imap.shutdown()
+            except Exception:
+                pass
+
+    def _conn(self):
+        if self._imap is None:
+            self._connect()
+        elif time.monotonic() - self._last_used > NOOP_INTERVAL:
+            try:
+                self._imap.noop()
+            except NETWORK_ERRORS:
+                self._reset()
+                self._connect()
+        self._last_used = time.monotonic()
+        return self._imap
+
+    def _call(self, fn, idempotent=True):
+        """执行一次操作；连接中断时重连并重试一次
+
+        idempotent=False（COPY / MOVE 等）时不重试：服务器可能已经执行、只是响应丢失，
+        重试会重复执行；断开连接后直接抛出，下一条命令重新连接。
+        """
+        with self._lock:
+            self.stats['commands'] += 1
+            try:
+                return fn(self._conn())
+            except NETWORK_ERRORS as e:
+                self._reset()
+                if not idempotent:
+                    raise
+                logger.info(f"IMAP 连接中断，重连: {e}")
+                return fn(self._conn())
+
+    @property
+    def capabilities(self):
+        return self._call(lambda imap: imap.capabilities)
+
+    def has_capability(self, name):
+        return name.upper() in self.capabilities
+
+    # ---------- 文件夹 ----------
+
+    def _select(self, folder, readonly, condstore=False):
+        # RFC 7162：SELECT/EXAMINE 带 (CONDSTORE) 参数时服务器返回 HIGHESTMODSEQ
+        mailbox = f'{folder} (CONDSTORE)' if condstore else folder
+        typ, data = self._imap.select(mailbox, readonly=readonly)
+        if typ != 'OK':
+            raise imaplib.IMAP4.error(f"选择文件夹失败: {folder} {data}")
+        info = {'folder': folder}
+        for key in ('EXISTS', 'UIDVALIDITY', 'UIDNEXT', 'HIGHESTMODSEQ'):
+            _, values = self._imap.response(key)
+            values = [v for v in values or [] if v]
+            if values:
+                info[key.lower()] = int(values[-1].split()[0])
+        self.mailbox = info
+        return info
+
+    def select(self, folder='INBOX', readonly=True, condstore=False):
+        """选择文件夹（readonly 时为 EXAMINE），返回邮箱状态"""
+        with self._lock:
+            info = self._call(lambda imap: self._select(folder, readonly, condstore))
+            self._folder = (folder, readonly, condstore)
+            return info
+
+    # ---------- 命令 ----------
+
+    def uid_search(self, *criteria, charset=None):
+        """UID SEARCH，返回升序的 UID 列表
+
+        最后一个条件含非 ASCII 字符时作为字面量发送（CHARSET UTF-8）；imaplib 每条命令
+        只支持一个字面量，多个中文关键词需要分多次搜索。
+        """
+        literal = None
+        if criteria and isinstance(criteria[-1], str) and not criteria[-1].isascii():
+            literal = criteria[-1].encode('utf-8')
+            criteria = criteria[:-1]
+            charset = charset or 'UTF-8'
+
+        def run(imap):
+            args = (('CHARSET', charset) if charset else ()) + criteria
+            imap.literal = literal
+            typ, data = imap.uid('SEARCH', *args)
+            if typ != 'OK':
+                raise imaplib.IMAP4.error(f"搜索失败: {data}")
+            # 带 MODSEQ 条件时结果末尾附有 (MODSEQ n)
+            tokens = b' '.join(d for d in data if d).split(b'(')[0].split()
+            return sorted(int(u) for u in tokens)
+        return self._call(run)
+
+    def fetch_headers(self, uids, batch=FETCH_BATCH):
+        """批量取邮件头，返回按 UID 升序的邮件列表"""
+        uids = sorted({int(u) for u in uids})
+        messages = []
+        for start in range(0, len(uids), batch):
+            message_set = compress_uids(uids[start:start + batch])
+            typ, data = self._call(lambda imap: imap.uid('FETCH', message_set, FETCH_ITEMS))
+            if typ != 'OK':
+                raise imaplib.IMAP4.error(f"获取邮件头失败: {data}")
+            messages.extend(parse_fetch_response(data))
+
+        self.stats['fetched'] += len(messages)
+        self.stats['header_bytes'] += sum(m['header_bytes'] for m in messages)
+        self.stats['message_bytes'] += sum(m['size'] for m in messages)
+        messages.sort(key=lambda m: m['uid'])
+        return messages
+
+    def fetch_flags(self, message_set, changedsince=None):
+        """UID FETCH <集合> (UID FLAGS)；changedsince 时只返回 MODSEQ 更大的邮件（CONDSTORE）"""
+        args = [message_set, '(UID FLAGS)']
+        if changedsince:
+            args.append(f'(CHANGEDSINCE {changedsince})')
+        typ, data = self._call(lambda imap: imap.uid('FETCH', *args))
+        if typ != 'OK':
+            raise imaplib.IMAP4.error(f"获取标记失败: {data}")
+        return [{'uid': m['uid'], 'flags': m['flags'], 'seen': m['seen']}
+                for m in parse_fetch_response(data)]
+
+    def fetch_sizes(self, uids, batch=FETCH_BATCH * 10):
+        """UID FETCH <集合> (UID RFC822.SIZE)，返回 {uid: 字节数}（不传输邮件内容）"""
+        uids = sorted({int(u) for u in uids})
+        sizes = {}
+        for start in range(0, len(uids), batch):
+            message_set = compress_uids(uids[start:start + batch])
+            typ, data = self._call(lambda imap: imap.uid('FETCH', message_set, '(UID RFC822.SIZE)'))
+            if typ != 'OK':
+                raise imaplib.IMAP4.error(f"获取邮件大小失败: {data}")
+            sizes.update((m['uid'], m['size']) for m in parse_fetch_response(data))
+        return sizes
+
+    def _uid_command(self, command, uids, *args, batch=STORE_BATCH, idempotent=True):
+        """对 UID 集合执行一条命令；UID 很多时按 batch 分批，避免命令行过长"""
+        uids = sorted({int(u) for u in uids})
+        for start in range(0, len(uids), batch):
+            message_set = compress_uids(uids[start:start + batch])
+            typ, data = self._call(lambda imap: imap.uid(command, message_set, *args), idempotent)
+            if typ != 'OK':
+                raise imaplib.IMAP4.error(f"UID {command} 失败: {data}")
+
+    def uid_store(self, uids, command, flags):
+        """UID STORE，UID 集合压缩为区间后一条命令完成"""
+        self._uid_command('STORE', uids, command, flags)
+
+    def uid_move(self, uids, folder):
+        """UID MOVE（RFC 6851）把邮件移动到另一个文件夹"""
+        self._uid_command('MOVE', uids, folder, idempotent=False)
+
+    def uid_copy(self, uids, folder):
+        """UID COPY 把邮件复制到另一个文件夹（不支持 MOVE 的服务器用它实现移动）"""
+        self._uid_command('COPY', uids, folder, idempotent=False)
+
+    def uid_expunge(self, uids):
+        """UID EXPUNGE（UIDPLUS）只永久删除指定 UID，不影响其他已标记删除的邮件"""
+        self._uid_command('EXPUNGE', uids)
+
+    def expunge(self):
+        return self._call(lambda imap: imap.expunge())
+
+    def idle(self, timeout=IDLE_TIMEOUT):
+        """IDLE 等待服务器推送，返回收到的未标记响应（如 '* 12 EXISTS'），超时返回空列表
+
+        服务器不支持 IDLE 时等待 timeout 秒后用 NOOP 轮询。
+        """
+        with self._lock:
+            imap = self._conn()
+            if 'IDLE' not in imap.capabilities:
+                time.sleep(timeout)
+                imap = self._conn()
+                typ, data = imap.noop()
+                return [f"* {d.decode(errors='ignore')}" for d in data if d]
+
+            tag = imap._new_tag()
+            imap.send(tag + b' IDLE\r\n')
+            line = imap.readline()
+            if not line.startswith(b'+'):
+                raise imaplib.IMAP4.error(f"IDLE 被拒绝: {line!r}")
+
+            events = []
+            sock = imap.sock
+            pending = sock.pending() if hasattr(sock, 'pending') else 0
+            if pending or select.select([sock], [], [], timeout)[0]:
+                line = imap.readline()
+                if not line:
+                    self._reset()
+                    raise imaplib.IMAP4.abort("IDLE 期间连接被关闭")
+                events.append(line.strip().decode(errors='ignore'))
+
+            imap.send(b'DONE\r\n')
+            while True:
+                line = imap.readline()
+                if not line:
+                    self._reset()
+                    raise imaplib.IMAP4.abort("IDLE 结束时连接被关闭")
+                if line.startswith(tag):
+                    break
+                events.append(line.strip().decode(errors='ignore'))
+            self._last_used = time.monotonic()
+            return events
+
+    def logout(self):
+        with self._lock:
+            if self._imap is not None:
+                try:
+                    self._imap.logout()
+                except Exception:
+                    pass
+                self._imap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.logout()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(config, timeout=30):
+    """获取进程内共享的 IMAP 会话（按服务器、端口、账号区分）"""
+    key = (config['imap_server'], config.get('imap_port', 993), config['email'])
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = IMAPClient(config, timeout=timeout)
+    return client
+
+
+def close_all():
+    """退出所有共享会话"""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.logout()
+
+
+atexit.register(close_all)
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+记忆关联计算 - 向量化打分 + MinHash/LSH 候选生成
+
+相似度规则与原 MemoryOptimizer._calculate_similarity 一致:
+- 类别相同            +0.3
+- 关键词重叠率        +0.4 × |K1∩K2| / max(|K1|, |K2|)
+- 内容共同词数 > 3    +0.2
+- 创建时间相差 < 2 天 +0.1
+
+关键词集合、词集合、类别、时间戳只在 prepare 时计算一次。记忆数不超过
+ALL_PAIRS_LIMIT 时分块枚举全部记忆对（交集大小用 0/1 矩阵乘法整块求出）；
+更多时用 MinHash + LSH 分桶只比较可能相似的记忆对，候选对的交集大小通过
+"拼接 + 排序 + 相邻相等计数"批量求出。
+"""
+
+import json
+
+import numpy as np
+
+ALL_PAIRS_LIMIT = 2000     # 不超过该数量时精确比较全部记忆对
+PAIR_BLOCK = 1000000       # 每批打分的记忆对数
+MAX_BUCKET = 300           # LSH 桶内记忆数上限（过大的桶由高频词造成，跳过）
+MERSENNE_PRIME = (1 << 61) - 1
+
+W_CATEGORY = 0.3
+W_KEYWORDS = 0.4
+W_CONTENT = 0.2
+W_TIME = 0.1
+MIN_COMMON_WORDS = 3
+NEAR_SECONDS = 2 * 86400
+
+
+def _ragged(sets, vocab):
+    """集合列表 -> (排好序的词ID扁平数组, 偏移数组)"""
+    lengths = np.fromiter((len(s) for s in sets), dtype=np.int64, count=len(sets))
+    offsets = np.zeros(len(sets) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    flat = np.empty(offsets[-1], dtype=np.int64)
+    for i, s in enumerate(sets):
+        if s:
+            flat[offsets[i]:offsets[i + 1]] = sorted(vocab.setdefault(t, len(vocab)) for t in s)
+    return flat, offsets
+
+
+def _gather(flat, offsets, rows):
+    """取出 rows 中每一行的元素，返回 (元素, 所属的 rows 下标)"""
+    lengths = offsets[rows + 1] - offsets[rows]
+    total = int(lengths.sum())
+    owner = np.repeat(np.arange(len(rows)), lengths)
+    starts = np.repeat(offsets[rows], lengths)
+    within = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return flat[starts + within], owner
+
+
+def _intersections(flat, offsets, left, right, vocab_size):
+    """每一对 (left[k], right[k]) 的集合交集大小"""
+    a, a_owner = _gather(flat, offsets, left)
+    b, b_owner = _gather(flat, offsets, right)
+    keys = np.concatenate([a_owner * vocab_size + a, b_owner * vocab_size + b])
+    keys.sort()
+    dup = keys[1:] == keys[:-1]  # 同一集合内无重复，相邻相等即为两侧共有
+    return np.bincount(keys[1:][dup] // vocab_size, minlength=len(left))
+
+
+def _parse_keywords(value):
+    """keywords 列可能是 JSONB 解析后的 list，也可能是 JSON 字符串"""
+    if not value:
+        return set()
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return set()
+    return {str(k) for k in value} if isinstance(value, (list, tuple)) else set()
+
+
+class MemoryLinker:
+    """批量计算记忆对相似度"""
+
+    def __init__(self, threshold=0.6, num_perm=128, bands=64, seed=1):
+        """bands 个带、每带 num_perm // bands 行；每带行数越少召回越高、候选越多"""
+        if num_perm % bands:
+            raise ValueError("num_perm 必须是 bands 的整数倍")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, MERSENNE_PRIME, size=num_perm, dtype=np.int64).astype(np.uint64)
+        self._b = rng.integers(0, MERSENNE_PRIME, size=num_perm, dtype=np.int64).astype(np.uint64)
+        self.stats = {}
+
+    def prepare(self, memories):
+        """memories: [(id, content, category, keywords, created_at)]，按创建时间降序"""
+        self.ids = np.array([m[0] for m in memories], dtype=np.int64)
+        contents = [m[1] or '' for m in memories]
+        self.has_rds = np.array(['RDS' in c for c in contents], dtype=bool)
+
+        categories = {}
+        self.category = np.array([categories.setdefault(m[2], len(categories)) for m in memories],
+                                 dtype=np.int64)
+        self.created = np.array([m[4].timestamp() if m[4] else np.nan for m in memories],
+                                dtype=np.float64)
+
+        vocab = {}
+        self._keywords = _ragged([_parse_keywords(m[3]) for m in memories], vocab)
+        self._keyword_vocab = max(len(vocab), 1)
+        words = {}
+        self._words = _ragged([set(c.lower().split()) for c in contents], words)
+        self._word_vocab = max(len(words), 1)
+        return self
+
+    # ---------- 打分 ----------
+
+    def score_pairs(self, left, right):
+        """向量化计算记忆对 (left[k], right[k]) 的相似度"""
+        score = W_CATEGORY * (self.category[left] == self.category[right])
+
+        kw_flat, kw_offsets = self._keywords
+        kw_len = np.diff(kw_offsets)
+        denom = np.maximum(kw_len[left], kw_len[right])
+        valid = (kw_len[left] > 0) & (kw_len[right] > 0)
+        if valid.any():
+            common = _intersections(kw_flat, kw_offsets, left[valid], right[valid], self._keyword_vocab)
+            score[valid] += common / denom[valid] * W_KEYWORDS
+
+        common_words = _intersections(*self._words, left, right, self._word_vocab)
+        score += W_CONTENT * (common_words > MIN_COMMON_WORDS)
+
+        with np.errstate(invalid='ignore'):
+            score += W_TIME * (np.abs(self.created[left] - self.created[right]) < NEAR_SECONDS)
+        return np.minimum(score, 1.0)
+
+    def link_types(self, left, right):
+        """关联类型：都提到 RDS -> same_topic；类别相同 -> same_category；否则 related"""
+        types = np.full(len(left), 'related', dtype=object)
+        types[self.category[left] == self.category[right]] = 'same_category'
+        types[self.has_rds[left] & self.has_rds[right]] = 'same_topic'
+        return types
+
+    # ---------- 候选生成 ----------
+
+    def _incidence(self, flat, offsets, vocab_size):
+        """0/1 记忆-词矩阵，只保留出现在至少两条记忆中的词（其余词不会产生交集）"""
+        n = len(self.ids)
+        df = np.bincount(flat, minlength=vocab_size)
+        keep = df >= 2
+        column = np.cumsum(keep) - 1
+        owner = np.repeat(np.arange(n), np.diff(offsets))
+        mask = keep[flat]
+        matrix = np.zeros((n, int(keep.sum())), dtype=np.float32)
+        matrix[owner[mask], column[flat[mask]]] = 1.0
+        return matrix
+
+    def _all_pairs_links(self):
+        """分块枚举全部记忆对：交集大小由矩阵乘法一次算出整块"""
+        n = len(self.ids)
+        words = self._incidence(*self._words, self._word_vocab)
+        keywords = self._incidence(*self._keywords, self._keyword_vocab)
+        kw_len = np.diff(self._keywords[1]).astype(np.float64)
+        rows_per_block = max(1, PAIR_BLOCK // max(n, 1))
+        columns = np.arange(n)
+
+        for start in range(0, n, rows_per_block):
+            rows = np.arange(start, min(start + rows_per_block, n))
+            score = W_CATEGORY * (self.category[rows, None] == self.category[None, :])
+            denom = np.maximum(kw_len[rows, None], kw_len[None, :])
+            # 交集计数在 float32 中是精确整数；比率与累加用 float64，与原实现的运算顺序一致，
+            # 否则恰好等于阈值的分数会因舍入落到阈值之上
+            with np.errstate(invalid='ignore', divide='ignore'):
+                overlap = (keywords[rows] @ keywords.T).astype(np.float64) / denom
+            score += np.nan_to_num(overlap, nan=0.0, posinf=0.0) * W_KEYWORDS
+            score += W_CONTENT * ((words[rows] @ words.T) > MIN_COMMON_WORDS)
+            with np.errstate(invalid='ignore'):
+                score += W_TIME * (np.abs(self.created[rows, None] - self.created[None, :]) < NEAR_SECONDS)
+            score = np.minimum(score, 1.0)
+
+            keep = (score > self.threshold) & (columns[None, :] > rows[:, None])
+            self.stats['candidates'] += int(((n - 1 - rows).clip(min=0)).sum())
+            i, j = np.nonzero(keep)
+            yield rows[i], j, score[i, j]
+
+    def signatures(self):
+        """MinHash 签名 (N × num_perm)，分块计算控制内存"""
+        flat, offsets = self._words
+        kw_flat, kw_offsets = self._keywords
+        n = len(self.ids)
+        sig = np.full((n, self.num_perm), np.iinfo(np.uint64).max, dtype=np.uint64)
+        # 关键词与内容词合并作为 MinHash 的集合（关键词ID平移到内容词表之后）
+        for values, offs in ((flat, offsets), (kw_flat + self._word_vocab, kw_offsets)):
+            for start in range(0, n, 4096):
+                rows = np.arange(start, min(start + 4096, n))
+                tokens, owner = _gather(values, offs, rows)
+                if not len(tokens):
+                    continue
+                nonempty = np.flatnonzero(np.diff(offs)[rows] > 0)
+                bounds = np.searchsorted(owner, nonempty)
+                for p in range(self.num_perm):
+                    hashed = (self._a[p] * tokens.astype(np.uint64) + self._b[p]) % np.uint64(MERSENNE_PRIME)
+                    block = np.minimum.reduceat(hashed, bounds)
+                    col = sig[rows[nonempty], p]
+                    sig[rows[nonempty], p] = np.minimum(col, block)
+        return sig
+
+    def _lsh_pairs(self):
+        """同一 LSH 桶内的记忆对（跨带去重）"""
+        sig = self.signatures()
+        n = len(self.ids)
+        r = self.num_perm // self.bands
+        rng = np.random.default_rng(0)
+        mix = rng.integers(1, 1 << 62, size=r, dtype=np.int64).astype(np.uint64)
+        encoded = []
+        skipped = 0
+        for band in range(self.bands):
+            keys = (sig[:, band * r:(band + 1) * r] * mix).sum(axis=1)
+            order = np.argsort(keys, kind='stable')
+            sorted_keys = keys[order]
+            starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+            sizes = np.diff(np.r_[starts, n])
+            skipped += int((sizes > MAX_BUCKET).sum())
+            # 每个成员与同桶中排在它后面的成员配对
+            size_of = np.repeat(sizes, sizes)
+            end_of = np.repeat(starts + sizes, sizes)
+            counts = np.where((size_of >= 2) & (size_of <= MAX_BUCKET), end_of - np.arange(n) - 1, 0)
+            if not counts.sum():
+                continue
+            left = np.repeat(np.arange(n), counts)
+            right = left + 1 + (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+            a, b = order[left], order[right]
+            encoded.append(np.minimum(a, b) * n + np.maximum(a, b))
+        self.stats['buckets_skipped'] = skipped
+        if not encoded:
+            return
+        pairs = np.unique(np.concatenate(encoded))
+        for start in range(0, len(pairs), PAIR_BLOCK):
+            block = pairs[start:start + PAIR_BLOCK]
+            yield block // n, block % n
+
+    def find_links(self, exact=None):
+        """返回 [(source_id, target_id, link_type, strength)]，source 为较新的记忆
+
+        exact: None 时按记忆数自动选择；True 强制全部记忆对；False 强制 LSH
+        """
+        if exact is None:
+            exact = len(self.ids) <= ALL_PAIRS_LIMIT
+        self.stats = {'memories': len(self.ids), 'mode': 'all_pairs' if exact else 'minhash_lsh',
+                      'candidates': 0}
+
+        if exact:
+            blocks = self._all_pairs_links()
+        else:
+            blocks = ((left, right, self.score_pairs(left, right)) for left, right in self._lsh_pairs())
+
+        links = []
+        for left, right, scores in blocks:
+            if not exact:
+                self.stats['candidates'] += len(left)
+            keep = scores > self.threshold
+            if not keep.any():
+                continue
+            left, right, scores = left[keep], right[keep], scores[keep]
+            types = self.link_types(left, right)
+            links.extend(zip(self.ids[left].tolist(), self.ids[right].tolist(),
+                             types.tolist(), np.round(scores, 2).tolist()))
+        self.stats['links'] = len(links)
+        return links
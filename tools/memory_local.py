@@ -8,40 +8,41 @@ import os
 import json
 import re
 import hashlib
+import importlib.util
+import socket
+import socketserver
 from datetime import datetime
 from pathlib import Path
 
-# 尝试导入向量库
-try:
-    import numpy as np
-    from sentence_transformers import SentenceTransformer
-    VECTOR_LIBS_AVAILABLE = True
-except ImportError:
-    VECTOR_LIBS_AVAILABLE = False
-    print("⚠️ 向量库未安装，使用关键词搜索模式")
+# 向量库按需导入（numpy / sentence_transformers 导入本身就要数秒）
+VECTOR_LIBS_AVAILABLE = all(
+    importlib.util.find_spec(m) is not None for m in ('numpy', 'sentence_transformers')
+)
 
 # 配置
 MEMORY_DIR = Path("/root/.openclaw/workspace/memory")
 VECTOR_DB_PATH = MEMORY_DIR / "vector_db"
 MEMORY_FILE = Path("/root/.openclaw/workspace/MEMORY.md")
+MODEL_NAME = 'paraphrase-multilingual-MiniLM-L12-v2'
+SOCKET_PATH = VECTOR_DB_PATH / "memory.sock"
+MUTATING_COMMANDS = {'add'}  # 守护进程无响应时不能在本地重试的命令
 
 class LocalMemory:
-    """本地记忆管理器"""
+    """本地记忆管理器
+
+    嵌入模型和向量索引在第一次语义搜索时才加载，add / summary / stats 不需要模型。
+    """
     
-    def __init__(self):
-        self.model = None
-        self.embeddings = {}
+    def __init__(self, quantize=False):
+        self.quantize = quantize
+        self._model = None
+        self._model_failed = False
+        self.index = None
+        self.store = None
         self.documents = []
-        
-        if VECTOR_LIBS_AVAILABLE:
-            try:
-                # 使用轻量级中文模型
-                print("🔄 加载嵌入模型...")
-                self.model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
-                print("✅ 模型加载完成")
-            except Exception as e:
-                print(f"⚠️ 模型加载失败: {e}")
-                self.model = None
+        self._doc_by_id = {}
+        self._files = {}
+        self._signature = None
         
         # 确保目录存在
         MEMORY_DIR.mkdir(exist_ok=True)
@@ -50,39 +51,117 @@ class LocalMemory:
         # 加载现有记忆
         self.load_memory()
     
-    def load_memory(self):
-        """从文件加载记忆"""
+    @property
+    def model(self):
+        """嵌入模型（首次访问时加载）"""
+        if self._model is None and VECTOR_LIBS_AVAILABLE and not self._model_failed:
+            try:
+                from sentence_transformers import SentenceTransformer
+                # 使用轻量级中文模型
+                print("🔄 加载嵌入模型...")
+                self._model = SentenceTransformer(MODEL_NAME)
+                print("✅ 模型加载完成")
+            except Exception as e:
+                print(f"⚠️ 模型加载失败: {e}")
+                self._model_failed = True
+        return self._model
+    
+    def _memory_files(self):
+        files = []
         # 加载 MEMORY.md
         if MEMORY_FILE.exists():
-            with open(MEMORY_FILE, 'r', encoding='utf-8') as f:
-                content = f.read()
-                self._index_document("MEMORY.md", content)
+            files.append(("MEMORY.md", MEMORY_FILE))
         
         # 加载 memory/*.md
-        for md_file in MEMORY_DIR.glob("*.md"):
-            with open(md_file, 'r', encoding='utf-8') as f:
+        files.extend((md_file.name, md_file) for md_file in sorted(MEMORY_DIR.glob("*.md")))
+        return files
+    
+    def _scan_signature(self):
+        """记忆文件的 (文件名, mtime, 大小) 签名，用于判断是否需要重新加载"""
+        signature = []
+        for filename, path in self._memory_files():
+            st = path.stat()
+            signature.append((filename, st.st_mtime_ns, st.st_size))
+        return tuple(signature)
+    
+    def load_memory(self):
+        """从文件加载记忆（只读文本；向量索引已建立时同步更新）"""
+        self.documents = []
+        self._doc_by_id = {}
+        self._files = {}
+        
+        for filename, path in self._memory_files():
+            with open(path, 'r', encoding='utf-8') as f:
                 content = f.read()
-                self._index_document(md_file.name, content)
+            self._add_documents(filename, content)
+        self._signature = self._scan_signature()
+        
+        if self.index is not None:
+            self.index = None
+            self._ensure_index()
         
         print(f"📚 已加载 {len(self.documents)} 个记忆文档")
     
+    def refresh(self):
+        """记忆文件有变化时重新加载（守护进程每次请求前调用）"""
+        if self._scan_signature() != self._signature:
+            self.load_memory()
+            return True
+        return False
+    
+    def _encode(self, paragraphs):
+        return self.model.encode(paragraphs, batch_size=32)
+    
+    def _ensure_index(self):
+        """按需构建向量索引（向量走缓存，只编码变化的段落）"""
+        if self.index is not None:
+            return True
+        if self.model is None:
+            return False
+        
+        from vector_index import VectorIndex
+        from embedding_store import EmbeddingStore
+        
+        dim = self.model.get_sentence_embedding_dimension()
+        if self.store is None:
+            self.store = EmbeddingStore(VECTOR_DB_PATH, MODEL_NAME, dim)
+        
+        vectors = self.store.sync(self._files, self._encode)
+        self.store.save()
+        self.index = VectorIndex(dim, quantize=self.quantize)
+        self.index.add([f"{filename}#{i}" for filename, paras in self._files.items()
+                        for i in range(len(paras))], vectors)
+        return True
+    
     def _index_document(self, filename, content):
-        """索引文档"""
+        """索引单个文档（新增记忆时使用）"""
+        doc_ids, paragraphs = self._add_documents(filename, content)
+        
+        # 索引已加载（如守护进程中）时立即生成嵌入，否则留到下次搜索
+        if self.index is not None and paragraphs:
+            self.index.add(doc_ids, self.store.update_file(filename, paragraphs, self._encode))
+            self.store.save()
+    
+    def _add_documents(self, filename, content):
+        """把文档切分为段落并登记，返回 (doc_ids, paragraphs)"""
         # 分割成段落
         paragraphs = [p.strip() for p in re.split(r'\n\n+', content) if p.strip()]
         
+        doc_ids = []
         for i, para in enumerate(paragraphs):
             doc_id = f"{filename}#{i}"
-            self.documents.append({
+            doc = {
                 'id': doc_id,
                 'filename': filename,
                 'content': para,
                 'length': len(para)
-            })
-            
-            # 生成嵌入
-            if self.model:
-                self.embeddings[doc_id] = self.model.encode(para)
+            }
+            self.documents.append(doc)
+            self._doc_by_id[doc_id] = doc
+            doc_ids.append(doc_id)
+        
+        self._files[filename] = paragraphs
+        return doc_ids, paragraphs
     
     def search(self, query, top_k=5):
         """搜索记忆"""
@@ -91,24 +170,16 @@ class LocalMemory:
         
         results = []
         
-        if self.model and query in self.embeddings:
-            # 语义搜索
+        if VECTOR_LIBS_AVAILABLE and self._ensure_index() and len(self.index):
+            # 语义搜索：一次矩阵-向量乘法求全部余弦相似度
             query_vec = self.model.encode(query)
             
-            for doc in self.documents:
-                doc_id = doc['id']
-                if doc_id in self.embeddings:
-                    # 计算余弦相似度
-                    similarity = self._cosine_similarity(query_vec, self.embeddings[doc_id])
-                    results.append({
-                        **doc,
-                        'score': float(similarity),
-                        'match_type': 'semantic'
-                    })
-            
-            # 按相似度排序
-            results.sort(key=lambda x: x['score'], reverse=True)
-            results = results[:top_k]
+            for doc_id, score in self.index.search(query_vec, top_k):
+                results.append({
+                    **self._doc_by_id[doc_id],
+                    'score': score,
+                    'match_type': 'semantic'
+                })
         
         else:
             # 关键词搜索
@@ -133,10 +204,6 @@ class LocalMemory:
         
         return results
     
-    def _cosine_similarity(self, a, b):
-        """计算余弦相似度"""
-        return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
-    
     def add_memory(self, content, category="general", tags=None):
         """添加新记忆"""
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -167,8 +234,8 @@ class LocalMemory:
         
         # 更新索引
         self._index_document(filename, memory_entry)
+        self._signature = self._scan_signature()
         
-        print(f"✅ 记忆已保存: {filename}")
         return filename
     
     def extract_facts(self, conversation):
@@ -235,10 +302,146 @@ class LocalMemory:
         return summary
 
 
-def main():
+    def stats(self):
+        """统计信息（不触发模型加载）"""
+        vectors = len(self.index) if self.index is not None else 0
+        if self.index is None:
+            try:
+                with open(VECTOR_DB_PATH / "manifest.json", 'r', encoding='utf-8') as f:
+                    vectors = len(json.load(f).get('hashes', []))
+            except (FileNotFoundError, ValueError):
+                pass
+        
+        return {
+            'documents': len(self.documents),
+            'vectors': vectors,
+            'vector_libs': VECTOR_LIBS_AVAILABLE,
+            'model_loaded': self._model is not None,
+            'memory_files': len(list(MEMORY_DIR.glob("*.md"))),
+        }
+
+
+def handle_request(memory, request):
+    """执行一条请求（守护进程与本地模式共用）"""
+    cmd = request.get('cmd')
+    if cmd == 'ping':
+        return 'pong'
+    
+    memory.refresh()
+    if cmd == 'search':
+        return memory.search(request['query'], request.get('top_k', 5))
+    if cmd == 'add':
+        return memory.add_memory(request['content'], request.get('category', 'general'),
+                                 request.get('tags'))
+    if cmd == 'summary':
+        return memory.summarize_daily(request.get('date'))
+    if cmd == 'stats':
+        return memory.stats()
+    raise ValueError(f"未知命令: {cmd}")
+
+
+class _DaemonHandler(socketserver.StreamRequestHandler):
+    """每个连接一行 JSON 请求，一行 JSON 响应"""
+    
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            response = {'ok': True, 'result': handle_request(self.server.memory, request)}
+        except Exception as e:
+            response = {'ok': False, 'error': str(e)}
+        self.wfile.write(json.dumps(response, ensure_ascii=False, default=str).encode('utf-8') + b"\n")
+
+
+class MemoryDaemon(socketserver.UnixStreamServer):
+    """常驻进程：持有已加载的模型与向量索引，通过 Unix socket 响应请求"""
+    
+    def __init__(self, memory, path=SOCKET_PATH):
+        if path.exists():
+            path.unlink()  # 上次异常退出留下的 socket 文件
+        super().__init__(str(path), _DaemonHandler)
+        os.chmod(path, 0o600)
+        self.memory = memory
+        self.path = path
+    
+    def server_close(self):
+        super().server_close()
+        if self.path.exists():
+            self.path.unlink()
+
+
+def call_daemon(cmd, timeout=60, **params):
+    """向守护进程发送请求；守护进程未运行时返回 None
+    
+    请求发出后超时或连接被断开时，只读命令返回 None（可在本地重试）；
+    修改类命令（MUTATING_COMMANDS）抛出 RuntimeError，避免守护进程与本地各执行一次
+    """
+    if not SOCKET_PATH.exists():
+        return None
+    
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        try:
+            sock.connect(str(SOCKET_PATH))
+        except (FileNotFoundError, ConnectionRefusedError, socket.timeout):
+            return None
+            
+        data = b""
+        try:
+            sock.sendall(json.dumps({'cmd': cmd, **params}, ensure_ascii=False).encode('utf-8') + b"\n")
+            while not data.endswith(b"\n"):
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                data += chunk
+            error = None if data.endswith(b"\n") else "连接被关闭，未收到完整响应"
+        except socket.timeout:
+            error = f"{timeout}s 内未响应"
+        except (BrokenPipeError, ConnectionResetError) as e:
+            error = f"连接中断: {e}"
+    
+    if error:
+        if cmd in MUTATING_COMMANDS:
+            raise RuntimeError(f"守护进程{error}，{cmd} 可能已执行，未在本地重试")
+        return None
+    
+    response = json.loads(data)
+    if not response['ok']:
+        raise RuntimeError(response['error'])
+    return response['result']
+
+
+def run_command(cmd, **params):
+    """优先交给守护进程执行，未运行时在本进程内执行"""
+    result = call_daemon(cmd, **params)
+    if result is not None:
+        return result
+    return handle_request(LocalMemory(), {'cmd': cmd, **params})
+
+
+def serve():
+    """启动常驻守护进程"""
+    if call_daemon('ping', timeout=2) == 'pong':
+        print(f"✅ 守护进程已在运行: {SOCKET_PATH}")
+        return
+    
+    import signal
     import sys
     
     memory = LocalMemory()
+    memory._ensure_index()  # 预热模型与索引
+    daemon = MemoryDaemon(memory)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"🧠 记忆守护进程已启动: {SOCKET_PATH}")
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.server_close()
+
+
+def main():
+    import sys
     
     if len(sys.argv) < 2:
         print("🧠 本地智能记忆系统")
@@ -247,13 +450,17 @@ def main():
         print("  python3 memory_local.py add <内容>       # 添加记忆")
         print("  python3 memory_local.py summary [日期]   # 每日摘要")
         print("  python3 memory_local.py stats            # 统计信息")
+        print("  python3 memory_local.py serve            # 启动常驻进程（模型常驻内存）")
         sys.exit(1)
     
     cmd = sys.argv[1]
     
-    if cmd == 'search':
+    if cmd == 'serve':
+        serve()
+    
+    elif cmd == 'search':
         query = sys.argv[2] if len(sys.argv) > 2 else input("搜索: ")
-        results = memory.search(query)
+        results = run_command('search', query=query)
         
         print(f"\n🔍 搜索: '{query}'")
         print(f"找到 {len(results)} 条结果:\n")
@@ -269,22 +476,29 @@ def main():
         category = sys.argv[3] if len(sys.argv) > 3 else "general"
         tags = sys.argv[4].split(',') if len(sys.argv) > 4 else []
         
-        memory.add_memory(content, category, tags)
+        try:
+            filename = run_command('add', content=content, category=category, tags=tags)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"✅ 记忆已保存: {filename}")
     
     elif cmd == 'summary':
         date = sys.argv[2] if len(sys.argv) > 2 else None
-        print(memory.summarize_daily(date))
+        print(run_command('summary', date=date))
     
     elif cmd == 'stats':
+        daemon_running = call_daemon('ping', timeout=2) == 'pong'
+        stats = run_command('stats')
         print("📊 记忆统计")
-        print(f"   文档数: {len(memory.documents)}")
-        print(f"   向量数: {len(memory.embeddings)}")
-        print(f"   向量库可用: {VECTOR_LIBS_AVAILABLE}")
-        print(f"   模型加载: {memory.model is not None}")
+        print(f"   文档数: {stats['documents']}")
+        print(f"   向量数: {stats['vectors']}")
+        print(f"   向量库可用: {stats['vector_libs']}")
+        print(f"   模型加载: {stats['model_loaded']}")
+        print(f"   守护进程: {'运行中' if daemon_running else '未运行'}")
         
         # 文件统计
-        md_files = list(MEMORY_DIR.glob("*.md"))
-        print(f"   记忆文件: {len(md_files)}")
+        print(f"   记忆文件: {stats['memory_files']}")
     
     else:
         print(f"未知命令: {cmd}")
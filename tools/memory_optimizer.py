@@ -3,20 +3,333 @@
 记忆层优化系统 - 关联记忆 + 自动摘要 + 混合检索
 """
 
-import json
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional
 import numpy as np
 
+from memory_linker import MemoryLinker
+
 # 尝试导入现有工具
 try:
+    from psycopg2.extras import execute_values
     from rds_manager import RDSManager
+    from memory_rds import get_access_tracker
+    from memory_recall import get_recall_cache
     RDS_AVAILABLE = True
 except:
     RDS_AVAILABLE = False
 
+# 检索文本：原文中的中文连续字串替换为相邻二元组（simple 分词器无法切分中文），
+# 关键词一并纳入。查询与文档使用同一个切分函数。
+SEARCH_INDEX_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION memory_search_text(t text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+        SELECT regexp_replace(coalesce(t, ''), '[\u4e00-\u9fff]+', ' ', 'g') || ' ' || coalesce((
+            SELECT string_agg(substr(m[1], i, 2), ' ')
+            FROM regexp_matches(coalesce(t, ''), '[\u4e00-\u9fff]{2,}', 'g') AS m,
+                 generate_series(1, char_length(m[1]) - 1) AS i
+        ), '')
+    $$;
+    """,
+    # 查询词项之间取 OR：中文二元组跨越原文分隔处时不会整体落空，由 ts_rank_cd 排序
+    """
+    CREATE OR REPLACE FUNCTION memory_search_query(q text) RETURNS tsquery
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+        SELECT replace(plainto_tsquery('simple', memory_search_text(q))::text, ' & ', ' | ')::tsquery
+    $$;
+    """,
+    """
+    ALTER TABLE memories ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        to_tsvector('simple', memory_search_text(coalesce(content, '') || ' ' || coalesce(keywords::text, '')))
+    ) STORED;
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_memories_search_vector ON memories USING gin(search_vector);",
+    # 被 search_vector 取代的表达式索引
+    "DROP INDEX IF EXISTS idx_memories_content_fts;",
+]
+
+# 模糊匹配的三元组索引（需要 pg_trgm 扩展，不可用时混合检索跳过该路）
+TRIGRAM_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm;",
+    "CREATE INDEX IF NOT EXISTS idx_memories_content_trgm ON memories USING gin(content gin_trgm_ops);",
+]
+
+# 混合检索：各路在 CTE 中用 row_number() 排名，RRF 融合后一次返回
+HYBRID_SEARCH_SQL = """
+WITH q AS (
+    SELECT memory_search_query(%(query)s) AS tsq
+),
+fts AS (
+    SELECT m.id, row_number() OVER (ORDER BY ts_rank_cd(m.search_vector, q.tsq) DESC, m.id) AS rnk
+    FROM memories m, q
+    WHERE m.search_vector @@ q.tsq
+    ORDER BY rnk
+    LIMIT %(depth)s
+),
+fuzzy AS (
+    {fuzzy}
+),
+related AS (
+    SELECT ml.target_memory_id AS id,
+           row_number() OVER (ORDER BY max(ml.strength) DESC, ml.target_memory_id) AS rnk
+    FROM memory_links ml
+    WHERE ml.source_memory_id IN (
+        SELECT id FROM fts WHERE rnk <= 5
+        UNION
+        SELECT id FROM fuzzy WHERE rnk <= 5
+    )
+    GROUP BY ml.target_memory_id
+    ORDER BY rnk
+    LIMIT %(depth)s
+),
+fused AS (
+    SELECT id, sum(1.0 / (%(rrf_k)s + rnk)) AS rrf_score
+    FROM (SELECT * FROM fts UNION ALL SELECT * FROM fuzzy UNION ALL SELECT * FROM related) ranked
+    GROUP BY id
+)
+SELECT m.*, f.rrf_score
+FROM fused f
+JOIN memories m ON m.id = f.id
+ORDER BY f.rrf_score DESC, m.id
+LIMIT %(top_k)s
+"""
+
+HYBRID_FUZZY_TRIGRAM = """
+    SELECT id, row_number() OVER (ORDER BY importance_score DESC, created_at DESC, id) AS rnk
+    FROM memories
+    WHERE content ILIKE %(pattern)s
+    ORDER BY rnk
+    LIMIT %(depth)s
+"""
+
+HYBRID_FUZZY_NONE = "SELECT NULL::integer AS id, NULL::bigint AS rnk WHERE false"
+
+RRF_K = 60  # RRF常数
+
+# 旧版混合检索的三次查询（未执行 init 时使用，也作为基准对照）
+LEGACY_FTS_SQL = """
+SELECT *, ts_rank(to_tsvector('simple', content), plainto_tsquery('simple', %s)) as rank
+FROM memories
+WHERE to_tsvector('simple', content) @@ plainto_tsquery('simple', %s)
+ORDER BY rank DESC
+LIMIT %s
+"""
+
+LEGACY_LIKE_SQL = """
+SELECT * FROM memories
+WHERE content ILIKE %s OR keywords::text ILIKE %s
+ORDER BY importance_score DESC, created_at DESC
+LIMIT %s
+"""
+
+LEGACY_RELATED_SQL = """
+SELECT m.*, ml.strength as link_score
+FROM memories m
+JOIN memory_links ml ON m.id = ml.target_memory_id
+WHERE ml.source_memory_id IN (
+    SELECT id FROM memories 
+    WHERE content ILIKE %s 
+    ORDER BY created_at DESC LIMIT 5
+)
+ORDER BY ml.strength DESC
+LIMIT %s
+"""
+
+
+def build_hybrid_sql(trigram: bool) -> str:
+    """trigram: 是否有 pg_trgm 索引（没有时不做模糊匹配，避免全表扫描）"""
+    return HYBRID_SEARCH_SQL.format(fuzzy=HYBRID_FUZZY_TRIGRAM if trigram else HYBRID_FUZZY_NONE)
+
+
+def like_pattern(query: str) -> str:
+    """ILIKE 模式，转义 % 和 _"""
+    return '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+# 每日摘要的判定规则（插入触发器与回填共用同一份 SQL）
+DECISION_WORDS = ['决定', '选择', '确定', '完成', '创建', '配置']
+ACTION_WORDS = ['TODO', '待办', '需要', '计划']
+PEOPLE_WORDS = ['大王', 'Marvin', '用户', '管理员']
+SUMMARY_LIST_LIMIT = 10        # 每日保留的决策/待办条数（按重要性）
+SUMMARY_BACKFILL_DAYS = 7      # 回填时每个任务覆盖的天数
+SUMMARY_BACKFILL_WORKERS = 4   # 回填并发数（不超过连接池上限）
+
+
+def _sql_text_array(words):
+    return "ARRAY[" + ", ".join("'" + w.replace("'", "''") + "'" for w in words) + "]::text[]"
+
+
+# 按天聚合一组记忆行；{source} 为行来源（触发器中是新插入行的过渡表，回填时是日期范围查询）
+SUMMARY_AGGREGATE_SQL = """
+WITH src AS (
+    SELECT r.created_at::date AS day, r.category, r.content,
+           jsonb_build_object('id', r.id, 'importance', r.importance_score,
+                              'text', left(r.content, 100)) AS item,
+           r.content ~ '{decision}' AS is_decision,
+           r.content ~ '{action}' AS is_action
+    FROM {{source}} r
+    WHERE r.created_at IS NOT NULL
+),
+people AS (
+    SELECT s.day, jsonb_agg(DISTINCT p) AS names
+    FROM src s, unnest({people}) p
+    WHERE strpos(s.content, p) > 0
+    GROUP BY s.day
+)
+SELECT s.day AS summary_date,
+       count(*) AS memory_count,
+       count(*) FILTER (WHERE s.is_decision) AS decision_count,
+       count(*) FILTER (WHERE s.is_action) AS action_count,
+       memory_summary_top(coalesce(jsonb_agg(s.item) FILTER (WHERE s.is_decision), '[]')) AS key_decisions,
+       memory_summary_top(coalesce(jsonb_agg(s.item) FILTER (WHERE s.is_action), '[]')) AS action_items,
+       coalesce(p.names, '[]') AS people_mentioned,
+       coalesce(jsonb_agg(DISTINCT s.category) FILTER (WHERE s.category IS NOT NULL), '[]') AS topics
+FROM src s
+LEFT JOIN people p ON p.day = s.day
+GROUP BY s.day, p.names
+""".format(decision='|'.join(DECISION_WORDS), action='|'.join(ACTION_WORDS),
+           people=_sql_text_array(PEOPLE_WORDS))
+
+SUMMARY_COLUMNS = ("summary_date, memory_count, decision_count, action_count, "
+                   "key_decisions, action_items, people_mentioned, topics")
+
+SUMMARY_DDL = [
+    """
+    ALTER TABLE memory_summaries
+    ADD COLUMN IF NOT EXISTS memory_count INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS decision_count INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS action_count INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+    """,
+    # 回填与删除重算按 created_at 范围查询
+    "CREATE INDEX IF NOT EXISTS idx_memories_created_at ON memories(created_at);",
+    # 决策/待办列表：[{id, importance, text}]，按重要性保留前 N 条（合并两个列表后再截取即可）
+    f"""
+    CREATE OR REPLACE FUNCTION memory_summary_top(items jsonb) RETURNS jsonb
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+        SELECT coalesce(jsonb_agg(e ORDER BY (e->>'importance')::numeric DESC NULLS LAST, (e->>'id')::int), '[]')
+        FROM (
+            SELECT e FROM jsonb_array_elements(items) e
+            ORDER BY (e->>'importance')::numeric DESC NULLS LAST, (e->>'id')::int
+            LIMIT {SUMMARY_LIST_LIMIT}
+        ) t
+    $$;
+    """,
+    """
+    CREATE OR REPLACE FUNCTION memory_summary_set(items jsonb) RETURNS jsonb
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+        SELECT coalesce(jsonb_agg(DISTINCT v), '[]') FROM jsonb_array_elements(items) v
+    $$;
+    """,
+    """
+    CREATE OR REPLACE FUNCTION memory_summary_text(total integer, decisions integer, actions integer)
+    RETURNS text LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+        SELECT format('今日共记录 %s 条记忆。', total)
+            || CASE WHEN decisions > 0 THEN format(' 关键决策: %s 项。', decisions) ELSE '' END
+            || CASE WHEN actions > 0 THEN format(' 待办事项: %s 项。', actions) ELSE '' END
+    $$;
+    """,
+    # 按天加事务级咨询锁：增量合并与整天重算互斥，不同日期互不影响
+    """
+    CREATE OR REPLACE FUNCTION memory_summary_lock(d date) RETURNS void
+    LANGUAGE sql AS $$
+        SELECT pg_advisory_xact_lock(hashtext('memory_summaries'), d - DATE '2000-01-01')
+    $$;
+    """,
+    # 整天重算 [d_from, d_to)：范围谓词可走 created_at 索引
+    f"""
+    CREATE OR REPLACE FUNCTION memory_summary_refresh(d_from date, d_to date) RETURNS integer
+    LANGUAGE plpgsql AS $$
+    DECLARE
+        n integer;
+    BEGIN
+        PERFORM memory_summary_lock(d::date) FROM generate_series(d_from, d_to - 1, INTERVAL '1 day') d;
+        DELETE FROM memory_summaries WHERE summary_date >= d_from AND summary_date < d_to;
+        INSERT INTO memory_summaries ({SUMMARY_COLUMNS}, content_summary, updated_at)
+        SELECT a.*, memory_summary_text(a.memory_count::int, a.decision_count::int, a.action_count::int), now()
+        FROM ({SUMMARY_AGGREGATE_SQL.format(source="(SELECT * FROM memories WHERE created_at >= d_from AND created_at < d_to)")}) a;
+        GET DIAGNOSTICS n = ROW_COUNT;
+        RETURN n;
+    END
+    $$;
+    """,
+    # 新记忆：只聚合本条语句插入的行，与已有摘要合并
+    f"""
+    CREATE OR REPLACE FUNCTION memory_summary_on_insert() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        PERFORM memory_summary_lock(t.d)
+        FROM (SELECT DISTINCT created_at::date AS d FROM new_rows WHERE created_at IS NOT NULL ORDER BY 1) t;
+        INSERT INTO memory_summaries AS s ({SUMMARY_COLUMNS}, content_summary, updated_at)
+        SELECT a.*, memory_summary_text(a.memory_count::int, a.decision_count::int, a.action_count::int), now()
+        FROM ({SUMMARY_AGGREGATE_SQL.format(source="new_rows")}) a
+        ON CONFLICT (summary_date) DO UPDATE SET
+            memory_count = s.memory_count + EXCLUDED.memory_count,
+            decision_count = s.decision_count + EXCLUDED.decision_count,
+            action_count = s.action_count + EXCLUDED.action_count,
+            key_decisions = memory_summary_top(coalesce(s.key_decisions, '[]') || EXCLUDED.key_decisions),
+            action_items = memory_summary_top(coalesce(s.action_items, '[]') || EXCLUDED.action_items),
+            people_mentioned = memory_summary_set(coalesce(s.people_mentioned, '[]') || EXCLUDED.people_mentioned),
+            topics = memory_summary_set(coalesce(s.topics, '[]') || EXCLUDED.topics),
+            content_summary = memory_summary_text(s.memory_count + EXCLUDED.memory_count,
+                                                  s.decision_count + EXCLUDED.decision_count,
+                                                  s.action_count + EXCLUDED.action_count),
+            updated_at = now();
+        RETURN NULL;
+    END
+    $$;
+    """,
+    # 删除（维护清理）与修改内容/时间：受影响的日期整天重算
+    """
+    CREATE OR REPLACE FUNCTION memory_summary_on_delete() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        PERFORM memory_summary_refresh(t.d, t.d + 1)
+        FROM (SELECT DISTINCT created_at::date AS d FROM old_rows WHERE created_at IS NOT NULL ORDER BY 1) t;
+        RETURN NULL;
+    END
+    $$;
+    """,
+    """
+    CREATE OR REPLACE FUNCTION memory_summary_on_update() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF OLD.created_at IS NOT NULL THEN
+            PERFORM memory_summary_refresh(OLD.created_at::date, OLD.created_at::date + 1);
+        END IF;
+        IF NEW.created_at IS NOT NULL AND NEW.created_at::date IS DISTINCT FROM OLD.created_at::date THEN
+            PERFORM memory_summary_refresh(NEW.created_at::date, NEW.created_at::date + 1);
+        END IF;
+        RETURN NULL;
+    END
+    $$;
+    """,
+    """
+    DROP TRIGGER IF EXISTS memories_summary_insert ON memories;
+    CREATE TRIGGER memories_summary_insert AFTER INSERT ON memories
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION memory_summary_on_insert();
+    DROP TRIGGER IF EXISTS memories_summary_delete ON memories;
+    CREATE TRIGGER memories_summary_delete AFTER DELETE ON memories
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION memory_summary_on_delete();
+    DROP TRIGGER IF EXISTS memories_summary_update ON memories;
+    CREATE TRIGGER memories_summary_update AFTER UPDATE OF content, category, importance_score, created_at
+    ON memories FOR EACH ROW
+    WHEN (OLD.content IS DISTINCT FROM NEW.content OR OLD.category IS DISTINCT FROM NEW.category
+          OR OLD.importance_score IS DISTINCT FROM NEW.importance_score
+          OR OLD.created_at IS DISTINCT FROM NEW.created_at)
+    EXECUTE FUNCTION memory_summary_on_update();
+    """,
+]
+
+
 class MemoryOptimizer:
     """记忆优化器"""
     
@@ -24,6 +337,8 @@ class MemoryOptimizer:
         if RDS_AVAILABLE:
             self.rds = RDSManager()
         self.workspace = Path("/root/.openclaw/workspace")
+        self.last_link_stats = {}
+        self._search_features = None
     
     def init_enhanced_tables(self):
         """初始化增强版记忆表"""
@@ -61,6 +376,9 @@ class MemoryOptimizer:
             );
             """,
             
+            # 每日摘要增量维护（memories 上的触发器）
+            *SUMMARY_DDL,
+            
             # 记忆访问统计表（用于主动回忆）
             """
             CREATE TABLE IF NOT EXISTS memory_access_patterns (
@@ -74,6 +392,9 @@ class MemoryOptimizer:
             );
             """,
             
+            # 主动回忆：按类别取最近访问的记忆
+            "CREATE INDEX IF NOT EXISTS idx_memories_category_accessed ON memories(category, last_accessed DESC NULLS LAST);",
+            
             # 为memories表添加新字段
             """
             ALTER TABLE memories 
@@ -83,24 +404,47 @@ class MemoryOptimizer:
             ADD COLUMN IF NOT EXISTS related_topics JSONB DEFAULT '[]'::jsonb;
             """,
             
-            # 创建全文搜索索引（使用simple配置，适配PostgreSQL默认）
-            """
-            CREATE INDEX IF NOT EXISTS idx_memories_content_fts ON memories 
-            USING gin(to_tsvector('simple', content));
-            """
+            # 检索列与索引（存储的 tsvector + GIN，可选三元组索引）
+            *SEARCH_INDEX_DDL,
+            *TRIGRAM_DDL,
         ]
         
+        failures = []
         with self.rds.get_connection() as conn:
             with conn.cursor() as cursor:
+                # 生成列会重写整表、GIN / 三元组索引在大表上耗时较长，本次会话不设语句超时
+                cursor.execute("SET statement_timeout = 0")
                 for sql in sql_statements:
                     try:
                         cursor.execute(sql)
                         conn.commit()
                     except Exception as e:
-                        print(f"⚠️ 表可能已存在或错误: {e}")
                         conn.rollback()
+                        cursor.execute("SET statement_timeout = 0")
+                        error = str(e).splitlines()[0]
+                        if sql in TRIGRAM_DDL:
+                            # 可选：pg_trgm 不可用时混合检索跳过模糊匹配
+                            print(f"⚠️ 三元组索引未创建（混合检索将跳过模糊匹配）: {error}")
+                            break
+                        print(f"❌ 语句执行失败: {error}")
+                        print(f"   {' '.join(sql.split())[:120]}")
+                        failures.append(error)
+                cursor.execute("RESET statement_timeout")
+                conn.commit()
         
+        self._search_features = None
+        if failures:
+            print(f"❌ 增强记忆表初始化未完成: {len(failures)} 条语句失败")
+            return False
         print("✅ 增强记忆表初始化完成")
+        
+        # 触发器只维护之后的写入，已有记忆回填一次
+        try:
+            stats = self.backfill_summaries()
+            print(f"✅ 每日摘要回填 {stats['days']} 天 ({stats['seconds']}s)")
+        except Exception as e:
+            print(f"❌ 每日摘要回填失败: {str(e).splitlines()[0]}")
+            return False
         return True
     
     def create_memory_link(self, source_id: int, target_id: int, 
@@ -146,224 +490,199 @@ class MemoryOptimizer:
                 cursor.execute(sql, (memory_id, min_strength, memory_id, min_strength))
                 return cursor.fetchall()
     
-    def auto_link_memories(self):
-        """自动创建记忆关联"""
+    def auto_link_memories(self, days: Optional[int] = None):
+        """自动创建记忆关联
+
+        days 为空时处理全表。关键词/词集合只解析一次，打分在 MemoryLinker 中
+        向量化完成（记忆较多时用 MinHash/LSH 生成候选对），结果一次批量 upsert。
+        """
         if not RDS_AVAILABLE:
             return 0
         
-        # 1. 获取近期记忆
+        # 1. 获取记忆
         sql = """
         SELECT id, content, category, keywords, created_at
         FROM memories
-        WHERE created_at > NOW() - INTERVAL '7 days'
+        {}
         ORDER BY created_at DESC
-        LIMIT 100
-        """
+        """.format("WHERE created_at > NOW() - make_interval(days => %s)" if days else "")
         
         with self.rds.get_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute(sql)
+                cursor.execute(sql, (days,) if days else None)
                 memories = cursor.fetchall()
         
-        links_created = 0
+        if len(memories) < 2:
+            return 0
         
-        # 2. 基于相似度创建关联
-        for i, m1 in enumerate(memories):
-            for m2 in memories[i+1:]:
-                similarity = self._calculate_similarity(m1, m2)
-                if similarity > 0.6:
-                    link_type = self._determine_link_type(m1, m2)
-                    if self.create_memory_link(m1[0], m2[0], link_type, similarity):
-                        links_created += 1
+        # 2. 批量计算相似度
+        linker = MemoryLinker().prepare(memories)
+        links = linker.find_links()
+        self.last_link_stats = linker.stats
         
-        return links_created
+        # 3. 一次写入全部关联（强度未变化的行不重写）
+        return self.save_memory_links(links)
     
-    def _calculate_similarity(self, m1, m2):
-        """计算两段记忆的相似度"""
-        # 基于关键词重叠 + 时间接近度 + 类别相同
-        score = 0.0
+    def save_memory_links(self, links):
+        """批量写入 [(source_id, target_id, link_type, strength)]，返回新增/更新条数"""
+        if not RDS_AVAILABLE or not links:
+            return 0
         
-        # 类别相同 +0.3
-        if m1[2] == m2[2]:  # category
-            score += 0.3
+        sql = """
+        INSERT INTO memory_links (source_memory_id, target_memory_id, link_type, strength)
+        VALUES %s
+        ON CONFLICT (source_memory_id, target_memory_id, link_type) DO UPDATE
+        SET strength = EXCLUDED.strength
+        WHERE memory_links.strength IS DISTINCT FROM EXCLUDED.strength
+        """
         
-        # 关键词重叠
-        try:
-            k1 = set(json.loads(m1[3]) if m1[3] else [])
-            k2 = set(json.loads(m2[3]) if m2[3] else [])
-            if k1 and k2:
-                overlap = len(k1 & k2) / max(len(k1), len(k2))
-                score += overlap * 0.4
-        except:
-            pass
-        
-        # 内容相似度（简单版本）
-        c1, c2 = m1[1].lower(), m2[1].lower()
-        common_words = set(c1.split()) & set(c2.split())
-        if len(common_words) > 3:
-            score += 0.2
-        
-        # 时间接近度（同一天+0.1）
-        try:
-            t1 = m1[4]
-            t2 = m2[4]
-            if abs((t1 - t2).days) <= 1:
-                score += 0.1
-        except:
-            pass
-        
-        return min(score, 1.0)
-    
-    def _determine_link_type(self, m1, m2):
-        """确定关联类型"""
-        # 简单启发式规则
-        if 'RDS' in m1[1] and 'RDS' in m2[1]:
-            return 'same_topic'
-        if m1[2] == m2[2]:
-            return 'same_category'
-        return 'related'
+        written = 0
+        with self.rds.get_connection() as conn:
+            with conn.cursor() as cursor:
+                for start in range(0, len(links), 1000):
+                    execute_values(cursor, sql, links[start:start + 1000], page_size=1000)
+                    written += cursor.rowcount
+            conn.commit()
+        return written
     
     def generate_daily_summary(self, date_str: str = None):
-        """生成每日摘要"""
+        """读取每日摘要（由 memories 上的触发器随写入增量维护，读取为单行主键查询）"""
         if not RDS_AVAILABLE:
             return None
         
         if not date_str:
             date_str = datetime.now().strftime('%Y-%m-%d')
         
-        # 1. 获取当日记忆
-        sql = """
-        SELECT * FROM memories
-        WHERE DATE(created_at) = %s
-        ORDER BY importance_score DESC
+        sql = f"""
+        SELECT {SUMMARY_COLUMNS}, content_summary
+        FROM memory_summaries
+        WHERE summary_date = %s
         """
         
         with self.rds.get_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute(sql, (date_str,))
-                memories = cursor.fetchall()
-        
-        if not memories:
+                try:
+                    cursor.execute(sql, (date_str,))
+                except Exception as e:
+                    conn.rollback()
+                    print(f"⚠️ 摘要表未升级，请先运行 init: {e}")
+                    return None
+                row = cursor.fetchone()
+        
+        if not row or not row[1]:
             return None
         
-        # 2. 提取关键信息
-        key_decisions = []
-        action_items = []
-        people = set()
-        topics = set()
+        def texts(items):
+            return [i['text'] if isinstance(i, dict) else i for i in items or []]
         
-        for m in memories:
-            content = m[4]  # content
-            
-            # 检测决策（包含"决定"、"选择"等词）
-            if any(w in content for w in ['决定', '选择', '确定', '完成', '创建', '配置']):
-                key_decisions.append(content[:100])
-            
-            # 检测行动项（包含"TODO"、"待办"等）
-            if any(w in content for w in ['TODO', '待办', '需要', '计划']):
-                action_items.append(content[:100])
-            
-            # 提取人名/角色（简单规则）
-            words = re.findall(r'[\u4e00-\u9fa5]{2,4}', content)
-            for w in words:
-                if w in ['大王', 'Marvin', '用户', '管理员']:
-                    people.add(w)
-            
-            # 提取主题
-            if m[3]:  # category
-                topics.add(m[3])
-        
-        # 3. 生成摘要文本
-        content_summary = f"今日共记录 {len(memories)} 条记忆。"
-        if key_decisions:
-            content_summary += f" 关键决策: {len(key_decisions)} 项。"
-        if action_items:
-            content_summary += f" 待办事项: {len(action_items)} 项。"
-        
-        # 4. 保存摘要
-        sql = """
-        INSERT INTO memory_summaries 
-        (summary_date, content_summary, key_decisions, action_items, people_mentioned, topics)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        ON CONFLICT (summary_date) DO UPDATE SET
-        content_summary = EXCLUDED.content_summary,
-        key_decisions = EXCLUDED.key_decisions,
-        action_items = EXCLUDED.action_items
+        return {
+            'date': date_str,
+            'total_memories': row[1],
+            'decision_count': row[2],
+            'action_count': row[3],
+            'key_decisions': texts(row[4]),
+            'action_items': texts(row[5]),
+            'people': row[6] or [],
+            'topics': row[7] or [],
+            'content_summary': row[8]
+        }
+    
+    def backfill_summaries(self, start: str = None, end: str = None,
+                           workers: int = SUMMARY_BACKFILL_WORKERS):
+        """按日期范围并行重算历史摘要 [start, end]，默认覆盖全部记忆
+        
+        每个任务重算 SUMMARY_BACKFILL_DAYS 天，使用 created_at 范围谓词走索引。
         """
+        if not RDS_AVAILABLE:
+            return None
         
         with self.rds.get_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute(sql, (
-                    date_str,
-                    content_summary,
-                    json.dumps(key_decisions[:10]),
-                    json.dumps(action_items[:10]),
-                    json.dumps(list(people)),
-                    json.dumps(list(topics))
-                ))
+                cursor.execute("SELECT min(created_at)::date, max(created_at)::date FROM memories")
+                first, last = cursor.fetchone()
+        
+        first = datetime.strptime(start, '%Y-%m-%d').date() if start else first
+        last = datetime.strptime(end, '%Y-%m-%d').date() if end else last
+        if not first or not last or first > last:
+            return {'ranges': 0, 'days': 0, 'seconds': 0.0}
+        
+        ranges = []
+        day = first
+        while day <= last:
+            upper = min(day + timedelta(days=SUMMARY_BACKFILL_DAYS), last + timedelta(days=1))
+            ranges.append((day, upper))
+            day = upper
+        
+        def refresh(date_range):
+            with self.rds.get_connection() as conn:
+                with conn.cursor() as cursor:
+                    # 每个任务重算多天，可能超过连接池的语句超时（SET LOCAL 随事务结束恢复）
+                    cursor.execute("SET LOCAL statement_timeout = 0")
+                    cursor.execute("SELECT memory_summary_refresh(%s, %s)", date_range)
+                    days = cursor.fetchone()[0]
                 conn.commit()
+            return days
         
-        return {
-            'date': date_str,
-            'total_memories': len(memories),
-            'key_decisions': key_decisions,
-            'action_items': action_items,
-            'people': list(people),
-            'topics': list(topics)
-        }
+        began = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            days = sum(pool.map(refresh, ranges))
+        return {'ranges': len(ranges), 'days': days, 'seconds': round(time.perf_counter() - began, 2)}
+    
+    def _detect_search_features(self, cursor):
+        """检查检索列与三元组索引是否已创建（init 之后才有）"""
+        if self._search_features is None:
+            cursor.execute("""
+                SELECT EXISTS (
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_schema = current_schema()
+                      AND table_name = 'memories' AND column_name = 'search_vector'
+                ), to_regclass('idx_memories_content_trgm') IS NOT NULL
+            """)
+            vector, trigram = cursor.fetchone()
+            self._search_features = {'search_vector': vector, 'trigram': trigram}
+        return self._search_features
     
     def hybrid_search(self, query: str, top_k: int = 10):
-        """混合检索：向量 + 关键词 + SQL"""
+        """混合检索：全文(GIN) + 模糊匹配(三元组索引) + 关联记忆，RRF 在 SQL 内融合
+
+        返回 memories 行（末尾附加 rrf_score），一次数据库往返。
+        未执行 init 创建检索列时退回旧的三次查询实现。
+        """
         if not RDS_AVAILABLE:
             return []
         
-        results = []
-        
-        # 1. 全文搜索（PostgreSQL内置）
-        sql_fts = """
-        SELECT *, ts_rank(to_tsvector('simple', content), plainto_tsquery('simple', %s)) as rank
-        FROM memories
-        WHERE to_tsvector('simple', content) @@ plainto_tsquery('simple', %s)
-        ORDER BY rank DESC
-        LIMIT %s
-        """
-        
-        # 2. 关键词模糊匹配
-        sql_like = """
-        SELECT * FROM memories
-        WHERE content ILIKE %s OR keywords::text ILIKE %s
-        ORDER BY importance_score DESC, created_at DESC
-        LIMIT %s
-        """
-        
-        # 3. 关联记忆搜索（通过关键词匹配）
-        sql_related = """
-        SELECT m.*, ml.strength as link_score
-        FROM memories m
-        JOIN memory_links ml ON m.id = ml.target_memory_id
-        WHERE ml.source_memory_id IN (
-            SELECT id FROM memories 
-            WHERE content ILIKE %s 
-            ORDER BY created_at DESC LIMIT 5
-        )
-        ORDER BY ml.strength DESC
-        LIMIT %s
-        """
-        
+        with self.rds.get_connection() as conn:
+            with conn.cursor() as cursor:
+                features = self._detect_search_features(cursor)
+                if features['search_vector']:
+                    cursor.execute(build_hybrid_sql(features['trigram']), {
+                        'query': query,
+                        'pattern': like_pattern(query),
+                        'depth': max(top_k, 20),
+                        'rrf_k': RRF_K,
+                        'top_k': top_k,
+                    })
+                    return cursor.fetchall()
+        
+        return self._hybrid_search_legacy(query, top_k)
+    
+    def _hybrid_search_legacy(self, query: str, top_k: int = 10):
+        """旧实现：三次查询（其中 ILIKE 为全表扫描）后在 Python 中 RRF 融合"""
         with self.rds.get_connection() as conn:
             with conn.cursor() as cursor:
                 # 执行三种搜索
                 try:
-                    cursor.execute(sql_fts, (query, query, top_k))
+                    cursor.execute(LEGACY_FTS_SQL, (query, query, top_k))
                     fts_results = cursor.fetchall()
                 except:
+                    conn.rollback()
                     fts_results = []
                 
-                cursor.execute(sql_like, (f'%{query}%', f'%{query}%', top_k))
+                cursor.execute(LEGACY_LIKE_SQL, (f'%{query}%', f'%{query}%', top_k))
                 like_results = cursor.fetchall()
                 
                 try:
-                    cursor.execute(sql_related, (f'%{query}%', top_k))
+                    cursor.execute(LEGACY_RELATED_SQL, (f'%{query}%', top_k))
                     related_results = cursor.fetchall()
                 except:
                     related_results = []
@@ -377,7 +696,7 @@ class MemoryOptimizer:
     
     def _reciprocal_rank_fusion(self, *result_lists):
         """RRF融合算法"""
-        k = 60  # RRF常数
+        k = RRF_K
         scores = {}
         
         for results in result_lists:
@@ -394,55 +713,25 @@ class MemoryOptimizer:
         return [r['item'] for r in sorted_results]
     
     def proactive_recall(self, query: str = None):
-        """主动回忆：基于当前查询和时间模式建议相关记忆"""
+        """主动回忆：基于当前查询和时间模式建议相关记忆
+        
+        时段建议来自按 (小时, 星期) 预计算的进程内缓存；查询关键词走 search_vector 索引，
+        同一组关键词的结果在缓存失效前复用。
+        """
         if not RDS_AVAILABLE:
             return []
         
-        suggestions = []
+        cache = get_recall_cache()
         now = datetime.now()
         
         # 1. 基于时间模式的建议
-        sql_pattern = """
-        SELECT category, SUM(access_count) as total
-        FROM memory_access_patterns
-        WHERE hour_of_day = %s AND day_of_week = %s
-        GROUP BY category
-        ORDER BY total DESC
-        LIMIT 3
-        """
-        
-        with self.rds.get_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(sql_pattern, (now.hour, now.weekday()))
-                patterns = cursor.fetchall()
-                
-                for p in patterns:
-                    # 获取该类别的最新记忆
-                    cursor.execute("""
-                        SELECT * FROM memories
-                        WHERE category = %s
-                        ORDER BY last_accessed DESC NULLS LAST
-                        LIMIT 2
-                    """, (p[0],))
-                    suggestions.extend(cursor.fetchall())
+        suggestions = cache.suggest(now.hour, now.weekday())
         
         # 2. 基于查询关键词的建议
         if query:
-            # 提取关键词
             keywords = self._extract_keywords(query)
             if keywords:
-                sql = """
-                SELECT * FROM memories
-                WHERE content ILIKE ANY(%s)
-                ORDER BY importance_score DESC, created_at DESC
-                LIMIT 3
-                """
-                
-                with self.rds.get_connection() as conn:
-                    with conn.cursor() as cursor:
-                        patterns = [f'%{k}%' for k in keywords[:3]]
-                        cursor.execute(sql, (patterns,))
-                        suggestions.extend(cursor.fetchall())
+                suggestions.extend(cache.keyword_matches(keywords))
         
         # 去重
         seen = set()
@@ -464,23 +753,11 @@ class MemoryOptimizer:
         return [w for w, c in sorted(freq.items(), key=lambda x: x[1], reverse=True)[:5]]
     
     def update_access_pattern(self, category: str):
-        """更新访问模式统计"""
+        """更新访问模式统计（由访问统计累加器合并后批量写入）"""
         if not RDS_AVAILABLE:
             return
         
-        now = datetime.now()
-        sql = """
-        INSERT INTO memory_access_patterns (hour_of_day, day_of_week, category, access_count, last_accessed)
-        VALUES (%s, %s, %s, 1, NOW())
-        ON CONFLICT (hour_of_day, day_of_week, category) DO UPDATE
-        SET access_count = memory_access_patterns.access_count + 1,
-            last_accessed = NOW()
-        """
-        
-        with self.rds.get_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(sql, (now.hour, now.weekday(), category))
-                conn.commit()
+        get_access_tracker().record_pattern(category)
     
     def auto_maintain(self):
         """自动维护：清理过期记忆、升级重要记忆"""
@@ -538,8 +815,9 @@ def main():
         print("🧠 记忆层优化系统")
         print("\n用法:")
         print("  python3 memory_optimizer.py init              # 初始化增强表")
-        print("  python3 memory_optimizer.py link              # 自动创建记忆关联")
-        print("  python3 memory_optimizer.py summary [日期]    # 生成每日摘要")
+        print("  python3 memory_optimizer.py link [天数]       # 自动创建记忆关联（默认全表）")
+        print("  python3 memory_optimizer.py summary [日期]    # 查看每日摘要")
+        print("  python3 memory_optimizer.py backfill [起] [止] # 重算历史摘要（默认全部）")
         print("  python3 memory_optimizer.py search <关键词>   # 混合检索")
         print("  python3 memory_optimizer.py suggest [查询]    # 主动回忆")
         print("  python3 memory_optimizer.py maintain          # 自动维护")
@@ -551,11 +829,17 @@ def main():
     cmd = sys.argv[1]
     
     if cmd == 'init':
-        optimizer.init_enhanced_tables()
+        if not optimizer.init_enhanced_tables():
+            sys.exit(1)
     
     elif cmd == 'link':
-        count = optimizer.auto_link_memories()
-        print(f"✅ 创建了 {count} 条记忆关联")
+        days = int(sys.argv[2]) if len(sys.argv) > 2 else None
+        count = optimizer.auto_link_memories(days)
+        stats = optimizer.last_link_stats
+        print(f"✅ 创建/更新了 {count} 条记忆关联")
+        if stats:
+            print(f"   记忆 {stats['memories']} 条, 模式 {stats['mode']}, "
+                  f"候选对 {stats['candidates']}, 超过阈值 {stats['links']}")
     
     elif cmd == 'summary':
         date = sys.argv[2] if len(sys.argv) > 2 else None
@@ -563,11 +847,18 @@ def main():
         if result:
             print(f"📅 {result['date']} 摘要")
             print(f"记忆数量: {result['total_memories']}")
-            print(f"关键决策: {len(result['key_decisions'])}")
-            print(f"待办事项: {len(result['action_items'])}")
+            print(f"关键决策: {result['decision_count']}")
+            print(f"待办事项: {result['action_count']}")
         else:
             print("📭 该日期无记忆")
     
+    elif cmd == 'backfill':
+        start = sys.argv[2] if len(sys.argv) > 2 else None
+        end = sys.argv[3] if len(sys.argv) > 3 else start
+        stats = optimizer.backfill_summaries(start, end)
+        if stats is not None:
+            print(f"✅ 重算 {stats['days']} 天摘要, {stats['ranges']} 个日期段, 耗时 {stats['seconds']}s")
+    
     elif cmd == 'search':
         query = sys.argv[2]
         results = optimizer.hybrid_search(query)
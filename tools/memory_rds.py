@@ -5,14 +5,196 @@
 """
 
 import json
+import time
+import atexit
+import logging
+import threading
 from datetime import datetime
+from psycopg2.extras import execute_values
 from rds_manager import RDSManager
 
+logger = logging.getLogger('memory_rds')
+
+
+class AccessTracker:
+    """记忆访问统计累加器 - 合并后批量写回 RDS
+
+    检索命中的记忆只在内存中累加 (id -> 次数, 最后访问时间)，同时按
+    (小时, 星期, 分类) 累加访问模式。后台线程每 interval 秒（或积累超过
+    max_pending 个不同 id 时）用一条 UPDATE ... FROM (VALUES ...) 更新 memories，
+    并在同一事务内 upsert memory_access_patterns。进程退出时自动刷新。
+    """
+    
+    def __init__(self, interval=5.0, max_pending=1000):
+        self.interval = interval
+        self.max_pending = max_pending
+        
+        self._rds = None
+        self._hits = {}       # memory_id -> [次数, 最后访问时间]
+        self._patterns = {}   # (hour, weekday, category) -> [次数, 最后访问时间]
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._patterns_table = None  # memory_access_patterns 是否存在（首次刷新时检查）
+        self._stats = {
+            'recorded': 0,
+            'flushes': 0,
+            'rows_updated': 0,
+            'failed_flushes': 0,
+            'flush_ms_max': 0.0,
+        }
+        
+        self._thread = threading.Thread(target=self._run, name='memory-access', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+    
+    def _get_rds(self):
+        if self._rds is None:
+            self._rds = RDSManager()
+        return self._rds
+    
+    def record(self, memories):
+        """记录一批被访问的记忆行（SELECT * FROM memories 的结果），立即返回"""
+        now = datetime.now()
+        with self._cond:
+            if self._closed:
+                return
+            for m in memories:
+                self._merge(self._hits, m[0], 1, now)
+                self._merge(self._patterns, (now.hour, now.weekday(), m[3]), 1, now)
+                self._stats['recorded'] += 1
+            if len(self._hits) >= self.max_pending:
+                self._cond.notify()
+    
+    def record_pattern(self, category, count=1):
+        """只记录访问模式（不对应具体记忆）"""
+        now = datetime.now()
+        with self._cond:
+            if not self._closed:
+                self._merge(self._patterns, (now.hour, now.weekday(), category), count, now)
+    
+    @staticmethod
+    def _merge(target, key, count, when):
+        entry = target.get(key)
+        if entry is None:
+            target[key] = [count, when]
+        else:
+            entry[0] += count
+            entry[1] = max(entry[1], when)
+    
+    def _run(self):
+        """后台刷新线程：定时或积累过多时触发"""
+        while True:
+            with self._cond:
+                if not self._closed and len(self._hits) < self.max_pending:
+                    self._cond.wait(self.interval)
+                if self._closed:
+                    return
+            self.flush()
+    
+    def flush(self):
+        """立即写回累加的访问统计，返回更新的记忆行数"""
+        with self._flush_lock:
+            with self._cond:
+                hits, self._hits = self._hits, {}
+                patterns, self._patterns = self._patterns, {}
+            if not hits and not patterns:
+                return 0
+            
+            start = time.monotonic()
+            try:
+                updated = self._write(hits, patterns)
+            except Exception as e:
+                logger.warning(f"访问统计写回失败，下次重试: {e}")
+                # 放回缓冲，与期间新增的计数合并
+                with self._cond:
+                    for key, (count, when) in hits.items():
+                        self._merge(self._hits, key, count, when)
+                    for key, (count, when) in patterns.items():
+                        self._merge(self._patterns, key, count, when)
+                self._stats['failed_flushes'] += 1
+                return 0
+            
+            elapsed_ms = (time.monotonic() - start) * 1000
+            self._stats['flushes'] += 1
+            self._stats['rows_updated'] += updated
+            self._stats['flush_ms_max'] = max(self._stats['flush_ms_max'], elapsed_ms)
+            return updated
+    
+    def _write(self, hits, patterns):
+        """一个事务内完成 memories 与 memory_access_patterns 的更新"""
+        # 按 id 排序加锁，避免多个进程同时刷新时死锁
+        hit_rows = [(memory_id, count, when) for memory_id, (count, when) in sorted(hits.items())]
+        pattern_rows = [(hour, weekday, category, count, when)
+                        for (hour, weekday, category), (count, when) in sorted(
+                            patterns.items(), key=lambda kv: (kv[0][0], kv[0][1], kv[0][2] or ''))]
+        
+        with self._get_rds().get_connection() as conn:
+            with conn.cursor() as cursor:
+                updated = 0
+                if hit_rows:
+                    execute_values(cursor, """
+                        UPDATE memories AS m
+                        SET access_count = COALESCE(m.access_count, 0) + v.hits,
+                            last_accessed = GREATEST(m.last_accessed, v.last_accessed)
+                        FROM (VALUES %s) AS v(id, hits, last_accessed)
+                        WHERE m.id = v.id
+                    """, hit_rows, template="(%s, %s, %s::timestamp)", page_size=len(hit_rows))
+                    updated = cursor.rowcount
+                
+                if pattern_rows:
+                    if self._patterns_table is None:
+                        cursor.execute("SELECT to_regclass('memory_access_patterns') IS NOT NULL")
+                        self._patterns_table = cursor.fetchone()[0]
+                    if self._patterns_table:
+                        execute_values(cursor, """
+                            INSERT INTO memory_access_patterns
+                            (hour_of_day, day_of_week, category, access_count, last_accessed)
+                            VALUES %s
+                            ON CONFLICT (hour_of_day, day_of_week, category) DO UPDATE
+                            SET access_count = memory_access_patterns.access_count + EXCLUDED.access_count,
+                                last_accessed = GREATEST(memory_access_patterns.last_accessed,
+                                                         EXCLUDED.last_accessed)
+                        """, pattern_rows, page_size=len(pattern_rows))
+            conn.commit()
+        return updated
+    
+    def get_stats(self):
+        s = dict(self._stats)
+        s['pending_ids'] = len(self._hits)
+        s['pending_patterns'] = len(self._patterns)
+        s['flush_ms_max'] = round(s['flush_ms_max'], 2)
+        return s
+    
+    def close(self):
+        """停止后台线程并写回剩余统计"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=5)
+        self.flush()
+
+
+_access_tracker = None
+_tracker_lock = threading.Lock()
+
+def get_access_tracker(**kwargs):
+    """获取进程内共享的访问统计累加器（首次调用时的参数生效）"""
+    global _access_tracker
+    with _tracker_lock:
+        if _access_tracker is None:
+            _access_tracker = AccessTracker(**kwargs)
+    return _access_tracker
+
+
 class MemoryRDS:
     """记忆RDS管理"""
     
     def __init__(self):
         self.rds = RDSManager()
+        self.access = get_access_tracker()
     
     def add_memory(self, content, category='general', session_key=None, importance=0.5, source=None):
         """添加记忆"""
@@ -88,24 +270,10 @@ class MemoryRDS:
             with conn.cursor() as cursor:
                 cursor.execute(sql, params)
                 results = cursor.fetchall()
-                
-                # 更新访问次数和时间
-                for r in results:
-                    self._update_access(r[0])
-                
-                return results
-    
-    def _update_access(self, memory_id):
-        """更新访问统计"""
-        sql = """
-        UPDATE memories 
-        SET last_accessed = NOW(), access_count = access_count + 1
-        WHERE id = %s
-        """
-        with self.rds.get_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(sql, (memory_id,))
-                conn.commit()
+        
+        # 访问次数和时间由累加器合并后批量写回
+        self.access.record(results)
+        return results
     
     def get_recent_memories(self, hours=24, limit=50):
         """获取最近记忆"""
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+主动回忆候选缓存 - 按 (小时, 星期) 预计算，后台刷新
+
+- 时段部分: 一次查询算出全部 168 个时段的热门类别，再用一条 LATERAL 查询取每个类别
+  最近访问的记忆；结果保存在进程内字典中，查询时只是一次字典查找
+- 关键词部分: 与混合检索相同的 search_vector 索引（未执行 init 时退回 ILIKE），
+  结果按关键词缓存
+- 失效: 后台线程每 poll 秒读取 memories 的最大 id（主键索引，O(1)），有新记忆即重建；
+  否则最多 ttl 秒重建一次以反映访问统计的变化
+"""
+
+import time
+import atexit
+import logging
+import threading
+from collections import OrderedDict, defaultdict
+
+from rds_manager import RDSManager
+
+logger = logging.getLogger('memory_recall')
+
+RECALL_TTL = 300            # 缓存最长有效期（秒）
+RECALL_POLL = 5             # 检查新记忆的间隔（秒）
+RECALL_CATEGORIES = 3       # 每个时段取访问最多的类别数
+RECALL_PER_CATEGORY = 2     # 每个类别取最近访问的记忆数
+RECALL_KEYWORD_LIMIT = 3    # 关键词建议条数
+KEYWORD_CACHE_SIZE = 256    # 缓存的关键词组合数
+
+BUCKET_CATEGORIES_SQL = """
+SELECT hour_of_day, day_of_week, category
+FROM (
+    SELECT hour_of_day, day_of_week, category,
+           row_number() OVER (PARTITION BY hour_of_day, day_of_week
+                              ORDER BY sum(access_count) DESC, category) AS rn
+    FROM memory_access_patterns
+    WHERE category IS NOT NULL
+    GROUP BY hour_of_day, day_of_week, category
+) t
+WHERE rn <= %s
+ORDER BY hour_of_day, day_of_week, rn
+"""
+
+# 每个类别最近访问的记忆（由 (category, last_accessed) 索引支持）
+FRESHEST_SQL = """
+SELECT m.*
+FROM unnest(%s::text[]) AS c(category)
+CROSS JOIN LATERAL (
+    SELECT * FROM memories
+    WHERE category = c.category
+    ORDER BY last_accessed DESC NULLS LAST
+    LIMIT %s
+) m
+"""
+
+KEYWORD_SQL = """
+SELECT * FROM memories
+WHERE search_vector @@ memory_search_query(%s)
+ORDER BY importance_score DESC, created_at DESC
+LIMIT %s
+"""
+
+LEGACY_KEYWORD_SQL = """
+SELECT * FROM memories
+WHERE content ILIKE ANY(%s)
+ORDER BY importance_score DESC, created_at DESC
+LIMIT %s
+"""
+
+
+class RecallCache:
+    """主动回忆候选缓存（进程内共享，后台线程刷新）"""
+
+    def __init__(self, ttl=RECALL_TTL, poll=RECALL_POLL):
+        self.ttl = ttl
+        self.poll = poll
+
+        self._rds = None
+        self._buckets = {}                # (hour, weekday) -> [memory row, ...]
+        self._keywords = OrderedDict()    # 关键词元组 -> [memory row, ...]（LRU）
+        self._token = None                # 构建时 memories 的最大 id
+        self._built_at = None
+        self._search_vector = False       # search_vector 列是否存在
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._stats = {
+            'refreshes': 0,
+            'invalidations': 0,
+            'failed_refreshes': 0,
+            'refresh_ms_max': 0.0,
+            'lookups': 0,
+            'keyword_hits': 0,
+            'keyword_queries': 0,
+        }
+
+        self._thread = threading.Thread(target=self._run, name='memory-recall', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _get_rds(self):
+        if self._rds is None:
+            self._rds = RDSManager()
+        return self._rds
+
+    # ---------- 查询 ----------
+
+    def suggest(self, hour, weekday):
+        """某时段热门类别的最新记忆（首次调用时同步构建）"""
+        if self._built_at is None:
+            self.refresh()
+        self._stats['lookups'] += 1
+        return list(self._buckets.get((hour, weekday), ()))
+
+    def keyword_matches(self, keywords, limit=RECALL_KEYWORD_LIMIT):
+        """关键词命中的记忆；同一组关键词在缓存失效前只查询一次"""
+        key = tuple(keywords[:3])
+        with self._lock:
+            rows = self._keywords.get(key)
+            if rows is not None:
+                self._keywords.move_to_end(key)
+                self._stats['keyword_hits'] += 1
+                return list(rows)
+
+        rows = self._query_keywords(key, limit)
+        with self._lock:
+            self._keywords[key] = rows
+            if len(self._keywords) > KEYWORD_CACHE_SIZE:
+                self._keywords.popitem(last=False)
+        return list(rows)
+
+    def _query_keywords(self, keywords, limit):
+        self._stats['keyword_queries'] += 1
+        with self._get_rds().get_connection() as conn:
+            with conn.cursor() as cursor:
+                if self._search_vector:
+                    cursor.execute(KEYWORD_SQL, (' '.join(keywords), limit))
+                else:
+                    cursor.execute(LEGACY_KEYWORD_SQL, ([f'%{k}%' for k in keywords], limit))
+                return cursor.fetchall()
+
+    # ---------- 刷新 ----------
+
+    def _run(self):
+        """后台线程：有新记忆或超过 ttl 时重建"""
+        while True:
+            with self._cond:
+                if not self._closed:
+                    self._cond.wait(self.poll)
+                if self._closed:
+                    return
+            if self._built_at is None:
+                continue  # 尚未被使用，不预先占用连接
+            try:
+                expired = time.monotonic() - self._built_at >= self.ttl
+                if expired or self._current_token() != self._token:
+                    if not expired:
+                        self._stats['invalidations'] += 1
+                    self.refresh()
+            except Exception as e:
+                logger.warning(f"主动回忆缓存检查失败: {e}")
+
+    def _current_token(self):
+        with self._get_rds().get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT max(id) FROM memories")
+                return cursor.fetchone()[0]
+
+    def invalidate(self):
+        """进程内写入记忆后可直接调用，下次查询前重建"""
+        with self._lock:
+            self._built_at = None
+            self._keywords.clear()
+
+    def refresh(self):
+        """重建全部时段的候选，返回是否成功"""
+        with self._refresh_lock:
+            start = time.monotonic()
+            try:
+                with self._get_rds().get_connection() as conn:
+                    with conn.cursor() as cursor:
+                        cursor.execute("SELECT max(id) FROM memories")
+                        token = cursor.fetchone()[0]
+                        cursor.execute("""
+                            SELECT to_regclass('memory_access_patterns') IS NOT NULL,
+                                   EXISTS (SELECT 1 FROM information_schema.columns
+                                           WHERE table_name = 'memories' AND column_name = 'search_vector'
+                                             AND table_schema = ANY(current_schemas(false)))
+                        """)
+                        has_patterns, search_vector = cursor.fetchone()
+
+                        bucket_categories = defaultdict(list)
+                        if has_patterns:
+                            cursor.execute(BUCKET_CATEGORIES_SQL, (RECALL_CATEGORIES,))
+                            for hour, weekday, category in cursor.fetchall():
+                                bucket_categories[(hour, weekday)].append(category)
+
+                        fresh = defaultdict(list)
+                        categories = sorted({c for cats in bucket_categories.values() for c in cats})
+                        if categories:
+                            cursor.execute(FRESHEST_SQL, (categories, RECALL_PER_CATEGORY))
+                            for row in cursor.fetchall():
+                                fresh[row[3]].append(row)
+                    conn.commit()
+            except Exception as e:
+                logger.warning(f"主动回忆缓存刷新失败: {e}")
+                self._stats['failed_refreshes'] += 1
+                if self._built_at is None:
+                    self._built_at = time.monotonic()  # 避免每次查询都重试，等待后台线程
+                return False
+
+            buckets = {key: tuple(row for c in cats for row in fresh.get(c, ()))
+                       for key, cats in bucket_categories.items()}
+            with self._lock:
+                self._buckets = buckets
+                self._keywords.clear()
+                self._token = token
+                self._search_vector = search_vector
+                self._built_at = time.monotonic()
+
+            elapsed_ms = (time.monotonic() - start) * 1000
+            self._stats['refreshes'] += 1
+            self._stats['refresh_ms_max'] = max(self._stats['refresh_ms_max'], elapsed_ms)
+            return True
+
+    def get_stats(self):
+        s = dict(self._stats)
+        s['buckets'] = len(self._buckets)
+        s['cached_keywords'] = len(self._keywords)
+        s['age_s'] = round(time.monotonic() - self._built_at, 1) if self._built_at is not None else None
+        s['refresh_ms_max'] = round(s['refresh_ms_max'], 2)
+        return s
+
+    def close(self):
+        """停止后台线程"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=5)
+
+
+_recall_cache = None
+_cache_lock = threading.Lock()
+
+def get_recall_cache(**kwargs):
+    """获取进程内共享的主动回忆缓存（首次调用时的参数生效）"""
+    global _recall_cache
+    with _cache_lock:
+        if _recall_cache is None:
+            _recall_cache = RecallCache(**kwargs)
+    return _recall_cache
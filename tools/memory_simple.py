@@ -1,89 +1,363 @@
 #!/usr/bin/env python3
 """
 增强记忆搜索 - 纯本地实现
-无需外部API，使用关键词+上下文匹配
+无需外部API，BM25 排序 + 位置倒排索引
+
+- 分词: 英文/数字按词切分，中文按字二元组 (bigram) 切分，查询与文档一致
+- 排序: BM25，文档长度、文档频率随索引增量维护
+- 短语: 查询中用双引号包裹的部分必须按顺序连续出现（位置倒排表校验）
+- Top-K: MaxScore 提前终止，跳过不可能进入前 K 的文档
 """
 
 import os
 import re
-import json
+import math
+import heapq
+import fcntl
+import hashlib
+import pickle
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
-from collections import defaultdict
 
 MEMORY_DIR = Path("/root/.openclaw/workspace/memory")
 MEMORY_FILE = Path("/root/.openclaw/workspace/MEMORY.md")
-INDEX_FILE = Path("/root/.openclaw/workspace/config/memory_index.json")
+INDEX_FILE = Path("/root/.openclaw/workspace/config/memory_index.bin")
+INDEX_VERSION = 2
+JOURNAL_LIMIT = 200  # 增量日志超过该条数时合并为新快照
+
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+STOPWORDS = {'the', 'a', 'an', 'is', 'are', 'was', 'were', 'be', 'been',
+             '的', '了', '和', '是', '在', '有', '我', '你', '他', '它',
+             'this', 'that', 'these', 'those', 'to', 'of', 'in', 'for',
+             'with', 'on', 'at', 'by', 'from', 'as', 'it', 'its'}
+
+TOKEN_RE = re.compile(r'[a-z0-9_]+|[\u4e00-\u9fff]+')
+PHRASE_RE = re.compile(r'"([^"]+)"')
+
+
+def tokenize(text):
+    """分词，返回 [(词项, 位置)]
+
+    中文连续字串切成相邻二元组（单字保留单字），停用词不产生词项但占位，
+    这样短语查询跨停用词时位置仍然对齐。
+    """
+    tokens = []
+    pos = 0
+    for m in TOKEN_RE.finditer(text.lower()):
+        run = m.group()
+        if run[0] >= '\u4e00':
+            if len(run) == 1:
+                if run not in STOPWORDS:
+                    tokens.append((run, pos))
+                pos += 1
+                continue
+            for i in range(len(run) - 1):
+                tokens.append((run[i:i + 2], pos))
+                pos += 1
+        else:
+            if run not in STOPWORDS and (len(run) >= 2 or run.isdigit()):
+                tokens.append((run, pos))
+            pos += 1
+    return tokens
+
 
 class SimpleMemory:
-    """简化版记忆系统"""
+    """简化版记忆系统
+
+    倒排索引持久化在 INDEX_FILE（pickle 快照），之后的变更以追加方式写入
+    同名 .journal 日志。启动时按文件 mtime/大小/内容哈希判断变化，只重新分词
+    发生变化的文件。多个进程共用索引时，分配文档ID、写日志与快照都在同名 .lock
+    文件锁内进行，加锁后先追上其他进程写入的日志。
+
+    倒排表: 词项 -> [文档ID数组, 位置偏移数组, 位置数组]
+    文档 i 的词频 = offsets[i+1] - offsets[i]，位置为 positions[offsets[i]:offsets[i+1]]
+    """
     
-    def __init__(self):
-        self.index = {'documents': {}, 'keywords': defaultdict(list)}
+    def __init__(self, memory_dir=MEMORY_DIR, memory_file=MEMORY_FILE, index_file=INDEX_FILE):
+        self.memory_dir = Path(memory_dir)
+        self.memory_file = Path(memory_file)
+        self.index_file = Path(index_file)
+        self.journal_file = self.index_file.with_suffix('.journal')
+        self.lock_file = self.index_file.with_suffix('.lock')
+        self._reset()
         self._build_index()
     
+    def _reset(self):
+        """清空内存中的索引状态"""
+        self.index = {
+            'documents': {},   # doc_id -> 文档
+            'postings': {},    # 词项 -> [docs, offsets, positions]
+            'df': {},          # 词项 -> 包含该词项的有效文档数
+            'max_tf': {},      # 词项 -> 最大词频（MaxScore 上界）
+            'total_length': 0,
+        }
+        self.files = {}          # filename -> {'mtime_ns', 'size', 'hash', 'doc_ids'}
+        self._next_id = 0
+        self._dead_postings = 0  # 倒排表中已删除文档的条目数
+        self._journal_entries = 0
+        self._journal_offset = 0     # 已重放到的日志字节位置
+        self._snapshot_stamp = None  # 已加载快照的 (inode, mtime)，其他进程重写快照后会变化
+        self._needs_snapshot = False
+    
     def _build_index(self):
-        """构建关键词索引"""
-        print("🔄 构建记忆索引...")
-        
-        docs_to_index = []
+        """加载持久化索引，并增量更新有变化的文件"""
+        with self._locked():
+            self._load_index()
+            updated = self._refresh_all()
         
+        print(f"✅ 索引就绪: {len(self.index['documents'])} 段落, "
+              f"{len(self.index['df'])} 词项 (更新 {updated} 个文件)")
+    
+    def _refresh_all(self):
+        """在锁内调用：重新分词有变化的文件，必要时合并为新快照，返回更新的文件数"""
+        current = {}
         # 加载 MEMORY.md
-        if MEMORY_FILE.exists():
-            with open(MEMORY_FILE, 'r', encoding='utf-8') as f:
-                docs_to_index.append(('MEMORY.md', f.read()))
+        if self.memory_file.exists():
+            current['MEMORY.md'] = self.memory_file
         
         # 加载 memory/*.md
-        for md_file in sorted(MEMORY_DIR.glob("*.md")):
-            with open(md_file, 'r', encoding='utf-8') as f:
-                docs_to_index.append((md_file.name, f.read()))
-        
-        # 索引每个文档
-        for filename, content in docs_to_index:
-            # 分割成段落
-            paragraphs = [p.strip() for p in re.split(r'\n\n+', content) if len(p.strip()) > 20]
-            
-            for i, para in enumerate(paragraphs):
-                doc_id = f"{filename}#{i}"
-                
-                # 提取关键词
-                words = self._extract_keywords(para)
-                
-                self.index['documents'][doc_id] = {
-                    'id': doc_id,
-                    'filename': filename,
-                    'content': para[:500],  # 限制长度
-                    'keywords': words,
-                    'word_count': len(para.split()),
-                    'timestamp': self._extract_date(filename, para)
-                }
-                
-                # 反向索引
-                for word in words:
-                    self.index['keywords'][word].append(doc_id)
-        
-        print(f"✅ 索引完成: {len(self.index['documents'])} 段落, {len(self.index['keywords'])} 关键词")
-    
-    def _extract_keywords(self, text):
-        """提取关键词"""
-        # 清理文本
-        text = re.sub(r'[^\w\u4e00-\u9fa5\s]', ' ', text)  # 保留中文和英文
-        words = text.lower().split()
-        
-        # 过滤停用词
-        stopwords = {'the', 'a', 'an', 'is', 'are', 'was', 'were', 'be', 'been', 
-                     '的', '了', '和', '是', '在', '有', '我', '你', '他', '它',
-                     'this', 'that', 'these', 'those', 'to', 'of', 'in', 'for',
-                     'with', 'on', 'at', 'by', 'from', 'as', 'it', 'its'}
-        
-        # 过滤短词和停用词，但保留中文
-        keywords = []
-        for w in words:
-            if len(w) >= 2 or any('\u4e00' <= c <= '\u9fff' for c in w):
-                if w not in stopwords:
-                    keywords.append(w)
-        
-        return list(set(keywords))  # 去重
+        for md_file in sorted(self.memory_dir.glob("*.md")):
+            current[md_file.name] = md_file
+        
+        updated = 0
+        for filename, path in current.items():
+            if self._refresh_file(filename, path):
+                updated += 1
+        
+        for filename in [f for f in self.files if f not in current]:
+            self._record(('remove', filename))
+            updated += 1
+        
+        if self._needs_snapshot or self._journal_entries > JOURNAL_LIMIT \
+                or self._dead_postings > len(self.index['documents']):
+            self._save_snapshot()
+        return updated
+    
+    # ---------- 持久化 ----------
+    
+    @contextmanager
+    def _locked(self):
+        """跨进程互斥（文件锁）"""
+        self.lock_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_file, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+    
+    def _stamp(self):
+        try:
+            st = self.index_file.stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns)
+    
+    def _catch_up(self):
+        """在锁内调用：快照被其他进程重写过则整体重新加载，否则只重放新追加的日志"""
+        if self._stamp() != self._snapshot_stamp:
+            self._reset()
+            self._load_index()
+        else:
+            self._replay_journal()
+    
+    def _load_index(self):
+        """读取快照并重放增量日志"""
+        try:
+            self._snapshot_stamp = self._stamp()
+            with open(self.index_file, 'rb') as f:
+                snapshot = pickle.load(f)
+            if snapshot.get('version') != INDEX_VERSION:
+                raise ValueError("索引版本不匹配")
+        except (FileNotFoundError, EOFError, ValueError, pickle.UnpicklingError):
+            self._needs_snapshot = True
+            return
+        
+        self.files = snapshot['files']
+        self.index = snapshot['index']
+        self._next_id = snapshot['next_id']
+        self._replay_journal()
+        
+    def _replay_journal(self):
+        """从上次读到的位置重放增量日志"""
+        try:
+            with open(self.journal_file, 'rb') as f:
+                f.seek(self._journal_offset)
+                while True:
+                    try:
+                        self._apply(pickle.load(f))
+                        self._journal_entries += 1
+                        self._journal_offset = f.tell()
+                    except EOFError:
+                        break
+                    except (pickle.UnpicklingError, ValueError, TypeError):
+                        # 日志末尾写了一半的记录：重写快照时丢弃
+                        self._needs_snapshot = True
+                        break
+        except FileNotFoundError:
+            pass
+    
+    def _save_snapshot(self):
+        """压缩倒排表（剔除已删除文档）并原子写入快照，清空增量日志"""
+        documents = self.index['documents']
+        if self._dead_postings:
+            for term in list(self.index['postings']):
+                docs, offsets, positions = self.index['postings'][term]
+                new_docs, new_offsets, new_positions = array('I'), array('I', [0]), array('I')
+                max_tf = 0
+                for i, doc_id in enumerate(docs):
+                    if doc_id in documents:
+                        new_docs.append(doc_id)
+                        new_positions.extend(positions[offsets[i]:offsets[i + 1]])
+                        new_offsets.append(len(new_positions))
+                        max_tf = max(max_tf, offsets[i + 1] - offsets[i])
+                if new_docs:
+                    self.index['postings'][term] = [new_docs, new_offsets, new_positions]
+                    self.index['max_tf'][term] = max_tf
+                else:
+                    del self.index['postings'][term]
+                    self.index['max_tf'].pop(term, None)
+            self._dead_postings = 0
+        
+        self.index_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_file.with_suffix('.tmp')
+        with open(tmp, 'wb') as f:
+            pickle.dump({
+                'version': INDEX_VERSION,
+                'files': self.files,
+                'index': self.index,
+                'next_id': self._next_id,
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.index_file)
+        self._snapshot_stamp = self._stamp()
+        
+        with open(self.journal_file, 'wb'):
+            pass
+        self._journal_entries = 0
+        self._journal_offset = 0
+        self._needs_snapshot = False
+    
+    def _record(self, entry):
+        """追加到增量日志并应用一条变更"""
+        if not self._needs_snapshot:  # 需要重写快照时不必记日志
+            with open(self.journal_file, 'ab') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+                self._journal_offset = f.tell()
+            self._journal_entries += 1
+        self._apply(entry)
+    
+    def _apply(self, entry):
+        """变更记录: ('file', filename, meta, docs)、('touch', filename, meta)
+        或 ('remove', filename)"""
+        kind, filename = entry[0], entry[1]
+        
+        if kind == 'touch':
+            self.files[filename] = entry[2]
+            return
+        
+        old = self.files.pop(filename, None)
+        if old:
+            for doc_id in old['doc_ids']:
+                self._remove_document(doc_id)
+        
+        if kind == 'file':
+            meta, docs = entry[2], entry[3]
+            self.files[filename] = meta
+            for doc in docs:
+                self._add_document(doc)
+    
+    def _add_document(self, doc):
+        """写入倒排表；文档ID单调递增，倒排表天然有序"""
+        index = self.index
+        doc_id = doc['doc_id']
+        terms = doc['positions']
+        
+        stored = {k: v for k, v in doc.items() if k != 'positions'}
+        stored['terms'] = frozenset(terms)
+        index['documents'][doc_id] = stored
+        index['total_length'] += doc['length']
+        
+        for term, positions in terms.items():
+            posting = index['postings'].get(term)
+            if posting is None:
+                posting = index['postings'][term] = [array('I'), array('I', [0]), array('I')]
+            posting[0].append(doc_id)
+            posting[2].extend(positions)
+            posting[1].append(len(posting[2]))
+            index['df'][term] = index['df'].get(term, 0) + 1
+            if len(positions) > index['max_tf'].get(term, 0):
+                index['max_tf'][term] = len(positions)
+        
+        self._next_id = max(self._next_id, doc_id + 1)
+    
+    def _remove_document(self, doc_id):
+        """标记删除：更新统计量，倒排表中的残留条目在下次写快照时清理"""
+        index = self.index
+        doc = index['documents'].pop(doc_id, None)
+        if not doc:
+            return
+        index['total_length'] -= doc['length']
+        for term in doc['terms']:
+            index['df'][term] -= 1
+            if not index['df'][term]:
+                del index['df'][term]
+        self._dead_postings += len(doc['terms'])
+    
+    # ---------- 分词与索引 ----------
+    
+    def _refresh_file(self, filename, path):
+        """文件有变化时重新分词，返回是否更新"""
+        st = path.stat()
+        meta = self.files.get(filename)
+        if meta and meta['mtime_ns'] == st.st_mtime_ns and meta['size'] == st.st_size:
+            return False
+        
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        digest = hashlib.sha1(content.encode('utf-8')).hexdigest()
+        
+        if meta and meta['hash'] == digest:
+            # 仅 mtime 变化（如 touch），内容未变
+            self._record(('touch', filename, {**meta, 'mtime_ns': st.st_mtime_ns, 'size': st.st_size}))
+            return False
+        
+        docs = self._tokenize_file(filename, content)
+        self._record(('file', filename, {
+            'mtime_ns': st.st_mtime_ns,
+            'size': st.st_size,
+            'hash': digest,
+            'doc_ids': [d['doc_id'] for d in docs],
+        }, docs))
+        return True
+    
+    def _tokenize_file(self, filename, content):
+        """切分段落并分配整数文档ID"""
+        # 分割成段落
+        paragraphs = [p.strip() for p in re.split(r'\n\n+', content) if len(p.strip()) > 20]
+        
+        docs = []
+        for i, para in enumerate(paragraphs):
+            tokens = tokenize(para)
+            positions = {}
+            for term, pos in tokens:
+                positions.setdefault(term, array('I')).append(pos)
+            docs.append({
+                'doc_id': self._next_id,
+                'id': f"{filename}#{i}",
+                'filename': filename,
+                'content': para[:500],  # 限制长度
+                'length': len(tokens),
+                'positions': positions,
+                'timestamp': self._extract_date(filename, para)
+            })
+            self._next_id += 1
+        return docs
     
     def _extract_date(self, filename, content):
         """提取日期"""
@@ -99,42 +373,188 @@ class SimpleMemory:
         
         return None
     
-    def search(self, query, top_k=5, context_lines=2):
-        """搜索记忆"""
-        query_words = self._extract_keywords(query)
-        
-        if not query_words:
+    # ---------- 检索 ----------
+    
+    def _idf(self, term):
+        n = len(self.index['documents'])
+        df = self.index['df'].get(term, 0)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+    
+    def _term_weights(self, terms):
+        """[(上界, 词项, idf, docs, offsets)]，按上界升序"""
+        weights = []
+        for term in terms:
+            if not self.index['df'].get(term):
+                continue
+            idf = self._idf(term)
+            max_tf = self.index['max_tf'][term]
+            # 文档长度取 0 时 BM25 词项得分最大，作为该词项的得分上界
+            upper = idf * max_tf * (BM25_K1 + 1) / (max_tf + BM25_K1 * (1 - BM25_B))
+            docs, offsets, _ = self.index['postings'][term]
+            weights.append((upper, term, idf, docs, offsets))
+        weights.sort(key=lambda w: w[0])
+        return weights
+    
+    def _length_norms(self):
+        """BM25 长度归一化中与文档相关的部分: k1 * (1 - b + b * dl / avgdl)"""
+        avgdl = self.index['total_length'] / max(len(self.index['documents']), 1) or 1.0
+        a = BM25_K1 * (1 - BM25_B)
+        c = BM25_K1 * BM25_B / avgdl
+        return lambda length: a + c * length
+    
+    def _top_k_maxscore(self, terms, k):
+        """MaxScore 文档级遍历
+
+        词项按得分上界升序排列；累计上界不超过当前第 K 名分数的词项为"非必要"词项，
+        候选文档只从必要词项的倒排表中产生，非必要词项仅对候选文档二分查找补分，
+        补分过程中一旦 得分 + 剩余上界 <= 门槛 即放弃该文档。
+        """
+        weights = self._term_weights(terms)
+        if not weights:
             return []
+        documents = self.index['documents']
+        norm = self._length_norms()
+        k1 = BM25_K1 + 1
+        
+        n = len(weights)
+        prefix = []
+        total = 0.0
+        for w in weights:
+            total += w[0]
+            prefix.append(total)
+        cursors = [0] * n
+        heap = []          # (score, doc_id)，最小堆
+        threshold = 0.0
+        essential = 0      # weights[:essential] 为非必要词项
         
-        # 计算匹配分数
-        scores = defaultdict(float)
-        matched_keywords = defaultdict(set)
+        while True:
+            candidate = None
+            for j in range(essential, n):
+                docs = weights[j][3]
+                if cursors[j] < len(docs) and (candidate is None or docs[cursors[j]] < candidate):
+                    candidate = docs[cursors[j]]
+            if candidate is None:
+                break
+            
+            doc = documents.get(candidate)
+            score = 0.0
+            if doc is not None:
+                dl_norm = norm(doc['length'])
+            for j in range(essential, n):
+                _, _, idf, docs, offsets = weights[j]
+                i = cursors[j]
+                if i < len(docs) and docs[i] == candidate:
+                    if doc is not None:
+                        tf = offsets[i + 1] - offsets[i]
+                        score += idf * tf * k1 / (tf + dl_norm)
+                    cursors[j] = i + 1
+            if doc is None:
+                continue  # 已删除的文档（快照合并前残留）
+            
+            for j in range(essential - 1, -1, -1):
+                if score + prefix[j] <= threshold:
+                    score = -1.0
+                    break
+                _, _, idf, docs, offsets = weights[j]
+                i = bisect_left(docs, candidate, cursors[j])
+                cursors[j] = i
+                if i < len(docs) and docs[i] == candidate:
+                    tf = offsets[i + 1] - offsets[i]
+                    score += idf * tf * k1 / (tf + dl_norm)
+            
+            if len(heap) < k:
+                heapq.heappush(heap, (score, candidate))
+            elif score > threshold:
+                heapq.heapreplace(heap, (score, candidate))
+            else:
+                continue
+            if len(heap) == k:
+                threshold = heap[0][0]
+                while essential < n and prefix[essential] <= threshold:
+                    essential += 1
+                if essential == n:
+                    break
         
-        for word in query_words:
-            for doc_id in self.index['keywords'].get(word, []):
-                scores[doc_id] += 1
-                matched_keywords[doc_id].add(word)
+        return sorted(((s, d) for s, d in heap if s > 0), reverse=True)
+    
+    def _score_all(self, terms, candidates=None):
+        """逐条累加 BM25（无提前终止），candidates 限定参与打分的文档"""
+        documents = self.index['documents']
+        norm = self._length_norms()
+        k1 = BM25_K1 + 1
+        scores = {}
+        for _, _, idf, docs, offsets in self._term_weights(terms):
+            for i, doc_id in enumerate(docs):
+                if candidates is not None and doc_id not in candidates:
+                    continue
+                doc = documents.get(doc_id)
+                if doc is None:
+                    continue
+                tf = offsets[i + 1] - offsets[i]
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * k1 / (tf + norm(doc['length']))
+        return scores
+    
+    def _phrase_matches(self, tokens):
+        """按顺序连续出现 tokens 的文档ID集合"""
+        postings = self.index['postings']
+        if any(term not in postings for term, _ in tokens):
+            return set()
+        base = tokens[0][1]
+        tokens = [(term, pos - base) for term, pos in tokens]
+        # 从最短的倒排表出发，其余词项二分查找
+        rarest = min(tokens, key=lambda t: len(postings[t[0]][0]))
         
-        # 归一化分数
-        for doc_id in scores:
-            doc = self.index['documents'][doc_id]
-            # 考虑关键词覆盖率和文档长度
-            coverage = len(matched_keywords[doc_id]) / len(query_words)
-            length_bonus = min(doc['word_count'] / 100, 1.0)  # 长度奖励
-            scores[doc_id] = (scores[doc_id] * coverage) * (1 + length_bonus * 0.2)
+        matches = set()
+        documents = self.index['documents']
+        for doc_id in postings[rarest[0]][0]:
+            if doc_id not in documents:
+                continue
+            positions = []
+            for term, rel in tokens:
+                docs, offsets, pos = postings[term]
+                i = bisect_left(docs, doc_id)
+                if i == len(docs) or docs[i] != doc_id:
+                    break
+                positions.append((rel, set(pos[offsets[i]:offsets[i + 1]])))
+            else:
+                first_rel, first = positions[0]
+                if any(all(p - first_rel + rel in s for rel, s in positions[1:]) for p in first):
+                    matches.add(doc_id)
+        return matches
+    
+    def search(self, query, top_k=5, context_lines=2, exhaustive=False):
+        """搜索记忆
+
+        查询中 "双引号" 包裹的部分按短语匹配；exhaustive=True 时不做提前终止
+        （用于基准对照）
+        """
+        terms = list(dict.fromkeys(term for term, _ in tokenize(query)))
+        if not terms:
+            return []
+        
+        candidates = None
+        for phrase in PHRASE_RE.findall(query):
+            tokens = tokenize(phrase)
+            if not tokens:
+                continue
+            matches = self._phrase_matches(tokens)
+            candidates = matches if candidates is None else candidates & matches
         
-        # 排序并返回前K个
-        sorted_results = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+        if candidates is None and not exhaustive:
+            ranked = self._top_k_maxscore(terms, top_k)
+        else:
+            scores = self._score_all(terms, candidates)
+            ranked = heapq.nlargest(top_k, ((s, d) for d, s in scores.items()))
         
         results = []
-        for doc_id, score in sorted_results[:top_k]:
+        for score, doc_id in ranked:
             doc = self.index['documents'][doc_id]
             results.append({
-                'id': doc_id,
+                'id': doc['id'],
                 'filename': doc['filename'],
                 'content': doc['content'],
                 'score': score,
-                'matched': list(matched_keywords[doc_id]),
+                'matched': [t for t in terms if t in doc['terms']],
                 'date': doc['timestamp']
             })
         
@@ -146,7 +566,7 @@ class SimpleMemory:
         date_str = datetime.now().strftime('%Y-%m-%d')
         
         filename = f"{date_str}_fact_{timestamp}.md"
-        filepath = MEMORY_DIR / filename
+        filepath = self.memory_dir / filename
         
         content = f"""# 自动提取记忆
 
@@ -159,23 +579,15 @@ class SimpleMemory:
 
 ---
 """
-        
-        MEMORY_DIR.mkdir(exist_ok=True)
+
+        self.memory_dir.mkdir(exist_ok=True)
         with open(filepath, 'w', encoding='utf-8') as f:
             f.write(content)
         
-        # 更新索引
-        words = self._extract_keywords(fact_text)
-        doc_id = f"{filename}#0"
-        self.index['documents'][doc_id] = {
-            'id': doc_id,
-            'filename': filename,
-            'content': fact_text,
-            'keywords': words,
-            'timestamp': date_str
-        }
-        for word in words:
-            self.index['keywords'][word].append(doc_id)
+        # 增量更新索引（追加一条日志记录，不重写整个索引）；先追上其他进程的日志再分配文档ID
+        with self._locked():
+            self._catch_up()
+            self._refresh_file(filename, filepath)
         
         return filename
     
@@ -208,7 +620,7 @@ def main():
     if len(sys.argv) < 2:
         print("🧠 增强记忆系统")
         print("\n用法:")
-        print("  python3 memory_simple.py search <查询>    # 搜索记忆")
+        print("  python3 memory_simple.py search <查询>    # 搜索记忆（\"短语\" 精确匹配）")
         print("  python3 memory_simple.py add <内容>       # 添加记忆")
         print("  python3 memory_simple.py recent [天数]    # 最近记忆")
         print("  python3 memory_simple.py stats            # 统计")
@@ -223,9 +635,11 @@ def main():
         print(f"\n🔍 搜索: '{query}'")
         print(f"找到 {len(results)} 条结果:\n")
         
+        best = results[0]['score'] if results else 0
         for i, r in enumerate(results, 1):
-            match_level = "🔴" if r['score'] > 2 else "🟡" if r['score'] > 1 else "🟢"
-            print(f"{i}. [{match_level}] {r['filename']}")
+            # BM25 分数没有固定量纲，按相对第一名的比例分级
+            match_level = "🔴" if r['score'] > 0.7 * best else "🟡" if r['score'] > 0.4 * best else "🟢"
+            print(f"{i}. [{match_level}] {r['filename']}  (BM25 {r['score']:.2f})")
             if r['date']:
                 print(f"   日期: {r['date']}")
             print(f"   匹配: {', '.join(r['matched'][:5])}")
@@ -247,12 +661,14 @@ def main():
             print(f"• [{doc.get('timestamp', 'N/A')}] {doc['content'][:80]}...")
     
     elif cmd == 'stats':
+        documents = memory.index['documents']
         print("📊 记忆统计")
-        print(f"   段落数: {len(memory.index['documents'])}")
-        print(f"   关键词: {len(memory.index['keywords'])}")
+        print(f"   段落数: {len(documents)}")
+        print(f"   词项数: {len(memory.index['df'])}")
+        print(f"   平均长度: {memory.index['total_length'] / max(len(documents), 1):.1f} 词项")
         
         # 文件统计
-        files = set(d['filename'] for d in memory.index['documents'].values())
+        files = set(d['filename'] for d in documents.values())
         print(f"   源文件: {len(files)}")
         
         # 最近更新
@@ -265,5 +681,6 @@ def main():
     else:
         print(f"未知命令: {cmd}")
 
+
 if __name__ == '__main__':
     main()
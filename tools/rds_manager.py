@@ -8,7 +8,8 @@ import json
 import os
 from datetime import datetime
 from pathlib import Path
-from contextlib import contextmanager
+
+from rds_pool import get_pool
 
 CONFIG_FILE = Path("/root/.openclaw/workspace/config/rds_config.json")
 
@@ -53,24 +54,13 @@ class RDSManager:
         self.config = config
         return config
     
-    @contextmanager
     def get_connection(self):
-        """获取数据库连接"""
-        import psycopg2
-        from psycopg2.extras import RealDictCursor
-        
-        conn = psycopg2.connect(
-            host=self.config['host'],
-            port=self.config['port'],
-            user=self.config['user'],
-            password=self.config['password'],
-            database=self.config['database'],
-            sslmode='disable'
-        )
-        try:
-            yield conn
-        finally:
-            conn.close()
+        """获取数据库连接（共享连接池，with 结束时自动归还）"""
+        return get_pool(self.config).get_connection()
+    
+    def get_pool_stats(self):
+        """连接池指标"""
+        return get_pool(self.config).get_stats()
     
     def init_database(self):
         """初始化所有表结构"""
@@ -312,6 +302,10 @@ def main():
                         print("\n已创建的表:")
                         for t in tables:
                             print(f"  - {t[0]}")
+            
+            stats = manager.get_pool_stats()
+            print(f"\n连接池: {stats['pool_size']}/{stats['maxconn']} "
+                  f"(借出 {stats['checkouts']} 次, 平均等待 {stats['wait_ms_avg']}ms)")
         except Exception as e:
             print(f"\n❌ 连接异常: {e}")
     
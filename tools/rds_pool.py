@@ -7,6 +7,7 @@ RDS连接池管理器 - 健壮版
 import json
 import os
 import time
+import threading
 import logging
 from pathlib import Path
 from contextlib import contextmanager
@@ -19,45 +20,93 @@ logger = logging.getLogger('rds_pool')
 
 CONFIG_FILE = Path("/root/.openclaw/workspace/config/rds_config.json")
 
+# 连接池参数
+POOL_MINCONN = 2
+POOL_MAXCONN = 10
+CHECKOUT_TIMEOUT = 30        # 等待空闲连接的最长时间（秒）
+HEALTH_CHECK_IDLE = 60       # 连接空闲超过该秒数才在取出时做 SELECT 1
+
+
+def _load_config_file():
+    """读取RDS配置文件"""
+    if CONFIG_FILE.exists():
+        with open(CONFIG_FILE, 'r') as f:
+            return json.load(f)
+    raise RuntimeError("RDS配置不存在")
+
+
+def _normalize_config(config):
+    """统一配置字段（兼容 database/dbname 两种写法）"""
+    return {
+        'host': config['host'],
+        'port': int(config.get('port') or 5432),
+        'user': config['user'],
+        'password': config.get('password', ''),
+        'database': config.get('database') or config.get('dbname'),
+        # 语句超时（毫秒）需在配置中显式开启；池被所有 RDSManager 共享，默认不限制
+        'statement_timeout_ms': config.get('statement_timeout_ms'),
+    }
+
+
+def _config_key(config):
+    return (config['host'], config['port'], config['database'], config['user'], config['statement_timeout_ms'])
+
 
 class RDSConnectionPool:
-    """RDS连接池 - 单例模式"""
+    """RDS连接池 - 按连接配置单例
+
+    同一组 host/port/database/user 在进程内只有一个连接池，
+    RDSManager、RobustRDSManager、MarvinDB 及所有 *_rds.py 工具共享。
+    """
     
-    _instance = None
-    _pool = None
-    _config = None
+    _instances = {}
+    _instances_lock = threading.Lock()
     
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-            cls._instance._initialized = False
-        return cls._instance
+    def __new__(cls, config=None):
+        config = _normalize_config(config or _load_config_file())
+        key = _config_key(config)
+        with cls._instances_lock:
+            instance = cls._instances.get(key)
+            if instance is None:
+                instance = super().__new__(cls)
+                instance._initialized = False
+                cls._instances[key] = instance
+        return instance
     
-    def __init__(self):
+    def __init__(self, config=None):
         if self._initialized:
             return
         
         self._initialized = True
-        self._load_config()
+        self._config = _normalize_config(config or _load_config_file())
+        self._pool = None
+        self._lock = threading.Lock()
+        # 限制同时借出的连接数，池满时阻塞等待而不是直接抛 PoolError
+        self._slots = threading.BoundedSemaphore(POOL_MAXCONN)
+        self._last_used = {}
+        self._metrics = {
+            'checkouts': 0,
+            'checkout_failures': 0,
+            'in_use': 0,
+            'peak_in_use': 0,
+            'wait_ms_total': 0.0,
+            'wait_ms_max': 0.0,
+            'health_checks': 0,
+            'discarded': 0,
+        }
         self._init_pool()
     
-    def _load_config(self):
-        """加载RDS配置"""
-        if CONFIG_FILE.exists():
-            with open(CONFIG_FILE, 'r') as f:
-                self._config = json.load(f)
-        else:
-            raise RuntimeError("RDS配置不存在")
-    
     def _init_pool(self):
         """初始化连接池"""
         try:
             import psycopg2
             from psycopg2 import pool
             
+            timeout = self._config['statement_timeout_ms']
+            options = {'options': f"-c statement_timeout={int(timeout)}"} if timeout else {}
             self._pool = psycopg2.pool.ThreadedConnectionPool(
-                minconn=2,
-                maxconn=10,  # 增加最大连接数
+                minconn=POOL_MINCONN,
+                maxconn=POOL_MAXCONN,
                 host=self._config['host'],
                 port=self._config['port'],
                 user=self._config['user'],
@@ -65,57 +114,162 @@ class RDSConnectionPool:
                 database=self._config['database'],
                 sslmode='disable',
                 connect_timeout=10,  # 连接超时10秒
-                options='-c statement_timeout=30000'  # 查询超时30秒
+                **options
             )
             logger.info("✅ RDS连接池初始化成功")
         except Exception as e:
             logger.error(f"❌ 连接池初始化失败: {e}")
             self._pool = None
     
-    @contextmanager
-    def get_connection(self, retries=3, delay=2):
-        """获取连接 - 带重试机制"""
-        conn = None
-        last_error = None
+    def _reset_pool(self):
+        """丢弃整个连接池（网络中断后重建）"""
+        with self._lock:
+            if self._pool:
+                try:
+                    self._pool.closeall()
+                except Exception:
+                    pass
+            self._pool = None
+            self._last_used.clear()
+    
+    def _is_healthy(self, conn):
+        """惰性健康检查：只检查已关闭或长时间空闲的连接"""
+        if conn.closed:
+            return False
+        
+        last_used = self._last_used.get(id(conn))
+        if last_used is not None and time.monotonic() - last_used < HEALTH_CHECK_IDLE:
+            return True
+        
+        self._count('health_checks')
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+    
+    def _checkout(self):
+        """从池中取出一个健康的连接"""
+        with self._lock:
+            if self._pool is None:
+                self._init_pool()
+            if self._pool is None:
+                raise ConnectionError("RDS连接池不可用")
+            pool = self._pool
         
-        for attempt in range(retries):
+        # 最多丢弃 maxconn 个失效连接，之后池会新建连接
+        for _ in range(POOL_MAXCONN + 1):
+            fresh = not pool._pool  # 池中无空闲连接时 getconn 会新建连接，无需再检查
+            conn = pool.getconn()
+            if fresh or self._is_healthy(conn):
+                return pool, conn
+            self._count('discarded')
+            self._last_used.pop(id(conn), None)
+            pool.putconn(conn, close=True)
+        raise ConnectionError("RDS连接健康检查连续失败")
+    
+    def _count(self, name, value=1):
+        with self._lock:
+            self._metrics[name] += value
+    
+    def _release(self, pool, conn, broken=False):
+        """归还连接；异常或断开的连接直接关闭"""
+        if broken or conn.closed:
+            self._count('discarded')
+            self._last_used.pop(id(conn), None)
+        else:
+            self._last_used[id(conn)] = time.monotonic()
+        
+        try:
+            pool.putconn(conn, close=broken or bool(conn.closed))
+            if conn.closed:
+                # 超出 minconn 的空闲连接会被 psycopg2 直接关闭
+                self._last_used.pop(id(conn), None)
+        except Exception as e:
+            # 连接池已被重建，旧连接直接关闭
+            logger.warning(f"释放连接失败: {e}")
             try:
-                if self._pool is None:
-                    self._init_pool()
-                
-                if self._pool:
-                    conn = self._pool.getconn()
-                    
-                    # 测试连接是否有效
-                    with conn.cursor() as cursor:
-                        cursor.execute("SELECT 1")
-                    
-                    yield conn
-                    return
+                conn.close()
+            except Exception:
+                pass
+    
+    @contextmanager
+    def get_connection(self, retries=3, delay=2, timeout=CHECKOUT_TIMEOUT):
+        """获取连接 - 带重试机制，退出时自动归还连接池"""
+        wait_start = time.monotonic()
+        if not self._slots.acquire(timeout=timeout):
+            self._count('checkout_failures')
+            raise ConnectionError(f"等待RDS连接超时 ({timeout}s)，连接池已满")
+        
+        try:
+            pool = conn = None
+            last_error = None
+            
+            for attempt in range(retries):
+                try:
+                    pool, conn = self._checkout()
+                    break
+                except Exception as e:
+                    last_error = e
+                    logger.warning(f"连接尝试 {attempt+1}/{retries} 失败: {e}")
                     
-            except Exception as e:
-                last_error = e
-                logger.warning(f"连接尝试 {attempt+1}/{retries} 失败: {e}")
-                
-                # 如果是最后一次尝试，重新初始化连接池
-                if attempt < retries - 1:
-                    time.sleep(delay)
-                    self._pool = None  # 强制重新初始化
-                
-        # 所有重试都失败
-        raise ConnectionError(f"无法连接到RDS (重试{retries}次): {last_error}")
+                    if attempt < retries - 1:
+                        time.sleep(delay)
+                        self._reset_pool()  # 强制重新初始化
+            
+            if conn is None:
+                # 所有重试都失败
+                self._count('checkout_failures')
+                raise ConnectionError(f"无法连接到RDS (重试{retries}次): {last_error}")
+            
+            wait_ms = (time.monotonic() - wait_start) * 1000
+            with self._lock:
+                m = self._metrics
+                m['checkouts'] += 1
+                m['wait_ms_total'] += wait_ms
+                m['wait_ms_max'] = max(m['wait_ms_max'], wait_ms)
+                m['in_use'] += 1
+                m['peak_in_use'] = max(m['peak_in_use'], m['in_use'])
+            
+            broken = False
+            try:
+                yield conn
+            except Exception:
+                try:
+                    conn.rollback()
+                except Exception:
+                    broken = True
+                raise
+            finally:
+                self._count('in_use', -1)
+                self._release(pool, conn, broken)
+        finally:
+            self._slots.release()
     
     def release_connection(self, conn):
         """释放连接回池"""
         if self._pool and conn:
-            try:
-                self._pool.putconn(conn)
-            except Exception as e:
-                logger.warning(f"释放连接失败: {e}")
-                try:
-                    conn.close()
-                except:
-                    pass
+            self._release(self._pool, conn)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """连接池指标：池大小、借出次数、等待时间"""
+        with self._lock:
+            m = dict(self._metrics)
+            idle = len(self._pool._pool) if self._pool else 0
+        m['wait_ms_avg'] = round(m['wait_ms_total'] / m['checkouts'], 2) if m['checkouts'] else 0.0
+        m['wait_ms_total'] = round(m['wait_ms_total'], 2)
+        m['wait_ms_max'] = round(m['wait_ms_max'], 2)
+        m.update({
+            'host': self._config['host'],
+            'database': self._config['database'],
+            'minconn': POOL_MINCONN,
+            'maxconn': POOL_MAXCONN,
+            'idle': idle,
+            'pool_size': idle + m['in_use'],
+        })
+        return m
     
     def close_all(self):
         """关闭所有连接"""
@@ -125,13 +279,15 @@ class RDSConnectionPool:
                 logger.info("✅ 所有连接已关闭")
             except Exception as e:
                 logger.error(f"关闭连接池失败: {e}")
+            self._pool = None
+            self._last_used.clear()
 
 
 class RDSHealthChecker:
     """RDS健康检查器"""
     
-    def __init__(self):
-        self.pool = RDSConnectionPool()
+    def __init__(self, pool=None):
+        self.pool = pool or RDSConnectionPool()
         self.last_check = None
         self.last_status = None
     
@@ -185,9 +341,9 @@ class RDSHealthChecker:
 class RobustRDSManager:
     """健壮的RDS管理器 - 带容错"""
     
-    def __init__(self):
-        self.pool = RDSConnectionPool()
-        self.health = RDSHealthChecker()
+    def __init__(self, config=None):
+        self.pool = RDSConnectionPool(config)
+        self.health = RDSHealthChecker(self.pool)
     
     def execute_with_fallback(self, sql, params=None, fallback_result=None):
         """执行SQL - 带容错"""
@@ -265,38 +421,29 @@ class RobustRDSManager:
         print("\n4️⃣ 压力测试（5次顺序连接）...")
         success = 0
         for i in range(5):
-            conn = None
             try:
                 start = time.time()
-                # 直接获取连接，不使用上下文管理器以便手动释放
-                conn = self.pool._pool.getconn()
-                with conn.cursor() as cursor:
-                    cursor.execute("SELECT 1")
-                    latency = (time.time() - start) * 1000
-                    print(f"   请求 {i+1}: {latency:.1f}ms ✅")
-                    success += 1
+                with self.pool.get_connection(retries=1) as conn:
+                    with conn.cursor() as cursor:
+                        cursor.execute("SELECT 1")
+                        latency = (time.time() - start) * 1000
+                        print(f"   请求 {i+1}: {latency:.1f}ms ✅")
+                        success += 1
             except Exception as e:
                 print(f"   请求 {i+1}: ❌ {e}")
-            finally:
-                if conn:
-                    self.pool._pool.putconn(conn)
-                # 短暂间隔避免连接池耗尽
-                time.sleep(0.1)
         
         print(f"\n成功率: {success}/5 ({success*20}%)")
         
+        stats = self.pool.get_stats()
+        print(f"连接池: {stats['pool_size']}/{stats['maxconn']}  "
+              f"借出 {stats['checkouts']} 次  平均等待 {stats['wait_ms_avg']}ms")
+        
         return success >= 4  # 放宽要求，80%成功率即可
 
 
-# 全局连接池实例
-_pool_instance = None
-
-def get_pool():
-    """获取全局连接池"""
-    global _pool_instance
-    if _pool_instance is None:
-        _pool_instance = RDSConnectionPool()
-    return _pool_instance
+def get_pool(config=None):
+    """获取全局连接池（同一配置共享同一个池）"""
+    return RDSConnectionPool(config)
 
 
 def main():
@@ -310,6 +457,7 @@ def main():
         print("\n用法:")
         print("  python3 rds_pool.py test      # 完整连接测试")
         print("  python3 rds_pool.py health    # 健康检查")
+        print("  python3 rds_pool.py stats     # 连接池指标")
         sys.exit(1)
     
     cmd = sys.argv[1]
@@ -322,6 +470,10 @@ def main():
         health = manager.health.check_health()
         print(json.dumps(health, indent=2, default=str))
     
+    elif cmd == 'stats':
+        manager.health.check_health()
+        print(json.dumps(manager.pool.get_stats(), indent=2, default=str))
+    
     else:
         print(f"❌ 未知命令: {cmd}")
 
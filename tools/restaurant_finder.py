@@ -2,6 +2,8 @@
 """
 餐厅推荐查询工具
 基于高德地图坐标，提供附近餐厅推荐和导航链接
+CSV 只解析一次，附近查询走网格索引（见 restaurant_index.py）
+地标推荐走预计算的地标 × 餐厅距离矩阵（见 restaurant_matrix.py）
 """
 
 import csv
@@ -9,12 +11,33 @@ import json
 import math
 from urllib.parse import quote
 
+from restaurant_index import get_catalog
+
 CSV_FILE = "/root/.openclaw/workspace/restaurants_full_with_coords.csv"
 
-def load_restaurants():
-    """加载餐厅数据"""
+# 常见地点坐标库（广州）
+LANDMARKS = {
+    '沙面': (113.244, 23.107),
+    '上下九': (113.243, 23.115),
+    '北京路': (113.272, 23.128),
+    '天河城': (113.324, 23.138),
+    '珠江新城': (113.324, 23.120),
+    '体育西': (113.321, 23.137),
+    '江南西': (113.273, 23.095),
+    '东山口': (113.293, 23.130),
+    '客村': (113.316, 23.100),
+    '芳村': (113.209, 23.098),
+    '番禺': (113.384, 22.937),
+    '海珠': (113.262, 23.105),
+    '荔湾': (113.226, 23.106),
+    '越秀': (113.267, 23.130),
+    '天河': (113.335, 23.138),
+}
+
+def load_restaurants(path=CSV_FILE):
+    """加载餐厅数据（解析 CSV；查询请用 get_catalog() 共享的目录）"""
     restaurants = []
-    with open(CSV_FILE, 'r', encoding='utf-8') as f:
+    with open(path, 'r', encoding='utf-8') as f:
         reader = csv.DictReader(f)
         for row in reader:
             # 只加载有坐标的
@@ -44,28 +67,12 @@ def haversine_distance(lng1, lat1, lng2, lat2):
     return R * c
 
 def get_nearby_restaurants(user_lng, user_lat, max_distance_km=5, min_score=0, list_type=None, limit=5):
-    """获取附近的餐厅"""
-    restaurants = load_restaurants()
-    
-    # 计算距离
-    for r in restaurants:
-        r['距离'] = haversine_distance(user_lng, user_lat, r['经度'], r['纬度'])
-    
-    # 筛选
-    filtered = [r for r in restaurants if r['距离'] <= max_distance_km]
-    if min_score > 0:
-        filtered = [r for r in filtered if r['评分'] >= min_score]
-    if list_type:
-        filtered = [r for r in filtered if r.get('清单') == list_type]
-    
-    # 按距离排序，然后按评分
-    filtered.sort(key=lambda x: (x['距离'], -x['评分']))
-    
-    return filtered[:limit]
+    """获取附近的餐厅（按距离排序，然后按评分；返回附加 距离 字段的副本）"""
+    return get_catalog().nearby(user_lng, user_lat, max_distance_km, min_score, list_type, limit)
 
 def get_restaurants_by_district(district, list_type=None, min_score=0, limit=10):
     """按区域获取餐厅"""
-    restaurants = load_restaurants()
+    restaurants = get_catalog().records
     
     # 筛选区域（支持模糊匹配）
     filtered = []
@@ -82,7 +89,7 @@ def get_restaurants_by_district(district, list_type=None, min_score=0, limit=10)
     # 按评分排序
     filtered.sort(key=lambda x: -x['评分'])
     
-    return filtered[:limit]
+    return [dict(r) for r in filtered[:limit]]
 
 def generate_nav_link(name, lng, lat, mode='car'):
     """生成高德导航链接"""
@@ -101,28 +108,14 @@ def format_restaurant(r, show_distance=False):
     info += f" | {r.get('城区', 'N/A')}"
     if show_distance and '距离' in r:
         info += f" | 📏{r['距离']:.1f}km"
+    if show_distance and '驾车分钟' in r:
+        info += f" | 🚗约{r['驾车分钟']}分钟"
     return info
 
 def recommend_by_location(location_desc, max_distance=3, list_type=None):
     """根据位置描述推荐餐厅"""
-    # 常见地点坐标库（广州）
-    location_coords = {
-        '沙面': (113.244, 23.107),
-        '上下九': (113.243, 23.115),
-        '北京路': (113.272, 23.128),
-        '天河城': (113.324, 23.138),
-        '珠江新城': (113.324, 23.120),
-        '体育西': (113.321, 23.137),
-        '江南西': (113.273, 23.095),
-        '东山口': (113.293, 23.130),
-        '客村': (113.316, 23.100),
-        '芳村': (113.209, 23.098),
-        '番禺': (113.384, 22.937),
-        '海珠': (113.262, 23.105),
-        '荔湾': (113.226, 23.106),
-        '越秀': (113.267, 23.130),
-        '天河': (113.335, 23.138),
-    }
+    location_coords = LANDMARKS
+    catalog = get_catalog()
     
     # 匹配位置
     matched_location = None
@@ -133,7 +126,7 @@ def recommend_by_location(location_desc, max_distance=3, list_type=None):
     
     if not matched_location:
         # 尝试按区域匹配
-        for r in load_restaurants():
+        for r in catalog.records:
             district = r.get('城区', '')
             if district and (district in location_desc or location_desc in district):
                 # 使用该区域的第一个餐厅坐标作为参考
@@ -144,7 +137,11 @@ def recommend_by_location(location_desc, max_distance=3, list_type=None):
         return None, f"未知位置: {location_desc}。支持: {', '.join(location_coords.keys())}"
     
     loc_name, (lng, lat) = matched_location
-    restaurants = get_nearby_restaurants(lng, lat, max_distance_km=max_distance, list_type=list_type, limit=5)
+    if loc_name in location_coords:
+        from restaurant_matrix import get_matrix
+        restaurants = get_matrix().nearby(loc_name, max_distance, list_type=list_type, limit=5)
+    else:
+        restaurants = catalog.nearby(lng, lat, max_distance, list_type=list_type, limit=5)
     
     return restaurants, loc_name
 
@@ -229,8 +226,7 @@ def main():
         name = sys.argv[2]
         
         # 搜索餐厅
-        restaurants = load_restaurants()
-        found = [r for r in restaurants if name in r.get('店名', '')]
+        found = get_catalog().by_name(name)
         
         if not found:
             print(f"❌ 未找到: {name}")
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+餐厅空间索引 - 只加载一次的餐厅目录 + 网格索引 + 向量化 haversine + 有界堆 top-k
+
+- RestaurantCatalog: CSV 解析一次，经纬度 / 评分 / 清单按列存为 NumPy 数组；
+  get_catalog() 在 CSV 修改后自动重新加载
+- GridIndex: 按 cell_deg 度划分网格（类似 geohash），点按 (行, 列) 排序后连续存放，
+  同一行相邻的格子在数组中也相邻；半径查询只取覆盖外接矩形的每行一段切片作为候选
+- 候选点用向量化 haversine 精确计算距离；top-k 先用 np.partition 取第 k 小的距离作为门槛，
+  门槛内的点再用 heapq.nsmallest（有界堆）按 (距离, -评分) 取前 k
+- 返回的餐厅是记录的副本（附加 距离 字段），不修改缓存
+"""
+
+import heapq
+import math
+import os
+import threading
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEG_LAT = math.pi * EARTH_RADIUS_KM / 180      # 约 111.195 km
+CELL_DEG = 0.01                                         # 网格边长（度），广州纬度约 1.0 x 1.1 km
+
+
+def haversine_km(lng, lat, lngs, lats):
+    """一点到多点的球面距离（公里），lngs / lats 为数组"""
+    lat1 = math.radians(lat)
+    lat2 = np.radians(lats)
+    dlat = lat2 - lat1
+    dlng = np.radians(lngs) - math.radians(lng)
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def top_k(distances, scores, ids, k):
+    """按 (距离, -评分) 取前 k 个 -> [(距离, 序号)]"""
+    if k <= 0 or len(distances) == 0:
+        return []
+    if len(distances) > k:
+        # 第 k 小的距离作为门槛，并列的点全部保留，结果与全排序一致
+        threshold = np.partition(distances, k - 1)[k - 1]
+        keep = distances <= threshold
+        distances, scores, ids = distances[keep], scores[keep], ids[keep]
+    best = heapq.nsmallest(k, zip(distances.tolist(), (-scores).tolist(), ids.tolist()))
+    return [(d, i) for d, _, i in best]
+
+
+class GridIndex:
+    """经纬度网格索引（只读，可多线程共享）"""
+
+    def __init__(self, lngs, lats, cell_deg=CELL_DEG):
+        self.cell = cell_deg
+        lngs = np.asarray(lngs, dtype=np.float64)
+        lats = np.asarray(lats, dtype=np.float64)
+        self.size = len(lngs)
+        if self.size:
+            self.lng0, self.lat0 = float(lngs.min()), float(lats.min())
+            self.nx = int((lngs.max() - self.lng0) // cell_deg) + 1
+            self.ny = int((lats.max() - self.lat0) // cell_deg) + 1
+        else:
+            self.lng0 = self.lat0 = 0.0
+            self.nx = self.ny = 1
+        keys = self._cells(lats, self.lat0, self.ny) * self.nx + self._cells(lngs, self.lng0, self.nx)
+        self.order = np.argsort(keys, kind='stable')      # 排序后位置 -> 原序号
+        self.keys = keys[self.order]
+        self.lngs = lngs[self.order]
+        self.lats = lats[self.order]
+
+    def _cells(self, values, origin, count):
+        return np.clip(((values - origin) // self.cell).astype(np.int64), 0, count - 1)
+
+    def _cell_range(self, low, high, origin, count):
+        a = int(math.floor((low - origin) / self.cell))
+        b = int(math.floor((high - origin) / self.cell))
+        return max(a, 0), min(b, count - 1)
+
+    def candidates(self, lng, lat, radius_km):
+        """外接矩形覆盖的格子中的点 -> 排序后的位置数组"""
+        if not self.size:
+            return np.empty(0, dtype=np.int64)
+        dlat = radius_km / KM_PER_DEG_LAT
+        dlng = radius_km / (KM_PER_DEG_LAT * max(math.cos(math.radians(abs(lat) + dlat)), 1e-6))
+        x0, x1 = self._cell_range(lng - dlng, lng + dlng, self.lng0, self.nx)
+        y0, y1 = self._cell_range(lat - dlat, lat + dlat, self.lat0, self.ny)
+        if x0 > x1 or y0 > y1:
+            return np.empty(0, dtype=np.int64)
+        rows = np.arange(y0, y1 + 1, dtype=np.int64) * self.nx
+        starts = np.searchsorted(self.keys, rows + x0, side='left')
+        ends = np.searchsorted(self.keys, rows + x1, side='right')
+        spans = [np.arange(a, b) for a, b in zip(starts.tolist(), ends.tolist()) if b > a]
+        return np.concatenate(spans) if spans else np.empty(0, dtype=np.int64)
+
+    def within(self, lng, lat, radius_km):
+        """半径内的点 -> (排序后的位置, 距离)"""
+        pos = self.candidates(lng, lat, radius_km)
+        distances = haversine_km(lng, lat, self.lngs[pos], self.lats[pos])
+        keep = distances <= radius_km
+        return pos[keep], distances[keep]
+
+
+class RestaurantCatalog:
+    """餐厅目录：记录列表 + 列式数组 + 网格索引"""
+
+    def __init__(self, records, cell_deg=CELL_DEG):
+        self.records = records
+        self.index = GridIndex([r['经度'] for r in records], [r['纬度'] for r in records], cell_deg)
+        order = self.index.order
+        # 过滤用的列与索引同序存放
+        self.scores = np.array([r['评分'] for r in records], dtype=np.float64)[order]
+        self.lists = np.array([r.get('清单') or '' for r in records], dtype=object)[order]
+
+    def __len__(self):
+        return len(self.records)
+
+    def _result(self, idx, distance):
+        return dict(self.records[idx], 距离=distance)
+
+    def nearby(self, lng, lat, max_distance_km=5, min_score=0, list_type=None, limit=5):
+        """半径内按 (距离, -评分) 排序的前 limit 家"""
+        pos, distances = self.index.within(lng, lat, max_distance_km)
+        keep = np.ones(len(pos), dtype=bool)
+        if min_score > 0:
+            keep &= self.scores[pos] >= min_score
+        if list_type:
+            keep &= self.lists[pos] == list_type
+        pos, distances = pos[keep], distances[keep]
+        # 并列时按 CSV 中的顺序
+        return [self._result(i, d) for d, i in top_k(distances, self.scores[pos], self.index.order[pos], limit)]
+
+    def radius(self, lng, lat, radius_km):
+        """半径内全部餐厅（按距离排序）"""
+        pos, distances = self.index.within(lng, lat, radius_km)
+        ids = self.index.order[pos]
+        order = np.lexsort((ids, distances))
+        return [self._result(i, d) for i, d in zip(ids[order].tolist(), distances[order].tolist())]
+
+    def nearest(self, lng, lat, k=5, min_score=0, list_type=None):
+        """不限距离的最近 k 家：半径从一个格子起逐次加倍，直到第 k 近的距离落在半径内"""
+        if not len(self):
+            return []
+        radius = self.index.cell * KM_PER_DEG_LAT
+        limit = math.pi * EARTH_RADIUS_KM
+        while True:
+            found = self.nearby(lng, lat, radius, min_score, list_type, k)
+            if len(found) >= k or radius >= limit:
+                return found
+            radius *= 2
+
+    def by_name(self, name):
+        return [r for r in self.records if name in r.get('店名', '')]
+
+
+_catalog = None
+_catalog_key = None
+_catalog_lock = threading.Lock()
+
+def get_catalog(path=None, loader=None):
+    """获取进程内共享的餐厅目录（CSV 修改后自动重新加载）
+
+    loader(path) -> 记录列表，默认为 restaurant_finder.load_restaurants
+    """
+    global _catalog, _catalog_key
+    if loader is None or path is None:
+        from restaurant_finder import CSV_FILE, load_restaurants
+        path = path or CSV_FILE
+        loader = loader or load_restaurants
+    key = (str(path), os.stat(path).st_mtime_ns)
+    with _catalog_lock:
+        if _catalog is None or _catalog_key != key:
+            _catalog = RestaurantCatalog(loader(path))
+            _catalog_key = key
+    return _catalog
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+地标 × 餐厅距离矩阵 - 预计算的球面距离（可选驾车时间），保存为 npz
+
+- 行为地标（restaurant_finder.LANDMARKS），列为餐厅（键: 店名|经度|纬度，坐标保留 5 位小数，
+  与 restaurant_rds 的自然键一致）；距离为 float32 公里，另存每行按距离排序的列号（int32，增量刷新时沿用）
+- 地标查询: 该行已排序的距离上 searchsorted 取半径内的前缀，过滤清单 / 评分后只对前 limit 名
+  （含并列）做 top-k，不再扫描全部餐厅
+- 增量刷新: 按键对齐已有的列，只计算新增餐厅的列和新增 / 坐标变化的地标行，删除的餐厅直接丢弃；
+  get_matrix() 在 CSV 或矩阵文件修改后自动在内存中刷新（不访问网络、不写文件）
+- 驾车时间: refresh --routes 时用 GaodeMap.driving_route（坐标直接作为起终点，不再地理编码）
+  补齐半径内缺失的 地标 → 餐厅 时间，结果随矩阵保存，之后刷新不再重复请求
+"""
+
+import math
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from restaurant_index import get_catalog, haversine_km, top_k
+
+MATRIX_FILE = Path("/root/.openclaw/workspace/data/restaurant_matrix.npz")
+ROUTE_RADIUS_KM = 5         # 只为该距离内的 地标 → 餐厅 请求驾车时间
+ROUTE_WORKERS = 4
+SAVE_EVERY = 200            # 请求驾车时间时每完成多少条保存一次
+
+
+def restaurant_key(r):
+    return f"{r['店名']}|{r['经度']:.5f}|{r['纬度']:.5f}"
+
+
+class DistanceMatrix:
+    """地标 × 餐厅距离矩阵（列与 catalog.records 同序）"""
+
+    def __init__(self, names, coords, keys, distances, durations=None, route_km=None, catalog=None, order=None):
+        self.names = list(names)
+        self.coords = np.asarray(coords, dtype=np.float64).reshape(len(self.names), 2)
+        self.keys = list(keys)
+        shape = (len(self.names), len(self.keys))
+        self.distances = np.asarray(distances, dtype=np.float32).reshape(shape)
+        nan = np.full(shape, np.nan, dtype=np.float32)
+        self.durations = nan if durations is None else np.asarray(durations, dtype=np.float32).reshape(shape)
+        self.route_km = nan.copy() if route_km is None else np.asarray(route_km, dtype=np.float32).reshape(shape)
+        self.catalog = catalog
+        self._index = {name: i for i, name in enumerate(self.names)}
+        # 每行按距离排序的列号（等距的先后不影响结果，nearby 会把并列的都交给 top_k）
+        if order is None:
+            order = np.argsort(self.distances, axis=1, kind='stable')
+        self.order = np.asarray(order, dtype=np.int32).reshape(shape)
+        self.sorted = np.take_along_axis(self.distances, self.order, axis=1)
+        if catalog is not None:
+            self.scores = np.array([r['评分'] for r in catalog.records], dtype=np.float64)
+            self.lists = np.array([r.get('清单') or '' for r in catalog.records], dtype=object)
+
+    @classmethod
+    def empty(cls):
+        return cls([], np.empty((0, 2)), [], np.empty((0, 0)))
+
+    @classmethod
+    def load(cls, path=MATRIX_FILE):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['names'].tolist(), data['coords'], data['keys'].tolist(), data['distances'],
+                       data['durations'], data['route_km'], order=data['order'])
+
+    def save(self, path=MATRIX_FILE):
+        """原子写入（np.savez_compressed，缺失的驾车时间为 NaN）"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + '.tmp.npz')
+        np.savez_compressed(tmp, names=np.array(self.names, dtype=str), coords=self.coords,
+                            keys=np.array(self.keys, dtype=str), distances=self.distances,
+                            durations=self.durations, route_km=self.route_km, order=self.order)
+        os.replace(tmp, path)
+
+    def refresh(self, catalog, landmarks):
+        """-> (按 catalog / landmarks 对齐的新矩阵, 统计)；只计算新增的列和新增 / 变化的地标行"""
+        keys = [restaurant_key(r) for r in catalog.records]
+        names = list(landmarks)
+        coords = np.array([landmarks[n] for n in names], dtype=np.float64).reshape(len(names), 2)
+        lngs = np.array([r['经度'] for r in catalog.records], dtype=np.float64)
+        lats = np.array([r['纬度'] for r in catalog.records], dtype=np.float64)
+
+        old_cols = {}
+        for i, key in enumerate(self.keys):
+            old_cols.setdefault(key, i)
+        src_cols = np.array([old_cols.get(k, -1) for k in keys], dtype=np.int64)
+        src_rows = np.array([self._index[n] if n in self._index and
+                             np.allclose(self.coords[self._index[n]], coords[i]) else -1
+                             for i, n in enumerate(names)], dtype=np.int64)
+
+        shape = (len(names), len(keys))
+        distances = np.empty(shape, dtype=np.float32)
+        durations = np.full(shape, np.nan, dtype=np.float32)
+        route_km = np.full(shape, np.nan, dtype=np.float32)
+        kept_rows, kept_cols = np.flatnonzero(src_rows >= 0), np.flatnonzero(src_cols >= 0)
+        if len(kept_rows) and len(kept_cols):
+            block = np.ix_(src_rows[kept_rows], src_cols[kept_cols])
+            target = np.ix_(kept_rows, kept_cols)
+            distances[target] = self.distances[block]
+            durations[target] = self.durations[block]
+            route_km[target] = self.route_km[block]
+
+        new_rows, new_cols = np.flatnonzero(src_rows < 0), np.flatnonzero(src_cols < 0)
+        recompute = set(new_rows.tolist())
+        for i in range(len(names)):
+            cols = slice(None) if i in recompute else new_cols
+            distances[i, cols] = haversine_km(coords[i, 0], coords[i, 1], lngs[cols], lats[cols])
+
+        # 保留的地标沿用原有的排序：旧列号换成新列号（丢弃已删除的），再与未覆盖的列（新增 / 重复键）合并
+        order = np.empty(shape, dtype=np.int32)
+        old_to_new = np.full(len(self.keys), -1, dtype=np.int64)
+        old_to_new[src_cols[kept_cols]] = kept_cols
+        covered = np.zeros(len(keys), dtype=bool)
+        covered[old_to_new[old_to_new >= 0]] = True
+        uncovered = np.flatnonzero(~covered)
+        for i in range(len(names)):
+            if i in recompute:
+                order[i] = np.argsort(distances[i], kind='stable')
+                continue
+            kept = old_to_new[self.order[src_rows[i]]]
+            kept = kept[kept >= 0]
+            extra = uncovered[np.argsort(distances[i, uncovered], kind='stable')]
+            # 两段各自有序：算出新列在结果中的位置后直接归并
+            slots = np.searchsorted(distances[i, kept], distances[i, extra], side='right') + np.arange(len(extra))
+            rest = np.ones(len(keys), dtype=bool)
+            rest[slots] = False
+            order[i, slots] = extra
+            order[i, rest] = kept
+
+        stats = {
+            'restaurants': len(keys),
+            'added': len(new_cols),
+            'removed': len(old_cols) - int(np.count_nonzero(old_to_new >= 0)),
+            'landmarks_recomputed': len(new_rows),
+            'computed': len(new_rows) * len(keys) + (len(names) - len(new_rows)) * len(new_cols),
+        }
+        return DistanceMatrix(names, coords, keys, distances, durations, route_km, catalog, order), stats
+
+    def nearby(self, landmark, max_distance_km=5, min_score=0, list_type=None, limit=5):
+        """地标附近按 (距离, -评分) 排序的前 limit 家（附加 距离，有驾车时间时附加 驾车分钟）"""
+        li = self._index[landmark]
+        end = int(np.searchsorted(self.sorted[li], max_distance_km, side='right'))
+        cols = self.order[li, :end]
+        distances = self.sorted[li, :end]
+        if min_score > 0 or list_type:
+            keep = np.ones(end, dtype=bool)
+            if min_score > 0:
+                keep &= self.scores[cols] >= min_score
+            if list_type:
+                keep &= self.lists[cols] == list_type
+            cols, distances = cols[keep], distances[keep]
+        if len(cols) > limit > 0:
+            # 已按距离排序：只保留前 limit 名及与第 limit 名距离并列的
+            cut = int(np.searchsorted(distances, distances[limit - 1], side='right'))
+            cols, distances = cols[:cut], distances[:cut]
+        best = top_k(distances.astype(np.float64), self.scores[cols], cols.astype(np.int64), limit)
+        return [self._result(li, i, d) for d, i in best]
+
+    def _result(self, li, col, distance):
+        result = dict(self.catalog.records[col], 距离=distance)
+        seconds = self.durations[li, col]
+        if not math.isnan(seconds):
+            result['驾车分钟'] = round(float(seconds) / 60)
+            result['驾车公里'] = round(float(self.route_km[li, col]), 1)
+        return result
+
+    def missing_routes(self, radius_km=ROUTE_RADIUS_KM):
+        """半径内还没有驾车时间的 (地标行, 餐厅列)，按距离从近到远"""
+        rows, cols = np.nonzero((self.distances <= radius_km) & np.isnan(self.durations))
+        order = np.argsort(self.distances[rows, cols], kind='stable')
+        return list(zip(rows[order].tolist(), cols[order].tolist()))
+
+    def fetch_routes(self, gaode, radius_km=ROUTE_RADIUS_KM, max_routes=None, workers=ROUTE_WORKERS,
+                     path=None):
+        """补齐驾车时间（GaodeMap 负责限速）；配额用完时停止。path 不为空时定期保存"""
+        from gaode_map import QUOTA_INFOCODES
+
+        pairs = self.missing_routes(radius_km)[:max_routes]
+        stats = {'pending': len(pairs), 'fetched': 0, 'failed': 0, 'stopped': False}
+        stop = threading.Event()
+        lock = threading.Lock()
+
+        def fetch(pair):
+            if stop.is_set():
+                return
+            li, col = pair
+            r = self.catalog.records[col]
+            lng, lat = self.coords[li]
+            route = gaode.driving_route(f"{lng:.6f},{lat:.6f}", f"{r['经度']:.6f},{r['纬度']:.6f}")
+            with lock:
+                if route['success']:
+                    self.durations[li, col] = route['duration']
+                    self.route_km[li, col] = route['distance'] / 1000
+                    stats['fetched'] += 1
+                    if path and stats['fetched'] % SAVE_EVERY == 0:
+                        self.save(path)
+                else:
+                    stats['failed'] += 1
+                    if route.get('infocode') in QUOTA_INFOCODES:
+                        stats['stopped'] = True
+                        stop.set()
+
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='gaode-route') as pool:
+                list(pool.map(fetch, pairs))
+        finally:
+            if path:
+                self.save(path)
+        return stats
+
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.distances, self.durations, self.route_km, self.order))
+
+
+_matrix = None
+_matrix_key = None
+_matrix_lock = threading.Lock()
+
+def get_matrix(path=MATRIX_FILE, catalog=None, landmarks=None):
+    """获取与当前餐厅目录对齐的距离矩阵（矩阵文件或 CSV 修改后自动刷新；文件不存在时在内存中计算）"""
+    global _matrix, _matrix_key
+    if landmarks is None:
+        from restaurant_finder import LANDMARKS as landmarks
+    catalog = catalog or get_catalog()
+    path = Path(path)
+    mtime = path.stat().st_mtime_ns if path.exists() else None
+    key = (str(path), mtime, id(catalog), tuple(landmarks.items()))
+    with _matrix_lock:
+        if _matrix is None or _matrix_key != key:
+            base = DistanceMatrix.load(path) if mtime is not None else DistanceMatrix.empty()
+            _matrix, _ = base.refresh(catalog, landmarks)
+            _matrix_key = key
+    return _matrix
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("📐 地标 × 餐厅距离矩阵")
+        print("\n用法:")
+        print("  python3 restaurant_matrix.py refresh [--routes N] [--radius km]  # 增量刷新并保存（可补齐 N 条驾车时间）")
+        print("  python3 restaurant_matrix.py show <地标> [距离km] [类型]")
+        print("  python3 restaurant_matrix.py stats")
+        sys.exit(1)
+
+    from restaurant_finder import LANDMARKS
+    cmd = sys.argv[1]
+    args = sys.argv[2:]
+
+    def option(name, default, cast):
+        if name in args:
+            i = args.index(name)
+            value = cast(args[i + 1])
+            del args[i:i + 2]
+            return value
+        return default
+
+    if cmd == 'refresh':
+        routes = option('--routes', 0, int)
+        radius = option('--radius', ROUTE_RADIUS_KM, float)
+        base = DistanceMatrix.load(MATRIX_FILE) if MATRIX_FILE.exists() else DistanceMatrix.empty()
+        matrix, stats = base.refresh(get_catalog(), LANDMARKS)
+        matrix.save(MATRIX_FILE)
+        print(f"✅ {len(matrix.names)} 个地标 × {stats['restaurants']} 家餐厅（新增 {stats['added']}，"
+              f"删除 {stats['removed']}，重算地标 {stats['landmarks_recomputed']}，计算 {stats['computed']} 个距离）")
+        if routes:
+            from gaode_map import GaodeMap
+            result = matrix.fetch_routes(GaodeMap(), radius, routes, path=MATRIX_FILE)
+            print(f"🚗 驾车时间: 获取 {result['fetched']}，失败 {result['failed']}"
+                  f"{'（配额已用完）' if result['stopped'] else ''}，"
+                  f"{radius}km 内仍缺 {len(matrix.missing_routes(radius))} 条")
+        print(f"💾 {MATRIX_FILE}")
+
+    elif cmd == 'show':
+        landmark = args[0]
+        distance = float(args[1]) if len(args) > 1 else 3
+        list_type = args[2] if len(args) > 2 else None
+        matrix = get_matrix()
+        if landmark not in matrix.names:
+            print(f"未知地标: {landmark}。支持: {', '.join(matrix.names)}")
+            sys.exit(1)
+        for i, r in enumerate(matrix.nearby(landmark, distance, list_type=list_type), 1):
+            drive = f"  🚗{r['驾车分钟']}分钟" if '驾车分钟' in r else ''
+            print(f"{i}. {r['店名']}  📏{r['距离']:.2f}km{drive}")
+
+    elif cmd == 'stats':
+        matrix = get_matrix()
+        known = int(np.count_nonzero(~np.isnan(matrix.durations)))
+        print(f"地标 {len(matrix.names)} 个 × 餐厅 {len(matrix.keys)} 家，内存 {matrix.nbytes() / 1e3:.1f} KB，"
+              f"驾车时间 {known} 条")
+        if MATRIX_FILE.exists():
+            print(f"文件 {MATRIX_FILE}（{MATRIX_FILE.stat().st_size / 1e3:.1f} KB）")
+
+    else:
+        print(f"未知命令: {cmd}")
+
+
+if __name__ == '__main__':
+    main()
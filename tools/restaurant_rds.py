@@ -2,87 +2,461 @@
 """
 餐厅数据RDS工具
 导入CSV、地理搜索、附近推荐
+
+CSV 导入（整个文件一个事务，可重复执行）:
+- 逐行读取、校验并规范化（表头按 CSV_FIELDS 的别名匹配，城市取自完整地址），不合格的行计数并给出样例
+- 合格行分批 COPY 到事务级临时表 restaurants_stage，最后一条 INSERT ... ON CONFLICT 合并
+- 自然键: 店名 + 保留 5 位小数（约 1 米）的坐标（唯一索引 idx_restaurants_natural_key），
+  同一文件内重复的键以最后一行为准；内容没有变化的行不改写
+
+附近搜索（执行 init-geo 创建索引之后）:
+- 距离只在子查询中计算一次，外层按距离过滤、排序，每行末尾附加 distance（公里）
+- earth: 有 earthdistance 扩展时，ll_to_earth(lat, lng) 的 GiST 索引按 <-> 做 KNN（三维直线距离与球面距离单调，结果精确）
+- point: 内置 point 类型的 GiST 索引（不需要扩展），分两步：先按 <-> 取平面（经纬度）最近的 k 家，
+  第 k 家的球面距离就是真实第 k 近距离的上界；再用该上界的外接矩形 <@ 走索引取候选，按球面距离精确排序
+- btree: 以上索引都建不了时，(lat, lng) 复合 B-tree 做外接矩形范围扫描；不限距离的最近 k 家按半径加倍逐次查询
 """
 
 import json
 import csv
+import io
+import math
+import re
+import time
 from datetime import datetime
 from pathlib import Path
 from rds_manager import RDSManager
 
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEG_LAT = math.pi * EARTH_RADIUS_KM / 180
+KNN_START_KM = 1.0          # btree 模式下最近 k 家的起始搜索半径
+
+IMPORT_BATCH = 10000        # 导入时每批 COPY 的行数（同时限制内存中的行数）
+REJECT_SAMPLES = 20         # 导入报告中保留的不合格行样例数
+COORD_DIGITS = 5            # 自然键中坐标保留的小数位
+
+# 表字段 -> CSV 表头（按顺序取第一个存在的列；restaurants_full_with_coords.csv 为第一个别名）
+CSV_FIELDS = {
+    'name': ('店名', '名称', 'name'),
+    'address': ('完整地址', '地址', 'address'),
+    'city': ('城市', 'city'),
+    'district': ('城区', '区域', 'district'),
+    'lat': ('纬度', 'lat'),
+    'lng': ('经度', 'lng'),
+    'rating': ('推荐分', '评分', 'rating'),
+    'category': ('类别', 'category'),
+    'phone': ('电话', 'phone'),
+}
+# 写入 tags 的列（老字号 为 "是" 时写入 "老字号"）
+TAG_FIELDS = ('清单', '老字号', '定位', '茶市饭市')
+
+IMPORT_COLUMNS = ('name', 'address', 'city', 'district', 'lat', 'lng', 'rating', 'category', 'tags', 'phone')
+
+NATURAL_KEY = f"name, COALESCE(ROUND(lat, {COORD_DIGITS}), 0), COALESCE(ROUND(lng, {COORD_DIGITS}), 0)"
+
+# 建唯一索引前先删除旧导入留下的重复行（保留最早的一行）
+NATURAL_KEY_DDL = [
+    f"""
+    DELETE FROM restaurants a USING restaurants b
+    WHERE a.id > b.id
+      AND a.name = b.name
+      AND COALESCE(ROUND(a.lat, {COORD_DIGITS}), 0) = COALESCE(ROUND(b.lat, {COORD_DIGITS}), 0)
+      AND COALESCE(ROUND(a.lng, {COORD_DIGITS}), 0) = COALESCE(ROUND(b.lng, {COORD_DIGITS}), 0)
+    """,
+    f"CREATE UNIQUE INDEX IF NOT EXISTS idx_restaurants_natural_key ON restaurants ({NATURAL_KEY})",
+]
+
+# 事务级临时表，提交时删除；列类型与 restaurants 相同，坐标在 COPY 时按表精度舍入
+STAGE_DDL = """
+CREATE TEMP TABLE restaurants_stage (
+    seq BIGSERIAL,
+    name VARCHAR(256) NOT NULL,
+    address VARCHAR(512),
+    city VARCHAR(50),
+    district VARCHAR(50),
+    lat NUMERIC(10, 8),
+    lng NUMERIC(11, 8),
+    rating NUMERIC(3, 2),
+    category VARCHAR(100),
+    tags JSONB,
+    phone VARCHAR(50)
+) ON COMMIT DROP
+"""
+
+# 同一键取最后一行；内容相同的行不更新（重复导入不产生死元组）
+MERGE_SQL = f"""
+WITH merged AS (
+    INSERT INTO restaurants ({', '.join(IMPORT_COLUMNS)})
+    SELECT DISTINCT ON ({NATURAL_KEY}) {', '.join(IMPORT_COLUMNS)}
+    FROM restaurants_stage
+    ORDER BY {NATURAL_KEY}, seq DESC
+    ON CONFLICT ({NATURAL_KEY}) DO UPDATE SET
+        address = EXCLUDED.address,
+        city = EXCLUDED.city,
+        district = EXCLUDED.district,
+        rating = EXCLUDED.rating,
+        category = EXCLUDED.category,
+        tags = EXCLUDED.tags,
+        phone = EXCLUDED.phone,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE (restaurants.address, restaurants.city, restaurants.district, restaurants.rating,
+           restaurants.category, restaurants.tags, restaurants.phone)
+          IS DISTINCT FROM
+          (EXCLUDED.address, EXCLUDED.city, EXCLUDED.district, EXCLUDED.rating,
+           EXCLUDED.category, EXCLUDED.tags, EXCLUDED.phone)
+    RETURNING (xmax = 0) AS inserted
+)
+SELECT count(*) FILTER (WHERE inserted), count(*),
+       (SELECT count(DISTINCT ({NATURAL_KEY})) FROM restaurants_stage)
+FROM merged
+"""
+
+CITY_PATTERN = re.compile(r'([^省市区县\s]{2,10}?)市')      # 完整地址中的城市（不含 市 字）
+
+# 按优先顺序尝试，建成第一个即止；earthdistance 依赖 cube，ll_to_earth 为 IMMUTABLE，可以建表达式索引
+GEO_INDEX_DDL = [
+    ('earth', 'idx_restaurants_earth', [
+        "CREATE EXTENSION IF NOT EXISTS cube;",
+        "CREATE EXTENSION IF NOT EXISTS earthdistance;",
+        "CREATE INDEX IF NOT EXISTS idx_restaurants_earth ON restaurants "
+        "USING gist (ll_to_earth(lat::float8, lng::float8));",
+    ]),
+    ('point', 'idx_restaurants_geo_point', [
+        "CREATE INDEX IF NOT EXISTS idx_restaurants_geo_point ON restaurants "
+        "USING gist (point(lng::float8, lat::float8));",
+    ]),
+    ('btree', 'idx_restaurants_lat_lng', [
+        "CREATE INDEX IF NOT EXISTS idx_restaurants_lat_lng ON restaurants(lat, lng);",
+    ]),
+]
+
+# asin 形式的 haversine（同一点不会因舍入超出 ACOS 定义域）
+HAVERSINE_SQL = """
+2 * 6371 * ASIN(SQRT(LEAST(1.0,
+    POWER(SIN(RADIANS(lat::float8 - %(lat)s) / 2), 2) +
+    COS(RADIANS(%(lat)s)) * COS(RADIANS(lat::float8)) *
+    POWER(SIN(RADIANS(lng::float8 - %(lng)s) / 2), 2))))
+"""
+
+NEARBY_BTREE_SQL = f"""
+SELECT * FROM (
+    SELECT r.*, {HAVERSINE_SQL} AS distance
+    FROM restaurants r
+    WHERE lat BETWEEN %(lat0)s AND %(lat1)s
+      AND lng BETWEEN %(lng0)s AND %(lng1)s
+) t
+WHERE distance <= %(radius)s
+ORDER BY distance, id
+LIMIT %(limit)s
+"""
+
+# radius 为 NULL 时不限距离
+KNN_EARTH_SQL = f"""
+SELECT * FROM (
+    SELECT r.*, {HAVERSINE_SQL} AS distance
+    FROM restaurants r
+    WHERE lat IS NOT NULL AND lng IS NOT NULL
+    ORDER BY ll_to_earth(lat::float8, lng::float8) <-> ll_to_earth(%(lat)s, %(lng)s)
+    LIMIT %(limit)s
+) t
+WHERE distance <= COALESCE(%(radius)s, distance)
+ORDER BY distance, id
+"""
+
+KNN_POINT_SQL = f"""
+WITH knn AS (
+    SELECT {HAVERSINE_SQL} AS distance
+    FROM restaurants
+    WHERE lat IS NOT NULL AND lng IS NOT NULL
+    ORDER BY point(lng::float8, lat::float8) <-> point(%(lng)s, %(lat)s)
+    LIMIT %(limit)s
+), bound AS (
+    SELECT LEAST(MAX(distance), %(radius)s) AS km FROM knn
+), bbox AS (
+    SELECT box(point(%(lng)s - dlng, %(lat)s - dlat), point(%(lng)s + dlng, %(lat)s + dlat)) AS b
+    FROM (SELECT km / {KM_PER_DEG_LAT!r} + 1e-9 AS dlat,
+                 km / ({KM_PER_DEG_LAT!r} * GREATEST(COS(RADIANS(LEAST(ABS(%(lat)s) + km / {KM_PER_DEG_LAT!r}, 90))), 1e-6))
+                    + 1e-9 AS dlng
+          FROM bound) d
+)
+SELECT * FROM (
+    SELECT r.*, {HAVERSINE_SQL} AS distance
+    FROM restaurants r
+    WHERE point(lng::float8, lat::float8) <@ (SELECT b FROM bbox)
+) t
+WHERE distance <= (SELECT km FROM bound)
+ORDER BY distance, id
+LIMIT %(limit)s
+"""
+
+
+def bounding_box(lat, lng, radius_km):
+    """半径对应的经纬度外接矩形 -> (lat0, lat1, lng0, lng1)"""
+    dlat = radius_km / KM_PER_DEG_LAT
+    dlng = radius_km / (KM_PER_DEG_LAT * max(math.cos(math.radians(min(abs(lat) + dlat, 90))), 1e-6))
+    return lat - dlat, lat + dlat, lng - dlng, lng + dlng
+
+
+def copy_line(values):
+    """一行 -> COPY 文本格式（规范化后的文本字段已不含制表符、换行）"""
+    return '\t'.join('\\N' if v is None else str(v).replace('\\', '\\\\').replace('\x00', '')
+                     for v in values) + '\n'
+
+
+def _number(text, low, high, label):
+    if not text:
+        return None
+    try:
+        number = float(text)
+    except ValueError:
+        raise ValueError(f"{label}不是数字")
+    if not (low <= number <= high):
+        raise ValueError(f"{label}超出范围")
+    return number
+
+
+class RowNormalizer:
+    """按 CSV 表头逐行校验、规范化（按列下标读取，tags 的 JSON 按取值组合缓存）"""
+    
+    FIELDS = ('name', 'address', 'city', 'district', 'lat', 'lng', 'rating', 'category', 'phone')
+    
+    def __init__(self, header, default_city=None):
+        position = {column.strip(): i for i, column in enumerate(header or [])}
+        self.columns = {}
+        for field, aliases in CSV_FIELDS.items():
+            for alias in aliases:
+                if alias in position:
+                    self.columns[field] = alias
+                    break
+        if 'name' not in self.columns:
+            raise ValueError(f"CSV 缺少店名列: {header}")
+        self.indices = [position[self.columns[f]] if f in self.columns else None for f in self.FIELDS]
+        self.tag_indices = [(field, position[field]) for field in TAG_FIELDS if field in position]
+        self.default_city = default_city or ''
+        self._tags = {}
+    
+    def _cells(self, row, indices):
+        # 去掉首尾空白、合并连续空白（同时去掉制表符、换行）
+        width = len(row)
+        return [' '.join(row[i].split()) if i is not None and i < width else '' for i in indices]
+    
+    def normalize(self, row):
+        """CSV 行（列表）-> IMPORT_COLUMNS 顺序的一行；不合格时抛出 ValueError（原因）"""
+        name, address, city, district, lat, lng, rating, category, phone = self._cells(row, self.indices)
+        if not name:
+            raise ValueError("缺少店名")
+        if len(name) > 256:
+            raise ValueError("店名过长")
+        
+        lat = _number(lat, -90, 90, "纬度")
+        lng = _number(lng, -180, 180, "经度")
+        if (lat is None) != (lng is None):
+            raise ValueError("坐标不完整")
+        if lat == 0 and lng == 0:
+            raise ValueError("坐标为 (0, 0)")
+        rating = _number(rating, 0, 5, "评分")
+        
+        if not city:
+            match = CITY_PATTERN.search(address)
+            city = match.group(1) if match else self.default_city
+        
+        key = tuple(self._cells(row, [i for _, i in self.tag_indices]))
+        tags = self._tags.get(key)
+        if tags is None:
+            values = []
+            for (field, _), value in zip(self.tag_indices, key):
+                if field == '老字号':
+                    value = '老字号' if value in ('是', '1', 'true', 'True') else ''
+                if value and value not in values:
+                    values.append(value)
+            tags = self._tags[key] = json.dumps(values, ensure_ascii=False)
+        
+        return (name, address[:512] or None, city[:50] or None, district[:50] or None,
+                lat, lng, rating, category[:100] or None, tags, phone[:50] or None)
+
+
 class RestaurantRDS:
     """餐厅RDS管理"""
     
     def __init__(self):
         self.rds = RDSManager()
+        self._geo_mode = None
+    
+    def _ensure_natural_key(self, cursor):
+        """首次导入时删除重复行并创建自然键唯一索引 -> 删除的重复行数"""
+        cursor.execute("SELECT to_regclass('idx_restaurants_natural_key') IS NOT NULL")
+        if cursor.fetchone()[0]:
+            return 0
+        cursor.execute(NATURAL_KEY_DDL[0])
+        removed = cursor.rowcount
+        cursor.execute(NATURAL_KEY_DDL[1])
+        return removed
     
-    def import_from_csv(self, csv_file):
+    def bulk_import(self, csv_file, default_city=None, batch_size=IMPORT_BATCH):
+        """流式导入 CSV（一个事务，失败时整体回滚）
+        
+        返回 {rows, valid, rejected, reject_reasons, reject_samples, inserted, updated, unchanged,
+              duplicates, deduplicated, seconds, rows_per_sec}
+        duplicates 为文件内重复的自然键行数，deduplicated 为首次建索引时删除的表中旧重复行数
+        """
+        stats = {'rows': 0, 'valid': 0, 'rejected': 0, 'reject_reasons': {}, 'reject_samples': []}
+        start = time.perf_counter()
+        copy_sql = f"COPY restaurants_stage ({', '.join(IMPORT_COLUMNS)}) FROM STDIN"
+        
+        with self.rds.get_connection() as conn:
+            with conn.cursor() as cursor:
+                try:
+                    # 大文件的 COPY / 合并可能超过连接池默认的语句超时（SET LOCAL 随事务结束恢复）
+                    cursor.execute("SET LOCAL statement_timeout = 0")
+                    stats['deduplicated'] = self._ensure_natural_key(cursor)
+                    cursor.execute(STAGE_DDL)
+                    
+                    buf, count = io.StringIO(), 0
+                    
+                    def flush():
+                        buf.seek(0)
+                        cursor.copy_expert(copy_sql, buf)
+                        buf.seek(0)
+                        buf.truncate()
+                    
+                    with open(csv_file, 'r', encoding='utf-8-sig', newline='') as f:
+                        reader = csv.reader(f)
+                        normalizer = RowNormalizer(next(reader, None), default_city)
+                        name_index = normalizer.indices[0]
+                        for row in reader:
+                            if not row:
+                                continue
+                            stats['rows'] += 1
+                            try:
+                                values = normalizer.normalize(row)
+                            except ValueError as e:
+                                reason = str(e)
+                                stats['rejected'] += 1
+                                stats['reject_reasons'][reason] = stats['reject_reasons'].get(reason, 0) + 1
+                                if len(stats['reject_samples']) < REJECT_SAMPLES:
+                                    stats['reject_samples'].append({
+                                        'line': reader.line_num,
+                                        'name': row[name_index] if name_index < len(row) else '',
+                                        'reason': reason,
+                                    })
+                                continue
+                            buf.write(copy_line(values))
+                            stats['valid'] += 1
+                            count += 1
+                            if count >= batch_size:
+                                flush()
+                                count = 0
+                    if count:
+                        flush()
+                    
+                    cursor.execute(MERGE_SQL)
+                    inserted, merged, keys = cursor.fetchone()
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+        
+        elapsed = time.perf_counter() - start
+        stats.update({
+            'inserted': inserted,
+            'updated': merged - inserted,
+            'unchanged': keys - merged,
+            'duplicates': stats['valid'] - keys,
+            'seconds': round(elapsed, 3),
+            'rows_per_sec': round(stats['rows'] / elapsed) if elapsed > 0 else 0,
+        })
+        return stats
+    
+    def import_from_csv(self, csv_file, default_city=None):
         """从CSV导入餐厅数据"""
-        imported = 0
+        try:
+            stats = self.bulk_import(csv_file, default_city)
+        except Exception as e:
+            return f"⚠️ 导入失败（已回滚）: {e}"
         
+        msg = (f"✅ 已导入 {stats['valid']} 家餐厅（新增 {stats['inserted']}，更新 {stats['updated']}，"
+               f"未变 {stats['unchanged']}，文件内重复 {stats['duplicates']}），"
+               f"{stats['rows_per_sec']} 行/秒")
+        if stats['deduplicated']:
+            msg += f"\n🧹 已清理表中旧的重复行 {stats['deduplicated']} 条"
+        if stats['rejected']:
+            reasons = '，'.join(f"{r} {n}" for r, n in stats['reject_reasons'].items())
+            msg += f"\n⚠️ 跳过 {stats['rejected']} 行: {reasons}"
+            for sample in stats['reject_samples'][:5]:
+                msg += f"\n   第 {sample['line']} 行 {sample['name'] or ''}: {sample['reason']}"
+        return msg
+    
+    def init_geo(self):
+        """创建附近搜索的索引（earthdistance GiST > 内置 point GiST > (lat, lng) B-tree，建成第一个即止）"""
+        results = []
         with self.rds.get_connection() as conn:
             with conn.cursor() as cursor:
-                with open(csv_file, 'r', encoding='utf-8') as f:
-                    reader = csv.DictReader(f)
-                    for row in reader:
-                        try:
-                            sql = """
-                            INSERT INTO restaurants 
-                            (name, address, city, district, lat, lng, rating, category, tags, phone)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                            ON CONFLICT DO NOTHING
-                            """
-                            cursor.execute(sql, (
-                                row.get('店名', ''),
-                                row.get('地址', ''),
-                                row.get('城市', ''),
-                                row.get('区域', ''),
-                                float(row['纬度']) if row.get('纬度') else None,
-                                float(row['经度']) if row.get('经度') else None,
-                                float(row['推荐分']) if row.get('推荐分') else None,
-                                row.get('类别', ''),
-                                json.dumps(row.get('标签', '').split(',') if row.get('标签') else []),
-                                row.get('电话', '')
-                            ))
-                            imported += 1
-                            if imported % 10 == 0:
-                                conn.commit()
-                        except Exception as e:
-                            print(f"⚠️ 导入失败 {row.get('店名')}: {e}")
-                            continue
-                
+                cursor.execute("SET statement_timeout = 0")
                 conn.commit()
-        
-        return f"✅ 已导入 {imported} 家餐厅"
+                for mode, index, ddl in GEO_INDEX_DDL:
+                    try:
+                        for sql in ddl:
+                            cursor.execute(sql)
+                        conn.commit()
+                        results.append(f"✅ {mode}: {index}")
+                        break
+                    except Exception as e:
+                        conn.rollback()
+                        results.append(f"⚠️ {mode} 不可用: {str(e).splitlines()[0]}")
+                cursor.execute("RESET statement_timeout")
+                conn.commit()
+        self._geo_mode = None
+        return results
+    
+    def _detect_geo_mode(self, cursor):
+        """按已建索引选择查询方式；都没有时按 btree 查询（结果正确，只是全表扫描）"""
+        if self._geo_mode is None:
+            self._geo_mode = 'btree'
+            for mode, index, _ in GEO_INDEX_DDL:
+                cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (index,))
+                if cursor.fetchone()[0]:
+                    self._geo_mode = mode
+                    break
+        return self._geo_mode
+    
+    def _knn(self, cursor, mode, lat, lng, radius_km, limit):
+        params = {'lat': lat, 'lng': lng, 'radius': radius_km, 'limit': limit}
+        cursor.execute(KNN_EARTH_SQL if mode == 'earth' else KNN_POINT_SQL, params)
+        return cursor.fetchall()
     
     def search_nearby(self, lat, lng, radius_km=5, limit=10):
-        """搜索附近的餐厅"""
-        # 使用Haversine公式计算距离 - PostgreSQL版本
-        sql = """
-        SELECT *, 
-            (6371 * ACOS(
-                COS(RADIANS(%s)) * COS(RADIANS(lat)) * 
-                COS(RADIANS(lng) - RADIANS(%s)) + 
-                SIN(RADIANS(%s)) * SIN(RADIANS(lat))
-            )) AS distance
-        FROM restaurants
-        WHERE lat IS NOT NULL AND lng IS NOT NULL
-        AND (6371 * ACOS(
-                COS(RADIANS(%s)) * COS(RADIANS(lat)) * 
-                COS(RADIANS(lng) - RADIANS(%s)) + 
-                SIN(RADIANS(%s)) * SIN(RADIANS(lat))
-            )) < %s
-        ORDER BY distance
-        LIMIT %s
-        """
-        
+        """搜索附近的餐厅（按距离排序；每行末尾附加 distance 公里）"""
         with self.rds.get_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute(sql, (lat, lng, lat, lat, lng, lat, radius_km, limit))
+                mode = self._detect_geo_mode(cursor)
+                if mode != 'btree':
+                    return self._knn(cursor, mode, lat, lng, radius_km, limit)
+                
+                lat0, lat1, lng0, lng1 = bounding_box(lat, lng, radius_km)
+                cursor.execute(NEARBY_BTREE_SQL, {
+                    'lat': lat, 'lng': lng, 'radius': radius_km, 'limit': limit,
+                    'lat0': lat0, 'lat1': lat1, 'lng0': lng0, 'lng1': lng1,
+                })
                 results = cursor.fetchall()
         
         return results
     
+    def nearest(self, lat, lng, k=10):
+        """不限距离的最近 k 家（KNN）"""
+        with self.rds.get_connection() as conn:
+            with conn.cursor() as cursor:
+                mode = self._detect_geo_mode(cursor)
+                if mode != 'btree':
+                    return self._knn(cursor, mode, lat, lng, None, k)
+        
+        # 半径逐次加倍，直到半径内有 k 家（半径内的行全部参与排序，结果是精确的）
+        radius = KNN_START_KM
+        while True:
+            results = self.search_nearby(lat, lng, radius, k)
+            if len(results) >= k or radius >= math.pi * EARTH_RADIUS_KM:
+                return results
+            radius *= 2
+    
     def search_by_city(self, city, min_rating=None, limit=20):
         """按城市搜索"""
         sql = "SELECT * FROM restaurants WHERE city = %s"
@@ -155,8 +529,10 @@ def main():
     if len(sys.argv) < 2:
         print("🍽️ 餐厅RDS工具")
         print("\n用法:")
-        print("  python3 restaurant_rds.py import <csv文件>     # 导入CSV")
+        print("  python3 restaurant_rds.py import <csv文件> [默认城市]   # 导入CSV（可重复执行）")
+        print("  python3 restaurant_rds.py init-geo                      # 创建附近搜索索引")
         print("  python3 restaurant_rds.py nearby <lat> <lng> [半径km]  # 附近搜索")
+        print("  python3 restaurant_rds.py nearest <lat> <lng> [数量]    # 最近的餐厅（不限距离）")
         print("  python3 restaurant_rds.py city <城市> [最低评分]        # 按城市搜索")
         print("  python3 restaurant_rds.py stats                         # 统计信息")
         print("\n示例:")
@@ -168,7 +544,8 @@ def main():
     
     if cmd == 'import':
         csv_file = sys.argv[2]
-        result = tool.import_from_csv(csv_file)
+        default_city = sys.argv[3] if len(sys.argv) > 3 else None
+        result = tool.import_from_csv(csv_file, default_city)
         print(result)
     
     elif cmd == 'nearby':
@@ -178,6 +555,16 @@ def main():
         results = tool.search_nearby(lat, lng, radius)
         print(tool.format_nearby_results(results))
     
+    elif cmd == 'init-geo':
+        for line in tool.init_geo():
+            print(line)
+    
+    elif cmd == 'nearest':
+        lat = float(sys.argv[2])
+        lng = float(sys.argv[3])
+        k = int(sys.argv[4]) if len(sys.argv) > 4 else 10
+        print(tool.format_nearby_results(tool.nearest(lat, lng, k)))
+    
     elif cmd == 'city':
         city = sys.argv[2]
         min_rating = float(sys.argv[3]) if len(sys.argv) > 3 else None
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+向量索引 - 连续矩阵存储 + 批量 Top-K
+
+- 所有向量归一化后存放在一个连续的 float32 矩阵中（可选 int8 量化）
+- 精确检索：一次矩阵-向量乘法 + argpartition
+- 语料较大时自动构建 IVF 倒排索引（k-means 聚类），只扫描最近的 nprobe 个簇
+"""
+
+import numpy as np
+
+IVF_THRESHOLD = 50000      # 向量数超过该值时启用 IVF 近似检索
+IVF_REBUILD_RATIO = 0.2    # 自上次建索引以来新增/删除超过该比例时重建
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(scores, k):
+    """返回分数最高的 k 个下标（按分数降序）"""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < scores.shape[0]:
+        idx = np.argpartition(-scores, k - 1)[:k]
+    else:
+        idx = np.arange(scores.shape[0])
+    return idx[np.argsort(-scores[idx], kind='stable')]
+
+
+def _nearest(vectors, centroids, block=8192):
+    """每个向量最近的聚类中心（分块计算，避免 N×K 大矩阵）"""
+    result = np.empty(vectors.shape[0], dtype=np.int64)
+    for start in range(0, vectors.shape[0], block):
+        result[start:start + block] = np.argmax(vectors[start:start + block] @ centroids.T, axis=1)
+    return result
+
+
+class VectorIndex:
+    """余弦相似度向量索引"""
+
+    def __init__(self, dim, quantize=False, ivf_threshold=IVF_THRESHOLD, nprobe=8):
+        """
+        quantize: True 时以 int8 存储（内存约为 float32 的 1/4，精度略降）
+        ivf_threshold: 向量数达到该值后启用 IVF；设为 None 始终精确检索
+        """
+        self.dim = dim
+        self.quantize = quantize
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+
+        self.ids = []
+        self._pos = {}
+        self._size = 0
+        dtype = np.int8 if quantize else np.float32
+        self._matrix = np.empty((0, dim), dtype=dtype)
+
+        self._centroids = None
+        self._lists = None
+        self._assigned = 0
+        self._changes = 0
+
+    def __len__(self):
+        return self._size
+
+    # ---------- 写入 ----------
+
+    def _encode(self, vectors):
+        vectors = _normalize(vectors)
+        if self.quantize:
+            return np.clip(np.rint(vectors * 127), -127, 127).astype(np.int8)
+        return vectors
+
+    def _reserve(self, extra):
+        """按倍数扩容，避免每次追加都复制整个矩阵"""
+        need = self._size + extra
+        if need <= self._matrix.shape[0]:
+            return
+        capacity = max(need, self._matrix.shape[0] * 2, 1024)
+        grown = np.empty((capacity, self.dim), dtype=self._matrix.dtype)
+        grown[:self._size] = self._matrix[:self._size]
+        self._matrix = grown
+
+    def add(self, ids, vectors):
+        """批量添加向量；已存在的 id 会被覆盖"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if len(ids) != vectors.shape[0]:
+            raise ValueError("ids 与向量数量不一致")
+
+        existing = [i for i in ids if i in self._pos]
+        if existing:
+            self.remove(existing)
+
+        self._reserve(len(ids))
+        for start in range(0, len(ids), 65536):
+            block = self._encode(vectors[start:start + 65536])
+            self._matrix[self._size + start:self._size + start + block.shape[0]] = block
+        for offset, doc_id in enumerate(ids):
+            self._pos[doc_id] = self._size + offset
+            self.ids.append(doc_id)
+        self._size += len(ids)
+        self._changes += len(ids)
+
+    def remove(self, ids):
+        """删除向量（压缩矩阵，保持连续存储）"""
+        drop = sorted((self._pos[i] for i in ids if i in self._pos))
+        if not drop:
+            return
+        keep = np.ones(self._size, dtype=bool)
+        keep[drop] = False
+        self._matrix = self._matrix[:self._size][keep].copy()
+        self.ids = [doc_id for doc_id, k in zip(self.ids, keep) if k]
+        self._pos = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        self._size = len(self.ids)
+        # 下标已变化，IVF 需要重建
+        self._centroids = None
+        self._lists = None
+        self._assigned = 0
+        self._changes = 0
+
+    @property
+    def matrix(self):
+        """有效部分的向量矩阵（只读视图）"""
+        return self._matrix[:self._size]
+
+    def vectors_float(self, rows=None):
+        """取出 float32 向量（量化存储时反量化）"""
+        m = self.matrix if rows is None else self.matrix[rows]
+        if self.quantize:
+            return m.astype(np.float32) / 127.0
+        return m
+
+    # ---------- 检索 ----------
+
+    def _scores(self, rows, query):
+        """对指定行计算余弦相似度"""
+        m = self.matrix if rows is None else self.matrix[rows]
+        if not self.quantize:
+            return m @ query
+        # 分块反量化，避免一次性生成 N×D 的 float32 临时矩阵
+        scores = np.empty(m.shape[0], dtype=np.float32)
+        for start in range(0, m.shape[0], 65536):
+            block = m[start:start + 65536].astype(np.float32)
+            scores[start:start + block.shape[0]] = block @ query
+        return scores / 127.0
+
+    def search(self, query, top_k=5, exact=False):
+        """返回 [(id, score)]，按相似度降序"""
+        if self._size == 0:
+            return []
+        query = _normalize(np.asarray(query, dtype=np.float32).reshape(self.dim))
+
+        use_ivf = (not exact and self.ivf_threshold is not None
+                   and self._size >= self.ivf_threshold)
+        if use_ivf:
+            self._maybe_build_ivf()
+            rows = self._ivf_candidates(query)
+            scores = self._scores(rows, query)
+            order = _top_k(scores, top_k)
+            return [(self.ids[rows[i]], float(scores[i])) for i in order]
+
+        scores = self._scores(None, query)
+        order = _top_k(scores, top_k)
+        return [(self.ids[i], float(scores[i])) for i in order]
+
+    # ---------- IVF ----------
+
+    def _maybe_build_ivf(self):
+        if self._centroids is None or self._changes > IVF_REBUILD_RATIO * max(self._assigned, 1):
+            self.build_ivf()
+
+    def build_ivf(self, nlist=None, iterations=10, sample_size=50000, seed=0):
+        """k-means 聚类构建倒排列表"""
+        n = self._size
+        nlist = nlist or max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(seed)
+
+        sample_rows = rng.choice(n, size=min(n, sample_size), replace=False)
+        sample = np.ascontiguousarray(self.vectors_float(np.sort(sample_rows)))
+        centroids = sample[rng.choice(sample.shape[0], size=min(nlist, sample.shape[0]), replace=False)].copy()
+
+        for _ in range(iterations):
+            assign = _nearest(sample, centroids)
+            counts = np.bincount(assign, minlength=centroids.shape[0])
+            order = np.argsort(assign, kind='stable')
+            starts = np.searchsorted(assign[order], np.arange(centroids.shape[0]))
+            nonempty = counts > 0
+            sums = np.add.reduceat(sample[order], starts[nonempty], axis=0)
+            centroids[nonempty] = sums / counts[nonempty, None]
+            centroids = _normalize(centroids)
+
+        # 分块分配全部向量，控制内存峰值
+        assign = np.empty(n, dtype=np.int64)
+        for start in range(0, n, 65536):
+            block = self.vectors_float(slice(start, min(start + 65536, n)))
+            assign[start:start + block.shape[0]] = _nearest(block, centroids)
+
+        order = np.argsort(assign, kind='stable')
+        bounds = np.searchsorted(assign[order], np.arange(centroids.shape[0] + 1))
+        self._lists = [order[bounds[c]:bounds[c + 1]] for c in range(centroids.shape[0])]
+        self._centroids = centroids
+        self._assigned = n
+        self._changes = 0
+
+    def _ivf_candidates(self, query):
+        """最近 nprobe 个簇的成员 + 建索引之后新增的向量"""
+        centroid_scores = self._centroids @ query
+        probe = _top_k(centroid_scores, self.nprobe)
+        parts = [self._lists[c] for c in probe]
+        if self._assigned < self._size:
+            parts.append(np.arange(self._assigned, self._size))
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)